@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures the read and write throughput of HDF5 columns created the same
+# way as the SPDV4 driver does (1d, with the given COMPRESSION option) for a
+# range of chunk sizes, including the 'AUTO' HDF5_CHUNK_SIZE option. Synthetic data
+# similar to the X, Y, Z and CLASSIFICATION point columns is used.
+#
+# Three things are timed for each chunk size:
+#   write  - appending the columns a block at a time (as writeData() does)
+#   read   - reading the columns back a block at a time
+#   sparse - reading scattered runs of elements with h5space.H5Space,
+#            like a spatial read of a block of an indexed file.
+
+from __future__ import print_function, division
+
+import os
+import time
+import argparse
+import tempfile
+import numpy
+import h5py
+
+from pylidar.lidarformats import h5space
+from pylidar.lidarformats import spdv4
+
+DEFAULT_CHUNK_SIZES = ['250', '1000', '10000', '100000', 'AUTO']
+
+COLUMNS = [('X', numpy.uint32), ('Y', numpy.uint32), ('Z', numpy.uint32),
+            ('CLASSIFICATION', numpy.uint8)]
+
+def getCmdargs():
+    """
+    Get commandline arguments
+    """
+    p = argparse.ArgumentParser()
+    p.add_argument("-n", "--nelements", type=int, default=10000000,
+            help="Number of elements in each column. (default: %(default)s)")
+    p.add_argument("-b", "--blocksize", type=int, default=100000,
+            help="Number of elements written and read at a time. " +
+                "(default: %(default)s)")
+    p.add_argument("-c", "--chunksize", action="append",
+            help="Chunk size to test. Can be given multiple times. " +
+                "(default: %s)" % ' '.join(DEFAULT_CHUNK_SIZES))
+    p.add_argument("--cachesize", type=int,
+            help="Size of the HDF5 chunk cache in bytes. " +
+                "(default: h5py default)")
+    p.add_argument("--cacheslots", type=int,
+            help="Number of slots in the HDF5 chunk cache. " +
+                "(default: h5py default)")
+    p.add_argument("--compression", default=spdv4.COMPRESSION_GZIP,
+            choices=spdv4.COMPRESSION_TYPES,
+            help="Compression to use. (default: %(default)s)")
+    p.add_argument("--tempdir", help="Directory to create the test file in")
+
+    return p.parse_args()
+
+def createData(nElements):
+    """
+    Create the synthetic columns. Coordinates wander like a scan
+    does so they compress like real data.
+    """
+    data = {}
+    for name, dtype in COLUMNS:
+        if name == 'CLASSIFICATION':
+            col = numpy.random.randint(1, 7, nElements)
+        else:
+            col = numpy.cumsum(numpy.random.randint(-100, 101, nElements))
+            col -= col.min()
+        data[name] = col.astype(dtype)
+    return data
+
+def writeFile(fname, data, chunkSize, blockSize, compression, h5pyKwargs):
+    """
+    Write the columns a block at a time. Returns the time taken.
+    """
+    compressionArgs = spdv4.getCompressionArgs(compression)
+    nElements = len(data[COLUMNS[0][0]])
+    start = time.time()
+    with h5py.File(fname, 'w', **h5pyKwargs) as fileHandle:
+        for blockStart in range(0, nElements, blockSize):
+            blockEnd = min(blockStart + blockSize, nElements)
+            for name, dtype in COLUMNS:
+                block = data[name][blockStart:blockEnd]
+                if name not in fileHandle:
+                    if chunkSize == spdv4.HDF5_CHUNK_SIZE_AUTO:
+                        chunks = (spdv4.getAutoChunkSize(block.dtype.itemsize,
+                                    block.shape[0], nElements),)
+                    else:
+                        chunks = (int(chunkSize),)
+                    dset = fileHandle.create_dataset(name, block.shape,
+                            chunks=chunks, dtype=block.dtype, 
+                            maxshape=(None,), **compressionArgs)
+                    dset[:] = block
+                else:
+                    dset = fileHandle[name]
+                    oldSize = dset.shape[0]
+                    dset.resize((oldSize + block.shape[0],))
+                    dset[oldSize:] = block
+    return time.time() - start
+
+def readFile(fname, blockSize, h5pyKwargs):
+    """
+    Read the columns back a block at a time. Returns the time taken.
+    """
+    start = time.time()
+    with h5py.File(fname, 'r', **h5pyKwargs) as fileHandle:
+        nElements = fileHandle[COLUMNS[0][0]].shape[0]
+        for blockStart in range(0, nElements, blockSize):
+            blockEnd = min(blockStart + blockSize, nElements)
+            for name, dtype in COLUMNS:
+                fileHandle[name][blockStart:blockEnd]
+    return time.time() - start
+
+def readFileSparse(fname, blockSize, h5pyKwargs):
+    """
+    Read scattered runs of elements with a H5Space. The runs select
+    about a quarter of each span of 4 blocks. Returns the time taken
+    and the number of elements read per column.
+    """
+    numpy.random.seed(1)
+    nRead = 0
+    start = time.time()
+    with h5py.File(fname, 'r', **h5pyKwargs) as fileHandle:
+        nElements = fileHandle[COLUMNS[0][0]].shape[0]
+        spanSize = blockSize * 4
+        for spanStart in range(0, nElements, spanSize):
+            spanEnd = min(spanStart + spanSize, nElements)
+            # runs of 1 to 100 elements with gaps of 1 to 300
+            runLengths = numpy.random.randint(1, 101, spanSize)
+            gapLengths = numpy.random.randint(1, 301, spanSize)
+            boolArray = numpy.repeat(numpy.tile([True, False], spanSize),
+                numpy.column_stack([runLengths, gapLengths]).reshape(-1))
+            boolArray = boolArray[:spanEnd - spanStart]
+            space = h5space.H5Space(nElements, boolArray, spanStart)
+            for name, dtype in COLUMNS:
+                space.read(fileHandle[name])
+            nRead += space.getSelectionSize()
+    return time.time() - start, nRead
+
+def run():
+    cmdargs = getCmdargs()
+    chunkSizes = cmdargs.chunksize
+    if chunkSizes is None:
+        chunkSizes = DEFAULT_CHUNK_SIZES
+
+    h5pyKwargs = {}
+    if cmdargs.cachesize is not None:
+        h5pyKwargs['rdcc_nbytes'] = cmdargs.cachesize
+    if cmdargs.cacheslots is not None:
+        h5pyKwargs['rdcc_nslots'] = cmdargs.cacheslots
+
+    data = createData(cmdargs.nelements)
+    nBytes = sum([data[name].nbytes for name, dtype in COLUMNS])
+    mBytes = nBytes / (1024 * 1024)
+    print('%d elements per column, %.1f Mb in total, %s compression' % (
+                cmdargs.nelements, mBytes, cmdargs.compression))
+
+    fd, fname = tempfile.mkstemp(suffix='.h5', dir=cmdargs.tempdir)
+    os.close(fd)
+    try:
+        print('%-10s %12s %12s %12s %12s' % ('chunks', 'write Mb/s',
+                'read Mb/s', 'sparse Mb/s', 'file Mb'))
+        for chunkSize in chunkSizes:
+            writeTime = writeFile(fname, data, chunkSize, cmdargs.blocksize,
+                            cmdargs.compression, h5pyKwargs)
+            fileSize = os.path.getsize(fname) / (1024 * 1024)
+            readTime = readFile(fname, cmdargs.blocksize, h5pyKwargs)
+            h5space.resetReadStats()
+            sparseTime, nRead = readFileSparse(fname, cmdargs.blocksize,
+                            h5pyKwargs)
+            sparseMBytes = mBytes * nRead / cmdargs.nelements
+            print('%-10s %12.1f %12.1f %12.1f %12.1f' % (chunkSize,
+                    mBytes / writeTime, mBytes / readTime,
+                    sparseMBytes / sparseTime, fileSize))
+            print('    sparse read stats:', h5space.getReadStats())
+    finally:
+        os.remove(fname)
+
+if __name__ == '__main__':
+    run()
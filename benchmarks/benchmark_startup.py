@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Times how long the bin/pylidar_* command line programs take to start.
+# Each is run with --help (which imports everything the program needs
+# at the top level and then exits) a number of times and the best and
+# mean times reported. If an input file is given, pylidar_info is also
+# timed on that file and the driver modules it needed are listed.
+
+from __future__ import print_function, division
+
+import os
+import sys
+import glob
+import time
+import argparse
+import subprocess
+
+BIN_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'bin')
+
+LOADED_DRIVERS_CODE = """
+import sys
+from pylidar.lidarformats import generic
+info = generic.getLidarFileInfo(sys.argv[1])
+print(' '.join(sorted(drvMod.modName for drvMod in generic.DRIVER_MODULES
+            if drvMod.module is not None)))
+"""
+
+def getCmdargs():
+    """
+    Get commandline arguments
+    """
+    p = argparse.ArgumentParser()
+    p.add_argument("-n", "--repeats", type=int, default=5,
+            help="Number of times to run each program. (default: %(default)s)")
+    p.add_argument("-p", "--program", action="append",
+            help="Just time the given program (eg pylidar_info). Can be " +
+                "given multiple times")
+    p.add_argument("-i", "--input",
+            help="Also time pylidar_info on this file")
+
+    return p.parse_args()
+
+def timeCmd(cmd, repeats):
+    """
+    Run cmd (a list) repeats times. Returns the best and mean times
+    in seconds.
+    """
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for n in range(repeats):
+            start = time.time()
+            subprocess.call(cmd, stdout=devnull, stderr=devnull)
+            times.append(time.time() - start)
+    return min(times), sum(times) / len(times)
+
+def run():
+    cmdargs = getCmdargs()
+
+    programs = sorted(glob.glob(os.path.join(BIN_DIR, 'pylidar_*')))
+    if cmdargs.program is not None:
+        programs = [prog for prog in programs
+                    if os.path.basename(prog) in cmdargs.program]
+
+    print('%-25s %10s %10s' % ('program', 'best (s)', 'mean (s)'))
+    for prog in programs:
+        best, mean = timeCmd([sys.executable, prog, '--help'],
+                        cmdargs.repeats)
+        print('%-25s %10.3f %10.3f' % (os.path.basename(prog), best, mean))
+
+    if cmdargs.input is not None:
+        prog = os.path.join(BIN_DIR, 'pylidar_info')
+        best, mean = timeCmd([sys.executable, prog, '-i', cmdargs.input],
+                        cmdargs.repeats)
+        print('%-25s %10.3f %10.3f' % ('pylidar_info -i', best, mean))
+
+        output = subprocess.check_output([sys.executable, '-c',
+                    LOADED_DRIVERS_CODE, cmdargs.input])
+        print('driver modules imported:', output.decode().strip())
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Times pylidar_translate converting a LAS file to SPDV4 (non spatially)
+# with a range of --writebuffersize values. 0 writes each block to the
+# output columns straight away (no write buffer). The best time for each
+# is reported along with the throughput in input Mb/s.
+
+from __future__ import print_function, division
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+TRANSLATE = os.path.join(os.path.dirname(os.path.dirname(
+                os.path.abspath(__file__))), 'bin',
+                'pylidar_translate')
+
+DEFAULT_BUFFER_SIZES = ['0', str(4 * 1024 * 1024), str(32 * 1024 * 1024),
+                str(128 * 1024 * 1024)]
+
+def getCmdargs():
+    """
+    Get commandline arguments
+    """
+    p = argparse.ArgumentParser()
+    p.add_argument("-i", "--input", required=True, help="Input LAS file")
+    p.add_argument("-n", "--repeats", type=int, default=3,
+            help="Number of times to run each translation. " +
+                "(default: %(default)s)")
+    p.add_argument("-s", "--buffersize", action="append",
+            help="Write buffer size in bytes to test. Can be given multiple " +
+                "times. (default: %s)" % ' '.join(DEFAULT_BUFFER_SIZES))
+    p.add_argument("--compression",
+            help="Compression to use for the output columns")
+    p.add_argument("--tempdir", help="Directory to create the output file in")
+
+    return p.parse_args()
+
+def timeTranslate(infile, outfile, bufferSize, compression, repeats):
+    """
+    Run pylidar_translate repeats times. Returns the best time
+    in seconds and the size of the output file.
+    """
+    cmd = [sys.executable, TRANSLATE, '-i', infile, '-o', outfile,
+            '-f', 'SPDV4', '--writebuffersize', bufferSize]
+    if compression is not None:
+        cmd.extend(['--compression', compression])
+
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for n in range(repeats):
+            if os.path.exists(outfile):
+                os.remove(outfile)
+            start = time.time()
+            subprocess.check_call(cmd, stdout=devnull, stderr=devnull)
+            times.append(time.time() - start)
+    return min(times), os.path.getsize(outfile)
+
+def run():
+    cmdargs = getCmdargs()
+    bufferSizes = cmdargs.buffersize
+    if bufferSizes is None:
+        bufferSizes = DEFAULT_BUFFER_SIZES
+
+    inMBytes = os.path.getsize(cmdargs.input) / (1024 * 1024)
+    print('%s: %.1f Mb' % (cmdargs.input, inMBytes))
+
+    fd, outfile = tempfile.mkstemp(suffix='.spd', dir=cmdargs.tempdir)
+    os.close(fd)
+    try:
+        print('%-12s %10s %10s %10s' % ('buffer', 'best (s)', 'Mb/s',
+                'out Mb'))
+        for bufferSize in bufferSizes:
+            best, outSize = timeTranslate(cmdargs.input, outfile, bufferSize,
+                            cmdargs.compression, cmdargs.repeats)
+            print('%-12s %10.3f %10.1f %10.1f' % (bufferSize, best,
+                    inMBytes / best, outSize / (1024 * 1024)))
+    finally:
+        if os.path.exists(outfile):
+            os.remove(outfile)
+
+if __name__ == '__main__':
+    run()
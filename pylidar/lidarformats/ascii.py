@@ -43,6 +43,30 @@ These are contained in the SUPPORTEDOPTIONS module level variable.
 |                       | Lines that start with this character are  |
 |                       | ignored. Defaults to '#'                  |
 +-----------------------+-------------------------------------------+
+| PARSE_THREADS         | an int. For uncompressed files, the       |
+|                       | number of threads used to parse the lines |
+|                       | of each block at the same time. Defaults  |
+|                       | to 1.                                     |
++-----------------------+-------------------------------------------+
+| CHECKPOINT_SIDECAR    | a boolean. If true, the table of where    |
+|                       | pulses start that is built up while       |
+|                       | reading (and used to seek to a pulse) is  |
+|                       | saved to a sidecar file (the file name    |
+|                       | plus '.lineidx.npz') on close and loaded  |
+|                       | from it when next opened. For gzip files  |
+|                       | the index of access points is saved too.  |
+|                       | Defaults to False.                        |
++-----------------------+-------------------------------------------+
+
+Uncompressed files are memory mapped and the lines parsed straight
+from the mapping which is much faster than reading them a line at a
+time (as is done for gzip compressed files).
+
+While a gzip file is read an index of access points (where 
+decompression can be restarted) is built every GZIP_INDEX_SPAN bytes 
+of uncompressed data. Seeking back to an earlier pulse then 
+only needs to decompress from the closest access point rather than 
+the start of the file.
 
 """
 
@@ -68,6 +92,7 @@ import sys
 import gzip
 import copy
 import numpy
+import zipfile
 
 from . import generic
 from . import gridindexutils
@@ -76,14 +101,27 @@ from . import gridindexutils
 if os.getenv('READTHEDOCS', default='False') != 'True':
     from . import _ascii
     HAVE_ZLIB = _ascii.HAVE_ZLIB
+    CHECKPOINT_INTERVAL = _ascii.CHECKPOINT_INTERVAL
+    if HAVE_ZLIB:
+        GZIP_INDEX_SPAN = _ascii.GZIP_INDEX_SPAN
+    else:
+        GZIP_INDEX_SPAN = None
 else:
     HAVE_ZLIB = False
+    CHECKPOINT_INTERVAL = None
+    "number of pulses between entries in the checkpoint table"
+    GZIP_INDEX_SPAN = None
+    "minimum bytes of uncompressed data between gzip access points"
 
-SUPPORTEDOPTIONS = ('COL_TYPES', 'PULSE_COLS', 'CLASSIFICATION_CODES', 'COMMENT_CHAR')
+SUPPORTEDOPTIONS = ('COL_TYPES', 'PULSE_COLS', 'CLASSIFICATION_CODES', 
+        'COMMENT_CHAR', 'PARSE_THREADS', 'CHECKPOINT_SIDECAR')
 "driver options"
 COMPULSARYOPTIONS = ('COL_TYPES',)
 "necessary driver options"
 
+CHECKPOINT_SIDECAR_EXT = '.lineidx.npz'
+"extension added to the file name for the checkpoint sidecar"
+
 class ASCIIFile(generic.LiDARFile):
     """
     Driver for reading ASCII files. Uses the underlying _ascii C++ module.
@@ -142,9 +180,16 @@ class ASCIIFile(generic.LiDARFile):
         if 'COMMENT_CHAR' in userClass.lidarDriverOptions:
             commentChar = userClass.lidarDriverOptions['COMMENT_CHAR']
 
+        self.commentChar = commentChar
+
+        parseThreads = 1
+        if 'PARSE_THREADS' in userClass.lidarDriverOptions:
+            parseThreads = userClass.lidarDriverOptions['PARSE_THREADS']
+
         # create reader
         self.reader = _ascii.Reader(fname, self.typeCode, self.pulseDTypes, 
-                            self.pointDTypes, bTimeSequential, commentChar)
+                            self.pointDTypes, bTimeSequential, commentChar,
+                            parseThreads)
 
         self.range = None
         self.lastRange = None
@@ -156,12 +201,127 @@ class ASCIIFile(generic.LiDARFile):
             codes = userClass.lidarDriverOptions['CLASSIFICATION_CODES']
             for trans in codes:
                 self.classificationTranslation.append(trans)
+
+        # checkpoint table sidecar
+        self.checkpointSidecar = False
+        self.nLoadedCheckpoints = 0
+        self.nLoadedAccessPoints = 0
+        if 'CHECKPOINT_SIDECAR' in userClass.lidarDriverOptions:
+            self.checkpointSidecar = (
+                userClass.lidarDriverOptions['CHECKPOINT_SIDECAR'])
+        if self.checkpointSidecar:
+            self.loadCheckpoints()
             
+    @staticmethod
+    def sniffFile(signature):
+        """
+        Same checks as _ascii.getFileType() - gzip header for .gz files
+        otherwise the first char of a .dat, .csv or .txt file.
+        See generic.LiDARFile.sniffFile()
+        """
+        firstChar = signature.header[:1]
+        if signature.extension == '.gz':
+            return signature.header[:2] == b'\x1f\x8b'
+        elif signature.extension in ('.dat', '.csv', '.txt'):
+            return firstChar in (b' ', b'#') or firstChar.isdigit()
+        return False
+
     @staticmethod        
     def getDriverName():
         return 'ASCII'
 
+    def getCheckpointSidecarInfo(self):
+        """
+        Internal method. Returns a dictionary of what the checkpoint
+        table depends on so a sidecar for a different version of the
+        file, or made with different options, isn't used.
+        """
+        pulseCols = ','.join([name for name, dtype, idx in self.pulseDTypes])
+        nCols = len(self.pulseDTypes) + len(self.pointDTypes)
+        info = {'interval' : CHECKPOINT_INTERVAL, 
+            'pulseCols' : pulseCols,
+            'commentChar' : self.commentChar,
+            'nCols' : nCols,
+            'fileSize' : os.path.getsize(self.fname),
+            'mtime' : os.path.getmtime(self.fname)}
+        if self.reader.gzipIndex is not None:
+            info['gzipIndexSpan'] = GZIP_INDEX_SPAN
+        return info
+
+    def loadCheckpoints(self):
+        """
+        Internal method. Loads the checkpoint table from the sidecar
+        file if it exists and matches this file.
+        """
+        sidecar = self.fname + CHECKPOINT_SIDECAR_EXT
+        if not os.path.exists(sidecar):
+            return
+
+        try:
+            with numpy.load(sidecar) as saved:
+                info = self.getCheckpointSidecarInfo()
+                for key in info:
+                    if saved[key] != info[key]:
+                        return
+                checkpoints = saved['checkpoints']
+                gzipIndex = None
+                if self.reader.gzipIndex is not None:
+                    gzipIndex = (saved['gzipOutOffsets'], 
+                            saved['gzipInOffsets'], saved['gzipBits'], 
+                            saved['gzipWindows'])
+        except (IOError, OSError, KeyError, ValueError, zipfile.BadZipfile):
+            # ignore a bad sidecar - the table will be rebuilt
+            return
+
+        # the pulse offsets in a gzip file are no use without the index
+        if gzipIndex is not None:
+            try:
+                self.reader.setGzipIndex(*gzipIndex)
+            except _ascii.error:
+                return
+            self.nLoadedAccessPoints = len(gzipIndex[0])
+
+        self.reader.setCheckpoints(checkpoints)
+        self.nLoadedCheckpoints = len(checkpoints)
+
+    def saveCheckpoints(self):
+        """
+        Internal method. Saves the checkpoint table to the sidecar
+        file if more has been found than was loaded.
+        """
+        checkpoints = self.reader.checkpoints
+        gzipIndex = self.reader.gzipIndex
+        if (len(checkpoints) <= self.nLoadedCheckpoints and 
+                (gzipIndex is None or 
+                len(gzipIndex[0]) <= self.nLoadedAccessPoints)):
+            return
+
+        arrays = {'checkpoints' : checkpoints}
+        if gzipIndex is not None:
+            outOffsets, inOffsets, bits, windows = gzipIndex
+            arrays['gzipOutOffsets'] = outOffsets
+            arrays['gzipInOffsets'] = inOffsets
+            arrays['gzipBits'] = bits
+            arrays['gzipWindows'] = windows
+        arrays.update(self.getCheckpointSidecarInfo())
+
+        # write to a temporary file and rename it so another reader
+        # never sees a partly written sidecar
+        sidecar = self.fname + CHECKPOINT_SIDECAR_EXT
+        tmpSidecar = sidecar + '.%d.tmp' % os.getpid()
+        try:
+            with open(tmpSidecar, 'wb') as f:
+                # the windows of uncompressed data compress well
+                numpy.savez_compressed(f, **arrays)
+            generic.replaceFile(tmpSidecar, sidecar)
+        except (IOError, OSError):
+            # directory may not be writeable. Not an error.
+            if os.path.exists(tmpSidecar):
+                os.remove(tmpSidecar)
+
     def close(self):
+        if self.checkpointSidecar and self.reader is not None:
+            self.saveCheckpoints()
         self.reader = None
         self.range = None
         self.lastRange = None
@@ -338,6 +498,13 @@ class ASCIIFileInfo(generic.LiDARFileInfo):
 
         # I don't think there is any information we can add here??
 
+    @staticmethod
+    def sniffFile(signature):
+        """
+        See ASCIIFile.sniffFile()
+        """
+        return ASCIIFile.sniffFile(signature)
+
     @staticmethod        
     def getDriverName():
         return 'ASCII'
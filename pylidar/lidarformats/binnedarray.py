@@ -0,0 +1,243 @@
+
+"""
+Contains the BinnedArray class which stores data for a block of bins
+in compressed sparse row (CSR) form. That is, a 1d array of the data sorted
+by bin with the start and count of the data in each bin.
+
+This uses much less memory than the 3d masked arrays returned by
+LidarData.getPointsByBins() and LidarData.getPulsesByBins() when a few
+bins contain many more elements than the rest. Pass binned=True to
+these functions to get a BinnedArray instead.
+"""
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import numpy
+
+BIN_START_DTYPE = numpy.int64
+"dtype of BinnedArray.start"
+BIN_COUNT_DTYPE = numpy.int64
+"dtype of BinnedArray.count"
+
+class BinnedArray(object):
+    """
+    Data for a 2d grid of bins. Has the following attributes:
+
+    * data - 1d array (can be structured) of all the elements. The elements
+      for each bin are together and the bins are in row major order.
+    * start - 2d array (nRows, nCols) of the index into data of the first
+      element of each bin.
+    * count - 2d array (nRows, nCols) of the number of elements in each bin.
+
+    So the elements for bin (row, col) are
+    data[start[row, col]:start[row, col] + count[row, col]].
+
+    Indexing a BinnedArray with a column name returns a new BinnedArray
+    for just that column (sharing start and count).
+
+    The reducing methods (min(), max(), sum(), mean() etc) return a 2d
+    masked array like the numpy.ma functions do for a 3d masked array
+    with axis=0. The mask is True for bins with no elements. These
+    methods require data to be a 1d array of numbers -
+    eg binned['Z'].min().
+    """
+    def __init__(self, data, start, count):
+        self.data = data
+        self.start = start
+        self.count = count
+
+    @staticmethod
+    def fromCounts(data, count):
+        """
+        Create a BinnedArray given data already sorted into bins in row
+        major order and the 2d count of elements in each bin.
+        """
+        count = count.astype(BIN_COUNT_DTYPE)
+        start = numpy.zeros(count.shape, dtype=BIN_START_DTYPE)
+        if count.size > 0:
+            flatStart = start.reshape(-1)
+            numpy.cumsum(count.reshape(-1)[:-1], out=flatStart[1:])
+        return BinnedArray(data, start, count)
+
+    @staticmethod
+    def fromIndex(data, idx, idxMask):
+        """
+        Create a BinnedArray from 1d data and the 3d index and mask
+        that would normally be used to create a 3d masked array of it
+        (as returned by gridindexutils.convertSPDIdxToReadIdxAndMaskInfo()).
+        """
+        # put the bins first so the elements in each bin are together
+        valid = numpy.logical_not(idxMask.transpose(1, 2, 0))
+        binnedData = data[idx.transpose(1, 2, 0)[valid]]
+        return BinnedArray.fromCounts(binnedData, valid.sum(axis=2))
+
+    @staticmethod
+    def fromMaskedArray(maskedArray):
+        """
+        Create a BinnedArray from a 3d masked array as returned by
+        LidarData.getPointsByBins() or LidarData.getPulsesByBins().
+        """
+        if maskedArray.dtype.names is not None:
+            firstField = maskedArray.dtype.names[0]
+            mask = numpy.ma.getmaskarray(maskedArray[firstField])
+        else:
+            mask = numpy.ma.getmaskarray(maskedArray)
+
+        valid = numpy.logical_not(mask.transpose(1, 2, 0))
+        data = numpy.ma.getdata(maskedArray).transpose(1, 2, 0)[valid]
+        return BinnedArray.fromCounts(data, valid.sum(axis=2))
+
+    @staticmethod
+    def stack(binnedList):
+        """
+        Combine a list of BinnedArrays with the same shape into one.
+        Elements from each bin in the first BinnedArray come before
+        elements from the same bin in the second BinnedArray and so on.
+        """
+        if len(binnedList) == 1:
+            return binnedList[0]
+
+        data = numpy.concatenate([binned.data for binned in binnedList])
+        binNums = numpy.concatenate([binned.getBinNumbers()
+                                    for binned in binnedList])
+        count = binnedList[0].count.copy()
+        for binned in binnedList[1:]:
+            count += binned.count
+
+        # stable sort so the order of the inputs is kept within a bin
+        order = numpy.argsort(binNums, kind='mergesort')
+        return BinnedArray.fromCounts(data[order], count)
+
+    @property
+    def shape(self):
+        "The (nRows, nCols) of the bins"
+        return self.count.shape
+
+    def __getitem__(self, colName):
+        return BinnedArray(self.data[colName], self.start, self.count)
+
+    def __len__(self):
+        return len(self.data)
+
+    def getBin(self, row, col):
+        """
+        Return the elements in the given bin as a 1d array
+        """
+        start = self.start[row, col]
+        return self.data[start:start + self.count[row, col]]
+
+    def getBinNumbers(self):
+        """
+        Return a 1d array the same length as data of the bin each
+        element is in (as row * nCols + col).
+        """
+        nBins = self.count.size
+        return numpy.repeat(numpy.arange(nBins), self.count.reshape(-1))
+
+    def toMaskedArray(self):
+        """
+        Return the data as a 3d masked array in the same form as
+        LidarData.getPointsByBins() (without binned=True).
+        """
+        nRows, nCols = self.shape
+        flatCount = self.count.reshape(-1)
+        if flatCount.size > 0:
+            maxCount = flatCount.max()
+        else:
+            maxCount = 0
+
+        binNums = self.getBinNumbers()
+        # position of each element within its bin
+        levels = (numpy.arange(len(self.data)) -
+                    self.start.reshape(-1)[binNums])
+
+        outData = numpy.zeros((maxCount, nRows * nCols),
+                        dtype=self.data.dtype)
+        outMask = numpy.ones((maxCount, nRows * nCols), dtype=bool)
+        outData[levels, binNums] = self.data
+        outMask[levels, binNums] = False
+
+        outData = outData.reshape((maxCount, nRows, nCols))
+        outMask = outMask.reshape((maxCount, nRows, nCols))
+        return numpy.ma.array(outData, mask=outMask)
+
+    def reduceBins(self, ufunc, dtype=None):
+        """
+        Apply the given numpy ufunc (eg numpy.minimum) to the elements
+        of each bin with ufunc.reduceat(). Returns a 2d masked array.
+        """
+        data = self.data
+        if dtype is not None:
+            data = data.astype(dtype)
+
+        flatCount = self.count.reshape(-1)
+        nonEmpty = flatCount > 0
+        out = numpy.zeros(flatCount.shape, dtype=data.dtype)
+        if len(data) > 0:
+            out[nonEmpty] = ufunc.reduceat(data,
+                            self.start.reshape(-1)[nonEmpty])
+        out = out.reshape(self.shape)
+        return numpy.ma.array(out, mask=(self.count == 0))
+
+    def min(self):
+        "Minimum of each bin"
+        return self.reduceBins(numpy.minimum)
+
+    def max(self):
+        "Maximum of each bin"
+        return self.reduceBins(numpy.maximum)
+
+    def sum(self):
+        "Sum of each bin"
+        return self.reduceBins(numpy.add, numpy.float64)
+
+    def mean(self):
+        "Mean of each bin"
+        total = self.sum()
+        return total / numpy.ma.array(self.count, mask=total.mask)
+
+    def std(self):
+        "Standard deviation of each bin"
+        mean = self.mean()
+        binNums = self.getBinNumbers()
+        diff = self.data - mean.data.reshape(-1)[binNums]
+        sqDiff = BinnedArray(diff * diff, self.start, self.count)
+        variance = sqDiff.sum() / numpy.ma.array(self.count, mask=mean.mask)
+        return numpy.ma.sqrt(variance)
+
+    def median(self):
+        "Median of each bin"
+        binNums = self.getBinNumbers()
+        # sort by bin then value
+        sortedData = self.data[numpy.lexsort((self.data, binNums))]
+
+        flatCount = self.count.reshape(-1)
+        nonEmpty = flatCount > 0
+        start = self.start.reshape(-1)[nonEmpty]
+        count = flatCount[nonEmpty]
+        lower = sortedData[start + (count - 1) // 2]
+        upper = sortedData[start + count // 2]
+
+        out = numpy.zeros(flatCount.shape, dtype=numpy.float64)
+        out[nonEmpty] = (lower.astype(numpy.float64) + upper) / 2
+        out = out.reshape(self.shape)
+        return numpy.ma.array(out, mask=(self.count == 0))
+
+    def getCount(self):
+        "Number of elements in each bin (as a 2d array - not masked)"
+        return self.count.copy()
@@ -17,6 +17,10 @@ These are contained in the READSUPPORTEDOPTIONS module level variable.
 |                       | of ['BEAM0000', 'BEAM0001', 'BEAM0010',    |
 |                       | 'BEAM0011', 'BEAM0101', 'BEAM0110',        |
 |                       | 'BEAM1000', 'BEAM1011']                    |
+|                       | or BEAM_ALL to read all the beams in the   |
+|                       | file as one stream of pulses (each beam in |
+|                       | turn) with an extra BEAM column of the     |
+|                       | beam number (eg 5 for 'BEAM0101')          |
 +-----------------------+--------------------------------------------+
 """
 
@@ -43,12 +47,20 @@ import copy
 import numpy
 
 from . import generic
+from . import gridindexutils
 
 READSUPPORTEDOPTIONS = ('POINT_FROM', 'BEAM')
 "Supported read options"
 
 DEFAULT_POINT_FROM = ('longitude_lastbin', 'latitude_lastbin', 'elevation_lastbin')
 DEFAULT_BEAM = 'BEAM0101'
+BEAM_ALL = 'ALL'
+"Value for the BEAM option to read all the beams"
+BEAMS = ['BEAM0000', 'BEAM0001', 'BEAM0010', 'BEAM0011', 'BEAM0101', 
+            'BEAM0110', 'BEAM1000', 'BEAM1011']
+"The beams in the order they are read with BEAM_ALL"
+BEAM_NAME = 'BEAM'
+"Column of the beam number added when reading with BEAM_ALL"
 EXPECTED_HEADER_FIELDS = ['l0_to_l1a_githash', 'l0_to_l1a_version']
 CLASSIFICATION_NAME = 'CLASSIFICATION'
 "GEDI L1A01 files don't have a CLASSIFICATION column so we have to create a blank one for SPDV4"
@@ -92,15 +104,56 @@ class GEDIL1A01File(generic.LiDARFile):
         self.beam = DEFAULT_BEAM
         if 'BEAM' in userClass.lidarDriverOptions:
             self.beam = userClass.lidarDriverOptions['BEAM']
+
+        if self.beam == BEAM_ALL:
+            self.beams = [beam for beam in BEAMS if beam in self.fileHandle]
+            if len(self.beams) == 0:
+                self.fileHandle = None
+                msg = 'no beams found in file'
+                raise generic.LiDARFormatNotUnderstood(msg)
+        elif self.beam in self.fileHandle:
+            self.beams = [self.beam]
+        else:
+            self.fileHandle = None
+            msg = 'beam %s not found in file' % self.beam
+            raise generic.LiDARInvalidSetting(msg)
+
+        # dataset handles keyed on (beam, name) so the groups
+        # are only searched once
+        self.datasets = {}
+        # data read for the current range keyed on name. Shared
+        # by the points, pulses and waveforms.
+        self.columnCache = {}
+
+        # the pulses of each beam follow on from the previous one
+        self.beamPulses = [self.getBeamNumberPulses(beam) 
+                                for beam in self.beams]
+        self.beamStarts = numpy.cumsum([0] + self.beamPulses)[:-1]
         
         self.range = None
 
+    @staticmethod
+    def sniffFile(signature):
+        """
+        Checks for the expected header fields.
+        See generic.LiDARFile.sniffFile()
+        """
+        fileHandle = signature.getHDF5Handle()
+        if fileHandle is None:
+            return False
+        for expected in EXPECTED_HEADER_FIELDS:
+            if expected not in fileHandle.attrs:
+                return False
+        return True
+
     @staticmethod        
     def getDriverName():
         return 'GEDIL1A01'
 
     def close(self):
         self.fileHandle = None
+        self.datasets = {}
+        self.columnCache = {}
         self.range = None
 
     def readPointsByPulse(self, colNames=None):
@@ -127,6 +180,8 @@ class GEDIL1A01File(generic.LiDARFile):
         Sets the PulseRange object to use for non spatial
         reads/writes.
         """
+        if self.range is None or pulseRange != self.range:
+            self.columnCache = {}
         self.range = copy.copy(pulseRange)
         nTotalPulses = self.getTotalNumberPulses()
         bMore = True
@@ -141,6 +196,130 @@ class GEDIL1A01File(generic.LiDARFile):
             
         return bMore
 
+    def getDataset(self, beam, name):
+        """
+        Internal method. Returns the h5py dataset for the named column
+        of the given beam, or None if there isn't one. Columns are looked
+        for in the beam group and then the geolocation group.
+        """
+        key = (beam, name)
+        if key not in self.datasets:
+            group = self.fileHandle[beam]
+            if name in group:
+                dataset = group[name]
+            elif name in group['geolocation']:
+                dataset = group['geolocation'][name]
+            else:
+                dataset = None
+            self.datasets[key] = dataset
+
+        return self.datasets[key]
+
+    def getColumnDataset(self, beam, name):
+        """
+        Internal method. As getDataset() but raises LiDARArrayColumnError
+        if the given beam doesn't have the named column.
+        """
+        dataset = self.getDataset(beam, name)
+        if dataset is None:
+            msg = 'column %s not found in %s' % (name, beam)
+            raise generic.LiDARArrayColumnError(msg)
+        return dataset
+
+    def hasColumn(self, name):
+        """
+        Internal method. Returns True if the beams being read have the 
+        named column and False if none of them do. Raises 
+        LiDARArrayColumnError if only some of them do.
+        """
+        missing = [beam for beam in self.beams 
+                        if self.getDataset(beam, name) is None]
+        if len(missing) == len(self.beams):
+            return False
+        elif len(missing) > 0:
+            msg = 'column %s not found in %s' % (name, ', '.join(missing))
+            raise generic.LiDARArrayColumnError(msg)
+        return True
+
+    def getBeamRanges(self):
+        """
+        Internal method. Returns a list of (beam, start, end) of the pulses
+        to read from each beam for the current range.
+        """
+        ranges = []
+        for beam, beamStart, nPulses in zip(self.beams, self.beamStarts, 
+                                self.beamPulses):
+            start = max(self.range.startPulse - beamStart, 0)
+            end = min(self.range.endPulse - beamStart, nPulses)
+            if end > start:
+                ranges.append((beam, start, end))
+        return ranges
+
+    def readColumn(self, name):
+        """
+        Internal method. Returns the named dataset for the current range
+        from all the beams being read. 2d datasets are sliced on the pulse
+        axis (the last for surface_type, otherwise the first). 
+        
+        Raises LiDARArrayColumnError if a beam doesn't have the dataset. 
+        The result is cached until the range changes.
+        """
+        if name in self.columnCache:
+            return self.columnCache[name]
+
+        pulseAxis = 0
+        if name == 'surface_type':
+            pulseAxis = 1
+
+        data = []
+        for beam, start, end in self.getBeamRanges():
+            if name == BEAM_NAME:
+                beamNumber = int(beam[len(BEAM_NAME):], 2)
+                data.append(numpy.full(end - start, beamNumber, 
+                                dtype=numpy.uint16))
+            elif pulseAxis == 1:
+                data.append(self.getColumnDataset(beam, name)[:, start:end])
+            else:
+                data.append(self.getColumnDataset(beam, name)[start:end])
+
+        if len(data) == 0:
+            # empty range. Still need the right type.
+            if name == BEAM_NAME:
+                data.append(numpy.empty(0, dtype=numpy.uint16))
+            elif pulseAxis == 1:
+                data.append(self.getColumnDataset(self.beams[0], name)[:, 0:0])
+            else:
+                data.append(self.getColumnDataset(self.beams[0], name)[0:0])
+
+        if len(data) == 1:
+            data = data[0]
+        else:
+            data = numpy.concatenate(data, axis=pulseAxis)
+
+        self.columnCache[name] = data
+        return data
+
+    def readNamedColumn(self, name):
+        """
+        Internal method. Returns the requested column for the current 
+        range. Creates the CLASSIFICATION column if it isn't in the file, 
+        splits up surface_type and adds the BEAM column for BEAM_ALL.
+        """
+        if name == BEAM_NAME and self.beam == BEAM_ALL:
+            return self.readColumn(BEAM_NAME)
+        elif self.hasColumn(name):
+            return self.readColumn(name)
+        elif name == CLASSIFICATION_NAME:
+            # hack so we can fake a CLASSIFICATION column
+            numRecords = self.range.endPulse - self.range.startPulse
+            return numpy.zeros(numRecords, dtype=numpy.uint8)
+        elif name in SURFACE_TYPE_NAMES:
+            idx = SURFACE_TYPE_NAMES.index(name)
+            return self.readColumn('surface_type')[idx]
+        else:
+            msg = 'column %s not found in file' % name
+            raise generic.LiDARArrayColumnError(msg)
+
     def readRange(self, colNames=None):
         """
         Internal method. Returns the requested column(s) as
@@ -150,48 +329,18 @@ class GEDIL1A01File(generic.LiDARFile):
         Assumes colName is not None
         """
         if isinstance(colNames, str):
-            if colNames == CLASSIFICATION_NAME and colNames not in self.fileHandle[self.beam]['geolocation'] and colNames not in self.fileHandle[self.beam]:
-                # hack so we can fake a CLASSIFICATION column
-                numRecords = self.range.endPulse - self.range.startPulse
-                return numpy.zeros(numRecords, dtype=numpy.uint8)
-
-            if colNames in self.fileHandle[self.beam]:
-                return self.fileHandle[self.beam][colNames][self.range.startPulse:self.range.endPulse]
-            else:
-                return self.fileHandle[self.beam]['geolocation'][colNames][self.range.startPulse:self.range.endPulse]
+            # a copy as the column may be cached
+            return self.readNamedColumn(colNames).copy()
         else:
             # a list etc. Have to build structured array first
-            dtypeList = []
-            for name in colNames:
-                if name == CLASSIFICATION_NAME and name not in self.fileHandle[self.beam]['geolocation'] and name not in self.fileHandle[self.beam]:
-                    dtypeList.append((CLASSIFICATION_NAME, numpy.uint8))
-                else:
-                    if name in self.fileHandle[self.beam]:
-                        s = self.fileHandle[self.beam][name].dtype.str
-                        dtypeList.append((str(name), s))
-                    elif name in self.fileHandle[self.beam]['geolocation']:
-                        s = self.fileHandle[self.beam]['geolocation'][name].dtype.str
-                        dtypeList.append((str(name), s))
-                    elif name in SURFACE_TYPE_NAMES:
-                        s = self.fileHandle[self.beam]['geolocation']['surface_type'].dtype.str
-                        dtypeList.append((str(name), s))
-                    else:
-                        msg = 'column %s not found in file' % name
-                        raise generic.LiDARArrayColumnError(msg)
+            columns = [self.readNamedColumn(name) for name in colNames]
+            dtypeList = [(str(name), column.dtype.str) 
+                            for name, column in zip(colNames, columns)]
 
             numRecords = self.range.endPulse - self.range.startPulse
             data = numpy.empty(numRecords, dtypeList)
-            for name in colNames:
-                if name == CLASSIFICATION_NAME and name not in self.fileHandle[self.beam]['geolocation'] and name not in self.fileHandle[self.beam]:
-                    data[CLASSIFICATION_NAME].fill(0)
-                else:
-                    if name in SURFACE_TYPE_NAMES:
-                        idx = SURFACE_TYPE_NAMES.index(name)
-                        data[str(name)] = self.fileHandle[self.beam]['geolocation']['surface_type'][idx,self.range.startPulse:self.range.endPulse]
-                    elif name in self.fileHandle[self.beam]:
-                        data[str(name)] = self.fileHandle[self.beam][name][self.range.startPulse:self.range.endPulse]
-                    else:
-                        data[str(name)] = self.fileHandle[self.beam]['geolocation'][name][self.range.startPulse:self.range.endPulse]
+            for name, column in zip(colNames, columns):
+                data[str(name)] = column
 
         return data
 
@@ -239,11 +388,12 @@ class GEDIL1A01File(generic.LiDARFile):
         """
         if colNames is None:
             colNames = []
-            for name in self.fileHandle[self.beam]['geolocation'].keys():
+            beamGroup = self.fileHandle[self.beams[0]]
+            for name in beamGroup['geolocation'].keys():
                 # add all the ones that are 1d array
                 try:
                     # some may be sub-datasets etc
-                    shape = self.fileHandle[self.beam]['geolocation'][name].shape
+                    shape = beamGroup['geolocation'][name].shape
                 except AttributeError as e:
                     continue
 
@@ -253,45 +403,93 @@ class GEDIL1A01File(generic.LiDARFile):
                     if name == 'surface_type':
                         for surface_type_name in SURFACE_TYPE_NAMES:
                             colNames.append(str(surface_type_name))
-            for name in self.fileHandle[self.beam].keys():
+            for name in beamGroup.keys():
                 # add all the ones that are 1d array
                 try:
                     # some may be sub-datasets etc
-                    shape = self.fileHandle[self.beam][name].shape
+                    shape = beamGroup[name].shape
                 except AttributeError as e:
                     continue
 
                 if len(shape) == 1:
                     colNames.append(str(name))
+
+            if self.beam == BEAM_ALL:
+                colNames.append(BEAM_NAME)
                     
         return self.readRange(colNames)
         
+    def readWaveformSamples(self, name, startName, countName):
+        """
+        Internal method. Returns the samples of the named 1d waveform 
+        dataset for the current range (from all the beams being read) and 
+        the start of each pulse's waveform in them. The start indices in
+        the file (startName) are 1 based and count from the start of the 
+        beam. The samples are cached until the range changes.
+        """
+        key = (name, startName)
+        if key in self.columnCache:
+            return self.columnCache[key]
+
+        fileStarts = self.readColumn(startName)
+        counts = self.readColumn(countName)
+
+        samples = []
+        starts = []
+        nSamples = 0
+        pulse = 0
+        for beam, start, end in self.getBeamRanges():
+            nPulses = end - start
+            beamStarts = fileStarts[pulse:pulse+nPulses].astype(numpy.int64) - 1
+            beamEnds = beamStarts + counts[pulse:pulse+nPulses]
+            first = beamStarts.min()
+            last = beamEnds.max()
+            samples.append(self.getColumnDataset(beam, name)[first:last])
+            starts.append(beamStarts - first + nSamples)
+            nSamples += last - first
+            pulse += nPulses
+
+        if len(samples) == 0:
+            samples.append(self.getColumnDataset(self.beams[0], name)[0:0])
+            starts.append(numpy.empty(0, dtype=numpy.int64))
+
+        data = (numpy.concatenate(samples), 
+                    numpy.concatenate(starts).astype(numpy.uint64))
+        self.columnCache[key] = data
+        return data
+
     def readWaveformInfo(self):
         """
         2d structured masked array containing information
         about the waveforms.
         """
-        # This is quite easy. Data is stored as a 2d array so just get the 
-        # pulses we need. All data populated so mask is all False.
-        if 'txwaveform' not in self.fileHandle[self.beam] or 'rxwaveform'  not in self.fileHandle[self.beam]:
+        # There is one waveform per pulse so the 2d array is just
+        # the pulses with an extra axis. All data populated so mask 
+        # is all False.
+        if (not self.hasColumn('txwaveform') or 
+                not self.hasColumn('rxwaveform')):
             # TODO: check we always have both.
             return None
 
-        numWf = self.fileHandle[self.beam]['shot_number'].shape[0]
         nPulses = self.range.endPulse - self.range.startPulse
 
         # create an empty structured array
-        data = numpy.empty(nPulses, dtype=[('NUMBER_OF_WAVEFORM_RECEIVED_BINS', 'U16'),
-                    ('RECEIVED_START_IDX', 'U64'), 
-                    ('NUMBER_OF_WAVEFORM_TRANSMITTED_BINS', 'U16'), 
-                    ('TRANSMITTED_START_IDX', 'U64'),
+        data = numpy.empty(nPulses, dtype=[('NUMBER_OF_WAVEFORM_RECEIVED_BINS', 'uint16'),
+                    ('RECEIVED_START_IDX', 'uint64'), 
+                    ('NUMBER_OF_WAVEFORM_TRANSMITTED_BINS', 'uint16'), 
+                    ('TRANSMITTED_START_IDX', 'uint64'),
                     ('RECEIVE_WAVE_OFFSET', 'float32'), ('RECEIVE_WAVE_GAIN', 'float32'),
                     ('TRANS_WAVE_OFFSET', 'float32'), ('TRANS_WAVE_GAIN', 'float32')])
         
-        data['NUMBER_OF_WAVEFORM_RECEIVED_BINS'] = self.fileHandle[self.beam]['rx_sample_count'][self.range.startPulse:self.range.endPulse]
-        data['RECEIVED_START_IDX'] = self.fileHandle[self.beam]['rx_sample_start_index'][self.range.startPulse:self.range.endPulse]
-        data['NUMBER_OF_WAVEFORM_TRANSMITTED_BINS'] = self.fileHandle[self.beam]['tx_sample_count'][self.range.startPulse:self.range.endPulse]
-        data['TRANSMITTED_START_IDX'] = self.fileHandle[self.beam]['tx_sample_start_index'][self.range.startPulse:self.range.endPulse]
+        # start indices are into the samples read for this range
+        recv, recvStart = self.readWaveformSamples('rxwaveform', 
+                        'rx_sample_start_index', 'rx_sample_count')
+        trans, transStart = self.readWaveformSamples('txwaveform', 
+                        'tx_sample_start_index', 'tx_sample_count')
+        data['NUMBER_OF_WAVEFORM_RECEIVED_BINS'] = self.readColumn('rx_sample_count')
+        data['RECEIVED_START_IDX'] = recvStart
+        data['NUMBER_OF_WAVEFORM_TRANSMITTED_BINS'] = self.readColumn('tx_sample_count')
+        data['TRANSMITTED_START_IDX'] = transStart
         # need for SPDV4
         data['RECEIVE_WAVE_OFFSET'] = 0
         data['RECEIVE_WAVE_GAIN'] = 1
@@ -299,12 +497,13 @@ class GEDIL1A01File(generic.LiDARFile):
         data['TRANS_WAVE_GAIN'] = 1
         
         # make 2d
-        wave_idx, wave_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
-                                      data['RECEIVED_START_IDX'], data['NUMBER_OF_WAVEFORM_RECEIVED_BINS'])
-        data = data[wave_idx]
-        data = numpy.ma.array(data, mask=wave_idx_mask)
+        data = numpy.expand_dims(data, 0)
 
-        return data      
+        # can't just set the whole thing to False since you get
+        # the 'bool' object is not iterable error
+        mask = numpy.zeros_like(data, dtype=bool)
+
+        return numpy.ma.array(data, mask=mask)
         
     def readTransmitted(self):
         """
@@ -313,16 +512,17 @@ class GEDIL1A01File(generic.LiDARFile):
         First axis is the waveform bin.
         Second axis is waveform number and last is pulse.
         """
-        if 'txwaveform' not in self.fileHandle[self.beam]:
+        if not self.hasColumn('txwaveform'):
             return None
         
-        # need info for the indexing into the waveforms
-        info = self.readWaveformInfo()
-        
-        # read as 2d
-        trans = self.fileHandle[self.beam]['txwaveform'][self.range.startPulse:self.range.endPulse]       
+        # one waveform per pulse so index with the start of each pulse's
+        # samples (as in the waveform info) made 2d
+        trans, transStart = self.readWaveformSamples('txwaveform', 
+                        'tx_sample_start_index', 'tx_sample_count')
+        cnt = self.readColumn('tx_sample_count')
         trans_idx, trans_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
-                                        info['TRANSMITTED_START_IDX'], info['NUMBER_OF_WAVEFORM_TRANSMITTED_BINS'])
+                                        numpy.expand_dims(transStart, 0), 
+                                        numpy.expand_dims(cnt, 0))
         trans = trans[trans_idx]
 
         return numpy.ma.array(trans, mask=trans_idx_mask)
@@ -334,16 +534,17 @@ class GEDIL1A01File(generic.LiDARFile):
         First axis is the waveform bin.
         Second axis is waveform number and last is pulse.
         """
-        if 'rxwaveform' not in self.fileHandle[self.beam]:
+        if not self.hasColumn('rxwaveform'):
             return None
 
-        # need info for the indexing into the waveforms
-        info = self.readWaveformInfo()
-            
-        # read as 2d
-        recv = self.fileHandle[self.beam]['rxwaveform'][self.range.startPulse:self.range.endPulse]
+        # one waveform per pulse so index with the start of each pulse's
+        # samples (as in the waveform info) made 2d
+        recv, recvStart = self.readWaveformSamples('rxwaveform', 
+                        'rx_sample_start_index', 'rx_sample_count')
+        cnt = self.readColumn('rx_sample_count')
         recv_idx, recv_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
-                                      info['RECEIVED_START_IDX'], info['NUMBER_OF_WAVEFORM_RECEIVED_BINS'])
+                                      numpy.expand_dims(recvStart, 0), 
+                                      numpy.expand_dims(cnt, 0))
         recv = recv[recv_idx]
 
         return numpy.ma.array(recv, mask=recv_idx_mask)
@@ -352,8 +553,14 @@ class GEDIL1A01File(generic.LiDARFile):
         """
         Return the total number of pulses
         """
+        return int(sum(self.beamPulses))
+
+    def getBeamNumberPulses(self, beam):
+        """
+        Internal method. Return the number of pulses in the given beam
+        """
         try:
-            nPulses = self.fileHandle[self.beam]['shot_number'].shape[0]
+            nPulses = self.getDataset(beam, 'shot_number').shape[0]
         except AttributeError as e:
             nPulses = 0
 
@@ -421,6 +628,13 @@ class GEDIL1A01FileInfo(generic.LiDARFileInfo):
 
         self.header = GEDIL1A01File.readHeaderAsDict(fileHandle)
             
+    @staticmethod
+    def sniffFile(signature):
+        """
+        See GEDIL1A01File.sniffFile()
+        """
+        return GEDIL1A01File.sniffFile(signature)
+
     @staticmethod        
     def getDriverName():
         return 'GEDI L1A01'
@@ -19,10 +19,13 @@ Base class for LiDAR format reader/writers
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from __future__ import print_function, division
 
+import os
 import abc
 import numpy
+import importlib
 from .. import basedriver
 from .. import __version__
+from . import binnedarray
 
 READ = basedriver.READ
 "access modes passed to driver constructor"
@@ -114,6 +117,73 @@ CLASSIFICATION_COLNAME = "CLASSIFICATION"
 # For writing to files when needed
 SOFTWARE_NAME = 'PyLidar %s' % __version__
 
+SIGNATURE_HEADER_SIZE = 2056
+"Number of bytes read from the start of a file by FileSignature"
+HDF5_MAGIC = b'\x89HDF\r\n\x1a\n'
+"Signature at the start of the HDF5 superblock"
+HDF5_MAGIC_OFFSETS = (0, 512, 1024, 2048)
+"Offsets the HDF5 superblock can be at when the file has a user block"
+
+class FileSignature(object):
+    """
+    Information about an existing file that is gathered once and 
+    passed to the sniffFile() method of each driver so they can 
+    cheaply check whether they are able to open the file.
+    
+    Has the following attributes:
+    
+    * fname - the file name
+    * extension - the lower case extension of fname (including the '.')
+    * header - bytes containing the start of the file (up to 
+      SIGNATURE_HEADER_SIZE bytes). Empty if the file can't be read.
+    * isHDF5 - True if the file has a HDF5 signature
+    
+    For HDF5 files, call getHDF5Handle() to get a h5py.File object
+    opened read only. This is shared between the drivers.
+    """
+    def __init__(self, fname):
+        self.fname = fname
+        self.extension = os.path.splitext(fname)[1].lower()
+        try:
+            fh = open(fname, 'rb')
+            self.header = fh.read(SIGNATURE_HEADER_SIZE)
+            fh.close()
+        except (OSError, IOError):
+            self.header = b''
+
+        self.isHDF5 = False
+        for offset in HDF5_MAGIC_OFFSETS:
+            if self.header[offset:offset + len(HDF5_MAGIC)] == HDF5_MAGIC:
+                self.isHDF5 = True
+                break
+
+        self.hdf5Handle = None
+
+    def getHDF5Handle(self):
+        """
+        Returns a h5py.File object for the file, or None if the file
+        is not HDF5 or cannot be opened.
+        """
+        if not self.isHDF5:
+            return None
+
+        if self.hdf5Handle is None:
+            import h5py
+            try:
+                self.hdf5Handle = h5py.File(self.fname, 'r')
+            except (OSError, IOError):
+                self.isHDF5 = False
+                
+        return self.hdf5Handle
+
+    def close(self):
+        """
+        Close any file handle opened by getHDF5Handle()
+        """
+        if self.hdf5Handle is not None:
+            self.hdf5Handle.close()
+            self.hdf5Handle = None
+
 class LiDARFileException(Exception):
     "Base class for LiDAR format reader/writers"
     
@@ -226,6 +296,21 @@ class LiDARFile(basedriver.Driver):
         """
         raise NotImplementedError()
 
+    @staticmethod
+    def sniffFile(signature):
+        """
+        Given an instance of FileSignature, return True if this driver 
+        recognises the file, False if it definitely can't read the file, or 
+        None if it can't tell without trying to open it. Used by 
+        getReaderForLiDARFile() to avoid opening the file with every driver.
+        
+        This should be fast - just look at the signature.header bytes,
+        signature.extension or the attributes of signature.getHDF5Handle().
+        
+        The default implementation returns None.
+        """
+        return None
+
     def readPointsForExtent(self, colNames=None):
         """
         Read all the points within the given extent
@@ -283,6 +368,42 @@ class LiDARFile(basedriver.Driver):
         """
         raise NotImplementedError()
 
+    def readPulsesForExtentBinned(self, extent=None, colNames=None):
+        """
+        As for readPulsesForExtentByBins() but returns a 
+        binnedarray.BinnedArray rather than a 3d masked array.
+        
+        The default implementation converts the result of 
+        readPulsesForExtentByBins(). Drivers should override this if
+        they can create the BinnedArray without the 3d array.
+        """
+        pulses = self.readPulsesForExtentByBins(extent, colNames)
+        return binnedarray.BinnedArray.fromMaskedArray(pulses)
+
+    def readPointsForExtentBinned(self, extent=None, colNames=None, 
+                indexByPulse=False, returnPulseIndex=False):
+        """
+        As for readPointsForExtentByBins() but returns a 
+        binnedarray.BinnedArray rather than a 3d masked array.
+        If returnPulseIndex is True, the indices into the 1d pulse array
+        are returned as a 1d array that matches the data attribute of the
+        BinnedArray.
+        
+        The default implementation converts the result of 
+        readPointsForExtentByBins(). Drivers should override this if
+        they can create the BinnedArray without the 3d array.
+        """
+        if returnPulseIndex:
+            points, pulseIdx = self.readPointsForExtentByBins(extent, 
+                            colNames, indexByPulse, returnPulseIndex)
+            pulseIdx = binnedarray.BinnedArray.fromMaskedArray(pulseIdx)
+            points = binnedarray.BinnedArray.fromMaskedArray(points)
+            return points, pulseIdx.data
+        else:
+            points = self.readPointsForExtentByBins(extent, colNames, 
+                            indexByPulse)
+            return binnedarray.BinnedArray.fromMaskedArray(points)
+
     @abc.abstractmethod        
     def readPointsByPulse(self):     
         """
@@ -357,6 +478,27 @@ class LiDARFile(basedriver.Driver):
         """
         raise NotImplementedError()
         
+    def prefetchExtent(self, extent):
+        """
+        Called by the processor on a background thread (when
+        Controls.setPrefetch(True) has been called) with the extent
+        of the next block while the user function is processing the
+        current one. Drivers can read the data for this extent ahead of
+        time so it is available when setExtent() is next called.
+
+        The default implementation does nothing.
+        """
+        pass
+
+    def prefetchPulseRange(self, pulseRange):
+        """
+        As for prefetchExtent(), but called with the PulseRange of the
+        next block when doing non spatial processing.
+
+        The default implementation does nothing.
+        """
+        pass
+
     @abc.abstractmethod
     def getTotalNumberPulses(self):
         """
@@ -439,6 +581,15 @@ class LiDARFile(basedriver.Driver):
         """
         raise NotImplementedError()
 
+    def setScaledDataType(self, colName, arrayType, dtype):
+        """
+        Set the dtype (numpy.float32 etc) that a column with scaling is 
+        returned as when read. The default is numpy.float64.
+        
+        arrayType is one of the lidarprocessor.ARRAY_TYPE_* constants
+        """
+        raise NotImplementedError()
+
     def setNullValue(self, colName, arrayType, value, scaled=True):
         """
         Set the 'null' value for the given column.
@@ -588,11 +739,166 @@ class LiDARFileInfo(basedriver.FileInfo):
         """
         raise NotImplementedError()
         
+    @staticmethod
+    def sniffFile(signature):
+        """
+        As for LiDARFile.sniffFile(). Used by getLidarFileInfo().
+        
+        The default implementation returns None.
+        """
+        return None
+
+class DriverModule(object):
+    """
+    Describes one of the modules in this package that implements a driver
+    so that it is only imported when it is needed. Importing all the drivers
+    up front is slow as they pull in h5py, numba and the C extensions.
+    
+    * modName - name of the module within pylidar.lidarformats
+    * driverName - what getDriverName() returns for the driver's LiDARFile
+      subclass
+    * isHDF5 - True if the driver reads HDF5 files
+    * extensions - tuple of (lower case) file extensions the driver reads
+    * magic - bytes that appear within the first magicSearchSize bytes
+      of files the driver reads. magicSearchSize defaults to len(magic).
+      
+    isHDF5, extensions and magic are used by mightRead() to decide whether
+    the module needs to be imported to check a file with sniffFile().
+    """
+    def __init__(self, modName, driverName, isHDF5=False, extensions=None,
+            magic=None, magicSearchSize=None):
+        self.modName = modName
+        self.driverName = driverName
+        self.isHDF5 = isHDF5
+        self.extensions = extensions
+        self.magic = magic
+        if magicSearchSize is None and magic is not None:
+            magicSearchSize = len(magic)
+        self.magicSearchSize = magicSearchSize
+        self.module = None
+        self.importError = None
+        
+    def mightRead(self, signature):
+        """
+        Given an instance of FileSignature, return True if the file
+        looks like something this driver might be able to read.
+        """
+        if self.isHDF5 and signature.isHDF5:
+            return True
+        if (self.extensions is not None and 
+                signature.extension in self.extensions):
+            return True
+        if (self.magic is not None and 
+                signature.header.find(self.magic, 0, 
+                    self.magicSearchSize) != -1):
+            return True
+        return False
+        
+    def load(self):
+        """
+        Import the module (if not already) and return it. Returns None
+        if the module can't be imported - normally because the 
+        libraries it needs are not available.
+        """
+        if self.module is None and self.importError is None:
+            package = __name__.rpartition('.')[0]
+            try:
+                self.module = importlib.import_module('.' + self.modName, 
+                                package=package)
+            except ImportError as e:
+                self.importError = e
+        return self.module
+
+DRIVER_MODULES = [DriverModule('spdv3', 'SPDV3', isHDF5=True),
+    DriverModule('spdv4', 'SPDV4', isHDF5=True),
+    DriverModule('ascii', 'ASCII', extensions=('.gz', '.dat', '.csv', '.txt')),
+    DriverModule('lvisbin', 'LVIS Binary', extensions=('.lce', '.lge', '.lgw')),
+    DriverModule('lvishdf5', 'LVIS HDF5', isHDF5=True),
+    DriverModule('gedil1a01', 'GEDIL1A01', isHDF5=True),
+    DriverModule('riegl_rxp', 'riegl RXP', magic=b'Riegl', magicSearchSize=32),
+    DriverModule('riegl_rdb', 'riegl RDB', 
+            magic=b'RIEGL LMS RDB 2 POINTCLOUD FILE'),
+    DriverModule('las', 'LAS', magic=b'LASF'),
+    DriverModule('pulsewaves', 'PulseWaves', magic=b'PulseWavesPulse')]
+"""
+The drivers in this package, in the order they are tried. Drivers 
+in other packages can still be used - they just need to be imported so
+they show up in LiDARFile.__subclasses__().
+"""
+
+def replaceFile(src, dst):
+    """
+    Renames src to dst, replacing dst if it exists. Used by the drivers 
+    to put a completely written sidecar file in place. Python 2 has no 
+    os.replace() and os.rename() won't replace a file on Windows so dst
+    is removed first there (so the replacement isn't atomic).
+    """
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    else:
+        try:
+            os.rename(src, dst)
+        except OSError:
+            os.remove(dst)
+            os.rename(src, dst)
+
+def loadDriverModule(driverName):
+    """
+    Import the module for the given driver name (as returned
+    by getDriverName()) and return it. Returns None if the module
+    can't be imported or there is no such driver in DRIVER_MODULES.
+    """
+    for drvMod in DRIVER_MODULES:
+        if drvMod.driverName == driverName:
+            return drvMod.load()
+    return None
+    
+def isDriverAvailable(driverName):
+    """
+    Returns True if the driver given by driverName can be used
+    (ie the libraries it needs are available).
+    """
+    return loadDriverModule(driverName) is not None
+
+def sniffDriverClasses(fname, baseClass):
+    """
+    Reads the signature of the file once and imports the modules in 
+    DRIVER_MODULES that might be able to read it. Then asks each subclass 
+    of baseClass (LiDARFile or LiDARFileInfo) whether it can read the file. 
+    Returns a list of the classes that recognised the file followed by 
+    the classes that couldn't tell. Classes that can't read the file 
+    are left out.
+    """
+    matched = []
+    unknown = []
+    signature = FileSignature(fname)
+    try:
+        for drvMod in DRIVER_MODULES:
+            if drvMod.mightRead(signature):
+                drvMod.load()
+                
+        for cls in baseClass.__subclasses__():
+            try:
+                result = cls.sniffFile(signature)
+            except Exception:
+                # be safe and try opening it
+                result = None
+                
+            if result is None:
+                unknown.append(cls)
+            elif result:
+                matched.append(cls)
+    finally:
+        signature.close()
+        
+    return matched + unknown
+        
 def getWriterForLiDARFormat(driverName, fname, mode, controls, userClass):
     """
     Given a driverName returns an instance of the given driver class
     Raises LiDARFormatDriverNotFound if not found
     """
+    loadDriverModule(driverName)
     for cls in LiDARFile.__subclasses__():
         if cls.getDriverName() == driverName:
             # create it
@@ -609,8 +915,8 @@ def getReaderForLiDARFile(fname, mode, controls, userClass, verbose=False):
     reader/writer or raises an exception if none
     found for the file.
     """
-    # try each subclass
-    for cls in LiDARFile.__subclasses__():
+    # try each subclass that might be able to read it
+    for cls in sniffDriverClasses(fname, LiDARFile):
         try:
             # attempt to create it
             inst = cls(fname, mode, controls, userClass)
@@ -618,7 +924,7 @@ def getReaderForLiDARFile(fname, mode, controls, userClass, verbose=False):
             if verbose:
                 print('Succeeded using class', cls)
             return inst
-        except LiDARFileException:
+        except LiDARFileException as e:
             # failed - onto the next one
             if verbose:
                 print('Failed using', cls, e)
@@ -631,7 +937,7 @@ def getLidarFileInfo(fname, verbose=False):
     Returns an instance of a LiDAR format info class.
     Or raises an exception if none found for the file.
     """
-    for cls in LiDARFileInfo.__subclasses__():
+    for cls in sniffDriverClasses(fname, LiDARFileInfo):
         try:
             inst = cls(fname)
             if verbose:
@@ -116,35 +116,45 @@ def flatten2dMaskedArray(flatArray, in2d, mask2d, idx2d):
 
     
 @jit
-def BuildSpatialIndexInternal(binNum, sortedBinNumNdx, si_start, si_count):
+def CountingSortSpatialIndexInternal(binNum, binCursor, sortedBinNumNdx, 
+                        si_start, si_count):
     """
     Internal function used by CreateSpatialIndex.
     
-    Fills in the spatial index from the sorted bins created by CreateSpatialIndex.
+    Does a counting sort of binNum and fills in the spatial index. 
+    This is O(n) rather than the O(n log n) of numpy.argsort.
     
     binNum is row * nCols + col where row and col are arrays of the row and col of each element being spatially indexed.
-    sortedBinNumNdx is argsorted binNum    
-    si_start and si_count are output spatial indices
+    binCursor is a 1d int64 array of nRows * nCols used internally.
+    sortedBinNumNdx is an output array the same shape as binNum that 
+    receives the indices that sort binNum. The sort is stable.
+    si_start and si_count are output spatial indices (inited to 0)
     """
     nCols = si_start.shape[1]
     nRows = si_start.shape[0]
     nThings = binNum.shape[0]
+    
+    # count the elements in each bin
+    for i in range(nThings):
+        bn = binNum[i]
+        si_count[bn // nCols, bn % nCols] += 1
+        
+    # work out where each bin starts in the sorted data
+    # empty bins are left with a start of 0 
+    total = 0
+    for row in range(nRows):
+        for col in range(nCols):
+            cnt = si_count[row, col]
+            if cnt > 0:
+                si_start[row, col] = total
+            binCursor[row * nCols + col] = total
+            total += cnt
+            
+    # put each element in the next free slot of its bin
     for i in range(nThings):
-        # get the bin of the sorted location of this element
-        bn = binNum[sortedBinNumNdx[i]]
-        # extract the row and column
-        row = bn // nCols
-        col = bn % nCols
-        # range check in case outside of the bouds of index 
-        # being created - not needed anymore as caller does this
-        #if row >= 0 and col >= 0 and row < nRows and col < nCols:    
-        if si_count[row, col] == 0:
-            # first element of a new bin - save the start 
-            # rest of elements in this bin should be next
-            # since it is sorted
-            si_start[row, col] = i
-        # update count of elements
-        si_count[row, col] += 1
+        bn = binNum[i]
+        sortedBinNumNdx[binCursor[bn]] = i
+        binCursor[bn] += 1
     
 @jit
 def convertIdxBool2D(start_idx_array, count_array, outBool, boolStart, outRow, outCol, 
@@ -346,20 +356,39 @@ def CreateSpatialIndex(coordOne, coordTwo, binSize, coordOneMax,
     # convert this to a 'binNum' which is a combination of row and col
     # and can be sorted to make a complete ordering of the 2-d grid of bins
     binNum = row * nCols + col
-    # get an array of indices of the sorted version of the bins
-    sortedBinNumNdx = numpy.argsort(binNum)
     
     # output spatial index arrays
     si_start = numpy.zeros((nRows, nCols), dtype=indexDtype)
     si_count = numpy.zeros((nRows, nCols), dtype=countDtype)
-        
-    # call our helper function to put the elements into the spatial index
-    BuildSpatialIndexInternal(binNum, sortedBinNumNdx, si_start, si_count)
+    
+    # bin numbers are bounded so do a counting sort to get an 
+    # array of indices of the sorted version of the bins and
+    # put the elements into the spatial index
+    sortedBinNumNdx = numpy.empty(binNum.shape, dtype=numpy.int64)
+    binCursor = numpy.empty((nRows * nCols,), dtype=numpy.int64)
+    CountingSortSpatialIndexInternal(binNum, binCursor, sortedBinNumNdx,
+                    si_start, si_count)
         
     # return array to get back to sorted version of the elements
     # and the new spatial index
     return validMask, sortedBinNumNdx, si_start, si_count
 
+def getBinNumbers(coordOne, coordTwo, binSize, coordOneMax, coordTwoMin, 
+                nRows, nCols):
+    """
+    Returns a 1d int64 array of the bin number (as row * nCols + col) of 
+    each element for a spatial index with the given parameters (see 
+    CreateSpatialIndex). Elements outside the index get -1.
+    """
+    row = numpy.floor((coordOneMax - coordOne) / binSize)
+    col = numpy.floor((coordTwo - coordTwoMin) / binSize)
+    validMask = (row >= 0) & (col >= 0) & (row < nRows) & (col < nCols)
+    
+    binNum = numpy.full(coordOne.shape, -1, dtype=numpy.int64)
+    binNum[validMask] = (row[validMask].astype(numpy.int64) * nCols + 
+                            col[validMask].astype(numpy.int64))
+    return binNum
+
 def convertSPDIdxToReadIdxAndMaskInfo(start_idx_array, count_array, outSize=None):
     """
     Convert either a 2d SPD spatial index or 1d index (pulse to points, 
@@ -438,6 +467,50 @@ def convertSPDIdxToReadIdxAndMaskInfo(start_idx_array, count_array, outSize=None
     else:
         return outIdx, outMask
 
+def coarsenReadIdxAndMask(idx, idxMask, factor):
+    """
+    Given a 3d index and mask as returned by convertSPDIdxToReadIdxAndMaskInfo()
+    for a spatial index, return the index and mask for a spatial index with 
+    bins factor times the size. If the number of rows or columns of idx
+    is not a multiple of factor (a partial block at the edge of the 
+    index) the last row or column of new bins only covers the old bins 
+    that exist.
+
+    The elements of each new bin are in the order of the old bins (row major)
+    they came from so they stay in file order.
+    """
+    maxCount, nRows, nCols = idx.shape
+    nRowsOut = (nRows + factor - 1) // factor
+    nColsOut = (nCols + factor - 1) // factor
+    
+    padRows = nRowsOut * factor - nRows
+    padCols = nColsOut * factor - nCols
+    if padRows > 0 or padCols > 0:
+        # pad with masked elements
+        padding = ((0, 0), (0, padRows), (0, padCols))
+        idx = numpy.pad(idx, padding, mode='constant')
+        idxMask = numpy.pad(idxMask, padding, mode='constant', 
+                            constant_values=True)
+    
+    # put all the elements of each of the new bins on the first axis
+    newShape = (maxCount, nRowsOut, factor, nColsOut, factor)
+    stackedShape = (factor * factor * maxCount, nRowsOut, nColsOut)
+    idx = idx.reshape(newShape).transpose(2, 4, 0, 1, 3).reshape(stackedShape)
+    idxMask = idxMask.reshape(newShape).transpose(2, 4, 0, 1, 3).reshape(
+                            stackedShape)
+    
+    # move the valid elements to the start of the first axis 
+    # (stable so they stay in order) and trim
+    if idxMask.size > 0:
+        maxCountOut = numpy.logical_not(idxMask).sum(axis=0).max()
+    else:
+        maxCountOut = 0
+    order = numpy.argsort(idxMask, axis=0, kind='mergesort')[:maxCountOut]
+    idx = numpy.take_along_axis(idx, order, axis=0)
+    idxMask = numpy.take_along_axis(idxMask, order, axis=0)
+    
+    return idx, idxMask
+
 def getSlicesForExtent(siPixGrid, siShape, overlap, xMin, xMax, yMin, yMax):
     """
     xMin, xMax, yMin, yMax is the extent snapped to the pixGrid.
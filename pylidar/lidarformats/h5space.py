@@ -1,6 +1,13 @@
 """
 A utilities to extend h5py's reading and writing of ranges of data,
 specifically the ability to quickly deal with multiple ranges.
+
+When reading, runs of selected elements separated by small gaps are
+merged into one hyperslab. The extra elements are then removed in
+memory. Gaps within the same HDF5 chunk are always merged since the 
+whole chunk has to be read and decompressed anyway. The size of the 
+gaps that are merged can be set with setReadGapThreshold() and the
+effect checked with getReadStats().
 """
 # This file is part of PyLidar
 # Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
@@ -22,7 +29,9 @@ from __future__ import print_function, division
 import os
 import sys
 import numpy
+import threading
 import h5py
+from h5py import _objects as h5pyobjects
 from numba import jit
 import ctypes
 from ctypes.util import find_library
@@ -46,6 +55,103 @@ if os.getenv('READTHEDOCS', default='False') != 'True':
                     ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
     H5Sselect_hyperslab.restype = ctypes.c_int
 
+DEFAULT_READ_GAP_THRESHOLD = 256
+"""
+Default maximum number of unselected elements between two runs of 
+selected elements for them to be read as one hyperslab
+"""
+
+READ_STATS_NAMES = ('selectionRuns', 'readRuns', 'selectedElements', 
+                'readElements', 'chunksRead')
+"""
+Names of the statistics returned by getReadStats(). These are 
+the number of runs of selected elements, the number of hyperslabs
+actually read, the number of selected elements, the number of elements
+actually read and the number of chunks these fell in (per column read).
+"""
+
+HDF5_LOCK = h5pyobjects.phil
+"""
+The lock h5py holds while calling the HDF5 library. The library isn't 
+thread safe so this is also held while H5Sselect_hyperslab() is called 
+directly. It can be taken more than once by the same thread.
+"""
+
+readGapThreshold = DEFAULT_READ_GAP_THRESHOLD
+readStats = numpy.zeros((len(READ_STATS_NAMES),), dtype=numpy.int64)
+readStatsLock = threading.Lock()
+
+def setReadGapThreshold(threshold):
+    """
+    Set the maximum number of unselected elements between two runs of 
+    selected elements for them to be read as one hyperslab. Set to None 
+    to read exactly the selected elements (no merging at all).
+    """
+    global readGapThreshold
+    readGapThreshold = threshold
+
+def getReadStats():
+    """
+    Return a dictionary of the statistics (see READ_STATS_NAMES) 
+    for all the reads since the last call to resetReadStats().
+    """
+    with readStatsLock:
+        return dict(zip(READ_STATS_NAMES, readStats.tolist()))
+
+def resetReadStats():
+    """
+    Set all the read statistics back to zero.
+    """
+    with readStatsLock:
+        readStats.fill(0)
+
+@jit
+def coalesceBoolRuns(boolArray, boolStart, gapThreshold, chunkSize, outBool,
+        stats):
+    """
+    Fill in the gaps between runs of True in boolArray that are no
+    longer than gapThreshold or are within one chunk.
+
+    * outBool receives the filled in copy of boolArray.
+    * chunkSize is the chunk size of the dataset (0 if not chunked).
+    * stats should be a zeroed int64 array with an element for each of
+      READ_STATS_NAMES which receives the statistics for this selection.
+
+    """
+    nVals = boolArray.shape[0]
+    lastTrue = -1
+    for n in range(nVals):
+        outBool[n] = boolArray[n]
+        if boolArray[n]:
+            stats[2] += 1
+            if lastTrue < 0 or n - lastTrue > 1:
+                # start of a run
+                stats[0] += 1
+                if lastTrue >= 0:
+                    gap = n - lastTrue - 1
+                    fill = gap <= gapThreshold
+                    if (not fill and chunkSize > 0 and 
+                            (boolStart + lastTrue) // chunkSize == 
+                            (boolStart + n) // chunkSize):
+                        fill = True
+                    if fill:
+                        for m in range(lastTrue + 1, n):
+                            outBool[m] = True
+            lastTrue = n
+
+    # now what will actually be read
+    lastChunk = -1
+    for n in range(nVals):
+        if outBool[n]:
+            stats[3] += 1
+            if n == 0 or not outBool[n - 1]:
+                stats[1] += 1
+            if chunkSize > 0:
+                chunk = (boolStart + n) // chunkSize
+                if chunk != lastChunk:
+                    stats[4] += 1
+                    lastChunk = chunk
+
 @jit
 def convertBoolToHDF5Space(boolArray, boolStart, spaceid, start, count, 
         select_hyperslab, selectSet, selectOr):
@@ -161,7 +267,10 @@ class H5Space(object):
         Pass either boolArray and boolStart or indices but not all 3.
         """
         # create the space object
+        self.size = size
         self.space = h5py.h5s.create_simple((size,), (size,))
+        # see getReadPlan()
+        self.readPlans = {}
         # default is all selected - reset to none in case boolArray all False
         self.space.select_none()
 
@@ -170,9 +279,10 @@ class H5Space(object):
             start = numpy.empty(1, dtype=numpy.uint64)
             count = numpy.empty(1, dtype=numpy.uint64)
             if boolArray.size > 0:
-                convertBoolToHDF5Space(boolArray, boolStart, self.space.id, 
-                    start, count, H5Sselect_hyperslab, h5py.h5s.SELECT_SET, 
-                    h5py.h5s.SELECT_OR)
+                with HDF5_LOCK:
+                    convertBoolToHDF5Space(boolArray, boolStart, 
+                        self.space.id, start, count, H5Sselect_hyperslab, 
+                        h5py.h5s.SELECT_SET, h5py.h5s.SELECT_OR)
         
             # grab these for updateBoolArray()    
             self.boolArray = boolArray
@@ -193,13 +303,72 @@ class H5Space(object):
             msg = 'Need to specify either boolArray and boolStart or indices'
             raise ValueError(msg)
 
+    def getReadPlan(self, dataSet):
+        """
+        Internal method. Returns a tuple of the h5py.h5s.SpaceID to read
+        from the dataset, a mask to apply to the data read to get just
+        the selected elements (None if not needed) and the statistics 
+        from coalesceBoolRuns(). These are cached for each chunk size.
+
+        Safe to call from more than one thread, but see prepareRead().
+        """
+        chunkSize = 0
+        if dataSet.chunks is not None:
+            chunkSize = dataSet.chunks[0]
+            
+        with HDF5_LOCK:
+            if chunkSize in self.readPlans:
+                return self.readPlans[chunkSize]
+            
+            stats = numpy.zeros((len(READ_STATS_NAMES),), dtype=numpy.int64)
+            readSpace = self.space
+            readMask = None
+            if readGapThreshold is not None and self.boolArray.size > 0:
+                outBool = numpy.empty_like(self.boolArray)
+                coalesceBoolRuns(self.boolArray, self.boolStart, 
+                    readGapThreshold, chunkSize, outBool, stats)
+                
+                if stats[1] < stats[0]:
+                    # some runs were merged
+                    readSpace = h5py.h5s.create_simple((self.size,), 
+                                (self.size,))
+                    readSpace.select_none()
+                    start = numpy.empty(1, dtype=numpy.uint64)
+                    count = numpy.empty(1, dtype=numpy.uint64)
+                    convertBoolToHDF5Space(outBool, self.boolStart, 
+                        readSpace.id, start, count, H5Sselect_hyperslab, 
+                        h5py.h5s.SELECT_SET, h5py.h5s.SELECT_OR)
+                    readMask = self.boolArray[outBool]
+                
+            plan = (readSpace, readMask, stats)
+            self.readPlans[chunkSize] = plan
+        return plan
+
+    def prepareRead(self, dataSets):
+        """
+        Work out how each of the given h5py datasets will be read 
+        (see getReadPlan()). Call this before reading the datasets from 
+        more than one thread so the threads only use the cached plans
+        rather than waiting for each other to create them.
+        """
+        if self.boolArray is not None:
+            for dataSet in dataSets:
+                self.getReadPlan(dataSet)
+
     def read(self, dataSet):
         """
         Given a h5py dataset read the data ranges selected and return a
         numpy array.
         """
+        readSpace = self.space
+        readMask = None
+        if self.boolArray is not None:
+            readSpace, readMask, stats = self.getReadPlan(dataSet)
+            with readStatsLock:
+                numpy.add(readStats, stats, out=readStats)
+    
         # create an empty array of the right size
-        npoints = self.space.get_select_npoints()
+        npoints = readSpace.get_select_npoints()
         data = numpy.empty(npoints, dtype=dataSet.dtype)
 
         if npoints > 0:        
@@ -207,7 +376,11 @@ class H5Space(object):
             mspace = h5py.h5s.create_simple(data.shape, data.shape)
         
             # read it
-            dataSet.id.read(mspace, self.space, data)
+            dataSet.id.read(mspace, readSpace, data)
+            
+        if readMask is not None:
+            # remove the elements that weren't selected
+            data = data[readMask]
         return data
         
     def write(self, dataSet, data):
@@ -229,12 +402,17 @@ class H5Space(object):
         """
         #if mask.size != self.space.get_select_npoints():
         #    raise ValueError('mask is wrong size')
+        
+        # selection has changed
+        self.readPlans = {}
             
         if self.boolStart is not None and self.boolArray is not None:
             start = numpy.empty(1, dtype=numpy.uint64)
             count = numpy.empty(1, dtype=numpy.uint64)
-            updateFromBool(self.space.id, self.boolStart, self.boolArray, mask, 
-                start, count, H5Sselect_hyperslab, h5py.h5s.SELECT_NOTB)
+            with HDF5_LOCK:
+                updateFromBool(self.space.id, self.boolStart, self.boolArray, 
+                    mask, start, count, H5Sselect_hyperslab, 
+                    h5py.h5s.SELECT_NOTB)
         else:
             # indices
             self.indices = self.indices[mask]
@@ -0,0 +1,199 @@
+"""
+Buffers appends to 1d HDF5 datasets so that a file being created a
+small block at a time is written in large batches. Each write to a
+dataset resizes it and re-compresses the partly filled chunk at the
+end, so many small writes are much slower than a few large ones.
+
+Data is held in memory until the total size buffered for all the
+columns reaches a byte limit. Each column is then written up to the
+last whole chunk boundary and the remainder kept for the next batch
+so chunks are only written once. Everything is written by flush().
+
+Datasets may be created larger than the data first written to them
+(when the final size is known in advance) so they don't need to be 
+resized on each write. The length actually written is tracked here and
+flush() trims the datasets back to it.
+"""
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from __future__ import print_function, division
+
+from collections import OrderedDict
+import numpy
+
+DEFAULT_WRITE_BUFFER_SIZE = 32 * 1024 * 1024
+"Default number of bytes buffered before the columns are written"
+
+class BufferedColumn(object):
+    """
+    Data waiting to be appended to one dataset
+    """
+    def __init__(self, groupHandle, name):
+        self.groupHandle = groupHandle
+        self.name = name
+        # list of 1d arrays in the order they were appended
+        self.arrays = []
+        self.nElements = 0
+        self.nBytes = 0
+
+    def append(self, data):
+        """
+        Add data to the end of the buffer
+        """
+        self.arrays.append(data)
+        self.nElements += data.shape[0]
+        self.nBytes += data.nbytes
+
+    def takeData(self, nElements):
+        """
+        Remove the first nElements from the buffer and
+        return them as one array
+        """
+        # keep the type of the first array - this is what
+        # the dataset gets created with
+        data = numpy.concatenate(self.arrays).astype(self.arrays[0].dtype,
+                    copy=False)
+        self.arrays = []
+        self.nElements = 0
+        self.nBytes = 0
+        if nElements < data.shape[0]:
+            remainder = data[nElements:]
+            self.append(remainder)
+            data = data[:nElements]
+        return data
+
+class H5WriteBuffer(object):
+    """
+    Buffers appends to 1d datasets. createFunc is called as
+    createFunc(groupHandle, name, data) to create a dataset that
+    doesn't exist yet with the first data written to it. The dataset
+    created can be longer than data.
+
+    If maxBytes is 0 data is written straight away.
+    """
+    def __init__(self, maxBytes, createFunc):
+        self.maxBytes = maxBytes
+        self.createFunc = createFunc
+        # keyed on (group name, dataset name). Ordered so
+        # datasets are created in the order first appended
+        self.columns = OrderedDict()
+        self.nBytes = 0
+        # number of elements written to each dataset, keyed as above.
+        # The datasets may be longer than this.
+        self.lengths = {}
+
+    def append(self, groupHandle, name, data):
+        """
+        Append data (1d array) to the named dataset under groupHandle.
+        """
+        key = (groupHandle.name, name)
+        if key not in self.columns:
+            self.columns[key] = BufferedColumn(groupHandle, name)
+
+        if self.maxBytes == 0:
+            self.writeColumn(groupHandle, name, data)
+            return
+
+        # the caller may re-use the array it took a view of
+        if data.base is not None:
+            data = data.copy()
+
+        self.columns[key].append(data)
+        self.nBytes += data.nbytes
+
+        if self.nBytes >= self.maxBytes:
+            self.writeBuffered(chunkAligned=True)
+
+    def getLength(self, groupHandle, name):
+        """
+        Return the length the named dataset will have once
+        everything buffered is written. 0 if it doesn't exist yet.
+        """
+        key = (groupHandle.name, name)
+        length = self.getWrittenLength(groupHandle, name)
+        if key in self.columns:
+            length += self.columns[key].nElements
+        return length
+
+    def getWrittenLength(self, groupHandle, name):
+        """
+        Internal method. Return the number of elements written 
+        to the named dataset so far.
+        """
+        key = (groupHandle.name, name)
+        if key in self.lengths:
+            return self.lengths[key]
+        elif name in groupHandle:
+            return groupHandle[name].shape[0]
+        else:
+            return 0
+
+    def flush(self):
+        """
+        Write everything that is buffered and trim any datasets created
+        longer than what has been written to them.
+        """
+        self.writeBuffered(chunkAligned=False)
+
+        for column in self.columns.values():
+            if column.name in column.groupHandle:
+                dset = column.groupHandle[column.name]
+                length = self.getWrittenLength(column.groupHandle, 
+                                column.name)
+                if dset.shape[0] > length:
+                    dset.resize((length,))
+
+    def writeBuffered(self, chunkAligned):
+        """
+        Internal method. Write the buffered columns. If chunkAligned
+        is True, columns that already exist are only written up to the
+        end of their last whole chunk.
+        """
+        for column in self.columns.values():
+            if column.nElements == 0:
+                continue
+            nElements = column.nElements
+            if chunkAligned and column.name in column.groupHandle:
+                dset = column.groupHandle[column.name]
+                chunkSize = dset.chunks[0]
+                end = (self.getWrittenLength(column.groupHandle, column.name)
+                            + nElements)
+                nElements -= end % chunkSize
+                if nElements <= 0:
+                    continue
+
+            data = column.takeData(nElements)
+            self.writeColumn(column.groupHandle, column.name, data)
+
+        self.nBytes = sum([column.nBytes for column in self.columns.values()])
+
+    def writeColumn(self, groupHandle, name, data):
+        """
+        Internal method. Append data to the dataset (creating it
+        if needed). The dataset is only resized if it is too short.
+        """
+        key = (groupHandle.name, name)
+        if name in groupHandle:
+            dset = groupHandle[name]
+            oldSize = self.getWrittenLength(groupHandle, name)
+            newSize = oldSize + data.shape[0]
+            if newSize > dset.shape[0]:
+                dset.resize((newSize,))
+            dset[oldSize:newSize] = data
+            self.lengths[key] = newSize
+        else:
+            self.createFunc(groupHandle, name, data)
+            self.lengths[key] = data.shape[0]
@@ -28,6 +28,21 @@ These are contained in the READSUPPORTEDOPTIONS module level variable.
 |                       | Dictates which point will be used to set  |
 |                       | the X_IDX and Y_IDX pulse fields          |
 +-----------------------+-------------------------------------------+
+| CHECKPOINT_SIDECAR    | a boolean. If true, the table of where    |
+|                       | pulses start that is built up during      |
+|                       | non-spatial reads (and used to seek to a  |
+|                       | pulse) is saved to a sidecar file (the    |
+|                       | file name plus '.pulseidx.npz') on close  |
+|                       | and loaded from it when next opened.      |
+|                       | Defaults to False.                        |
++-----------------------+-------------------------------------------+
+| DECOMPRESS_THREADS    | an int. For LAZ files, the number of      |
+|                       | threads used to decompress the upcoming   |
+|                       | chunks of the file at the same time on    |
+|                       | non-spatial reads. Each thread opens its  |
+|                       | own copy of the file. Defaults to 0 (the  |
+|                       | file is decompressed on the main thread). |
++-----------------------+-------------------------------------------+
 
 Write Driver Options
 --------------------
@@ -91,6 +106,7 @@ from __future__ import print_function, division
 import os
 import copy
 import numpy
+import zipfile
 import datetime
 from osgeo import osr
 
@@ -106,6 +122,7 @@ if os.getenv('READTHEDOCS', default='False') != 'True':
     # bring constants over
     FIRST_RETURN = _las.FIRST_RETURN
     LAST_RETURN = _las.LAST_RETURN
+    CHECKPOINT_INTERVAL = _las.CHECKPOINT_INTERVAL
 
     # numpy needs a list before it will pull out fields, C returns
     # a tuple. Probably need to sort this at some stage    
@@ -119,11 +136,20 @@ else:
     "for indexing pulses"
     LAST_RETURN = None
     "for indexing pulses"
+    CHECKPOINT_INTERVAL = None
+    "number of pulses between entries in the checkpoint table"
     LAS_WAVEFORM_TABLE_FIELDS = []
     "for building waveforms - need to build unique table of these"
     
 from . import gridindexutils
 
+CHECKPOINT_SIDECAR_EXT = '.pulseidx.npz'
+"extension added to the file name for the checkpoint sidecar"
+
+WAVEFORM_PULSE_COLUMNS = ('GPS_TIME', 'X_ORIGIN', 'Y_ORIGIN', 'Z_ORIGIN',
+    'AZIMUTH', 'ZENITH', 'NUMBER_OF_WAVEFORM_SAMPLES', 'WFM_START_IDX')
+"pulse columns that are filled in from the waveforms when they are read"
+
 LAS_SIMPLEGRID_COUNT_DTYPE = numpy.uint32
 "types for the spatial index"
 LAS_SIMPLEGRID_INDEX_DTYPE = numpy.uint64
@@ -197,6 +223,16 @@ class LasFile(generic.LiDARFile):
                 msg = 'cannot create las file' + str(e)
                 raise generic.LiDARFileException(msg)
 
+        # checkpoint table sidecar
+        self.checkpointSidecar = False
+        self.nLoadedCheckpoints = 0
+        if mode == generic.READ:
+            if 'CHECKPOINT_SIDECAR' in userClass.lidarDriverOptions:
+                self.checkpointSidecar = (
+                    userClass.lidarDriverOptions['CHECKPOINT_SIDECAR'])
+            if self.checkpointSidecar:
+                self.loadCheckpoints()
+
         if mode == generic.READ:
             self.header = None
         else:
@@ -207,15 +243,87 @@ class LasFile(generic.LiDARFile):
         self.lastPulses = None
         self.lastWaveformInfo = None
         self.lastReceived = None
+        # point columns in self.lastPoints (None for all) and 
+        # whether the waveforms were read
+        self.lastPointColumns = None
+        self.lastWaveforms = False
         self.extent = None
         self.lastExtent = None
         self.firstBlockWritten = False # can't write header values when this is True
 
+    @staticmethod
+    def sniffFile(signature):
+        """
+        Checks for 'LASF' at the start of the file, as for isLasFile().
+        See generic.LiDARFile.sniffFile()
+        """
+        return signature.header[:4] == b'LASF'
+
     @staticmethod        
     def getDriverName():
         return 'LAS'
         
+    def getCheckpointSidecarInfo(self):
+        """
+        Internal method. Returns a dictionary of what the checkpoint
+        table depends on so a sidecar for a different version of the
+        file, or made with different options, isn't used.
+        """
+        return {'interval' : CHECKPOINT_INTERVAL, 
+            'buildPulses' : self.lasFile.build_pulses,
+            'fileSize' : os.path.getsize(self.fname),
+            'mtime' : os.path.getmtime(self.fname)}
+
+    def loadCheckpoints(self):
+        """
+        Internal method. Loads the checkpoint table from the sidecar
+        file if it exists and matches this file.
+        """
+        sidecar = self.fname + CHECKPOINT_SIDECAR_EXT
+        if not os.path.exists(sidecar):
+            return
+
+        try:
+            with numpy.load(sidecar) as saved:
+                info = self.getCheckpointSidecarInfo()
+                for key in info:
+                    if saved[key] != info[key]:
+                        return
+                checkpoints = saved['checkpoints']
+        except (IOError, OSError, KeyError, ValueError, zipfile.BadZipfile):
+            # ignore a bad sidecar - the table will be rebuilt
+            return
+
+        self.lasFile.setCheckpoints(checkpoints)
+        self.nLoadedCheckpoints = len(checkpoints)
+
+    def saveCheckpoints(self):
+        """
+        Internal method. Saves the checkpoint table to the sidecar
+        file if more has been found than was loaded.
+        """
+        checkpoints = self.lasFile.checkpoints
+        if len(checkpoints) <= self.nLoadedCheckpoints:
+            return
+
+        # write to a temporary file and rename it so another reader
+        # never sees a partly written sidecar
+        sidecar = self.fname + CHECKPOINT_SIDECAR_EXT
+        tmpSidecar = sidecar + '.%d.tmp' % os.getpid()
+        try:
+            with open(tmpSidecar, 'wb') as f:
+                numpy.savez(f, checkpoints=checkpoints, 
+                    **self.getCheckpointSidecarInfo())
+            generic.replaceFile(tmpSidecar, sidecar)
+        except (IOError, OSError):
+            # directory may not be writeable. Not an error.
+            if os.path.exists(tmpSidecar):
+                os.remove(tmpSidecar)
+
     def close(self):
+        if (self.mode == generic.READ and self.checkpointSidecar and
+                self.lasFile is not None):
+            self.saveCheckpoints()
         self.lasFile = None
         self.range = None
         self.lastRange = None
@@ -223,6 +331,8 @@ class LasFile(generic.LiDARFile):
         self.lastPulses = None
         self.lastWaveformInfo = None
         self.lastReceived = None
+        self.lastPointColumns = None
+        self.lastWaveforms = False
         self.extent = None
         self.lastExtent = None
 
@@ -238,8 +348,9 @@ class LasFile(generic.LiDARFile):
         Read a 2d structured masked array containing the points
         for each pulse.
         """
-        pulses = self.readPulsesForRange()
-        points = self.readPointsForRange()
+        pulses = self.readPulsesForRange(['NUMBER_OF_RETURNS', 
+                            'PTS_START_IDX'])
+        points = self.readPointsForRange(self.getColumnsToRead(colNames))
         if points.size == 0:
             return None
         nReturns = pulses['NUMBER_OF_RETURNS']
@@ -280,40 +391,120 @@ class LasFile(generic.LiDARFile):
         # after a read that we can't
         return not self.lasFile.finished
         
-    def readData(self, extent=None):
+    @staticmethod
+    def getColumnsToRead(colNames, extraColNames=None):
+        """
+        Internal method. Returns the list of point columns that need to
+        be read for colNames (as passed to the read functions) plus
+        any in extraColNames. None means all the columns.
+        """
+        if colNames is None:
+            return None
+        if isinstance(colNames, str):
+            colNames = [colNames]
+        colNames = list(colNames)
+        if extraColNames is not None:
+            colNames.extend(extraColNames)
+        return colNames
+
+    @staticmethod
+    def pulseColumnsNeedWaveforms(colNames):
+        """
+        Internal method. Returns True if any of the given pulse columns
+        are filled in from the waveforms.
+        """
+        if colNames is None:
+            return True
+        if isinstance(colNames, str):
+            colNames = [colNames]
+        for col in colNames:
+            if col in WAVEFORM_PULSE_COLUMNS:
+                return True
+        return False
+
+    def lastReadHas(self, pointColNames, waveforms):
+        """
+        Internal method. Returns True if the last read included the
+        given point columns and the waveforms (if needed).
+        """
+        if waveforms and not self.lastWaveforms:
+            return False
+        if self.lastPointColumns is None:
+            return True
+        if pointColNames is None:
+            return False
+        return set(pointColNames).issubset(self.lastPointColumns)
+
+    def getColumnsForNewRead(self, pointColNames, waveforms):
+        """
+        Internal method. Returns the point columns and waveform
+        flag to pass to the C extension. These include what was read
+        last time since the same things are usually asked for with each
+        block - this way they all get read at once.
+        """
+        if pointColNames is not None and self.lastPointColumns is not None:
+            pointColNames = list(set(pointColNames) | 
+                                set(self.lastPointColumns))
+        elif self.lastRange is not None or self.lastExtent is not None:
+            # last read was of all the columns
+            pointColNames = None
+        waveforms = waveforms or self.lastWaveforms
+        return pointColNames, waveforms
+
+    def readData(self, extent=None, pointColNames=None, waveforms=True):
         """
         Internal method. Just reads into the self.last* fields
+
+        pointColNames is a list of the point columns needed (None for all)
+        and waveforms is True if the waveforms are needed. Only these are
+        converted in the C extension. The data is read again if a later 
+        call needs something else for the same range/extent.
         """
         # assume only one of self.range or self.extent is set...
         if self.range is not None:
-            if self.lastRange is None or self.range != self.lastRange:
-                pulses, points, info, recv = self.lasFile.readData(self.range.startPulse, 
-                            self.range.endPulse)
+            sameData = (self.lastRange is not None and 
+                                self.range == self.lastRange)
+            if not sameData or not self.lastReadHas(pointColNames, waveforms):
+                pointColNames, waveforms = self.getColumnsForNewRead(
+                                pointColNames, waveforms)
+                pulses, points, info, recv = self.lasFile.readData(
+                            self.range.startPulse, self.range.endPulse,
+                            pointColNames, waveforms)
                 self.lastRange = copy.copy(self.range)
                 self.lastPoints = points
                 self.lastPulses = pulses
                 self.lastWaveformInfo = info
                 self.lastReceived = recv
+                self.lastPointColumns = pointColNames
+                self.lastWaveforms = waveforms
                 
         else:
             if extent is None:
                 extent = self.extent
                 
             if extent is not None:
-                if self.lastExtent is None or extent != self.lastExtent:
+                sameData = (self.lastExtent is not None and 
+                                extent == self.lastExtent)
+                if (not sameData or 
+                        not self.lastReadHas(pointColNames, waveforms)):
+                    pointColNames, waveforms = self.getColumnsForNewRead(
+                                pointColNames, waveforms)
                     # tell liblas to only read data in from the current extent
                     # this may be on a different grid to the pixelgrid - it doesn't matter
                     # since the spatial index isn't grid based.
                     self.lasFile.setExtent(extent.xMin, extent.xMax,
                         extent.yMin, extent.yMax)                
             
-                    pulses, points, info, recv = self.lasFile.readData()
+                    pulses, points, info, recv = self.lasFile.readData(
+                            pointColumns=pointColNames, waveforms=waveforms)
                 
                     self.lastExtent = copy.copy(extent)
                     self.lastPoints = points
                     self.lastPulses = pulses
                     self.lastWaveformInfo = info
                     self.lastReceived = recv
+                    self.lastPointColumns = pointColNames
+                    self.lastWaveforms = waveforms
             else:
                 msg = 'must set extent or range before reading data'
                 raise ValueError(msg)
@@ -327,7 +518,8 @@ class LasFile(generic.LiDARFile):
         colNames can be a list of column names to return. By default
         all columns are returned.
         """
-        self.readData()                            
+        self.readData(pointColNames=self.getColumnsToRead(colNames),
+                        waveforms=False)
         return self.subsetColumns(self.lastPoints, colNames)
         
     def readPulsesForRange(self, colNames=None):
@@ -339,7 +531,8 @@ class LasFile(generic.LiDARFile):
         colNames can be a list of column names to return. By default
         all columns are returned.
         """
-        self.readData()                            
+        self.readData(pointColNames=[], 
+                waveforms=self.pulseColumnsNeedWaveforms(colNames))
         return self.subsetColumns(self.lastPulses, colNames)
         
     def readWaveformInfo(self):
@@ -347,7 +540,7 @@ class LasFile(generic.LiDARFile):
         2d structured masked array containing information
         about the waveforms.
         """
-        self.readData()                            
+        self.readData(pointColNames=[], waveforms=True)
         # workaround - seems a structured array returned from
         # C doesn't work with masked arrays. The dtype looks different.
         # TODO: check this with a later numpy
@@ -380,9 +573,11 @@ class LasFile(generic.LiDARFile):
         # TODO: cache?
 
         # now the waveforms. Use the just created 2d array of waveform info's to
-        # create the 3d one. 
-        idx = info['RECEIVED_START_IDX']
-        cnt = info['NUMBER_OF_WAVEFORM_RECEIVED_BINS']
+        # create the 3d one. info is masked where a pulse has fewer
+        # waveforms than the most in the block - give these a count of zero
+        # so they are masked in the output too
+        idx = numpy.ma.filled(info['RECEIVED_START_IDX'], 0)
+        cnt = numpy.ma.filled(info['NUMBER_OF_WAVEFORM_RECEIVED_BINS'], 0)
             
         recv_idx, recv_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
                                         idx, cnt)
@@ -467,7 +662,8 @@ class LasFile(generic.LiDARFile):
         colNames can be a name or list of column names to return. By default
         all columns are returned.
         """
-        self.readData()
+        self.readData(pointColNames=self.getColumnsToRead(colNames),
+                        waveforms=False)
         return self.subsetColumns(self.lastPoints, colNames)
 
     def readPulsesForExtent(self, colNames=None):
@@ -479,7 +675,8 @@ class LasFile(generic.LiDARFile):
         colNames can be a name or list of column names to return. By default
         all columns are returned.
         """
-        self.readData()
+        self.readData(pointColNames=[], 
+                waveforms=self.pulseColumnsNeedWaveforms(colNames))
         return self.subsetColumns(self.lastPulses, colNames)
         
     def readPulsesForExtentByBins(self, extent=None, colNames=None):
@@ -497,7 +694,8 @@ class LasFile(generic.LiDARFile):
         if extent is None:
             extent = self.extent
             
-        self.readData(extent)
+        self.readData(extent, pointColNames=[], 
+                waveforms=self.pulseColumnsNeedWaveforms(colNames))
         
         # TODO: cache somehow with colNames
         # round() ok since points should already be on the grid, nasty 
@@ -558,7 +756,10 @@ class LasFile(generic.LiDARFile):
         if extent is None:
             extent = self.extent
             
-        self.readData(extent)
+        # X and Y are needed for the spatial index
+        self.readData(extent, 
+                pointColNames=self.getColumnsToRead(colNames, ['X', 'Y']),
+                waveforms=False)
 
         # TODO: cache somehow with colNames
         # round() ok since points should already be on the grid, nasty 
@@ -848,6 +1049,13 @@ class LasFileInfo(generic.LiDARFileInfo):
             
         self.hasSpatialIndex = lasFile.hasSpatialIndex
         
+    @staticmethod
+    def sniffFile(signature):
+        """
+        See LasFile.sniffFile()
+        """
+        return LasFile.sniffFile(signature)
+
     @staticmethod        
     def getDriverName():
         return 'LAS'
@@ -14,6 +14,13 @@ These are contained in the READSUPPORTEDOPTIONS module level variable.
 |                       | file the coordinates for the point is      |
 |                       | created from. Defaults to POINT_FROM_LCE   |
 +-----------------------+--------------------------------------------+
+| MEMORY_MAP            | a boolean. If True, the files are memory   |
+|                       | mapped and the columns read are views of   |
+|                       | the records in the files rather than being |
+|                       | copied out a pulse at a time. Only the     |
+|                       | columns asked for are created. Defaults to |
+|                       | False.                                     |
++-----------------------+--------------------------------------------+
 """
 
 # This file is part of PyLidar
@@ -55,9 +62,93 @@ else:
     POINT_FROM_LGWEND = None
     "How the points are set"
 
-READSUPPORTEDOPTIONS = ('POINT_FROM',)
+READSUPPORTEDOPTIONS = ('POINT_FROM', 'MEMORY_MAP')
 "Supported read options"
 
+# Layout of the records in each version of the files for MEMORY_MAP. 
+# See lvisbin.h. The lowest sample fields of the LGW files are named
+# *END as for the pulse columns.
+_IDS = [('LFID', numpy.uint32), ('SHOTNUMBER', numpy.uint32)]
+_ANGLES = [('AZIMUTH', numpy.float32), ('INCIDENTANGLE', numpy.float32), 
+            ('RANGE', numpy.float32)]
+_TIME = [('LVISTIME', numpy.float64)]
+_LCE = [('TLON', numpy.float64), ('TLAT', numpy.float64), 
+            ('ZT', numpy.float32)]
+_LGE = [('GLON', numpy.float64), ('GLAT', numpy.float64), 
+            ('ZG', numpy.float32), ('RH25', numpy.float32), 
+            ('RH50', numpy.float32), ('RH75', numpy.float32), 
+            ('RH100', numpy.float32)]
+_LGW = [('LON0', numpy.float64), ('LAT0', numpy.float64), 
+            ('Z0', numpy.float32), ('LONEND', numpy.float64), 
+            ('LATEND', numpy.float64), ('ZEND', numpy.float32), 
+            ('SIGMEAN', numpy.float32)]
+_LGW_WAVE_V100 = [('RXWAVE', numpy.uint8, 432)]
+_LGW_WAVE_V103 = [('TXWAVE', numpy.uint8, 80), ('RXWAVE', numpy.uint8, 432)]
+_LGW_WAVE_V104 = [('TXWAVE', numpy.uint16, 120), ('RXWAVE', numpy.uint16, 528)]
+
+FILE_TYPES = ('LCE', 'LGE', 'LGW')
+"the types of file, in the order their pulse columns are returned"
+
+RECORD_FIELDS = {
+    'LCE' : {100 : _LCE, 101 : _IDS + _LCE, 102 : _IDS + _TIME + _LCE,
+            103 : _IDS + _ANGLES + _TIME + _LCE, 
+            104 : _IDS + _ANGLES + _TIME + _LCE},
+    'LGE' : {100 : _LGE, 101 : _IDS + _LGE, 102 : _IDS + _TIME + _LGE,
+            103 : _IDS + _ANGLES + _TIME + _LGE, 
+            104 : _IDS + _ANGLES + _TIME + _LGE},
+    'LGW' : {100 : _LGW + _LGW_WAVE_V100, 101 : _IDS + _LGW + _LGW_WAVE_V100,
+            102 : _IDS + _TIME + _LGW + _LGW_WAVE_V100,
+            103 : _IDS + _ANGLES + _TIME + _LGW + _LGW_WAVE_V103,
+            104 : _IDS + _ANGLES + _TIME + _LGW + _LGW_WAVE_V104}}
+"record fields for each file type keyed on the version * 100"
+
+WAVEFORM_RECORD_FIELDS = ('TXWAVE', 'RXWAVE')
+"record fields that are waveforms rather than pulse columns"
+
+POINT_RECORD_FIELDS = {
+    POINT_FROM_LCE : ('LCE', 'TLON', 'TLAT', 'ZT'),
+    POINT_FROM_LGE : ('LGE', 'GLON', 'GLAT', 'ZG'),
+    POINT_FROM_LGW0 : ('LGW', 'LON0', 'LAT0', 'Z0'),
+    POINT_FROM_LGWEND : ('LGW', 'LONEND', 'LATEND', 'ZEND')}
+"the file type and record fields for X, Y and Z for each POINT_FROM"
+
+def _pulseStructFields(fileType, fields):
+    """
+    Internal function. Returns the SLVISPulse fields (see lvisbin.cpp)
+    for the given file type and record fields.
+    """
+    return [(fileType + '_' + name, dtype) for name, dtype in fields]
+
+PULSE_DTYPE = numpy.dtype([('LCEVERSION', numpy.float32), 
+            ('LGEVERSION', numpy.float32), ('LGWVERSION', numpy.float32)] + 
+            _pulseStructFields('LCE', _IDS + _ANGLES + _TIME + _LCE) +
+            _pulseStructFields('LGE', _IDS + _ANGLES + _TIME + _LGE) +
+            _pulseStructFields('LGW', _IDS + _ANGLES + _TIME + _LGW) +
+            [('WFM_START_IDX', numpy.uint32), 
+            ('NUMBER_OF_WAVEFORM_SAMPLES', numpy.uint8),
+            ('NUMBER_OF_RETURNS', numpy.uint8), 
+            ('PTS_START_IDX', numpy.uint64)], align=True)
+"""
+dtype of the SLVISPulse struct that _lvisbin creates the pulses from.
+The pulses only have the fields that are in the files but keep these offsets.
+"""
+
+POINT_DTYPE = numpy.dtype([('X', numpy.float64), ('Y', numpy.float64), 
+            ('Z', numpy.float32), ('CLASSIFICATION', numpy.uint8)], 
+            align=True)
+"dtype of the points (as created by _lvisbin)"
+
+WAVEFORM_INFO_DTYPE = numpy.dtype([
+            ('NUMBER_OF_WAVEFORM_RECEIVED_BINS', numpy.uint16),
+            ('RECEIVED_START_IDX', numpy.uint64),
+            ('NUMBER_OF_WAVEFORM_TRANSMITTED_BINS', numpy.uint16),
+            ('TRANSMITTED_START_IDX', numpy.uint64),
+            ('RECEIVE_WAVE_GAIN', numpy.float32),
+            ('RECEIVE_WAVE_OFFSET', numpy.float32),
+            ('TRANS_WAVE_GAIN', numpy.float32),
+            ('TRANS_WAVE_OFFSET', numpy.float32)], align=True)
+"dtype of the waveform info (as created by _lvisbin)"
+
 def translateChars(input, old, new):
     """
     Translate any instances of old into new in string input.
@@ -150,6 +241,19 @@ class LVISBinFile(generic.LiDARFile):
             point_from = userClass.lidarDriverOptions['POINT_FROM']
 
         self.lvisFile = _lvisbin.File(lcename, lgename, lgwname, point_from)
+        self.pointFrom = point_from
+        self.memoryMap = False
+        if 'MEMORY_MAP' in userClass.lidarDriverOptions:
+            self.memoryMap = userClass.lidarDriverOptions['MEMORY_MAP']
+
+        # for MEMORY_MAP. 1d structured array of the records in each 
+        # file keyed on the file type
+        self.records = {}
+        self.nMappedPulses = 0
+        self.lastMappedRange = None
+        if self.memoryMap:
+            self.mapFiles({'LCE' : lcename, 'LGE' : lgename, 'LGW' : lgwname})
+
         self.range = None
         self.lastRange = None
         self.lastPoints = None
@@ -158,12 +262,86 @@ class LVISBinFile(generic.LiDARFile):
         self.lastReceived = None
         self.lastTransmitted = None
 
+    @staticmethod
+    def sniffFile(signature):
+        """
+        Checks the extension, as for getFilenames().
+        See generic.LiDARFile.sniffFile()
+        """
+        return signature.extension in ('.lce', '.lge', '.lgw')
+
     @staticmethod        
     def getDriverName():
         return 'LVIS Binary'
 
+    def mapFiles(self, fnames):
+        """
+        Internal method. Memory maps each of the files given in fnames 
+        (keyed on the file type, None if the file doesn't exist) as a 1d
+        structured array of its records. The records are in native byte
+        order as for _lvisbin.
+        """
+        versions = {'LCE' : self.lvisFile.lceVersion, 
+                    'LGE' : self.lvisFile.lgeVersion, 
+                    'LGW' : self.lvisFile.lgwVersion}
+        nPulses = None
+        # (name, file type, record field) of each pulse column in the 
+        # order _lvisbin returns them. The versions are stored in
+        # place of the record field for the first 3.
+        self.mappedPulseColumns = []
+        for fileType in FILE_TYPES:
+            self.mappedPulseColumns.append((fileType + 'VERSION', None, 
+                                versions[fileType]))
+
+        for fileType in FILE_TYPES:
+            fname = fnames[fileType]
+            if fname is None:
+                continue
+
+            version = int(round(versions[fileType] * 100))
+            if version not in RECORD_FIELDS[fileType]:
+                msg = 'Unsupported %s version %s' % (fileType, 
+                                versions[fileType])
+                raise generic.LiDARFormatNotUnderstood(msg)
+
+            dtype = numpy.dtype(RECORD_FIELDS[fileType][version])
+            nRecords = os.path.getsize(fname) // dtype.itemsize
+            if nRecords > 0:
+                # copy on write so callers can update the columns they
+                # are given without changing the file
+                records = numpy.memmap(fname, dtype=dtype, mode='c', 
+                                shape=(nRecords,)).view(numpy.ndarray)
+            else:
+                records = numpy.zeros(0, dtype=dtype)
+            self.records[fileType] = records
+
+            if nPulses is None or nRecords < nPulses:
+                nPulses = nRecords
+
+            for name in dtype.names:
+                if name not in WAVEFORM_RECORD_FIELDS:
+                    self.mappedPulseColumns.append((fileType + '_' + name,
+                                fileType, name))
+
+        if nPulses is not None:
+            self.nMappedPulses = nPulses
+
+        for name in ('WFM_START_IDX', 'NUMBER_OF_WAVEFORM_SAMPLES', 
+                    'NUMBER_OF_RETURNS', 'PTS_START_IDX'):
+            self.mappedPulseColumns.append((name, None, None))
+
+        # the fields of PULSE_DTYPE that are in the files, at the same
+        # offsets as _lvisbin returns them
+        names = [name for name, fileType, value in self.mappedPulseColumns]
+        self.mappedPulseDtype = numpy.dtype({'names' : names,
+                'formats' : [PULSE_DTYPE.fields[name][0] for name in names],
+                'offsets' : [PULSE_DTYPE.fields[name][1] for name in names],
+                'itemsize' : PULSE_DTYPE.itemsize})
+
     def close(self):
         self.lvisFile = None
+        self.records = {}
+        self.lastMappedRange = None
         self.range = None
         self.lastPoints = None
         self.lastPulses = None
@@ -194,6 +372,10 @@ class LVISBinFile(generic.LiDARFile):
         reads/writes.
         """
         self.range = copy.copy(pulseRange)
+        if self.memoryMap:
+            # we know how many records there are
+            return self.range.startPulse < self.nMappedPulses
+
         # return True if we can still read data
         # we just assume we can until we find out
         # after a read that we can't
@@ -213,6 +395,117 @@ class LVISBinFile(generic.LiDARFile):
             self.lastReceived = recv
             self.lastTransmitted = trans
 
+    def getMappedRange(self):
+        """
+        Internal method. Returns the start and end of the current range 
+        limited to the pulses in the memory mapped files.
+        """
+        start = min(self.range.startPulse, self.nMappedPulses)
+        end = min(self.range.endPulse, self.nMappedPulses)
+        return start, end
+
+    def getMappedPulseColumn(self, colName, start, end):
+        """
+        Internal method. Returns a 1d array of the named pulse column for
+        the given pulses. Columns from the files are views of the records.
+        """
+        for name, fileType, value in self.mappedPulseColumns:
+            if name == colName:
+                break
+        else:
+            msg = 'column %s does not exist for this format' % colName
+            raise generic.LiDARArrayColumnError(msg)
+
+        nPulses = end - start
+        if fileType is not None:
+            return self.records[fileType][value][start:end]
+        elif name.endswith('VERSION'):
+            return numpy.full(nPulses, value, dtype=numpy.float32)
+        elif name == 'WFM_START_IDX':
+            if 'LGW' in self.records:
+                return numpy.arange(nPulses, dtype=numpy.uint32)
+            return numpy.zeros(nPulses, dtype=numpy.uint32)
+        elif name == 'NUMBER_OF_WAVEFORM_SAMPLES':
+            return numpy.full(nPulses, 'LGW' in self.records, 
+                                dtype=numpy.uint8)
+        elif name == 'NUMBER_OF_RETURNS':
+            return numpy.ones(nPulses, dtype=numpy.uint8)
+        else:
+            # PTS_START_IDX - one point per pulse
+            return numpy.arange(nPulses, dtype=numpy.uint64)
+
+    def getMappedPoints(self, start, end):
+        """
+        Internal method. Returns the points for the given pulses
+        from the file given by POINT_FROM.
+        """
+        points = numpy.zeros(end - start, dtype=POINT_DTYPE)
+        fileType, xName, yName, zName = POINT_RECORD_FIELDS[self.pointFrom]
+        if fileType in self.records:
+            records = self.records[fileType][start:end]
+            points['X'] = records[xName]
+            points['Y'] = records[yName]
+            points['Z'] = records[zName]
+        return points
+
+    def readMappedWaveformData(self):
+        """
+        Internal method. Reads the waveform info, received and transmitted
+        for the current range from the memory mapped LGW file into the
+        self.last* fields. Received and transmitted are converted to
+        uint16 as _lvisbin does.
+        """
+        if (self.lastMappedRange is not None and 
+                self.range == self.lastMappedRange):
+            return
+
+        start, end = self.getMappedRange()
+        nPulses = end - start
+        if 'LGW' in self.records:
+            records = self.records['LGW'][start:end]
+            info = numpy.empty(nPulses, dtype=WAVEFORM_INFO_DTYPE)
+            received = records['RXWAVE']
+            nRecvBins = received.shape[1]
+            info['NUMBER_OF_WAVEFORM_RECEIVED_BINS'] = nRecvBins
+            info['RECEIVED_START_IDX'] = numpy.arange(nPulses, 
+                                dtype=numpy.uint64) * nRecvBins
+            if 'TXWAVE' in records.dtype.names:
+                transmitted = records['TXWAVE']
+                nTransBins = transmitted.shape[1]
+                info['TRANSMITTED_START_IDX'] = numpy.arange(nPulses,
+                                dtype=numpy.uint64) * nTransBins
+                transmitted = transmitted.astype(numpy.uint16).reshape(-1)
+            else:
+                nTransBins = 0
+                info['TRANSMITTED_START_IDX'] = 0
+                transmitted = numpy.empty(0, dtype=numpy.uint16)
+            info['NUMBER_OF_WAVEFORM_TRANSMITTED_BINS'] = nTransBins
+            info['RECEIVE_WAVE_GAIN'] = 1.0
+            info['RECEIVE_WAVE_OFFSET'] = 0.0
+            info['TRANS_WAVE_GAIN'] = 1.0
+            info['TRANS_WAVE_OFFSET'] = 0.0
+            received = received.astype(numpy.uint16).reshape(-1)
+        else:
+            info = numpy.empty(0, dtype=WAVEFORM_INFO_DTYPE)
+            received = numpy.empty(0, dtype=numpy.uint16)
+            transmitted = numpy.empty(0, dtype=numpy.uint16)
+
+        self.lastMappedRange = copy.copy(self.range)
+        self.lastWaveformInfo = info
+        self.lastReceived = received
+        self.lastTransmitted = transmitted
+
+    def readWaveformData(self):
+        """
+        Internal method. Returns the waveform info, received and 
+        transmitted arrays for the current range.
+        """
+        if self.memoryMap:
+            self.readMappedWaveformData()
+        else:
+            self.readData()
+        return self.lastWaveformInfo, self.lastReceived, self.lastTransmitted
+
     def readPointsForRange(self, colNames=None):
         """
         Reads the points for the current range. Returns a 1d array.
@@ -222,6 +515,11 @@ class LVISBinFile(generic.LiDARFile):
         colNames can be a list of column names to return. By default
         all columns are returned.
         """
+        if self.memoryMap:
+            start, end = self.getMappedRange()
+            return self.subsetColumns(self.getMappedPoints(start, end), 
+                                colNames)
+
         self.readData()
         return self.subsetColumns(self.lastPoints, colNames)
         
@@ -234,6 +532,20 @@ class LVISBinFile(generic.LiDARFile):
         colNames can be a list of column names to return. By default
         all columns are returned.
         """
+        if self.memoryMap:
+            # only create the columns asked for
+            start, end = self.getMappedRange()
+            if isinstance(colNames, str):
+                return self.getMappedPulseColumn(colNames, start, end)
+
+            names = colNames
+            if names is None:
+                names = self.mappedPulseDtype.names
+            pulses = numpy.zeros(end - start, dtype=self.mappedPulseDtype)
+            for name in names:
+                pulses[name] = self.getMappedPulseColumn(name, start, end)
+            return self.subsetColumns(pulses, colNames)
+
         self.readData()                            
         return self.subsetColumns(self.lastPulses, colNames)
         
@@ -242,16 +554,16 @@ class LVISBinFile(generic.LiDARFile):
         2d structured masked array containing information
         about the waveforms.
         """
-        self.readData()                            
+        waveformInfo, received, transmitted = self.readWaveformData()
         # workaround - seems a structured array returned from
         # C doesn't work with masked arrays. The dtype looks different.
         # TODO: check this with a later numpy
-        colNames = self.lastWaveformInfo.dtype.names
-        info = self.subsetColumns(self.lastWaveformInfo, colNames)
+        colNames = waveformInfo.dtype.names
+        info = self.subsetColumns(waveformInfo, colNames)
         if info is not None:
             # TODO: cache?
-            idx = self.lastPulses['WFM_START_IDX']
-            cnt = self.lastPulses['NUMBER_OF_WAVEFORM_SAMPLES']
+            idx = self.readPulsesForRange('WFM_START_IDX')
+            cnt = self.readPulsesForRange('NUMBER_OF_WAVEFORM_SAMPLES')
 
             # ok format the waveform info into a 2d (by pulse) structure using
             # the start and count fields (that connect with the pulse) 
@@ -269,13 +581,16 @@ class LVISBinFile(generic.LiDARFile):
         # TODO: cache?
 
         # now the waveforms. Use the just created 2d array of waveform info's to
-        # create the 3d one. 
-        idx = info['TRANSMITTED_START_IDX']
-        cnt = info['NUMBER_OF_WAVEFORM_TRANSMITTED_BINS']
+        # create the 3d one. info is masked where a pulse has fewer
+        # waveforms than the most in the block - give these a count of zero
+        # so they are masked in the output too
+        idx = numpy.ma.filled(info['TRANSMITTED_START_IDX'], 0)
+        cnt = numpy.ma.filled(info['NUMBER_OF_WAVEFORM_TRANSMITTED_BINS'], 0)
             
         trans_idx, trans_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
                                         idx, cnt)
-        trans = self.lastTransmitted[trans_idx]
+        waveformInfo, received, transmitted = self.readWaveformData()
+        trans = transmitted[trans_idx]
         trans = numpy.ma.array(trans, mask=trans_idx_mask)
 
         return trans
@@ -287,13 +602,16 @@ class LVISBinFile(generic.LiDARFile):
         # TODO: cache?
 
         # now the waveforms. Use the just created 2d array of waveform info's to
-        # create the 3d one. 
-        idx = info['RECEIVED_START_IDX']
-        cnt = info['NUMBER_OF_WAVEFORM_RECEIVED_BINS']
+        # create the 3d one. info is masked where a pulse has fewer
+        # waveforms than the most in the block - give these a count of zero
+        # so they are masked in the output too
+        idx = numpy.ma.filled(info['RECEIVED_START_IDX'], 0)
+        cnt = numpy.ma.filled(info['NUMBER_OF_WAVEFORM_RECEIVED_BINS'], 0)
             
         recv_idx, recv_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
                                         idx, cnt)
-        recv = self.lastReceived[recv_idx]
+        waveformInfo, received, transmitted = self.readWaveformData()
+        recv = received[recv_idx]
         recv = numpy.ma.array(recv, mask=recv_idx_mask)
 
         return recv
@@ -302,6 +620,8 @@ class LVISBinFile(generic.LiDARFile):
         """
         Return the total number of pulses
         """
+        if self.memoryMap:
+            return self.nMappedPulses
         return self.lvisFile.getNumPulses()
 
     def writeData(self, pulses=None, points=None, transmitted=None, 
@@ -336,6 +656,13 @@ class LVISBinFileInfo(generic.LiDARFileInfo):
         
         self.lcename, self.lgename, self.lgwname = getFilenames(fname)
             
+    @staticmethod
+    def sniffFile(signature):
+        """
+        See LVISBinFile.sniffFile()
+        """
+        return LVISBinFile.sniffFile(signature)
+
     @staticmethod        
     def getDriverName():
         return 'LVIS Binary'
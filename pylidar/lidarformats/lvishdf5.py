@@ -92,6 +92,20 @@ class LVISHDF5File(generic.LiDARFile):
 
         self.range = None
 
+    @staticmethod
+    def sniffFile(signature):
+        """
+        Checks for the expected header fields and ancillary data.
+        See generic.LiDARFile.sniffFile()
+        """
+        fileHandle = signature.getHDF5Handle()
+        if fileHandle is None:
+            return False
+        for expected in EXPECTED_HEADER_FIELDS:
+            if expected not in fileHandle.attrs:
+                return False
+        return ANCILLARY_DATA in fileHandle
+
     @staticmethod        
     def getDriverName():
         return 'LVIS HDF5'
@@ -320,13 +334,20 @@ class LVISHDF5File(generic.LiDARFile):
         """
         Return the total number of pulses
         """
+        return self.getNumberOfPulses(self.fileHandle)
+
+    @staticmethod
+    def getNumberOfPulses(fileHandle):
+        """
+        Internal method. Returns the number of pulses in the open file.
+        """
         # not sure if we can rely on any particular named column
         # so go for the first thing that is an array and hope they
         # are all the same length.
         nPulses = 0
-        for name in self.fileHandle.keys():
+        for name in fileHandle.keys():
             try:
-                nPulses = self.fileHandle[name].shape[0]
+                nPulses = fileHandle[name].shape[0]
             except AttributeError as e:
                 continue
 
@@ -406,7 +427,15 @@ class LVISHDF5FileInfo(generic.LiDARFileInfo):
             raise generic.LiDARFormatNotUnderstood(msg)
 
         self.header = LVISHDF5File.readHeaderAsDict(fileHandle)
+        self.totalNumberPulses = LVISHDF5File.getNumberOfPulses(fileHandle)
             
+    @staticmethod
+    def sniffFile(signature):
+        """
+        See LVISHDF5File.sniffFile()
+        """
+        return LVISHDF5File.sniffFile(signature)
+
     @staticmethod        
     def getDriverName():
         return 'LVIS HDF5'
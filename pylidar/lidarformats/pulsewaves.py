@@ -130,6 +130,14 @@ class PulseWavesFile(generic.LiDARFile):
         self.lastTransmitted = None
         self.firstBlockWritten = False # can't write header values when this is True
 
+    @staticmethod
+    def sniffFile(signature):
+        """
+        Checks for 'PulseWavesPulse', as for isPulseWavesFile().
+        See generic.LiDARFile.sniffFile()
+        """
+        return signature.header[:15] == b'PulseWavesPulse'
+
     @staticmethod        
     def getDriverName():
         return 'PulseWaves'
@@ -377,6 +385,13 @@ class PulseWavesFileInfo(generic.LiDARFileInfo):
         # get header
         self.header = pulsewavesFile.readHeader()
 
+    @staticmethod
+    def sniffFile(signature):
+        """
+        See PulseWavesFile.sniffFile()
+        """
+        return PulseWavesFile.sniffFile(signature)
+
     @staticmethod        
     def getDriverName():
         return 'PulseWaves'
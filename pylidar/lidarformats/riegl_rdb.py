@@ -111,6 +111,14 @@ class RieglRDBFile(generic.LiDARFile):
         self.header = None
         self.rdbFile = _rieglrdb.RDBFile(fname, userClass.lidarDriverOptions)
         
+    @staticmethod
+    def sniffFile(signature):
+        """
+        Checks for RDB_MAGIC, as for isRieglRDBFile().
+        See generic.LiDARFile.sniffFile()
+        """
+        return signature.header[:len(RDB_MAGIC)] == RDB_MAGIC
+
     @staticmethod        
     def getDriverName():
         return 'riegl RDB'
@@ -300,6 +308,13 @@ class RieglRDBFileInfo(generic.LiDARFileInfo):
                 # just copy value across - not JSON
                 self.header[key] = header[key]
 
+    @staticmethod
+    def sniffFile(signature):
+        """
+        See RieglRDBFile.sniffFile()
+        """
+        return RieglRDBFile.sniffFile(signature)
+
     @staticmethod        
     def getDriverName():
         return 'riegl RDB'
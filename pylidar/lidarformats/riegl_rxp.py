@@ -131,6 +131,14 @@ class RieglRXPFile(generic.LiDARFile):
         self.scanFile = _rieglrxp.ScanFile(fname, waveName, 
                         userClass.lidarDriverOptions)
                           
+    @staticmethod
+    def sniffFile(signature):
+        """
+        Checks for 'Riegl' in the first 32 bytes, as for isRieglRXPFile().
+        See generic.LiDARFile.sniffFile()
+        """
+        return signature.header[:32].find(b'Riegl') != -1
+
     @staticmethod        
     def getDriverName():
         return 'riegl RXP'
@@ -365,6 +373,13 @@ class RieglRXPFileInfo(generic.LiDARFileInfo):
 
         self.header = _rieglrxp.getFileInfo(fname)
 
+    @staticmethod
+    def sniffFile(signature):
+        """
+        See RieglRXPFile.sniffFile()
+        """
+        return RieglRXPFile.sniffFile(signature)
+
     @staticmethod        
     def getDriverName():
         return 'riegl RXP'
@@ -413,6 +413,19 @@ class SPDV3File(generic.LiDARFile):
             dict[key] = value
         return dict
 
+    @staticmethod
+    def sniffFile(signature):
+        """
+        Checks for the VERSION_MAJOR_SPD field in the HEADER.
+        See generic.LiDARFile.sniffFile()
+        """
+        fileHandle = signature.getHDF5Handle()
+        if fileHandle is None or 'HEADER' not in fileHandle:
+            return False
+        header = fileHandle['HEADER']
+        return ('VERSION_MAJOR_SPD' in header and 
+                header['VERSION_MAJOR_SPD'][0] == 2)
+
     @staticmethod
     def getDriverName():
         """
@@ -1572,6 +1585,13 @@ class SPDV3FileInfo(generic.LiDARFileInfo):
         self.hasSpatialIndex = 'INDEX' in fileHandle
         # probably other things too
         
+    @staticmethod
+    def sniffFile(signature):
+        """
+        See SPDV3File.sniffFile()
+        """
+        return SPDV3File.sniffFile(signature)
+
     @staticmethod
     def getDriverName():
         """
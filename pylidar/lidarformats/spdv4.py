@@ -2,6 +2,29 @@
 """
 SPD V4 format driver and support functions
 
+Read Driver Options
+-------------------
+
+These are contained in the READSUPPORTEDOPTIONS module level variable.
+
++-----------------------------+-------------------------------------------+
+| Name                        | Use                                       |
++=============================+===========================================+
+| HDF5_CHUNK_CACHE_SIZE       | Size in bytes of the HDF5 raw data chunk  |
+|                             | cache for each column. Defaults to the    |
+|                             | h5py default (1Mb).                       |
++-----------------------------+-------------------------------------------+
+| HDF5_CHUNK_CACHE_SLOTS      | Number of slots in the HDF5 raw data      |
+|                             | chunk cache. Should be a prime number     |
+|                             | around 100 times the number of chunks     |
+|                             | that fit in the cache. Defaults to the    |
+|                             | h5py default.                             |
++-----------------------------+-------------------------------------------+
+| READ_THREADS                | Number of threads used to read (and       |
+|                             | decompress and unscale) the columns of    |
+|                             | each block. Defaults to 1 (no threads).   |
++-----------------------------+-------------------------------------------+
+
 Write Driver Options
 --------------------
 
@@ -14,7 +37,46 @@ These are contained in the WRITESUPPORTEDOPTIONS module level variable.
 |                             | doesn't get created. Defaults to True     |
 +-----------------------------+-------------------------------------------+
 | HDF5_CHUNK_SIZE             | Set the HDF5 chunk size when creating     |
-|                             | columns. Defaults to 250.                 |
+|                             | columns. Defaults to 250. Set to 'AUTO'   |
+|                             | to pick a size for each column from the   |
+|                             | size of the first block written and the   |
+|                             | expected number of elements in the header |
+|                             | (see getAutoChunkSize()).                 |
++-----------------------------+-------------------------------------------+
+| HDF5_CHUNK_CACHE_SIZE       | As for reading                            |
++-----------------------------+-------------------------------------------+
+| COMPRESSION                 | Compression used for new columns. One of  |
+|                             | 'GZIP' (the default, level 1), 'LZF',     |
+|                             | 'NONE', 'BLOSC' or 'ZSTD'. 'BLOSC' and    |
+|                             | 'ZSTD' require the hdf5plugin module,     |
+|                             | which must also be installed when reading |
+|                             | the file.                                 |
++-----------------------------+-------------------------------------------+
+| HDF5_CHUNK_CACHE_SLOTS      | As for reading                            |
++-----------------------------+-------------------------------------------+
+| READ_THREADS                | As for reading                            |
++-----------------------------+-------------------------------------------+
+| WRITE_BUFFER_SIZE           | Number of bytes of new data to hold in    |
+|                             | memory before writing it to the columns   |
+|                             | when creating a file. Defaults to 32Mb.   |
+|                             | Set to 0 to write each block straight     |
+|                             | away (see h5writebuffer).                 |
++-----------------------------+-------------------------------------------+
+| EXPECTED_NUMBER_OF_PULSES   | Total number of pulses that will be       |
+|                             | written, if known. The pulse columns are  |
+|                             | created this long so they don't need to   |
+|                             | be resized as each block is written. They |
+|                             | are trimmed on close if fewer are written.|
++-----------------------------+-------------------------------------------+
+| EXPECTED_NUMBER_OF_POINTS   | As above for the points                   |
++-----------------------------+-------------------------------------------+
+| EXPECTED_NUMBER_OF_WAVEFORMS| As above for the waveform info            |
++-----------------------------+-------------------------------------------+
+| POINT_INDEX                 | Also create an index on the locations of  |
+|                             | the points when creating a file with a    |
+|                             | cartesian spatial index. This is used by  |
+|                             | getPointsByBins() instead of binning the  |
+|                             | points for each block. Defaults to False  |
 +-----------------------------+-------------------------------------------+
 
 """
@@ -38,22 +100,56 @@ from __future__ import print_function, division
 import sys
 import copy
 import numpy
+import threading
+from multiprocessing.pool import ThreadPool
 import h5py
+# registers the extra HDF5 filters (blosc, zstd etc) so they can be read
+try:
+    import hdf5plugin
+    HAVE_HDF5PLUGIN = True
+except ImportError:
+    HAVE_HDF5PLUGIN = False
 from numba import jit
 from rios import pixelgrid
 from . import generic
 from . import gridindexutils
 from . import h5space
+from . import h5writebuffer
 from . import spdv4_index
+from . import binnedarray
 
 WRITESUPPORTEDOPTIONS = ('SCALING_BUT_NO_DATA_WARNING', 
-            'HDF5_CHUNK_SIZE')
+            'HDF5_CHUNK_SIZE', 'POINT_INDEX', 'HDF5_CHUNK_CACHE_SIZE', 
+            'HDF5_CHUNK_CACHE_SLOTS', 'COMPRESSION', 'READ_THREADS', 
+            'WRITE_BUFFER_SIZE', 'EXPECTED_NUMBER_OF_PULSES', 
+            'EXPECTED_NUMBER_OF_POINTS', 'EXPECTED_NUMBER_OF_WAVEFORMS')
 "driver options"
-READSUPPORTEDOPTIONS = ()
+READSUPPORTEDOPTIONS = ('HDF5_CHUNK_CACHE_SIZE', 'HDF5_CHUNK_CACHE_SLOTS',
+            'READ_THREADS')
 "driver options"
 
 "Default hdf5 chunk size set on column creation"
 DEFAULT_HDF5_CHUNK_SIZE = 250
+HDF5_CHUNK_SIZE_AUTO = 'AUTO'
+"Value of the HDF5_CHUNK_SIZE option to pick chunk sizes automatically"
+AUTO_CHUNK_TARGET_BYTES = 256 * 1024
+"Size of chunks (in bytes) aimed for when HDF5_CHUNK_SIZE is 'AUTO'"
+AUTO_CHUNK_MIN_ELEMENTS = 1024
+"Smallest chunk (in elements) used when HDF5_CHUNK_SIZE is 'AUTO'"
+
+COMPRESSION_GZIP = 'GZIP'
+"Values for the COMPRESSION option"
+COMPRESSION_LZF = 'LZF'
+"Values for the COMPRESSION option"
+COMPRESSION_NONE = 'NONE'
+"Values for the COMPRESSION option"
+COMPRESSION_BLOSC = 'BLOSC'
+"Values for the COMPRESSION option"
+COMPRESSION_ZSTD = 'ZSTD'
+"Values for the COMPRESSION option"
+COMPRESSION_TYPES = (COMPRESSION_GZIP, COMPRESSION_LZF, COMPRESSION_NONE,
+            COMPRESSION_BLOSC, COMPRESSION_ZSTD)
+"All the supported values for the COMPRESSION option"
 
 HEADER_FIELDS = {'AZIMUTH_MAX' : numpy.float64, 'AZIMUTH_MIN' : numpy.float64,
 'BANDWIDTHS' : numpy.float32, 'BIN_SIZE' : numpy.float32,
@@ -266,6 +362,80 @@ SPDV4_CLASSIFICATION_RAIL = 13
 HEADER_TRANSLATION_DICT = {generic.HEADER_NUMBER_OF_POINTS : 'NUMBER_OF_POINTS'}
 "Translation of header field names"
 
+CHUNK_SIZE_HEADER_FIELDS = {'POINTS' : 'NUMBER_OF_POINTS', 
+    'PULSES' : 'NUMBER_OF_PULSES', 'WAVEFORMS' : 'NUMBER_OF_WAVEFORMS'}
+"Header field with the number of elements for each group of columns"
+
+EXPECTED_LENGTH_OPTIONS = {'POINTS' : 'EXPECTED_NUMBER_OF_POINTS',
+    'PULSES' : 'EXPECTED_NUMBER_OF_PULSES', 
+    'WAVEFORMS' : 'EXPECTED_NUMBER_OF_WAVEFORMS'}
+"Driver option with the expected number of elements for each group of columns"
+
+def getCompressionArgs(compression):
+    """
+    Returns a dictionary of the parameters to pass to h5py's 
+    create_dataset() for the given COMPRESSION option.
+    """
+    compression = compression.upper()
+    if compression == COMPRESSION_GZIP:
+        # From SPDLib
+        args = {'shuffle' : True, 'compression' : 'gzip', 
+                'compression_opts' : 1}
+    elif compression == COMPRESSION_LZF:
+        args = {'shuffle' : True, 'compression' : 'lzf'}
+    elif compression == COMPRESSION_NONE:
+        args = {}
+    elif compression == COMPRESSION_BLOSC or compression == COMPRESSION_ZSTD:
+        if not HAVE_HDF5PLUGIN:
+            msg = ('hdf5plugin module must be installed for %s compression' % 
+                        compression)
+            raise generic.LiDARFunctionUnsupported(msg)
+        if compression == COMPRESSION_BLOSC:
+            # does its own shuffle
+            args = dict(hdf5plugin.Blosc(cname='lz4', clevel=5,
+                        shuffle=hdf5plugin.Blosc.SHUFFLE))
+        else:
+            args = dict(hdf5plugin.Zstd(clevel=1))
+            args['shuffle'] = True
+    else:
+        msg = 'Unsupported compression %s' % compression
+        raise generic.LiDARInvalidSetting(msg)
+    return args
+
+def getAutoChunkSize(itemSize, blockLength, expectedLength):
+    """
+    Returns the number of elements in each chunk for a new column
+    when the HDF5_CHUNK_SIZE option is 'AUTO'. 
+
+    Aims for chunks of AUTO_CHUNK_TARGET_BYTES, but no bigger than the 
+    block being written (blockLength elements) as blocks of about the same 
+    size are normally read back. Chunks are also no bigger than the expected 
+    total number of elements in the column (expectedLength, pass 0 if 
+    not known) and no smaller than AUTO_CHUNK_MIN_ELEMENTS.
+    """
+    chunkSize = AUTO_CHUNK_TARGET_BYTES // itemSize
+    chunkSize = min(chunkSize, max(blockLength, AUTO_CHUNK_MIN_ELEMENTS))
+    chunkSize = max(chunkSize, AUTO_CHUNK_MIN_ELEMENTS)
+    if expectedLength > 0:
+        chunkSize = min(chunkSize, max(expectedLength, blockLength))
+    return max(chunkSize, 1)
+
+@jit
+def getMinMax(data):
+    """
+    Returns the minimum and maximum of a 1d array (which can be a field
+    of a structured array) in one pass. data must not be empty.
+    """
+    minVal = data[0]
+    maxVal = data[0]
+    for i in range(1, data.shape[0]):
+        val = data[i]
+        if val < minVal:
+            minVal = val
+        elif val > maxVal:
+            maxVal = val
+    return minVal, maxVal
+
 @jit
 def flatten3dWaveformData(wavedata, inmask, nrecv, flattened):
     """
@@ -335,13 +505,59 @@ class SPDV4File(generic.LiDARFile):
         self.createIndexOnUpdate = False
 
         # hdf5 chunk size - as a tuple - columns are 1d
+        # None means work it out for each column
         self.hdf5ChunkSize = (DEFAULT_HDF5_CHUNK_SIZE,)
         if 'HDF5_CHUNK_SIZE' in userClass.lidarDriverOptions:
-            self.hdf5ChunkSize = (userClass.lidarDriverOptions['HDF5_CHUNK_SIZE'],)
+            chunkSize = userClass.lidarDriverOptions['HDF5_CHUNK_SIZE']
+            if chunkSize == HDF5_CHUNK_SIZE_AUTO:
+                self.hdf5ChunkSize = None
+            else:
+                self.hdf5ChunkSize = (chunkSize,)
+                
+        # compression for new columns
+        self.compressionArgs = getCompressionArgs(COMPRESSION_GZIP)
+        if 'COMPRESSION' in userClass.lidarDriverOptions:
+            self.compressionArgs = getCompressionArgs(
+                        userClass.lidarDriverOptions['COMPRESSION'])
+                
+        # raw data chunk cache. Use the h5py defaults unless set
+        h5pyKwargs = {}
+        if 'HDF5_CHUNK_CACHE_SIZE' in userClass.lidarDriverOptions:
+            h5pyKwargs['rdcc_nbytes'] = userClass.lidarDriverOptions['HDF5_CHUNK_CACHE_SIZE']
+        if 'HDF5_CHUNK_CACHE_SLOTS' in userClass.lidarDriverOptions:
+            h5pyKwargs['rdcc_nslots'] = userClass.lidarDriverOptions['HDF5_CHUNK_CACHE_SLOTS']
+
+        # create an index on the points when the file is closed
+        self.pointIndex = False
+        if 'POINT_INDEX' in userClass.lidarDriverOptions:
+            self.pointIndex = userClass.lidarDriverOptions['POINT_INDEX']
+
+        # size of the buffer of new data when creating
+        writeBufferSize = h5writebuffer.DEFAULT_WRITE_BUFFER_SIZE
+        if 'WRITE_BUFFER_SIZE' in userClass.lidarDriverOptions:
+            writeBufferSize = userClass.lidarDriverOptions['WRITE_BUFFER_SIZE']
+        self.writeBuffer = h5writebuffer.H5WriteBuffer(writeBufferSize, 
+                                self.createDataColumn)
+
+        # total number of elements that will be written to each group
+        # of columns (when creating) if known. Keyed on group name.
+        self.expectedLengths = {}
+        for groupName in EXPECTED_LENGTH_OPTIONS:
+            option = EXPECTED_LENGTH_OPTIONS[groupName]
+            if option in userClass.lidarDriverOptions:
+                self.expectedLengths[groupName] = int(
+                        userClass.lidarDriverOptions[option])
+
+        # threads to read the columns with. The pool is created
+        # by getReadThreadPool() when first needed
+        self.readThreads = 1
+        if 'READ_THREADS' in userClass.lidarDriverOptions:
+            self.readThreads = userClass.lidarDriverOptions['READ_THREADS']
+        self.readThreadPool = None
 
         # attempt to open the file
         try:
-            self.fileHandle = h5py.File(fname, h5py_mode)
+            self.fileHandle = h5py.File(fname, h5py_mode, **h5pyKwargs)
         except (OSError, IOError) as err:
             # always seems to throw an OSError
             # found another one!
@@ -410,7 +626,8 @@ class SPDV4File(generic.LiDARFile):
         # Spatial Index
         self.si_handler = spdv4_index.SPDV4SpatialIndex.getHandlerForFile(
                             self.fileHandle, mode, 
-                            prefType=self.preferredSpatialIndex)
+                            prefType=self.preferredSpatialIndex,
+                            compressionArgs=self.compressionArgs)
          
         # the following is for caching reads so we don't need to 
         # keep re-reading each time the user asks. Also handy since
@@ -443,6 +660,13 @@ class SPDV4File(generic.LiDARFile):
         self.lastRecv_Idx = None
         # mask for 2d recvbypulses
         self.lastRecv_IdxMask = None
+        # data read ahead of time by prefetchExtent() or
+        # prefetchPulseRange(). Installed into the above by
+        # setExtent() or setPulseRange().
+        self.prefetchedData = None
+        # held while reading from the file so prefetching can happen
+        # on another thread
+        self.readLock = threading.RLock()
         # flushed by close()
         self.pulseScalingValues = {}
         self.pointScalingValues = {}
@@ -450,6 +674,15 @@ class SPDV4File(generic.LiDARFile):
         self.pulseNullValues = {}
         self.pointNullValues = {}
         self.waveFormNullValues = {}
+        # header _MIN, _MAX and NUMBER_OF_ values accumulated from the
+        # data written. Written to the file by flushHeaderUpdates()
+        self.headerMins = {}
+        self.headerMaxs = {}
+        self.headerCounts = {}
+        # dtypes to read scaled columns as. float64 if not present
+        self.pulseScaledDtypes = {}
+        self.pointScaledDtypes = {}
+        self.waveFormScaledDtypes = {}
         # handle dtypes for optional fields
         self.pulseDtypes = {}
         self.pointDtypes = {}
@@ -492,6 +725,19 @@ class SPDV4File(generic.LiDARFile):
                                 generic.CLASSIFICATION_RAIL))
 
         
+    @staticmethod
+    def sniffFile(signature):
+        """
+        Checks for the VERSION_SPD attribute.
+        See generic.LiDARFile.sniffFile()
+        """
+        fileHandle = signature.getHDF5Handle()
+        if fileHandle is None:
+            return False
+        fileAttrs = fileHandle.attrs
+        return ('VERSION_SPD' in fileAttrs and 
+                fileAttrs['VERSION_SPD'][0] == SPDV4_VERSION_MAJOR)
+
     @staticmethod 
     def getDriverName():
         """
@@ -530,13 +776,7 @@ class SPDV4File(generic.LiDARFile):
         # need to check that the given extent is on the same grid as the 
         # spatial index. If not a new spatial index will have to be calculated
         # for each block before we can access the data.
-        totalPixGrid = self.getPixelGrid()
-        extentPixGrid = pixelgrid.PixelGridDefn(xMin=extent.xMin, 
-                xMax=extent.xMax, yMin=extent.yMin, yMax=extent.yMax,
-                xRes=extent.binSize, yRes=extent.binSize, projection=totalPixGrid.projection)
-        self.extentAlignedWithSpatialIndex = (self.si_handler.canAccessUnaligned() or
-                (extentPixGrid.alignedWith(totalPixGrid) and 
-                extent.binSize == totalPixGrid.xRes))
+        self.extentAlignedWithSpatialIndex = self.isExtentAligned(extent)
         
         if (not self.extentAlignedWithSpatialIndex and 
                     not self.unalignedWarningGiven):
@@ -544,6 +784,73 @@ class SPDV4File(generic.LiDARFile):
 spatial index will be recomputed on the fly"""
             self.controls.messageHandler(msg, generic.MESSAGE_INFORMATION)
             self.unalignedWarningGiven = True
+            
+        # use any data that has been read ahead for this extent
+        prefetched = self.prefetchedData
+        if (prefetched is not None and 'extent' in prefetched and
+                prefetched['extent'] == extent):
+            self.prefetchedData = None
+            self.lastExtent = copy.copy(extent)
+            self.lastPulseRange = None
+            self.lastPulses = None
+            self.lastPulsesColumns = None
+            self.lastPoints = None
+            self.lastPointsColumns = None
+            if 'pulses' in prefetched:
+                (self.lastPulses, self.lastPulsesSpace, self.lastPulses_Idx, 
+                    self.lastPulses_IdxMask) = prefetched['pulses']
+                self.lastPulsesColumns = prefetched['pulseColumns']
+            if 'points' in prefetched:
+                (self.lastPoints, self.lastPointsSpace, self.lastPoints_Idx, 
+                    self.lastPoints_IdxMask) = prefetched['points']
+                self.lastPointsColumns = prefetched['pointColumns']
+        
+    def isExtentAligned(self, extent):
+        """
+        Returns True if the given extent is on the same grid as the 
+        spatial index (or the spatial index doesn't require this).
+        Also returns True if the bins of the extent are a whole
+        multiple of the spatial index's as the index handler can
+        combine its bins to match.
+        """
+        totalPixGrid = self.getPixelGrid()
+        extentPixGrid = pixelgrid.PixelGridDefn(xMin=extent.xMin, 
+                xMax=extent.xMax, yMin=extent.yMin, yMax=extent.yMax,
+                xRes=extent.binSize, yRes=extent.binSize, projection=totalPixGrid.projection)
+        return (self.si_handler.canAccessUnaligned() or
+                (extentPixGrid.alignedWith(totalPixGrid) and 
+                extent.binSize == totalPixGrid.xRes) or
+                self.si_handler.getPyramidFactor(extent) is not None)
+
+    def prefetchExtent(self, extent):
+        """
+        Read the pulses and points for the given extent using the 
+        same columns as were last read. Called on a background thread
+        by the processor. The data is used by setExtent() if the extents 
+        match.
+        """
+        if self.mode != generic.READ or not self.hasSpatialIndex():
+            return
+            
+        pulseColNames = self.lastPulsesColumns
+        pointColNames = self.lastPointsColumns
+        if pulseColNames is None and pointColNames is None:
+            # nothing read yet so we don't know what will be needed
+            return
+            
+        prefetched = {'extent' : copy.copy(extent)}
+        with self.readLock:
+            extentAligned = self.isExtentAligned(extent)
+            if pulseColNames is not None:
+                prefetched['pulses'] = self.readPulsesForExtentNoCache(extent,
+                                extentAligned, pulseColNames)
+                prefetched['pulseColumns'] = pulseColNames
+            if pointColNames is not None:
+                prefetched['points'] = self.readPointsForExtentNoCache(extent,
+                                extentAligned, pointColNames)
+                prefetched['pointColumns'] = pointColNames
+                
+            self.prefetchedData = prefetched
         
     def getPixelGrid(self):
         """
@@ -582,7 +889,13 @@ spatial index will be recomputed on the fly"""
         """
         Close all open file handles
         """
+        # write any new data still in memory
+        if self.mode == generic.CREATE:
+            self.writeBuffer.flush()
+
         if self.si_handler is not None:
+            if self.pointIndex and self.mode == generic.CREATE:
+                self.createPointIndex()
             self.si_handler.close()
 
         # flush the scaling values
@@ -681,6 +994,8 @@ spatial index will be recomputed on the fly"""
                     attrs = handle[colName].attrs
                     attrs[NULL_NAME] = value
         
+            self.flushHeaderUpdates()
+
             # write the version information
             headerArray = numpy.array([SPDV4_VERSION_MAJOR, SPDV4_VERSION_MINOR], 
                                 HEADER_FIELDS['VERSION_SPD'])
@@ -689,6 +1004,10 @@ spatial index will be recomputed on the fly"""
         # close
         self.fileHandle.close()
         self.fileHandle = None        
+        if self.readThreadPool is not None:
+            self.readThreadPool.close()
+            self.readThreadPool.join()
+            self.readThreadPool = None
         self.lastExtent = None
         self.lastPoints = None
         self.lastPointsSpace = None
@@ -710,6 +1029,7 @@ spatial index will be recomputed on the fly"""
         self.lastRecvSpace = None
         self.lastRecv_Idx = None
         self.lastRecv_IdxMask = None
+        self.prefetchedData = None
         self.pulseScalingValues = None
         self.pointScalingValues = None
         self.extent = None
@@ -719,21 +1039,84 @@ spatial index will be recomputed on the fly"""
         self.pointDtypes = None
         self.waveFormDtypes = None
 
+    def createPointIndex(self):
+        """
+        Internal method. Called from close() when the POINT_INDEX
+        driver option is set to create the point index from 
+        the points that have been written.
+        """
+        if not self.hasSpatialIndex():
+            msg = 'Can only create a point index when writing a spatial index'
+            raise generic.LiDARInvalidSetting(msg)
+        if self.getHeaderValue('INDEX_TYPE') != SPDV4_INDEX_CARTESIAN:
+            msg = 'Can only create a point index for a cartesian spatial index'
+            raise generic.LiDARInvalidSetting(msg)
+            
+        pointsHandle = self.fileHandle['DATA']['POINTS']
+        nPoints = 0
+        if 'X' in pointsHandle and 'Y' in pointsHandle:
+            nPoints = pointsHandle['X'].shape[0]
+            
+        self.si_handler.createPointIndex(nPoints, self.readPointCoordsForIndex)
+
+    def readPointCoordsForIndex(self, start, end):
+        """
+        Internal method. Returns the unscaled X and Y of the given range 
+        of points for creating the point index. Uses the scaling cached
+        by setScaling() as this isn't written to the file until after
+        the index is created.
+        """
+        pointsHandle = self.fileHandle['DATA']['POINTS']
+        coords = []
+        for colName in ('X', 'Y'):
+            data = pointsHandle[colName][start:end]
+            try:
+                gain, offset = self.getScaling(colName, 
+                                    generic.ARRAY_TYPE_POINTS)
+                data = (data / gain) + offset
+            except generic.LiDARArrayColumnError:
+                pass
+            coords.append(data)
+        return coords
+
+    def getReadThreadPool(self):
+        """
+        Internal method. Returns the ThreadPool to read columns with
+        (creating it if needed) or None if READ_THREADS is 1.
+        """
+        if self.readThreadPool is None and self.readThreads > 1:
+            self.readThreadPool = ThreadPool(self.readThreads)
+        return self.readThreadPool
+
     @staticmethod
-    def readFieldAndUnScale(handle, name, selection, unScaled=False):
+    def readFieldAndUnScale(handle, name, selection, unScaled=False, 
+                out=None, scaledDtype=numpy.float64):
         """
         Given a h5py handle, field name and selection does
         any unscaling if asked (unScaled=False). 
+        
+        If out is given the data is put into it (it can be a field of
+        a structured array) and it is returned. Otherwise a new array is 
+        created, of type scaledDtype if the data is unscaled.
+        The unscaling is done in place so no temporary arrays are created.
         """
         attrs = handle[name].attrs
         data = selection.read(handle[name])
 
         if not unScaled and GAIN_NAME in attrs and OFFSET_NAME in attrs:
-            data = (data / attrs[GAIN_NAME]) + attrs[OFFSET_NAME]
+            if out is None:
+                out = numpy.empty(data.shape, dtype=scaledDtype)
+            numpy.divide(data, attrs[GAIN_NAME], out=out, casting='unsafe')
+            numpy.add(out, attrs[OFFSET_NAME], out=out, casting='unsafe')
+            data = out
+        elif out is not None:
+            out[...] = data
+            data = out
         return data
         
     @staticmethod
-    def readFieldsAndUnScale(handle, colNames, selection):
+    def readFieldsAndUnScale(handle, colNames, selection, scaledDtypes=None,
+                threadPool=None):
         """
         Given a list of column names returns a structured array
         of the data. If colNames is a string, a single un-structred
@@ -741,7 +1124,14 @@ spatial index will be recomputed on the fly"""
         It will work out of any of the column names end with '_U'
         and deal with them appropriately.
         selection should be a h5space.H5Space.
+        scaledDtypes is a dictionary of the dtype to return scaled columns 
+        as (see setScaledDataType()). float64 is used for columns not in it.
+        If threadPool (a multiprocessing.pool.ThreadPool) is given the 
+        columns are read concurrently on it.
         """
+        if scaledDtypes is None:
+            scaledDtypes = {}
+            
         if isinstance(colNames, str):
             if colNames not in handle:
                 msg = 'column %s not found in file' % colNames
@@ -749,8 +1139,9 @@ spatial index will be recomputed on the fly"""
             unScaled = colNames.endswith('_U')
             if unScaled:
                 colNames = colNames[:-2]
+            scaledDtype = scaledDtypes.get(colNames, numpy.float64)
             data = SPDV4File.readFieldAndUnScale(handle, colNames, 
-                                selection, unScaled)
+                                selection, unScaled, scaledDtype=scaledDtype)
 
         else:            
             # create a blank structured array to read the data into
@@ -768,7 +1159,7 @@ spatial index will be recomputed on the fly"""
                 attrs = handle[name].attrs
                 hasScale = GAIN_NAME in attrs and OFFSET_NAME in attrs
                 if hasScale and not unScaled:
-                    s = 'f8'
+                    s = numpy.dtype(scaledDtypes.get(name, numpy.float64)).str
                 else:
                     if unScaled:
                         hdfName = name[:-2]
@@ -781,10 +1172,24 @@ spatial index will be recomputed on the fly"""
                
             data = numpy.empty(numRecords, dtypeList)
         
-            for name, hdfName, unScaled in zip(colNames, hdfNameList, unScaledList):
-                field = SPDV4File.readFieldAndUnScale(handle, hdfName, 
-                                selection, unScaled)
-                data[str(name)] = field
+            def readField(field):
+                name, hdfName, unScaled = field
+                # straight into the structured array
+                SPDV4File.readFieldAndUnScale(handle, hdfName, 
+                                selection, unScaled, out=data[str(name)])
+
+            fieldList = list(zip(colNames, hdfNameList, unScaledList))
+            if threadPool is not None and len(fieldList) > 1:
+                # each column is a separate dataset so can be 
+                # decompressed and unscaled at the same time. Work out 
+                # how each is read first so the threads share nothing 
+                # but the (cached) plans.
+                selection.prepareRead([handle[hdfName] 
+                                for hdfName in hdfNameList])
+                threadPool.map(readField, fieldList)
+            else:
+                for field in fieldList:
+                    readField(field)
             
         return data
         
@@ -811,15 +1216,9 @@ spatial index will be recomputed on the fly"""
                         colNames in self.lastPoints.dtype.names):
                     return self.lastPoints[colNames]
         
-        point_space, idx, mask_idx = (
-                            self.si_handler.getPointsSpaceForExtent(self.extent, 
-                                        self.controls.overlap, 
-                                        self.extentAlignedWithSpatialIndex))
-        
-        points = self.readFieldsAndUnScale(pointsHandle, colNames, point_space)
-
-        # translate any classifications
-        self.recodeClassification(points, generic.RECODE_TO_LAS, colNames)
+        with self.readLock:
+            points, point_space, idx, mask_idx = self.readPointsForExtentNoCache(
+                    self.extent, self.extentAlignedWithSpatialIndex, colNames)
             
         self.lastExtent = copy.copy(self.extent)
         self.lastPoints = points
@@ -828,6 +1227,27 @@ spatial index will be recomputed on the fly"""
         self.lastPoints_IdxMask = mask_idx
         self.lastPointsColumns = colNames
         return points
+        
+    def readPointsForExtentNoCache(self, extent, extentAligned, colNames):
+        """
+        Internal method. Reads the points for the given extent without 
+        checking or updating the cache. Returns a tuple of the points,
+        the H5Space and the index and mask to turn the points into
+        a 2d array by pulse.
+        """
+        pointsHandle = self.fileHandle['DATA']['POINTS']
+        point_space, idx, mask_idx = (
+                            self.si_handler.getPointsSpaceForExtent(extent, 
+                                        self.controls.overlap, extentAligned))
+        
+        points = self.readFieldsAndUnScale(pointsHandle, colNames, point_space,
+                        self.pointScaledDtypes,
+                        threadPool=self.getReadThreadPool())
+
+        # translate any classifications
+        self.recodeClassification(points, generic.RECODE_TO_LAS, colNames)
+        
+        return points, point_space, idx, mask_idx
 
     def readPulsesForExtent(self, colNames=None):
         """
@@ -852,30 +1272,52 @@ spatial index will be recomputed on the fly"""
                         colNames in self.lastPulses.dtype.names):
                     return self.lastPulses[colNames]
         
+        with self.readLock:
+            pulses, pulse_space, idx, mask_idx = self.readPulsesForExtentNoCache(
+                    self.extent, self.extentAlignedWithSpatialIndex, colNames)
+
+        self.lastExtent = copy.copy(self.extent)
+        self.lastPulses = pulses
+        self.lastPulsesSpace = pulse_space
+        self.lastPulses_Idx = idx
+        self.lastPulses_IdxMask = mask_idx
+        self.lastPulsesColumns = colNames
+        self.lastPoints = None # cache will now be out of date
+        return pulses
+        
+    def readPulsesForExtentNoCache(self, extent, extentAligned, colNames):
+        """
+        Internal method. Reads the pulses for the given extent without 
+        checking or updating the cache. Returns a tuple of the pulses,
+        the H5Space and the index and mask to turn the pulses into
+        a 3d array by bin.
+        """
+        pulsesHandle = self.fileHandle['DATA']['PULSES']
         pulse_space, idx, mask_idx = (
-                            self.si_handler.getPulsesSpaceForExtent(self.extent, 
-                                    self.controls.overlap, 
-                                    self.extentAlignedWithSpatialIndex))
+                            self.si_handler.getPulsesSpaceForExtent(extent, 
+                                    self.controls.overlap, extentAligned))
 
-        pulses = self.readFieldsAndUnScale(pulsesHandle, colNames, pulse_space)
+        pulses = self.readFieldsAndUnScale(pulsesHandle, colNames, pulse_space,
+                        self.pulseScaledDtypes,
+                        threadPool=self.getReadThreadPool())
         
-        if not self.extentAlignedWithSpatialIndex:
+        if not extentAligned:
             # need to recompute subset of spatial index to bins
             # are aligned with current extent
             # round() ok since points should already be on the grid, nasty 
             # rounding errors propogated with ceil()         
-            nrows = int(numpy.round((self.extent.yMax - self.extent.yMin) / 
-                        self.extent.binSize))
-            ncols = int(numpy.round((self.extent.xMax - self.extent.xMin) / 
-                        self.extent.binSize))
+            nrows = int(numpy.round((extent.yMax - extent.yMin) / 
+                        extent.binSize))
+            ncols = int(numpy.round((extent.xMax - extent.xMin) / 
+                        extent.binSize))
             nrows += (self.controls.overlap * 2)
             ncols += (self.controls.overlap * 2)
             x_idx = self.readFieldAndUnScale(pulsesHandle, self.si_handler.si_xPulseColName, pulse_space)
             y_idx = self.readFieldAndUnScale(pulsesHandle, self.si_handler.si_yPulseColName, pulse_space)
             mask, sortedbins, new_idx, new_cnt = gridindexutils.CreateSpatialIndex(
                     y_idx, x_idx, 
-                    self.extent.binSize, 
-                    self.extent.yMax, self.extent.xMin, nrows, ncols, 
+                    extent.binSize, 
+                    extent.yMax, extent.xMin, nrows, ncols, 
                     SPDV4_SIMPLEGRID_INDEX_DTYPE, SPDV4_SIMPLEGRID_COUNT_DTYPE)
             # ok calculate indices on new spatial indexes
             nOut = self.fileHandle['DATA']['PULSES']['PULSE_ID'].shape[0]
@@ -885,14 +1327,7 @@ spatial index will be recomputed on the fly"""
             pulses = pulses[mask]
             pulses = pulses[sortedbins]
 
-        self.lastExtent = copy.copy(self.extent)
-        self.lastPulses = pulses
-        self.lastPulsesSpace = pulse_space
-        self.lastPulses_Idx = idx
-        self.lastPulses_IdxMask = mask_idx
-        self.lastPulsesColumns = colNames
-        self.lastPoints = None # cache will now be out of date
-        return pulses
+        return pulses, pulse_space, idx, mask_idx
     
     def readPulsesForExtentByBins(self, extent=None, colNames=None):
         """
@@ -920,27 +1355,68 @@ spatial index will be recomputed on the fly"""
         pulses = numpy.ma.array(pulsesByBins, mask=idxMask)
         return pulses
 
-    def readPointsForExtentByBins(self, extent=None, colNames=None, 
-                    indexByPulse=False, returnPulseIndex=False):
+    def readPulsesForExtentBinned(self, extent=None, colNames=None):
         """
-        Return the points as a 3d structured masked array.
-        
-        Note that because the spatial index on a SPDV4 file currently is on pulses
-        this may miss points that are attached to pulses outside the current
-        extent. If this is a problem then select an overlap large enough.
-        
-        Pass indexByPulse=True to bin the points by the locations of the pulses
-            (using X_IDX and Y_IDX rather than the locations of the points)
-            This is the default for non-cartesian indices.
-        Pass returnPulseIndex=True to also return a masked 3d array of 
-            the indices into the 1d pulse array (as returned by 
-            readPulsesForExtent())
-            
+        Return the pulses as a binnedarray.BinnedArray. Uses the 
+        same indices as readPulsesForExtentByBins() but without creating
+        the 3d structured array.
         """
-        # if they have given us a new extent then use that
         if extent is not None:
             oldExtent = self.lastExtent
             self.setExtent(extent)
+        pulses = self.readPulsesForExtent(colNames)
+        idx = self.lastPulses_Idx
+        idxMask = self.lastPulses_IdxMask 
+
+        if extent is not None:
+            self.setExtent(oldExtent)
+
+        return binnedarray.BinnedArray.fromIndex(pulses, idx, idxMask)
+
+    def canUsePointIndex(self, indexByPulse):
+        """
+        Internal method. Returns True if the point index can be used 
+        to bin the points for the current extent. Only used when reading
+        as writeData() needs the points in pulse order.
+        """
+        return (self.mode == generic.READ and not indexByPulse and 
+                self.si_handler.hasPointIndex() and 
+                self.extentAlignedWithSpatialIndex and
+                self.si_handler.getPyramidFactor(self.extent) == 1)
+
+    def readPointsForExtentByPointIndex(self, colNames):
+        """
+        Internal method. Reads the points for the current extent using
+        the point index. Returns the points sorted by bin and the count
+        of points in each bin.
+        """
+        pointsHandle = self.fileHandle['DATA']['POINTS']
+        if colNames is None:
+            # get all names
+            colNames = pointsHandle.keys()
+            
+        with self.readLock:
+            point_space, binOrder, cnt = (
+                        self.si_handler.getPointsBinnedSpaceForExtent(
+                            self.extent, self.controls.overlap, 
+                            self.extentAlignedWithSpatialIndex))
+            points = self.readFieldsAndUnScale(pointsHandle, colNames, 
+                            point_space, self.pointScaledDtypes,
+                            threadPool=self.getReadThreadPool())
+            
+        # translate any classifications
+        self.recodeClassification(points, generic.RECODE_TO_LAS, colNames)
+
+        return points[binOrder], cnt
+
+    def binPointsForExtent(self, colNames, indexByPulse):
+        """
+        Internal method. Creates a spatial index for the points in 
+        the current extent. Returns the points, the mask and sort order
+        from gridindexutils.CreateSpatialIndex(), the start and count
+        of the new index and the number of returns for each pulse (only
+        if the points were binned by pulse, otherwise None).
+        """
         # have to spatially index the points 
         # since SPDV4 files have only a spatial index on pulses currently.
         points = self.readPointsForExtent(colNames)
@@ -959,6 +1435,7 @@ spatial index will be recomputed on the fly"""
         yMax = self.lastExtent.yMax + (self.controls.overlap * self.lastExtent.binSize)
         
         # create point spatial index
+        nreturns = None
         if indexByPulse or self.si_handler.indexType != SPDV4_INDEX_CARTESIAN:
             # TODO: check if is there is a better way of going about this
             # in theory spatial index already exists but may be more work 
@@ -976,6 +1453,54 @@ spatial index will be recomputed on the fly"""
                 y_idx, x_idx, self.lastExtent.binSize, 
                 yMax, xMin, nrows, ncols, SPDV4_SIMPLEGRID_INDEX_DTYPE, 
                 SPDV4_SIMPLEGRID_COUNT_DTYPE)
+
+        return points, mask, sortedbins, idx, cnt, nreturns
+
+    def readPointsForExtentByBins(self, extent=None, colNames=None, 
+                    indexByPulse=False, returnPulseIndex=False):
+        """
+        Return the points as a 3d structured masked array.
+        
+        Note that because the spatial index on a SPDV4 file is on pulses
+        this may miss points that are attached to pulses outside the current
+        extent. If this is a problem then select an overlap large enough.
+        Files created with the POINT_INDEX driver option also have an index
+        on the points which is used instead when reading (and indexByPulse 
+        is False) so this does not apply.
+        
+        Pass indexByPulse=True to bin the points by the locations of the pulses
+            (using X_IDX and Y_IDX rather than the locations of the points)
+            This is the default for non-cartesian indices.
+        Pass returnPulseIndex=True to also return a masked 3d array of 
+            the indices into the 1d pulse array (as returned by 
+            readPulsesForExtent())
+            
+        """
+        # if they have given us a new extent then use that
+        if extent is not None:
+            oldExtent = self.lastExtent
+            self.setExtent(extent)
+            
+        if self.canUsePointIndex(indexByPulse):
+            # points are already binned
+            sortedPoints, cnt = self.readPointsForExtentByPointIndex(colNames)
+            start = binnedarray.BinnedArray.fromCounts(sortedPoints, cnt).start
+            pts_idx, pts_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
+                                start, cnt)
+            pointsByBins = sortedPoints[pts_idx]
+            
+            if extent is not None:
+                self.setExtent(oldExtent)
+            
+            self.lastPoints3d_Idx = pts_idx
+            self.lastPoints3d_IdxMask = pts_idx_mask
+            self.lastPoints3d_InRegionMask = None
+            self.lastPoints3d_InRegionSort = None
+            
+            return numpy.ma.array(pointsByBins, mask=pts_idx_mask)
+
+        points, mask, sortedbins, idx, cnt, nreturns = self.binPointsForExtent(
+                        colNames, indexByPulse)
                 
         nOut = len(points)
         pts_space, pts_idx, pts_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
@@ -1019,6 +1544,47 @@ spatial index will be recomputed on the fly"""
         else:
             # just return the points
             return points
+
+    def readPointsForExtentBinned(self, extent=None, colNames=None, 
+                    indexByPulse=False, returnPulseIndex=False):
+        """
+        Return the points as a binnedarray.BinnedArray. The index created
+        for the points is already in this form so this avoids creating
+        the 3d arrays that readPointsForExtentByBins() does.
+        
+        See readPointsForExtentByBins() for the meaning of the parameters.
+        If returnPulseIndex is True the indices into the 1d pulse array
+        are returned as a 1d array that matches the data attribute of the
+        BinnedArray.
+        """
+        if extent is not None:
+            oldExtent = self.lastExtent
+            self.setExtent(extent)
+            
+        if self.canUsePointIndex(indexByPulse):
+            sortedPoints, cnt = self.readPointsForExtentByPointIndex(colNames)
+            
+            if extent is not None:
+                self.setExtent(oldExtent)
+            
+            return binnedarray.BinnedArray.fromCounts(sortedPoints, cnt)
+
+        points, mask, sortedbins, idx, cnt, nreturns = self.binPointsForExtent(
+                        colNames, indexByPulse)
+        sortedPoints = points[mask][sortedbins]
+
+        if extent is not None:
+            self.setExtent(oldExtent)
+
+        points = binnedarray.BinnedArray.fromCounts(sortedPoints, cnt)
+
+        if indexByPulse and returnPulseIndex:
+            pulse_count = numpy.arange(0, nreturns.size)
+            pulse_idx_1d = numpy.repeat(pulse_count, nreturns)
+            sortedpulse_idx_1d = pulse_idx_1d[mask][sortedbins]
+            return points, sortedpulse_idx_1d
+        else:
+            return points
         
     def readPointsByPulse(self, colNames=None):
         """
@@ -1043,40 +1609,43 @@ spatial index will be recomputed on the fly"""
         Return 2d masked array of information about
         the waveforms.
         """
-        if self.controls.spatialProcessing:
-            try:
-                # optional fields - fail if they don't exist
-                idx = self.readPulsesForExtent('WFM_START_IDX')
-                cnt = self.readPulsesForExtent('NUMBER_OF_WAVEFORM_SAMPLES')
-            except generic.LiDARArrayColumnError:
-                return None
-        else:
-            try:
-                # optional fields - fail if they don't exist
-                idx = self.readPulsesForRange('WFM_START_IDX')
-                cnt = self.readPulsesForRange('NUMBER_OF_WAVEFORM_SAMPLES')
-            except generic.LiDARArrayColumnError:
-                return None
+        with self.readLock:
+            if self.controls.spatialProcessing:
+                try:
+                    # optional fields - fail if they don't exist
+                    idx = self.readPulsesForExtent('WFM_START_IDX')
+                    cnt = self.readPulsesForExtent('NUMBER_OF_WAVEFORM_SAMPLES')
+                except generic.LiDARArrayColumnError:
+                    return None
+            else:
+                try:
+                    # optional fields - fail if they don't exist
+                    idx = self.readPulsesForRange('WFM_START_IDX')
+                    cnt = self.readPulsesForRange('NUMBER_OF_WAVEFORM_SAMPLES')
+                except generic.LiDARArrayColumnError:
+                    return None
 
-        waveHandle = self.fileHandle['DATA']['WAVEFORMS']
-        colNames = waveHandle.keys()
-        if len(colNames) == 0:
-            return None
-        nOut = waveHandle['NUMBER_OF_WAVEFORM_RECEIVED_BINS'].shape[0]
-        wave_space, wave_idx, wave_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
-                    idx, cnt, nOut)
+            waveHandle = self.fileHandle['DATA']['WAVEFORMS']
+            colNames = waveHandle.keys()
+            if len(colNames) == 0:
+                return None
+            nOut = waveHandle['NUMBER_OF_WAVEFORM_RECEIVED_BINS'].shape[0]
+            wave_space, wave_idx, wave_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
+                        idx, cnt, nOut)
 
-        waveformInfo = self.readFieldsAndUnScale(waveHandle, colNames, wave_space)
-        waveformInfo = waveformInfo[wave_idx]
-        wave_masked = numpy.ma.array(waveformInfo, mask=wave_idx_mask)
+            waveformInfo = self.readFieldsAndUnScale(waveHandle, colNames, wave_space,
+                            self.waveFormScaledDtypes,
+                            threadPool=self.getReadThreadPool())
+            waveformInfo = waveformInfo[wave_idx]
+            wave_masked = numpy.ma.array(waveformInfo, mask=wave_idx_mask)
 
-        self.lastWaveSpace = wave_space
+            self.lastWaveSpace = wave_space
 
-        if self.mode == generic.UPDATE:
-            self.lastWave_Idx = wave_idx
-            self.lastWave_IdxMask = wave_idx_mask
+            if self.mode == generic.UPDATE:
+                self.lastWave_Idx = wave_idx
+                self.lastWave_IdxMask = wave_idx_mask
         
-        return wave_masked
+            return wave_masked
         
     def readTransmitted(self):
         """
@@ -1085,42 +1654,43 @@ spatial index will be recomputed on the fly"""
         First axis is the waveform bin.
         Second axis is waveform number and last is pulse.
         """
-        waveformInfo = self.readWaveformInfo()
-        if waveformInfo is None:
-            return None
+        with self.readLock:
+            waveformInfo = self.readWaveformInfo()
+            if waveformInfo is None:
+                return None
 
-        if 'TRANSMITTED' not in self.fileHandle['DATA']:
-            return None
-        nOut = self.fileHandle['DATA']['TRANSMITTED'].shape[0]
+            if 'TRANSMITTED' not in self.fileHandle['DATA']:
+                return None
+            nOut = self.fileHandle['DATA']['TRANSMITTED'].shape[0]
 
-        # NB: waveformInfo is masked
-        idx = waveformInfo['TRANSMITTED_START_IDX'].data
-        cnt = waveformInfo['NUMBER_OF_WAVEFORM_TRANSMITTED_BINS']
-        cnt = cnt.filled(0)
+            # NB: waveformInfo is masked
+            idx = waveformInfo['TRANSMITTED_START_IDX'].data
+            cnt = waveformInfo['NUMBER_OF_WAVEFORM_TRANSMITTED_BINS']
+            cnt = cnt.filled(0)
         
-        trans_shape, trans_idx, trans_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
-                        idx, cnt, nOut)
+            trans_shape, trans_idx, trans_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
+                            idx, cnt, nOut)
             
-        trans = trans_shape.read(self.fileHandle['DATA']['TRANSMITTED'])
-        # so we can apply scaling, below
-        trans = trans.astype(numpy.float32)
-        trans = trans[trans_idx]
-
-        # apply gain and offset
-        for waveform in range(waveformInfo.shape[0]):
-            offset = waveformInfo[waveform]['TRANS_WAVE_OFFSET']
-            gain = waveformInfo[waveform]['TRANS_WAVE_GAIN']
-            trans[:,waveform] = (trans[:,waveform] / gain) + offset
+            trans = trans_shape.read(self.fileHandle['DATA']['TRANSMITTED'])
+            # so we can apply scaling, below
+            trans = trans.astype(numpy.float32)
+            trans = trans[trans_idx]
+
+            # apply gain and offset
+            for waveform in range(waveformInfo.shape[0]):
+                offset = waveformInfo[waveform]['TRANS_WAVE_OFFSET']
+                gain = waveformInfo[waveform]['TRANS_WAVE_GAIN']
+                trans[:,waveform] = (trans[:,waveform] / gain) + offset
             
-        self.lastTransSpace = trans_shape
-        if self.mode == generic.UPDATE:
-            self.lastTrans_Idx = trans_idx
-            self.lastTrans_IdxMask = trans_idx_mask
+            self.lastTransSpace = trans_shape
+            if self.mode == generic.UPDATE:
+                self.lastTrans_Idx = trans_idx
+                self.lastTrans_IdxMask = trans_idx_mask
         
-        # create masked array
-        trans = numpy.ma.array(trans, mask=trans_idx_mask)
+            # create masked array
+            trans = numpy.ma.array(trans, mask=trans_idx_mask)
         
-        return trans
+            return trans
             
 
     def readReceived(self):
@@ -1130,42 +1700,43 @@ spatial index will be recomputed on the fly"""
         First axis is the waveform bin.
         Second axis is waveform number and last is pulse.
         """
-        waveformInfo = self.readWaveformInfo()
-        if waveformInfo is None:
-            return None
+        with self.readLock:
+            waveformInfo = self.readWaveformInfo()
+            if waveformInfo is None:
+                return None
 
-        if 'RECEIVED' not in self.fileHandle['DATA']:
-            return None
-        nOut = self.fileHandle['DATA']['RECEIVED'].shape[0]
+            if 'RECEIVED' not in self.fileHandle['DATA']:
+                return None
+            nOut = self.fileHandle['DATA']['RECEIVED'].shape[0]
         
-        # NB: waveformInfo is masked
-        idx = waveformInfo['RECEIVED_START_IDX'].data
-        cnt = waveformInfo['NUMBER_OF_WAVEFORM_RECEIVED_BINS']
-        cnt = cnt.filled(0)
+            # NB: waveformInfo is masked
+            idx = waveformInfo['RECEIVED_START_IDX'].data
+            cnt = waveformInfo['NUMBER_OF_WAVEFORM_RECEIVED_BINS']
+            cnt = cnt.filled(0)
         
-        recv_shape, recv_idx, recv_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
-                        idx, cnt, nOut)
+            recv_shape, recv_idx, recv_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
+                            idx, cnt, nOut)
             
-        recv = recv_shape.read(self.fileHandle['DATA']['RECEIVED'])
-        # so we can apply scaling, below
-        recv = recv.astype(numpy.float32)
-        recv = recv[recv_idx]
-
-        # apply gain and offset
-        for waveform in range(waveformInfo.shape[0]):
-            offset = waveformInfo[waveform]['RECEIVE_WAVE_OFFSET']
-            gain = waveformInfo[waveform]['RECEIVE_WAVE_GAIN']
-            recv[:,waveform] = (recv[:,waveform] / gain) + offset
-
-        self.lastRecvSpace = recv_shape
-        if self.mode == generic.UPDATE:
-            self.lastRecv_Idx = recv_idx
-            self.lastRecv_IdxMask = recv_idx_mask
+            recv = recv_shape.read(self.fileHandle['DATA']['RECEIVED'])
+            # so we can apply scaling, below
+            recv = recv.astype(numpy.float32)
+            recv = recv[recv_idx]
+
+            # apply gain and offset
+            for waveform in range(waveformInfo.shape[0]):
+                offset = waveformInfo[waveform]['RECEIVE_WAVE_OFFSET']
+                gain = waveformInfo[waveform]['RECEIVE_WAVE_GAIN']
+                recv[:,waveform] = (recv[:,waveform] / gain) + offset
+
+            self.lastRecvSpace = recv_shape
+            if self.mode == generic.UPDATE:
+                self.lastRecv_Idx = recv_idx
+                self.lastRecv_IdxMask = recv_idx_mask
         
-        # create masked array
-        recv = numpy.ma.array(recv, mask=recv_idx_mask)
+            # create masked array
+            recv = numpy.ma.array(recv, mask=recv_idx_mask)
         
-        return recv
+            return recv
             
     def preparePulsesForWriting(self, pulses):
         """
@@ -1284,9 +1855,8 @@ spatial index will be recomputed on the fly"""
                 
                 nreturns = points[firstField].count(axis=0)
                 pointsHandle = self.fileHandle['DATA']['POINTS']
-                currPointsCount = 0
-                if firstField in pointsHandle:
-                    currPointsCount = pointsHandle[firstField].shape[0]
+                currPointsCount = self.writeBuffer.getLength(pointsHandle, 
+                                        firstField)
                     
                 # cumsum gives us the end of the points
                 # so need roll to move to the start
@@ -1421,10 +1991,8 @@ spatial index will be recomputed on the fly"""
             flattened =  numpy.empty(transmitted.count(), dtype=transmitted.dtype)
             
             flatten3dWaveformData(transmitted.data, transmitted.mask, ntrans, flattened)
-            currTransCount = 0
-            if 'TRANSMITTED' in self.fileHandle['DATA']:
-                transHandle = self.fileHandle['DATA']['TRANSMITTED']
-                currTransCount = transHandle.shape[0]
+            currTransCount = self.writeBuffer.getLength(
+                                self.fileHandle['DATA'], 'TRANSMITTED')
 
             trans_start = numpy.cumsum(ntrans)
             trans_start = numpy.roll(trans_start, 1)
@@ -1479,10 +2047,8 @@ spatial index will be recomputed on the fly"""
             flattened =  numpy.empty(received.count(), dtype=received.dtype)
             
             flatten3dWaveformData(received.data, received.mask, nrecv, flattened)
-            currRecvCount = 0
-            if 'RECEIVED' in self.fileHandle['DATA']:
-                recvHandle = self.fileHandle['DATA']['RECEIVED']
-                currRecvCount = recvHandle.shape[0]
+            currRecvCount = self.writeBuffer.getLength(
+                                self.fileHandle['DATA'], 'RECEIVED')
             
             recv_start = numpy.cumsum(nrecv)
             recv_start = numpy.roll(recv_start, 1)
@@ -1503,9 +2069,7 @@ spatial index will be recomputed on the fly"""
         
         nwaveforms = waveformInfo[firstField].count(axis=0)
         waveHandle = self.fileHandle['DATA']['WAVEFORMS']
-        currWaveformsCount = 0
-        if firstField in waveHandle:
-            currWaveformsCount = waveHandle[firstField].shape[0]
+        currWaveformsCount = self.writeBuffer.getLength(waveHandle, firstField)
 
         # cumsum gives us the end of the points
         # so need roll to move to the start
@@ -1545,14 +2109,33 @@ spatial index will be recomputed on the fly"""
         The type is the same as the numpy array data and data
         is written to the column
 
-        sets the chunk size to self.hdf5ChunkSize which can be
-        overridden in the driver options.
-        """
-        # From SPDLib
-        dset = groupHandle.create_dataset(name, data.shape, 
-                chunks=self.hdf5ChunkSize, dtype=data.dtype, shuffle=True, 
-                compression="gzip", compression_opts=1, maxshape=(None,))
-        dset[:] = data
+        sets the chunk size to self.hdf5ChunkSize and the compression
+        to self.compressionArgs which can be overridden in the driver options.
+
+        When creating, if the total number of elements for the group is 
+        known (from the EXPECTED_NUMBER_OF_* options) the column is 
+        created that long and data written to the start of it.
+        """
+        groupName = groupHandle.name.split('/')[-1]
+        expectedSize = 0
+        if self.mode == generic.CREATE and groupName in self.expectedLengths:
+            expectedSize = self.expectedLengths[groupName]
+
+        chunks = self.hdf5ChunkSize
+        if chunks is None:
+            # AUTO - use the number of elements in the header if known
+            chunkExpectedSize = expectedSize
+            if chunkExpectedSize == 0 and groupName in CHUNK_SIZE_HEADER_FIELDS:
+                headerName = CHUNK_SIZE_HEADER_FIELDS[groupName]
+                chunkExpectedSize = int(self.getHeaderValue(headerName))
+            chunks = (getAutoChunkSize(data.dtype.itemsize, data.shape[0], 
+                        chunkExpectedSize),)
+            
+        nElements = max(expectedSize, data.shape[0])
+        dset = groupHandle.create_dataset(name, (nElements,), 
+                chunks=chunks, dtype=data.dtype, maxshape=(None,), 
+                **self.compressionArgs)
+        dset[:data.shape[0]] = data
         
     def prepareDataForWriting(self, data, name, arrayType):
         """
@@ -1645,37 +2228,21 @@ spatial index will be recomputed on the fly"""
         Writes a structured array as named datasets under hdfHandle. Also writes
         columns in dictionary generatedColumns to the same place.
 
-        Only use for file creation.
+        Only use for file creation. The data is appended via 
+        self.writeBuffer so may not be in the file until it is flushed.
         """
-        firstField = structArray.dtype.names[0]
-        if firstField in hdfHandle:
-            oldSize = hdfHandle[firstField].shape[0]
-        else:
-            oldSize = 0
-        newSize = oldSize + len(structArray)
-        
         for name in structArray.dtype.names:
             # don't bother writing out the ones we generate ourselves
             if name not in generatedColumns:
                 data, hdfname = self.prepareDataForWriting(
                             structArray[name], name, arrayType)
-                    
-                if hdfname in hdfHandle:
-                    hdfHandle[hdfname].resize((newSize,))
-                    hdfHandle[hdfname][oldSize:newSize+1] = data
-                else:
-                    self.createDataColumn(hdfHandle, hdfname, data)
+                self.writeBuffer.append(hdfHandle, hdfname, data)
                     
         # now write the generated ones
         for name in generatedColumns.keys():
             data, hdfname = self.prepareDataForWriting(
                 generatedColumns[name], name, arrayType)
-                        
-            if hdfname in hdfHandle:
-                hdfHandle[hdfname].resize((newSize,))
-                hdfHandle[hdfname][oldSize:newSize+1] = data
-            else:
-                self.createDataColumn(hdfHandle, hdfname, data)
+            self.writeBuffer.append(hdfHandle, hdfname, data)
         
     def writeData(self, pulses=None, points=None, transmitted=None, 
                 received=None, waveformInfo=None):
@@ -1850,25 +2417,11 @@ spatial index will be recomputed on the fly"""
                         generatedColumns, generic.ARRAY_TYPE_WAVEFORMS)
                 
             if transmitted is not None and len(transmitted) > 0:
-                if 'TRANSMITTED' in self.fileHandle['DATA']:
-                    tHandle = self.fileHandle['DATA']['TRANSMITTED']
-                    oldSize = tHandle.shape[0]
-                    newSize = oldSize + len(transmitted)
-                    tHandle.resize((newSize,))
-                    tHandle[oldSize:newSize+1] = transmitted
-                else:
-                    self.createDataColumn(self.fileHandle['DATA'], 
+                self.writeBuffer.append(self.fileHandle['DATA'], 
                                 'TRANSMITTED', transmitted)
 
             if received is not None and len(received) > 0:
-                if 'RECEIVED' in self.fileHandle['DATA']:
-                    rHandle = self.fileHandle['DATA']['RECEIVED']
-                    oldSize = rHandle.shape[0]
-                    newSize = oldSize + len(received)
-                    rHandle.resize((newSize,))
-                    rHandle[oldSize:newSize+1] = received
-                else:
-                    self.createDataColumn(self.fileHandle['DATA'], 
+                self.writeBuffer.append(self.fileHandle['DATA'], 
                                 'RECEIVED', received)
                 
         else:
@@ -1926,55 +2479,85 @@ spatial index will be recomputed on the fly"""
 
     def updateHeaderFromData(self, points, pulses, waveformInfo):
         """
-        Given some data, updates the _MIN, _MAX etc
+        Given some data, updates the _MIN, _MAX etc. These are kept in
+        memory and only written to the file by flushHeaderUpdates().
         """
-        # Pull out the types for NUMBER_OF_POINTS and NUMBER_OF_PULSES
-        nPointsType = HEADER_FIELDS['NUMBER_OF_POINTS']
-        nPulsesType = HEADER_FIELDS['NUMBER_OF_PULSES']
-
         if points is not None and points.size > 0:
-            for key in POINTS_HEADER_UPDATE_DICT.keys():
-                if key in points.dtype.names:
-                    minVal = points[key].min()
-                    maxVal = points[key].max()
-                    minKey, maxKey = POINTS_HEADER_UPDATE_DICT[key]
-                    if minVal < self.fileHandle.attrs[minKey]:
-                        self.fileHandle.attrs[minKey] = minVal
-                    if maxVal > self.fileHandle.attrs[maxKey]:
-                        self.fileHandle.attrs[maxKey] = maxVal
+            self.updateHeaderMinMax(points, POINTS_HEADER_UPDATE_DICT)
             # update the NUMBER_OF_POINTS field also
-            # ensure these are saved back as the same type
             if self.mode == generic.CREATE:
-                self.fileHandle.attrs['NUMBER_OF_POINTS'] += nPointsType(points.size)
+                self.updateHeaderCount('NUMBER_OF_POINTS', points.size)
 
         if pulses is not None and pulses.size > 0:
-            for key in PULSES_HEADER_UPDATE_DICT.keys():
-                if key in pulses.dtype.names:
-                    minVal = pulses[key].min()
-                    maxVal = pulses[key].max()
-                    minKey, maxKey = PULSES_HEADER_UPDATE_DICT[key]
-                    if minVal < self.fileHandle.attrs[minKey]:
-                        self.fileHandle.attrs[minKey] = minVal
-                    if maxVal > self.fileHandle.attrs[maxKey]:
-                        self.fileHandle.attrs[maxKey] = maxVal
+            self.updateHeaderMinMax(pulses, PULSES_HEADER_UPDATE_DICT)
             # update the NUMBER_OF_PULSES field also
-            # ensure these are saved back as the same type
             if self.mode == generic.CREATE:
-                self.fileHandle.attrs['NUMBER_OF_PULSES'] += nPulsesType(pulses.size)
+                self.updateHeaderCount('NUMBER_OF_PULSES', pulses.size)
 
         if waveformInfo is not None and waveformInfo.size > 0:
-            for key in WAVEFORMS_HEADER_UPDATE_DICT.keys():
-                if key in waveformInfo.dtype.names:
-                    minVal = wavefromInfo[key].min()
-                    maxVal = wavefromInfo[key].max()
-                    minKey, maxKey = WAVEFORMS_HEADER_UPDATE_DICT[key]
-                    if minVal < self.fileHandle.attrs[minKey]:
-                        self.fileHandle.attrs[minKey] = minVal
-                    if maxVal > self.fileHandle.attrs[maxKey]:
-                        self.fileHandle.attrs[maxKey] = maxVal
+            self.updateHeaderMinMax(waveformInfo, WAVEFORMS_HEADER_UPDATE_DICT)
             # update the NUMBER_OF_WAVEFORMS field also
             if self.mode == generic.CREATE:
-                self.fileHandle.attrs['NUMBER_OF_WAVEFORMS'] += waveformInfo.size
+                self.updateHeaderCount('NUMBER_OF_WAVEFORMS', 
+                                waveformInfo.size)
+
+    def updateHeaderMinMax(self, data, updateDict):
+        """
+        Internal method. Updates self.headerMins and self.headerMaxs
+        from the columns of the structured array data given in
+        updateDict.
+        """
+        for key in updateDict.keys():
+            if key in data.dtype.names:
+                column = data[key]
+                if isinstance(column, numpy.ma.MaskedArray):
+                    column = column.compressed()
+                elif column.ndim != 1:
+                    column = column.reshape(-1)
+                if column.size == 0:
+                    continue
+
+                minVal, maxVal = getMinMax(column)
+                minKey, maxKey = updateDict[key]
+                if minKey not in self.headerMins or minVal < self.headerMins[minKey]:
+                    self.headerMins[minKey] = minVal
+                if maxKey not in self.headerMaxs or maxVal > self.headerMaxs[maxKey]:
+                    self.headerMaxs[maxKey] = maxVal
+
+    def updateHeaderCount(self, key, count):
+        """
+        Internal method. Adds count to the NUMBER_OF_ header field key
+        """
+        if key in self.headerCounts:
+            self.headerCounts[key] += count
+        else:
+            self.headerCounts[key] = count
+
+    def flushHeaderUpdates(self):
+        """
+        Internal method. Writes the values accumulated by 
+        updateHeaderFromData() to the header. Values are saved as
+        the type given in HEADER_FIELDS.
+        """
+        if self.mode == generic.READ:
+            return
+
+        attrs = self.fileHandle.attrs
+        for key in self.headerMins:
+            value = self.headerMins[key]
+            if value < attrs[key]:
+                attrs[key] = HEADER_FIELDS[key](value)
+        for key in self.headerMaxs:
+            value = self.headerMaxs[key]
+            if value > attrs[key]:
+                attrs[key] = HEADER_FIELDS[key](value)
+        for key in self.headerCounts:
+            cls = HEADER_FIELDS[key]
+            attrs[key] = cls(attrs[key] + cls(self.headerCounts[key]))
+
+        self.headerMins = {}
+        self.headerMaxs = {}
+        self.headerCounts = {}
 
     # The functions below are for when there is no spatial index.
     def setPulseRange(self, pulseRange):
@@ -1995,7 +2578,84 @@ spatial index will be recomputed on the fly"""
         elif self.pulseRange.endPulse >= nTotalPulses:
             self.pulseRange.endPulse = nTotalPulses
             
+        # use any data that has been read ahead for this range
+        prefetched = self.prefetchedData
+        if (prefetched is not None and 'range' in prefetched and
+                prefetched['range'] == self.pulseRange):
+            self.prefetchedData = None
+            self.lastPulseRange = copy.copy(self.pulseRange)
+            self.lastExtent = None
+            self.lastPulses = None
+            self.lastPulsesColumns = None
+            self.lastPoints = None
+            self.lastPointsSpace = None
+            self.lastPointsColumns = None
+            self.lastPulses, self.lastPulsesSpace = prefetched['pulses']
+            self.lastPulsesColumns = prefetched['pulseColumns']
+            if 'points' in prefetched:
+                (self.lastPoints, self.lastPointsSpace, self.lastPoints_Idx, 
+                    self.lastPoints_IdxMask) = prefetched['points']
+                self.lastPointsColumns = prefetched['pointColumns']
+            
         return bMore
+        
+    def prefetchPulseRange(self, pulseRange):
+        """
+        Read the pulses and points for the given range using the 
+        same columns as were last read. Called on a background thread
+        by the processor. The data is used by setPulseRange() if the 
+        ranges match.
+        """
+        if self.mode != generic.READ:
+            return
+            
+        pulseColNames = self.lastPulsesColumns
+        pointColNames = self.lastPointsColumns
+        if pulseColNames is None:
+            # nothing read yet so we don't know what will be needed
+            return
+            
+        with self.readLock:
+            # limit to the data in the same way as setPulseRange()
+            pulseRange = copy.copy(pulseRange)
+            nTotalPulses = self.getTotalNumberPulses()
+            if pulseRange.startPulse >= nTotalPulses:
+                return
+            elif pulseRange.endPulse >= nTotalPulses:
+                pulseRange.endPulse = nTotalPulses
+                
+            prefetched = {'range' : pulseRange}
+            
+            pulsesHandle = self.fileHandle['DATA']['PULSES']
+            nOut = pulsesHandle['PULSE_ID'].shape[0]
+            pulse_space = h5space.createSpaceFromRange(pulseRange.startPulse, 
+                        pulseRange.endPulse, nOut)
+            pulses = self.readFieldsAndUnScale(pulsesHandle, pulseColNames, 
+                        pulse_space, self.pulseScaledDtypes,
+                        threadPool=self.getReadThreadPool())
+            prefetched['pulses'] = (pulses, pulse_space)
+            prefetched['pulseColumns'] = pulseColNames
+            
+            pointsHandle = self.fileHandle['DATA']['POINTS']
+            if pointColNames is not None and 'RETURN_NUMBER' in pointsHandle:
+                nReturns = self.readFieldAndUnScale(pulsesHandle, 
+                                'NUMBER_OF_RETURNS', pulse_space)
+                startIdxs = self.readFieldAndUnScale(pulsesHandle, 
+                                'PTS_START_IDX', pulse_space)
+                nOut = pointsHandle['RETURN_NUMBER'].shape[0]
+                point_space, point_idx, point_idx_mask = (
+                        gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
+                        startIdxs, nReturns, nOut))
+                points = self.readFieldsAndUnScale(pointsHandle, pointColNames,
+                                point_space, self.pointScaledDtypes,
+                                threadPool=self.getReadThreadPool())
+                self.recodeClassification(points, generic.RECODE_TO_LAS, 
+                                pointColNames)
+                prefetched['points'] = (points, point_space, point_idx, 
+                                point_idx_mask)
+                prefetched['pointColumns'] = pointColNames
+                
+            self.prefetchedData = prefetched
 
     def readPointsForRange(self, colNames=None):
         """
@@ -2017,34 +2677,37 @@ spatial index will be recomputed on the fly"""
                     colNames in self.lastPoints.dtype.names):
                 return self.lastPoints[colNames]
 
-        if (self.lastPulseRange is None or 
-                    self.lastPulseRange != self.pulseRange or
-                    self.lastPointsSpace is None):
-            # otherwise we can re-use the self.lastPointsSpace
-            nReturns = self.readPulsesForRange('NUMBER_OF_RETURNS')
-            startIdxs = self.readPulsesForRange('PTS_START_IDX')
-
-            if 'RETURN_NUMBER' not in pointsHandle:
-                # not much else we can do...
-                # means to points were written to the file, 
-                # although there might be pulses
-                # TODO: is this correct?
-                return None
-        
-            nOut = pointsHandle['RETURN_NUMBER'].shape[0]
-            point_space, point_idx, point_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
-                        startIdxs, nReturns, nOut)
-
-            # keep these indices from pulses to points - handy for the indexing 
-            # functions.
-            self.lastPointsSpace = point_space
-            self.lastPoints_Idx = point_idx
-            self.lastPoints_IdxMask = point_idx_mask
-        #    print('new range')
-        #else:
-        #    print('reuse range')
-        
-        points = self.readFieldsAndUnScale(pointsHandle, colNames, self.lastPointsSpace)
+        with self.readLock:
+            if (self.lastPulseRange is None or 
+                        self.lastPulseRange != self.pulseRange or
+                        self.lastPointsSpace is None):
+                # otherwise we can re-use the self.lastPointsSpace
+                nReturns = self.readPulsesForRange('NUMBER_OF_RETURNS')
+                startIdxs = self.readPulsesForRange('PTS_START_IDX')
+
+                if 'RETURN_NUMBER' not in pointsHandle:
+                    # not much else we can do...
+                    # means to points were written to the file, 
+                    # although there might be pulses
+                    # TODO: is this correct?
+                    return None
+        
+                nOut = pointsHandle['RETURN_NUMBER'].shape[0]
+                point_space, point_idx, point_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
+                            startIdxs, nReturns, nOut)
+
+                # keep these indices from pulses to points - handy for the indexing 
+                # functions.
+                self.lastPointsSpace = point_space
+                self.lastPoints_Idx = point_idx
+                self.lastPoints_IdxMask = point_idx_mask
+            #    print('new range')
+            #else:
+            #    print('reuse range')
+        
+            points = self.readFieldsAndUnScale(pointsHandle, colNames, 
+                            self.lastPointsSpace, self.pointScaledDtypes,
+                            threadPool=self.getReadThreadPool())
 
         # translate any classifications
         self.recodeClassification(points, generic.RECODE_TO_LAS, colNames)
@@ -2074,20 +2737,22 @@ spatial index will be recomputed on the fly"""
                     colNames in self.lastPulses.dtype.names):
                 return self.lastPulses[colNames]
         
-        if (self.lastPulseRange is None or 
-                self.lastPulseRange != self.pulseRange or
-                self.lastPulsesSpace is None):
-            nOut = pulsesHandle['PULSE_ID'].shape[0]
-            space = h5space.createSpaceFromRange(self.pulseRange.startPulse, 
-                        self.pulseRange.endPulse, nOut)
+        with self.readLock:
+            if (self.lastPulseRange is None or 
+                    self.lastPulseRange != self.pulseRange or
+                    self.lastPulsesSpace is None):
+                nOut = pulsesHandle['PULSE_ID'].shape[0]
+                space = h5space.createSpaceFromRange(self.pulseRange.startPulse, 
+                            self.pulseRange.endPulse, nOut)
 
-            self.lastPulsesSpace = space
-            self.lastPulseRange = copy.copy(self.pulseRange)
-            self.lastPoints = None # now invalid
-            self.lastPointsSpace = None
+                self.lastPulsesSpace = space
+                self.lastPulseRange = copy.copy(self.pulseRange)
+                self.lastPoints = None # now invalid
+                self.lastPointsSpace = None
 
-        pulses = self.readFieldsAndUnScale(pulsesHandle, colNames, 
-                self.lastPulsesSpace)
+            pulses = self.readFieldsAndUnScale(pulsesHandle, colNames, 
+                    self.lastPulsesSpace, self.pulseScaledDtypes,
+                    threadPool=self.getReadThreadPool())
 
         self.lastPulses = pulses
         self.lastPulsesColumns = colNames
@@ -2099,15 +2764,13 @@ spatial index will be recomputed on the fly"""
         """
         # PULSE_ID is always present.
         pulseHandle = self.fileHandle['DATA']['PULSES']
-        if 'PULSE_ID' in pulseHandle:
-            return pulseHandle['PULSE_ID'].shape[0]
-        else:
-            return 0
+        return self.writeBuffer.getLength(pulseHandle, 'PULSE_ID')
         
     def getHeader(self):
         """
         Return our attributes on the file
         """
+        self.flushHeaderUpdates()
         return self.fileHandle.attrs
         
     def setHeader(self, newHeaderDict):
@@ -2117,6 +2780,7 @@ spatial index will be recomputed on the fly"""
         if self.mode == generic.READ:
             msg = 'Can only set header values on update or create'
             raise generic.LiDARInvalidSetting(msg)
+        self.flushHeaderUpdates()
         for key in newHeaderDict.keys():
             self.fileHandle.attrs[key] = newHeaderDict[key]
             
@@ -2124,6 +2788,7 @@ spatial index will be recomputed on the fly"""
         """
         Just extract the one value and return it
         """
+        self.flushHeaderUpdates()
         return self.fileHandle.attrs[name]
         
     def setHeaderValue(self, name, value):
@@ -2133,6 +2798,7 @@ spatial index will be recomputed on the fly"""
         if self.mode == generic.READ:
             msg = 'Can only set header values on update or create'
             raise generic.LiDARInvalidSetting(msg)
+        self.flushHeaderUpdates()
         self.fileHandle.attrs[name] = value
     
     def setScaling(self, colName, arrayType, gain, offset):
@@ -2269,6 +2935,30 @@ spatial index will be recomputed on the fly"""
             msg = 'Cannot find column %s' % colName
             raise generic.LiDARArrayColumnError(msg)
 
+    def setScaledDataType(self, colName, arrayType, dtype):
+        """
+        Set the dtype (numpy.float32 etc) that a scaled column is returned
+        as when read. The default is numpy.float64. The unscaling is done 
+        straight into an array of this type so no float64 copy is made.
+        
+        arrayType is one of the lidarprocessor.ARRAY_TYPE_* constants
+        """
+        if arrayType == generic.ARRAY_TYPE_PULSES:
+            self.pulseScaledDtypes[colName] = dtype
+        elif arrayType == generic.ARRAY_TYPE_POINTS:
+            self.pointScaledDtypes[colName] = dtype
+        elif arrayType == generic.ARRAY_TYPE_WAVEFORMS:
+            self.waveFormScaledDtypes[colName] = dtype
+        else:
+            raise generic.LiDARInvalidSetting('Unsupported array type')
+
+        # cached and read ahead data will be in the old type. 
+        # Wait for any read ahead in progress to finish first.
+        with self.readLock:
+            self.lastPoints = None
+            self.lastPulses = None
+            self.prefetchedData = None
+
     def setNullValue(self, colName, arrayType, value, scaled=True):
         """
         Sets the 'null' value for the given column. 
@@ -2417,6 +3107,13 @@ class SPDV4FileInfo(generic.LiDARFileInfo):
         self.has_Spatial_Index = si_handler is not None
         # probably other things too
         
+    @staticmethod
+    def sniffFile(signature):
+        """
+        See SPDV4File.sniffFile()
+        """
+        return SPDV4File.sniffFile(signature)
+
     @staticmethod 
     def getDriverName():
         """
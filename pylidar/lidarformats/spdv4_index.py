@@ -24,6 +24,8 @@ import sys
 import abc
 import copy
 import numpy
+import tempfile
+from collections import OrderedDict
 from rios import pixelgrid
 from . import generic
 from . import gridindexutils
@@ -48,6 +50,37 @@ SPDV4_SIMPLEGRID_COUNT_DTYPE = numpy.uint32
 SPDV4_SIMPLEGRID_INDEX_DTYPE = numpy.uint64
 "data types for the spatial index"
 
+POINT_INDEX_CHUNK_SIZE = 1000000
+"number of points to read at a time when creating the point index"
+POINT_INDEX_BUFFER_SIZE = 10000000
+"""
+number of entries of POINT_IDX sorted in memory before being written
+"""
+POINT_INDEX_TEMP_DTYPE = numpy.dtype([('BIN', numpy.int64), 
+                ('IDX', SPDV4_SIMPLEGRID_INDEX_DTYPE)])
+"""
+the bin and index of each point in the temporary file used when creating
+the point index
+"""
+
+SI_CACHE_STRIP_ROWS = 16
+"number of rows of the spatial index read from the file at a time"
+SI_CACHE_NUM_STRIPS = 8
+"number of strips of rows of the spatial index kept in memory"
+
+DEFAULT_COMPRESSION_ARGS = {'shuffle' : True, 'compression' : 'gzip', 
+                'compression_opts' : 1}
+"""
+parameters passed to h5py's create_dataset() for the spatial index
+unless the file's compression is given to getHandlerForFile()
+"""
+
+PYRAMID_TOLERANCE = 1e-6
+"""
+tolerance (in bins) when checking if an extent is on the grid of the
+spatial index (see SPDV4SpatialIndex.getPyramidFactor())
+"""
+
 class SPDV4SpatialIndex(object):
     """
     Class that hides the details of different Spatial Indices
@@ -57,6 +90,7 @@ class SPDV4SpatialIndex(object):
     def __init__(self, fileHandle, mode):
         self.fileHandle = fileHandle
         self.mode = mode
+        self.compressionArgs = DEFAULT_COMPRESSION_ARGS
         
         # read the pixelgrid info out of the header
         # this is same for all spatial indices on SPD V4
@@ -123,6 +157,37 @@ class SPDV4SpatialIndex(object):
         """
         raise NotImplementedError()
 
+    def hasPointIndex(self):
+        """
+        Return True if the file has an index on the points
+        as well as the pulses
+        """
+        return False
+
+    def getPyramidFactor(self, extent):
+        """
+        The bins of the spatial index can be combined to give an index with
+        bins that are a multiple of the size (a level of a pyramid). 
+        Returns this multiple if the given extent is on the same grid
+        as the spatial index with a bin size that is a whole multiple
+        of the index's. Otherwise returns None.
+        """
+        pixGrid = self.pixelGrid
+        if pixGrid is None:
+            return None
+            
+        factor = extent.binSize / pixGrid.xRes
+        xOff = (extent.xMin - pixGrid.xMin) / pixGrid.xRes
+        yOff = (pixGrid.yMax - extent.yMax) / pixGrid.yRes
+        for val in (factor, xOff, yOff):
+            if abs(val - numpy.round(val)) > PYRAMID_TOLERANCE:
+                return None
+                
+        factor = int(numpy.round(factor))
+        if factor < 1:
+            return None
+        return factor
+
     @abc.abstractmethod
     def canUpdateInPlace(self):
         """
@@ -153,13 +218,18 @@ class SPDV4SpatialIndex(object):
         return cls
         
     @staticmethod
-    def getHandlerForFile(fileHandle, mode, prefType=SPDV4_INDEXTYPE_SIMPLEGRID):
+    def getHandlerForFile(fileHandle, mode, prefType=SPDV4_INDEXTYPE_SIMPLEGRID,
+                compressionArgs=None):
         """
         Returns the 'most appropriate' spatial
         index handler for the given file.
         
         prefType contains the user's preferred spatial index.
         If it is not defined for a file another type will be chosen
+
+        compressionArgs are the parameters to h5py's create_dataset()
+        used when writing the index (as for the columns of the file). 
+        If None, DEFAULT_COMPRESSION_ARGS is used.
         
         None is returned if no spatial index is available and mode == READ
         
@@ -191,15 +261,90 @@ class SPDV4SpatialIndex(object):
                 else:
                     bContinue = False
 
+        if handler is not None and compressionArgs is not None:
+            handler.compressionArgs = compressionArgs
+
         return handler
         
+class GridIndexRowCache(object):
+    """
+    Wraps one of the 2d datasets of a grid spatial index (ie PLS_PER_BIN 
+    or BIN_OFFSETS) so that rows are only read from the file when they are 
+    needed. Rows are read in strips of SI_CACHE_STRIP_ROWS (the datasets 
+    are chunked by row) and the last SI_CACHE_NUM_STRIPS strips used are 
+    kept. So the memory used depends on the size of the blocks being read
+    rather than the size of the file.
+
+    Supports the shape attribute and indexing with a tuple of a row and
+    column slice (as returned by gridindexutils.getSlicesForExtent()).
+
+    stripRows and numStrips default to SI_CACHE_STRIP_ROWS and 
+    SI_CACHE_NUM_STRIPS.
+    """
+    def __init__(self, dataset, stripRows=None, numStrips=None):
+        if stripRows is None:
+            stripRows = SI_CACHE_STRIP_ROWS
+        if numStrips is None:
+            numStrips = SI_CACHE_NUM_STRIPS
+        self.dataset = dataset
+        self.shape = dataset.shape
+        self.dtype = dataset.dtype
+        self.stripRows = stripRows
+        self.numStrips = numStrips
+        # strip number to array of rows, least recently used first
+        self.strips = OrderedDict()
+
+    def getStrip(self, stripNum):
+        """
+        Internal method. Returns the rows for the given strip, reading them 
+        from the file if they are not already cached.
+        """
+        if stripNum in self.strips:
+            # move to the end as most recently used
+            strip = self.strips.pop(stripNum)
+        else:
+            startRow = stripNum * self.stripRows
+            endRow = min(startRow + self.stripRows, self.shape[0])
+            strip = self.dataset[startRow:endRow]
+            if len(self.strips) >= self.numStrips:
+                self.strips.popitem(last=False)
+
+        self.strips[stripNum] = strip
+        return strip
+
+    def __getitem__(self, slices):
+        rowSlice, colSlice = slices
+        startRow, endRow, step = rowSlice.indices(self.shape[0])
+        startCol, endCol, step = colSlice.indices(self.shape[1])
+
+        out = numpy.empty((max(endRow - startRow, 0), 
+                    max(endCol - startCol, 0)), dtype=self.dtype)
+        row = startRow
+        while row < endRow:
+            stripNum = row // self.stripRows
+            strip = self.getStrip(stripNum)
+            stripStart = stripNum * self.stripRows
+            stripEnd = min(stripStart + strip.shape[0], endRow)
+            out[row - startRow:stripEnd - startRow] = (
+                    strip[row - stripStart:stripEnd - stripStart, 
+                        startCol:endCol])
+            row = stripEnd
+
+        return out
+
 SPATIALINDEX_GROUP = 'SPATIALINDEX'
 SIMPLEPULSEGRID_GROUP = 'SIMPLEPULSEGRID'
+SIMPLEPOINTGRID_GROUP = 'SIMPLEPOINTGRID'
         
 class SPDV4SimpleGridSpatialIndex(SPDV4SpatialIndex):
     """
     Implementation of a simple grid index, which is currently
     the only type used in SPD V4 files.
+
+    The file may also contain an optional index on the points (see 
+    createPointIndex()). Because the points must stay in pulse order
+    this is stored as the PTS_PER_BIN and BIN_OFFSETS of each bin 
+    into POINT_IDX, which contains the indices of the points sorted by bin.
     """
     def __init__(self, fileHandle, mode):
         SPDV4SpatialIndex.__init__(self, fileHandle, mode)
@@ -213,6 +358,10 @@ class SPDV4SimpleGridSpatialIndex(SPDV4SpatialIndex):
         self.lastPulseSpace = None
         self.lastPulseIdx = None
         self.lastPulseIdxMask = None
+        # optional point index
+        self.si_pointCnt = None
+        self.si_pointIdx = None
+        self.newPointIndex = False
         
         if mode == generic.READ or mode == generic.UPDATE:
             # read it in if it exists.
@@ -225,8 +374,17 @@ class SPDV4SimpleGridSpatialIndex(SPDV4SpatialIndex):
             if group is None:
                 raise generic.LiDARSpatialIndexNotAvailable()
             else:
-                self.si_cnt = group['PLS_PER_BIN'][...]
-                self.si_idx = group['BIN_OFFSETS'][...]
+                # these are read as needed
+                self.si_cnt = GridIndexRowCache(group['PLS_PER_BIN'])
+                self.si_idx = GridIndexRowCache(group['BIN_OFFSETS'])
+                
+                siGroup = fileHandle[SPATIALINDEX_GROUP]
+                if SIMPLEPOINTGRID_GROUP in siGroup:
+                    pointGroup = siGroup[SIMPLEPOINTGRID_GROUP]
+                    self.si_pointCnt = GridIndexRowCache(
+                                            pointGroup['PTS_PER_BIN'])
+                    self.si_pointIdx = GridIndexRowCache(
+                                            pointGroup['BIN_OFFSETS'])
                     
                 # define the pulse data columns to use for the spatial index
                 self.indexType = self.fileHandle.attrs['INDEX_TYPE']
@@ -261,24 +419,49 @@ class SPDV4SimpleGridSpatialIndex(SPDV4SpatialIndex):
             countDataset = group.create_dataset('PLS_PER_BIN', 
                     (nrows, ncols), 
                     chunks=(1, ncols), dtype=SPDV4_SIMPLEGRID_COUNT_DTYPE,
-                    shuffle=True, compression="gzip", compression_opts=1)
+                    **self.compressionArgs)
             if self.si_cnt is not None:
                 countDataset[...] = self.si_cnt
                     
             offsetDataset = group.create_dataset('BIN_OFFSETS', 
                     (nrows, ncols), 
                     chunks=(1, ncols), dtype=SPDV4_SIMPLEGRID_INDEX_DTYPE,
-                    shuffle=True, compression="gzip", compression_opts=1)
+                    **self.compressionArgs)
             if self.si_idx is not None:
                 offsetDataset[...] = self.si_idx
+                
+            if self.newPointIndex:
+                # POINT_IDX has already been written by createPointIndex()
+                group = self.getPointIndexGroup()
+                    
+                countDataset = group.create_dataset('PTS_PER_BIN', 
+                        (nrows, ncols), 
+                        chunks=(1, ncols), dtype=SPDV4_SIMPLEGRID_COUNT_DTYPE,
+                        **self.compressionArgs)
+                countDataset[...] = self.si_pointCnt
+                    
+                offsetDataset = group.create_dataset('BIN_OFFSETS', 
+                        (nrows, ncols), 
+                        chunks=(1, ncols), dtype=SPDV4_SIMPLEGRID_INDEX_DTYPE,
+                        **self.compressionArgs)
+                offsetDataset[...] = self.si_pointIdx
                     
         SPDV4SpatialIndex.close(self)
         
-    def getSISubset(self, extent, overlap, extentAlignedWithIndex):
+    def getSISubset(self, extent, overlap, extentAlignedWithIndex, 
+                usePointIndex=False):
         """
         Internal method. Reads the required block out of the spatial
-        index for the requested extent.
+        index for the requested extent. If usePointIndex is True the 
+        block is read from the point index rather than the pulse index.
         """
+        if usePointIndex:
+            si_cnt = self.si_pointCnt
+            si_idx = self.si_pointIdx
+        else:
+            si_cnt = self.si_cnt
+            si_idx = self.si_idx
+
         # snap the extent to the grid of the spatial index
         pixGrid = self.pixelGrid
         if extentAlignedWithIndex:
@@ -310,28 +493,43 @@ class SPDV4SimpleGridSpatialIndex(SPDV4SpatialIndex):
         idx_subset = numpy.zeros((nrows, ncols), dtype=SPDV4_SIMPLEGRID_INDEX_DTYPE)
         
         imageSlice, siSlice = gridindexutils.getSlicesForExtent(pixGrid, 
-             self.si_cnt.shape, overlap, xMin, xMax, yMin, yMax)
+             si_cnt.shape, overlap, xMin, xMax, yMin, yMax)
              
         if imageSlice is not None and siSlice is not None:
 
-            cnt_subset[imageSlice] = self.si_cnt[siSlice]
-            idx_subset[imageSlice] = self.si_idx[siSlice]
+            cnt_subset[imageSlice] = si_cnt[siSlice]
+            idx_subset[imageSlice] = si_idx[siSlice]
 
         return idx_subset, cnt_subset
 
     def getPulsesSpaceForExtent(self, extent, overlap, extentAlignedWithIndex):
         """
         Get the space and indexes for pulses of the given extent.
+
+        If the bin size of the extent is a multiple of the index's
+        (see getPyramidFactor()) the bins of the index are combined
+        rather than the caller having to re-index the pulses.
         """
         # return cache
         if self.lastExtent is not None and self.lastExtent == extent:
             return self.lastPulseSpace, self.lastPulseIdx, self.lastPulseIdxMask
+            
+        factor = None
+        if extentAlignedWithIndex:
+            factor = self.getPyramidFactor(extent)
+        if factor is None:
+            factor = 1
         
-        idx_subset, cnt_subset = self.getSISubset(extent, overlap,
+        # overlap is in the bins of the extent
+        idx_subset, cnt_subset = self.getSISubset(extent, overlap * factor,
                 extentAlignedWithIndex)
         nOut = self.fileHandle['DATA']['PULSES']['PULSE_ID'].shape[0]
         pulse_space, pulse_idx, pulse_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
                 idx_subset, cnt_subset, nOut)
+        
+        if factor > 1:
+            pulse_idx, pulse_idx_mask = gridindexutils.coarsenReadIdxAndMask(
+                pulse_idx, pulse_idx_mask, factor)
                 
         self.lastPulseSpace = pulse_space
         self.lastPulseIdx = pulse_idx
@@ -360,6 +558,170 @@ class SPDV4SimpleGridSpatialIndex(SPDV4SpatialIndex):
 
         return point_space, point_idx, point_idx_mask
 
+    def hasPointIndex(self):
+        """
+        Return True if the file has a point index
+        """
+        return self.si_pointCnt is not None
+
+    def getPointsBinnedSpaceForExtent(self, extent, overlap, 
+                extentAlignedWithIndex):
+        """
+        Get the space for points of the given extent using the point index.
+        Returns the space, an array that sorts the points (as read with the 
+        space) by bin in row major order and the 2d count of points in 
+        each bin.
+        """
+        idx_subset, cnt_subset = self.getSISubset(extent, overlap,
+                extentAlignedWithIndex, usePointIndex=True)
+        
+        pointIdxHandle = self.fileHandle[SPATIALINDEX_GROUP][SIMPLEPOINTGRID_GROUP]['POINT_IDX']
+        nIdx = pointIdxHandle.shape[0]
+        idx_space, bin_idx, bin_idx_mask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(
+                idx_subset, cnt_subset, nIdx)
+        # the bins within the subset are in the same order as in the
+        # point index so these are already sorted by bin
+        pointIds = idx_space.read(pointIdxHandle)
+        
+        # read the points in the order they are in the file. Points that 
+        # are next to each other are then read as one hyperslab.
+        if pointIds.size > 0:
+            boolStart = int(pointIds.min())
+            boolArray = numpy.zeros((int(pointIds.max()) - boolStart + 1,), 
+                            dtype=bool)
+            boolArray[pointIds - boolStart] = True
+        else:
+            boolStart = 0
+            boolArray = numpy.zeros((0,), dtype=bool)
+            
+        nOut = self.fileHandle['DATA']['POINTS']['RETURN_NUMBER'].shape[0]
+        point_space = h5space.H5Space(nOut, boolArray, boolStart)
+        
+        # position of each of pointIds in the points as read. 
+        # Stable sort not needed as the ids are unique.
+        readOrder = numpy.argsort(pointIds)
+        binOrder = numpy.empty((pointIds.size,), dtype=numpy.int64)
+        binOrder[readOrder] = numpy.arange(pointIds.size)
+        
+        return point_space, binOrder, cnt_subset
+
+    def createPointIndex(self, nPoints, readCoords):
+        """
+        Create the point index (only valid when creating a file with a 
+        cartesian index). readCoords is a function that takes the index 
+        of the first and last (plus one) point and returns the (unscaled) 
+        X and Y of those points. The points are read twice in chunks - 
+        once to count the points in each bin and then again to put their 
+        indices into the point index. Points outside the index are left out.
+
+        POINT_IDX is split into pieces of up to POINT_INDEX_BUFFER_SIZE 
+        entries (a whole number of bins). On the second read the bin and
+        index of each point are appended to its piece in a temporary file
+        (next to the file being created). Each piece is then sorted by bin 
+        and written.
+        """
+        pixGrid = self.pixelGrid
+        nrows, ncols = pixGrid.getDimensions()
+        nBins = nrows * ncols
+        
+        counts = numpy.zeros((nBins,), dtype=numpy.int64)
+        for start in range(0, nPoints, POINT_INDEX_CHUNK_SIZE):
+            end = min(start + POINT_INDEX_CHUNK_SIZE, nPoints)
+            x, y = readCoords(start, end)
+            binNum = gridindexutils.getBinNumbers(y, x, pixGrid.xRes, 
+                            pixGrid.yMax, pixGrid.xMin, nrows, ncols)
+            counts += numpy.bincount(binNum[binNum >= 0], minlength=nBins)
+            
+        # where each bin starts in POINT_IDX
+        binCursor = numpy.zeros((nBins,), dtype=numpy.int64)
+        if nBins > 0:
+            numpy.cumsum(counts[:-1], out=binCursor[1:])
+        binStart = numpy.where(counts > 0, binCursor, 0)
+        binEnd = binCursor + counts
+        nIdx = int(counts.sum())
+        
+        # the first bin of each piece
+        pieceBins = []
+        firstBin = 0
+        while firstBin < nBins:
+            pieceBins.append(firstBin)
+            lastBin = numpy.searchsorted(binEnd, 
+                        binCursor[firstBin] + POINT_INDEX_BUFFER_SIZE, 
+                        side='right')
+            firstBin = max(lastBin, firstBin + 1)
+        pieceBins = numpy.array(pieceBins, dtype=numpy.int64)
+        pieceStart = binCursor[pieceBins]
+        pieceEnd = numpy.append(pieceStart[1:], nIdx)
+
+        group = self.getPointIndexGroup()
+        pointIdxDataset = group.create_dataset('POINT_IDX', (nIdx,), 
+                    chunks=True, dtype=SPDV4_SIMPLEGRID_INDEX_DTYPE,
+                    **self.compressionArgs)
+        if nIdx > 0:
+            tempDir = os.path.dirname(os.path.abspath(
+                                self.fileHandle.filename))
+            tempFile = tempfile.TemporaryFile(dir=tempDir)
+            try:
+                pointBins = numpy.memmap(tempFile, 
+                            dtype=POINT_INDEX_TEMP_DTYPE, shape=(nIdx,))
+
+                # the next free entry of each piece
+                pieceCursor = pieceStart.copy()
+                for start in range(0, nPoints, POINT_INDEX_CHUNK_SIZE):
+                    end = min(start + POINT_INDEX_CHUNK_SIZE, nPoints)
+                    x, y = readCoords(start, end)
+                    binNum = gridindexutils.getBinNumbers(y, x, 
+                                pixGrid.xRes, pixGrid.yMax, pixGrid.xMin, 
+                                nrows, ncols)
+                    pointIdx = numpy.flatnonzero(binNum >= 0)
+                    binNum = binNum[pointIdx]
+                    pointIdx += start
+
+                    # so the points of each piece are together
+                    order = numpy.argsort(binNum, kind='stable')
+                    binNum = binNum[order]
+                    pointIdx = pointIdx[order]
+                    chunkStart = numpy.searchsorted(binNum, pieceBins)
+                    chunkEnd = numpy.append(chunkStart[1:], binNum.size)
+                    for piece in numpy.flatnonzero(chunkEnd > chunkStart):
+                        s = slice(pieceCursor[piece], pieceCursor[piece] + 
+                                chunkEnd[piece] - chunkStart[piece])
+                        chunkSlice = slice(chunkStart[piece], chunkEnd[piece])
+                        pointBins['BIN'][s] = binNum[chunkSlice]
+                        pointBins['IDX'][s] = pointIdx[chunkSlice]
+                        pieceCursor[piece] = s.stop
+
+                for start, end in zip(pieceStart, pieceEnd):
+                    pieceData = numpy.array(pointBins[start:end])
+                    # stable so each bin's points stay in order
+                    order = numpy.argsort(pieceData['BIN'], kind='stable')
+                    pointIdxDataset[start:end] = pieceData['IDX'][order]
+                del pointBins
+            finally:
+                tempFile.close()
+                            
+        self.si_pointCnt = counts.reshape((nrows, ncols)).astype(
+                            SPDV4_SIMPLEGRID_COUNT_DTYPE)
+        self.si_pointIdx = binStart.reshape((nrows, ncols)).astype(
+                            SPDV4_SIMPLEGRID_INDEX_DTYPE)
+        self.newPointIndex = True
+        
+    def getPointIndexGroup(self):
+        """
+        Internal method. Returns the group the point index is written 
+        to, creating it if needed.
+        """
+        if SPATIALINDEX_GROUP not in self.fileHandle:
+            group = self.fileHandle.create_group(SPATIALINDEX_GROUP)
+        else:
+            group = self.fileHandle[SPATIALINDEX_GROUP]
+            
+        if SIMPLEPOINTGRID_GROUP not in group:
+            group = group.create_group(SIMPLEPOINTGRID_GROUP)
+        else:
+            group = group[SIMPLEPOINTGRID_GROUP]
+        return group
+
     def createNewIndex(self, pixelGrid):
         """
         Create a new spatial index
@@ -22,53 +22,63 @@ And the doProcessing function itself
 from __future__ import print_function, division
 
 import os
+import sys
+import copy
 import numpy
+import threading
+import multiprocessing
 from rios import imageio
 from rios import pixelgrid
 from rios import cuiprogress
 from . import basedriver
 from . import gdaldriver
+from . import writequeue
+# the format modules are imported when a file needs 
+# them - see generic.DRIVER_MODULES
 from .lidarformats import generic
-# import modules implementing subclasses here so 
-# we can use the __subclasses__() python feature
-from .lidarformats import spdv3
-from .lidarformats import spdv4
-from .lidarformats import ascii
-from .lidarformats import lvisbin
-from .lidarformats import lvishdf5
-from .lidarformats import gedil1a01
-
-HAVE_FMT_ASCII_ZLIB = ascii.HAVE_ZLIB
-HAVE_FMT_RIEGL_RXP = True
-try:
-    from .lidarformats import riegl_rxp
-except ImportError:
-    # libraries not available
-    HAVE_FMT_RIEGL_RXP = False
-
-HAVE_FMT_RIEGL_RDB = True
-try:
-    from .lidarformats import riegl_rdb
-except ImportError:
-    # libraries not available
-    HAVE_FMT_RIEGL_RDB = False
-
-HAVE_FMT_LAS = True
-try:
-    from .lidarformats import las
-except ImportError:
-    # library not available
-    HAVE_FMT_LAS = False
-
-HAVE_FMT_PULSEWAVES = True
-try:
-    from .lidarformats import pulsewaves
-except ImportError:
-    # library not available
-    HAVE_FMT_PULSEWAVES = False
-    
 from . import userclasses
 
+def haveFormat(driverName):
+    """
+    Returns True if the LiDAR driver with the given name (as returned by
+    getDriverName(), eg 'LAS' or 'riegl RXP') can be used. The driver
+    module is imported the first time this is called for it.
+    """
+    return generic.isDriverAvailable(driverName)
+
+def _haveAsciiZlib():
+    """
+    Internal method. Returns True if the ASCII driver can read gzipped files.
+    """
+    ascii = generic.loadDriverModule('ASCII')
+    return ascii is not None and ascii.HAVE_ZLIB
+
+_HAVE_FMT_CHECKS = {'HAVE_FMT_ASCII_ZLIB' : _haveAsciiZlib,
+    'HAVE_FMT_RIEGL_RXP' : lambda: haveFormat('riegl RXP'),
+    'HAVE_FMT_RIEGL_RDB' : lambda: haveFormat('riegl RDB'),
+    'HAVE_FMT_LAS' : lambda: haveFormat('LAS'),
+    'HAVE_FMT_PULSEWAVES' : lambda: haveFormat('PulseWaves')}
+"""
+Functions that compute the HAVE_FMT_* flags. These import the driver
+module so are only called when the flag is first asked for.
+"""
+
+def __getattr__(name):
+    """
+    Computes the HAVE_FMT_* flags the first time they are asked for
+    (Python 3.7 and later) and caches them as module attributes.
+    """
+    if name in _HAVE_FMT_CHECKS:
+        value = _HAVE_FMT_CHECKS[name]()
+        globals()[name] = value
+        return value
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+if sys.version_info < (3, 7):
+    # no module __getattr__ so compute the flags now
+    for _name in _HAVE_FMT_CHECKS:
+        globals()[_name] = _HAVE_FMT_CHECKS[_name]()
+
 READ = generic.READ
 "to be passed to ImageData and LidarData class constructors"
 UPDATE = generic.UPDATE
@@ -102,6 +112,12 @@ Controls.setMessageHandler
 DEFAULT_WINDOW_SIZE = 256 # bins
 "Size of the default window size in bins"
 
+DEFAULT_NUM_WORKERS = 1
+"Number of processes used for processing blocks by default"
+
+DEFAULT_WRITE_QUEUE_SIZE = 0
+"Number of blocks that can be waiting to be written. 0 means write immediately"
+
 ARRAY_TYPE_POINTS = generic.ARRAY_TYPE_POINTS
 """
 For use in userclass.LidarData.translateFieldNames() and 
@@ -267,6 +283,9 @@ class Controls(object):
         self.snapGrid = False
         self.progress = cuiprogress.SilentProgress()
         self.messageHandler = defaultMessageFn
+        self.numWorkers = DEFAULT_NUM_WORKERS
+        self.prefetch = False
+        self.writeQueueSize = DEFAULT_WRITE_QUEUE_SIZE
         
     def setFootprint(self, footprint):
         """
@@ -383,6 +402,56 @@ class Controls(object):
         MESSAGE_* constants).
         """
         self.messageHandler = messageHandler        
+
+    def setNumWorkers(self, numWorkers):
+        """
+        Set the number of processes to use for processing blocks. The 
+        default is 1 which processes each block in turn in this process.
+        
+        When greater than 1, and spatial processing is being done, and 
+        all LiDAR files are opened READ and all image files are either
+        READ or CREATE, blocks are handed out to a pool of worker processes. 
+        Each worker opens its own copy of the input files. Any output images
+        are still written by this process, in block order.
+        
+        In this mode userFunc must be a module level function and otherArgs
+        must be able to be pickled. Changes made to otherArgs by userFunc
+        are not returned from the workers.
+        
+        If the files cannot be processed in parallel a warning is printed
+        and processing happens in a single process.
+        """
+        self.numWorkers = numWorkers
+
+    def setPrefetch(self, prefetch):
+        """
+        Set whether to read the next block of LiDAR data on a background
+        thread while the user function is processing the current block. 
+        True or False. The columns read are the same as those requested
+        for the current block. This only applies to LiDAR files opened READ 
+        and drivers that support it (currently SPDV4).
+        """
+        self.prefetch = prefetch
+
+    def setWriteQueueSize(self, size):
+        """
+        Set the number of blocks that can be waiting to be written to
+        each file being created. When greater than 0, each LiDAR or image
+        file opened CREATE gets a thread that does the writing, so 
+        compression and disk writes happen while the next block is being 
+        read and processed. When size blocks are waiting the processing
+        waits for the writing to catch up.
+        
+        Any error that occurs while writing is raised when the next block
+        is written, or at the end of processing.
+        
+        Note that arrays passed to setPoints(), setData() etc should not be 
+        changed by the user function after they have been set as they may 
+        still be waiting to be written.
+        
+        The default is 0 which means the writing is done straight away.
+        """
+        self.writeQueueSize = size
     
 class LidarFile(object):
     """
@@ -478,6 +547,9 @@ def doProcessing(userFunc, dataFiles, otherArgs=None, controls=None):
 
     # First Open all the files
     gridList, driverList = openFiles(dataFiles, userContainer, controls)
+    
+    # writer threads for the output files if requested
+    writeQueues = createWriteQueues(dataFiles, userContainer, controls)
             
     # need to determine if we have a spatial index for all LiDAR files
     if controls.spatialProcessing:
@@ -510,16 +582,6 @@ To suppress this message call Controls.setSpatialProcessing(False)"""
         # work out where the first block is
         # controls.windowSize is in bins. Convert to meters
         windowSizeWorld = controls.windowSize * workingPixGrid.xRes
-        currentExtent = basedriver.Extent(workingPixGrid.xMin, 
-                        workingPixGrid.xMin + windowSizeWorld,
-                        workingPixGrid.yMax - windowSizeWorld,
-                        workingPixGrid.yMax, workingPixGrid.xRes)
-                        
-        # handle the file being smaller than the block size
-        if currentExtent.xMax > workingPixGrid.xMax:
-            currentExtent.xMax = workingPixGrid.xMax
-        if currentExtent.yMin < workingPixGrid.yMin:
-            currentExtent.yMin = workingPixGrid.yMin
 
         # work out number of pixels of workingPixGrid - allow 
         # rounding error of up to half a pixel by using round
@@ -532,8 +594,22 @@ To suppress this message call Controls.setSpatialProcessing(False)"""
         xtotalblocks = int(numpy.ceil(xsize / controls.windowSize))
         ytotalblocks = int(numpy.ceil(ysize / controls.windowSize))
         nTotalBlocks = xtotalblocks * ytotalblocks
+        currentExtent = getExtentForBlock(0, workingPixGrid, windowSizeWorld,
+                                xtotalblocks)
         bMoreToDo = currentExtent.yMax > workingPixGrid.yMin
         
+        if controls.numWorkers > 1:
+            if canProcessInParallel(dataFiles):
+                doParallelProcessing(userFunc, dataFiles, otherArgs, controls,
+                        userContainer, driverList, writeQueues, workingPixGrid, 
+                        windowSizeWorld, xtotalblocks, nTotalBlocks)
+                return
+            else:
+                msg = """Warning: Can only process blocks in parallel when LiDAR files
+are opened READ and image files READ or CREATE. Processing will now occur
+in a single process."""
+                controls.messageHandler(msg, MESSAGE_WARNING)
+
     else:
         windowSizeSq = controls.windowSize * controls.windowSize
         try:
@@ -562,7 +638,12 @@ To suppress this message call Controls.setSpatialProcessing(False)"""
         # update the driver classes with the new extent
         if controls.spatialProcessing:
             for driver in driverList:
-                driver.setExtent(currentExtent)
+                if driver in writeQueues:
+                    # must happen in order with the writes
+                    writeQueues[driver].put(driver.setExtent, 
+                                    copy.copy(currentExtent))
+                else:
+                    driver.setExtent(currentExtent)
             # update info class
             userContainer.info.setExtent(currentExtent)
             # last block yet?
@@ -585,6 +666,26 @@ To suppress this message call Controls.setSpatialProcessing(False)"""
         if not otherArgs is None:
             functionArgs += (otherArgs, )
             
+        # start reading the next block while the user function runs
+        prefetchThread = None
+        if controls.prefetch and bMoreToDo:
+            nextExtent = None
+            nextRange = None
+            if controls.spatialProcessing:
+                if nBlocksSoFar + 1 < nTotalBlocks:
+                    nextExtent = getExtentForBlock(nBlocksSoFar + 1, 
+                            workingPixGrid, windowSizeWorld, xtotalblocks)
+            else:
+                nextRange = generic.PulseRange(
+                            currentRange.startPulse + windowSizeSq,
+                            currentRange.endPulse + windowSizeSq)
+                            
+            if nextExtent is not None or nextRange is not None:
+                prefetchThread = threading.Thread(target=prefetchData,
+                            args=(driverList, nextExtent, nextRange))
+                prefetchThread.daemon = True
+                prefetchThread.start()
+            
         # call it if we still have data
         if bMoreToDo:
             userFunc(*functionArgs)
@@ -601,6 +702,10 @@ To suppress this message call Controls.setSpatialProcessing(False)"""
                         userClassItem.flush()
                 else:
                     userClass.flush()
+                    
+        # must have finished reading ahead before the next block is set
+        if prefetchThread is not None:
+            prefetchThread.join()
 
         # we have completed another one - this var is used below
         # for calculating block location
@@ -608,21 +713,8 @@ To suppress this message call Controls.setSpatialProcessing(False)"""
         
         if controls.spatialProcessing:
             # update to read in next block
-            # try going across first
-            xblock = nBlocksSoFar % xtotalblocks
-            yblock = nBlocksSoFar // xtotalblocks
-            currentExtent.xMin = workingPixGrid.xMin + xblock * windowSizeWorld
-            currentExtent.xMax = workingPixGrid.xMin + (xblock+1) * windowSizeWorld
-            currentExtent.yMax = workingPixGrid.yMax - yblock * windowSizeWorld
-            currentExtent.yMin = workingPixGrid.yMax - (yblock+1) * windowSizeWorld
-        
-            # partial block
-            if currentExtent.xMax > workingPixGrid.xMax:
-                currentExtent.xMax = workingPixGrid.xMax
-        
-            # partial block
-            if currentExtent.yMin < workingPixGrid.yMin:
-                currentExtent.yMin = workingPixGrid.yMin
+            currentExtent = getExtentForBlock(nBlocksSoFar, workingPixGrid,
+                                windowSizeWorld, xtotalblocks)
             
             # done?
             bMoreToDo = (nBlocksSoFar < nTotalBlocks)
@@ -639,10 +731,229 @@ To suppress this message call Controls.setSpatialProcessing(False)"""
 
     controls.progress.reset()
     
+    # wait for any writing to finish
+    for driver in writeQueues:
+        writeQueues[driver].close()
+    
     # close all the files
     for driver in driverList:
         driver.close()
 
+def createWriteQueues(dataFiles, userContainer, controls):
+    """
+    Creates a writequeue.WriteQueue for each of the files being
+    created if Controls.setWriteQueueSize() has been set. Returns
+    a dictionary keyed on driver.
+    """
+    writeQueues = {}
+    if controls.writeQueueSize <= 0:
+        return writeQueues
+        
+    for name in dataFiles.__dict__.keys():
+        userClass = getattr(userContainer, name)
+        if isinstance(userClass, list):
+            userClassList = userClass
+        else:
+            userClassList = [userClass]
+            
+        for userClassItem in userClassList:
+            if userClassItem.mode == CREATE:
+                driver = userClassItem.driver
+                # each block queues a setExtent() and a write
+                writeQueue = writequeue.WriteQueue(driver, 
+                                controls.writeQueueSize * 2)
+                userClassItem.setWriteQueue(writeQueue)
+                writeQueues[driver] = writeQueue
+                
+    return writeQueues
+
+def getExtentForBlock(nBlock, workingPixGrid, windowSizeWorld, xtotalblocks):
+    """
+    Returns a basedriver.Extent for the given block number (counting
+    across first, then down) of the workingPixGrid. 
+    """
+    xblock = nBlock % xtotalblocks
+    yblock = nBlock // xtotalblocks
+    extent = basedriver.Extent(
+                workingPixGrid.xMin + xblock * windowSizeWorld,
+                workingPixGrid.xMin + (xblock+1) * windowSizeWorld,
+                workingPixGrid.yMax - (yblock+1) * windowSizeWorld,
+                workingPixGrid.yMax - yblock * windowSizeWorld,
+                workingPixGrid.xRes)
+
+    # partial block
+    if extent.xMax > workingPixGrid.xMax:
+        extent.xMax = workingPixGrid.xMax
+
+    # partial block
+    if extent.yMin < workingPixGrid.yMin:
+        extent.yMin = workingPixGrid.yMin
+
+    return extent
+
+def prefetchData(driverList, extent, pulseRange):
+    """
+    Run on a background thread by doProcessing when Controls.setPrefetch()
+    has been set to True. Asks each LiDAR driver opened READ to read the 
+    data for the next block (given by extent or pulseRange).
+    """
+    for driver in driverList:
+        if isinstance(driver, generic.LiDARFile) and driver.mode == READ:
+            try:
+                if extent is not None:
+                    driver.prefetchExtent(extent)
+                else:
+                    driver.prefetchPulseRange(pulseRange)
+            except Exception:
+                # ignore - any problem will be raised when the
+                # block is actually read
+                pass
+
+def canProcessInParallel(dataFiles):
+    """
+    Returns True if all the LiDAR files are being read and all the image
+    files are being read or created. Only these can be processed by 
+    doParallelProcessing.
+    """
+    for name in dataFiles.__dict__.keys():
+        inputFiles = getattr(dataFiles, name)
+        if not isinstance(inputFiles, list):
+            inputFiles = [inputFiles]
+            
+        for inputFile in inputFiles:
+            if isinstance(inputFile, LidarFile):
+                if inputFile.mode != READ:
+                    return False
+            elif isinstance(inputFile, ImageFile):
+                if inputFile.mode == UPDATE:
+                    return False
+                    
+    return True
+
+def doParallelProcessing(userFunc, dataFiles, otherArgs, controls, 
+        userContainer, driverList, writeQueues, workingPixGrid, 
+        windowSizeWorld, xtotalblocks, nTotalBlocks):
+    """
+    Called by doProcessing when Controls.setNumWorkers() has been set 
+    to more than 1. Hands each block to a pool of worker processes
+    which open their own copies of the input files and run userFunc. 
+    The image data set by userFunc is returned to this process and 
+    written out in block order.
+    """
+    # workers don't report progress and need something that can be pickled
+    workerControls = copy.copy(controls)
+    workerControls.setProgress(cuiprogress.SilentProgress())
+    
+    blockList = []
+    for nBlock in range(nTotalBlocks):
+        extent = getExtentForBlock(nBlock, workingPixGrid, windowSizeWorld,
+                        xtotalblocks)
+        blockList.append((extent, nBlock == 0, nBlock == (nTotalBlocks - 1)))
+
+    controls.progress.setProgress(0)
+    
+    pool = multiprocessing.Pool(controls.numWorkers, initializer=initWorker,
+                initargs=(userFunc, dataFiles, otherArgs, workerControls, 
+                workingPixGrid))
+    try:
+        # imap returns the results in the same order as blockList
+        nBlocksSoFar = 0
+        for extent, outputList in pool.imap(processBlockInWorker, blockList):
+            for driver in driverList:
+                if driver in writeQueues:
+                    writeQueues[driver].put(driver.setExtent, extent)
+                elif driver.mode == CREATE:
+                    driver.setExtent(extent)
+            userContainer.info.setExtent(extent)
+            
+            for name, idx, data in outputList:
+                userClass = getattr(userContainer, name)
+                if idx is not None:
+                    userClass = userClass[idx]
+                userClass.setData(data)
+                userClass.flush()
+                
+            nBlocksSoFar += 1
+            percentProgress = int((nBlocksSoFar / nTotalBlocks) * 100)
+            controls.progress.setProgress(percentProgress)
+            
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        
+    controls.progress.reset()
+    
+    # wait for any writing to finish
+    for driver in writeQueues:
+        writeQueues[driver].close()
+    
+    # close all the files
+    for driver in driverList:
+        driver.close()
+
+# state of each worker process started by doParallelProcessing. 
+# Set by initWorker.
+workerState = None
+
+def initWorker(userFunc, dataFiles, otherArgs, controls, workingPixGrid):
+    """
+    Called when each worker process started by doParallelProcessing
+    is created. Opens the files and saves the state for processBlockInWorker.
+    """
+    global workerState
+    userContainer = userclasses.DataContainer(controls)
+    gridList, driverList = openFiles(dataFiles, userContainer, controls)
+    
+    # image outputs need to know the grid so the extent can be set
+    # they are never written to by the worker.
+    for driver in driverList:
+        if driver.mode == CREATE:
+            driver.setPixelGrid(workingPixGrid)
+    userContainer.info.setPixGrid(workingPixGrid)
+    
+    workerState = (userFunc, dataFiles, otherArgs, userContainer, driverList)
+
+def processBlockInWorker(block):
+    """
+    Runs userFunc on the given block inside a worker process. Returns
+    the extent and a list of (name, index, data) tuples for each of the 
+    output images. index is None when the name does not refer to a list.
+    """
+    extent, firstBlock, lastBlock = block
+    userFunc, dataFiles, otherArgs, userContainer, driverList = workerState
+    
+    for driver in driverList:
+        driver.setExtent(extent)
+    userContainer.info.setExtent(extent)
+    userContainer.info.firstBlock = firstBlock
+    userContainer.info.lastBlock = lastBlock
+    
+    functionArgs = (userContainer,)
+    if not otherArgs is None:
+        functionArgs += (otherArgs, )
+        
+    userFunc(*functionArgs)
+    
+    # grab the data for the output images to send back
+    outputList = []
+    for name in dataFiles.__dict__.keys():
+        userClass = getattr(userContainer, name)
+        if isinstance(userClass, list):
+            userClassList = [(idx, item) for idx, item in enumerate(userClass)]
+        else:
+            userClassList = [(None, userClass)]
+            
+        for idx, userClassItem in userClassList:
+            if (isinstance(userClassItem, userclasses.ImageData) and 
+                    userClassItem.mode == CREATE):
+                outputList.append((name, idx, userClassItem.data))
+                userClassItem.data = None
+                
+    return extent, outputList
+
 def openFiles(dataFiles, userContainer, controls):
     """
     Open all the files required by doProcessing
@@ -28,7 +28,7 @@ import importlib
 
 from . import utils
 # testsuite1 etc loaded dynamically below
-from pylidar import lidarprocessor
+from pylidar.lidarformats import generic
 from pylidar.toolbox import interpolation # so we can check we have pynninterp etc
 
 def getCmdargs():
@@ -65,6 +65,8 @@ def run():
 
     oldpath, newpath, tests = utils.extractTarFile(cmdargs.input, cmdargs.path,
                                     not cmdargs.noversioncheck)
+    tests = tests + [name for name in utils.SYNTHETIC_TESTS 
+                                    if name not in tests]
 
     if cmdargs.list:
         for name in tests:
@@ -102,27 +104,28 @@ def run():
             fmts = getattr(mod, 'REQUIRED_FORMATS')
             for fmt in fmts:
                 if fmt == "LAS":
-                    if not lidarprocessor.HAVE_FMT_LAS:
+                    if not generic.isDriverAvailable('LAS'):
                         print('Skipping', name, 'due to missing format driver', fmt)
                         doTest = False
                         break
                 elif fmt == "RIEGLRXP":
-                    if not lidarprocessor.HAVE_FMT_RIEGL_RXP:
+                    if not generic.isDriverAvailable('riegl RXP'):
                         print('Skipping', name, 'due to missing format driver', fmt)
                         doTest = False
                         break
                 elif fmt == "RIEGLRDB":
-                    if not lidarprocessor.HAVE_FMT_RIEGL_RDB:
+                    if not generic.isDriverAvailable('riegl RDB'):
                         print('Skipping', name, 'due to missing format driver', fmt)
                         doTest = False
                         break
                 elif fmt == "ASCIIGZ":
-                    if not lidarprocessor.HAVE_FMT_ASCII_ZLIB:
+                    ascii = generic.loadDriverModule('ASCII')
+                    if ascii is None or not ascii.HAVE_ZLIB:
                         print('Skipping', name, 'due to missing format driver', fmt)
                         doTest = False
                         break
                 elif fmt == "PULSEWAVES":
-                    if not lidarprocessor.HAVE_FMT_PULSEWAVES:
+                    if not generic.isDriverAvailable('PulseWaves'):
                         print('Skipping', name, 'due to missing format driver', fmt)
                         doTest = False
                         break
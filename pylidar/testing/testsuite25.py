@@ -0,0 +1,65 @@
+"""
+Simple testsuite that checks the bins of a spatial index can be 
+combined when the block is not a whole number of the new bins
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import numpy
+from . import utils
+from pylidar.lidarformats import gridindexutils
+
+# number of pulses in each bin of a 3 x 3 spatial index
+COUNTS = numpy.array([[2, 0, 1], [1, 3, 0], [0, 2, 1]])
+
+def run(oldpath, newpath):
+    """
+    Runs the 25th basic test suite. Tests:
+
+    Combining the bins of a spatial index with a partial edge block
+    """
+    start = numpy.zeros(COUNTS.shape, dtype=numpy.uint64)
+    start.flat[1:] = numpy.cumsum(COUNTS.flat)[:-1]
+    idx, idxMask = gridindexutils.convertSPDIdxToReadIdxAndMaskInfo(start, 
+                            COUNTS)
+
+    for factor in (2, 3, 4):
+        coarseIdx, coarseMask = gridindexutils.coarsenReadIdxAndMask(idx, 
+                            idxMask, factor)
+        
+        nRows = (COUNTS.shape[0] + factor - 1) // factor
+        nCols = (COUNTS.shape[1] + factor - 1) // factor
+        if coarseIdx.shape[1:] != (nRows, nCols):
+            msg = 'Wrong shape %s for factor %d' % (coarseIdx.shape, factor)
+            raise utils.TestingDataMismatch(msg)
+            
+        # each new bin should have the pulses of the old bins it 
+        # covers in file order
+        for row in range(nRows):
+            for col in range(nCols):
+                oldBins = (slice(row * factor, (row + 1) * factor), 
+                            slice(col * factor, (col + 1) * factor))
+                expected = numpy.sort(numpy.concatenate(
+                    [numpy.arange(s, s + c) for s, c in zip(
+                    start[oldBins].flat, COUNTS[oldBins].flat)]))
+                valid = numpy.logical_not(coarseMask[:, row, col])
+                got = coarseIdx[:, row, col][valid]
+                if not numpy.array_equal(got, expected):
+                    msg = 'Bin %d, %d wrong for factor %d' % (row, col, factor)
+                    raise utils.TestingDataMismatch(msg)
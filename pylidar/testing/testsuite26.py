@@ -0,0 +1,83 @@
+"""
+Simple testsuite that checks the COMPRESSION option of the SPDV4 driver
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+import h5py
+from . import utils
+from pylidar.lidarformats import generic
+from pylidar.toolbox.translate.ascii2spdv4 import translate
+from pylidar.toolbox.indexing.gridindex import createGridSpatialIndex
+
+INPUT_ASCII = 'testsuite26.dat'
+IMPORTED_SPD = 'testsuite26_%s.spd'
+INDEXED_SPD = 'testsuite26_idx_%s.spd'
+
+COMPRESSIONS = [('GZIP', 'gzip'), ('LZF', 'lzf'), ('NONE', None)]
+"the COMPRESSION options tested and the filter h5py reports for each"
+
+BINSIZE = 10.0
+
+def checkCompression(fname, expected):
+    """
+    Check all the columns and the spatial index (if there is one) 
+    are written with the expected filter
+    """
+    fileh = h5py.File(fname, 'r')
+    def checkDataset(name, obj):
+        if isinstance(obj, h5py.Dataset) and obj.compression != expected:
+            msg = '%s in %s has compression %s rather than %s' % (name, 
+                        fname, obj.compression, expected)
+            raise utils.TestingDataMismatch(msg)
+    fileh.visititems(checkDataset)
+    fileh.close()
+
+def run(oldpath, newpath):
+    """
+    Runs the 26th basic test suite. Tests:
+
+    Writing SPDV4 files and spatial indices with each COMPRESSION option
+    """
+    inputASCII = os.path.join(newpath, INPUT_ASCII)
+    utils.writeSyntheticASCII(inputASCII)
+    info = generic.getLidarFileInfo(inputASCII)
+
+    firstSPD = None
+    firstIndexed = None
+    for compression, expected in COMPRESSIONS:
+        importedSPD = os.path.join(newpath, IMPORTED_SPD % compression)
+        translate(info, inputASCII, importedSPD, 
+                utils.SYNTHETIC_ASCII_COLTYPES, 
+                utils.SYNTHETIC_ASCII_PULSE_COLS, compression=compression)
+        checkCompression(importedSPD, expected)
+        
+        indexedSPD = os.path.join(newpath, INDEXED_SPD % compression)
+        createGridSpatialIndex(importedSPD, indexedSPD, binSize=BINSIZE, 
+                tempDir=newpath, pointIndex=True, compression=compression)
+        checkCompression(indexedSPD, expected)
+
+        # the data should be the same whatever the compression
+        if firstSPD is None:
+            firstSPD = importedSPD
+            firstIndexed = indexedSPD
+        else:
+            utils.compareLiDARFiles(firstSPD, importedSPD)
+            utils.compareLiDARFiles(firstIndexed, indexedSPD)
@@ -0,0 +1,62 @@
+"""
+Simple testsuite that checks the READ_THREADS option of the SPDV4 driver
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+from . import utils
+from pylidar.lidarformats import generic
+from pylidar.toolbox.translate.ascii2spdv4 import translate
+from pylidar.toolbox.indexing.gridindex import createGridSpatialIndex
+
+INPUT_ASCII = 'testsuite27.dat'
+IMPORTED_SPD = 'testsuite27.spd'
+INDEXED_SPD = 'testsuite27_idx.spd'
+
+BINSIZE = 5.0
+WINDOWSIZE = 4
+"small so there are lots of blocks"
+
+READ_THREADS = 4
+
+def run(oldpath, newpath):
+    """
+    Runs the 27th basic test suite. Tests:
+
+    Reading a SPDV4 file spatially and non spatially with READ_THREADS
+    """
+    inputASCII = os.path.join(newpath, INPUT_ASCII)
+    utils.writeSyntheticASCII(inputASCII)
+    info = generic.getLidarFileInfo(inputASCII)
+
+    importedSPD = os.path.join(newpath, IMPORTED_SPD)
+    translate(info, inputASCII, importedSPD, utils.SYNTHETIC_ASCII_COLTYPES, 
+                utils.SYNTHETIC_ASCII_PULSE_COLS)
+    indexedSPD = os.path.join(newpath, INDEXED_SPD)
+    createGridSpatialIndex(importedSPD, indexedSPD, binSize=BINSIZE, 
+                tempDir=newpath)
+
+    for spatial in (False, True):
+        oneThread = utils.readLiDARData(indexedSPD, {'READ_THREADS' : 1},
+                        windowSize=WINDOWSIZE, spatial=spatial)
+        manyThreads = utils.readLiDARData(indexedSPD, 
+                        {'READ_THREADS' : READ_THREADS}, 
+                        windowSize=WINDOWSIZE, spatial=spatial)
+        utils.compareLiDARData(oneThread, manyThreads)
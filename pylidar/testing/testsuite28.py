@@ -0,0 +1,90 @@
+"""
+Simple testsuite that checks the WRITE_BUFFER_SIZE option of the SPDV4 driver
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+from . import utils
+from pylidar import lidarprocessor
+from pylidar.lidarformats import generic
+from pylidar.toolbox.translate.ascii2spdv4 import translate
+from pylidar.toolbox.indexing.gridindex import copyScaling
+from rios import cuiprogress
+
+INPUT_ASCII = 'testsuite28.dat'
+IMPORTED_SPD = 'testsuite28.spd'
+COPIED_SPD = 'testsuite28_%d.spd'
+
+WRITE_BUFFER_SIZES = [0, 1000, 64 * 1024, 64 * 1024 * 1024]
+"""
+no buffering, less than a block, a few blocks and the whole file
+"""
+
+WINDOWSIZE = 4
+"small so there are lots of blocks"
+
+def copyFunc(data):
+    """
+    Copies the pulses and points
+    """
+    if data.info.isFirstBlock():
+        copyScaling(data.input1, data.output1)
+
+    pulses = data.input1.getPulses()
+    points = data.input1.getPointsByPulse()
+    data.output1.setPulses(pulses)
+    data.output1.setPoints(points)
+
+def run(oldpath, newpath):
+    """
+    Runs the 28th basic test suite. Tests:
+
+    Writing a SPDV4 file with different WRITE_BUFFER_SIZEs
+    """
+    inputASCII = os.path.join(newpath, INPUT_ASCII)
+    utils.writeSyntheticASCII(inputASCII)
+    info = generic.getLidarFileInfo(inputASCII)
+
+    importedSPD = os.path.join(newpath, IMPORTED_SPD)
+    translate(info, inputASCII, importedSPD, utils.SYNTHETIC_ASCII_COLTYPES, 
+                utils.SYNTHETIC_ASCII_PULSE_COLS)
+    imported = utils.readLiDARData(importedSPD)
+
+    for bufferSize in WRITE_BUFFER_SIZES:
+        copiedSPD = os.path.join(newpath, COPIED_SPD % bufferSize)
+        
+        dataFiles = lidarprocessor.DataFiles()
+        dataFiles.input1 = lidarprocessor.LidarFile(importedSPD, 
+                                lidarprocessor.READ)
+        dataFiles.output1 = lidarprocessor.LidarFile(copiedSPD, 
+                                lidarprocessor.CREATE)
+        dataFiles.output1.setLiDARDriver('SPDV4')
+        dataFiles.output1.setLiDARDriverOption('WRITE_BUFFER_SIZE', 
+                                bufferSize)
+    
+        controls = lidarprocessor.Controls()
+        progress = cuiprogress.GDALProgressBar()
+        controls.setProgress(progress)
+        controls.setSpatialProcessing(False)
+        controls.setWindowSize(WINDOWSIZE)
+    
+        lidarprocessor.doProcessing(copyFunc, dataFiles, controls=controls)
+
+        utils.compareLiDARData(imported, utils.readLiDARData(copiedSPD))
@@ -0,0 +1,148 @@
+"""
+Simple testsuite that checks the DECOMPRESS_THREADS option of the LAS driver
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+import numpy
+from . import utils
+from pylidar import lidarprocessor
+from pylidar.toolbox.translate import translatecommon
+from rios import cuiprogress
+
+REQUIRED_FORMATS = ["LAS"]
+
+INPUT_ASCII = 'testsuite29.dat'
+OUTPUT_LAZ = 'testsuite29.laz'
+
+NPULSES = 40000
+"""
+enough points for several of the 50000 point chunks that LAZ
+files are compressed in
+"""
+
+WAVEFORM_NBINS = [8, 12, 16, 20]
+"""
+number of bins of the waveform of each pulse (by pulse number).
+Each is a different wave packet descriptor.
+"""
+
+POINT_FORMAT = 4
+"LAS point format with waveforms"
+RECORD_LENGTH = 57
+
+DECOMPRESS_THREADS = [2, 3, 8]
+WINDOWSIZE = 150
+"blocks of 22500 pulses which don't line up with the chunks"
+
+def getWaveformDescr():
+    """
+    Returns the table of unique waveform info for the WAVEFORM_DESCR
+    driver option (as las.getWavePacketDescriptions() would)
+    """
+    descr = numpy.empty(len(WAVEFORM_NBINS),
+                dtype=[('NUMBER_OF_WAVEFORM_RECEIVED_BINS', numpy.uint16),
+                ('RECEIVE_WAVE_GAIN', numpy.float64),
+                ('RECEIVE_WAVE_OFFSET', numpy.float64)])
+    descr['NUMBER_OF_WAVEFORM_RECEIVED_BINS'] = WAVEFORM_NBINS
+    descr['RECEIVE_WAVE_GAIN'] = 1.0
+    descr['RECEIVE_WAVE_OFFSET'] = 1.0
+    return descr
+
+def writeFunc(data):
+    """
+    Writes the pulses and points of the ASCII file to the LAZ file
+    with a synthetic waveform for each pulse
+    """
+    if data.info.isFirstBlock():
+        for colName in ('X', 'Y', 'Z'):
+            data.output1.setScaling(colName, lidarprocessor.ARRAY_TYPE_POINTS,
+                    1000.0, 0.0)
+
+    pulses = data.input1.getPulses()
+    points = data.input1.getPointsByPulse(['X', 'Y', 'Z', 'CLASSIFICATION'])
+    nPulses = pulses.shape[0]
+
+    outPulses = numpy.empty(nPulses, dtype=[('GPS_TIME', numpy.float64),
+                ('NUMBER_OF_RETURNS', numpy.uint8),
+                ('NUMBER_OF_WAVEFORM_SAMPLES', numpy.uint8)])
+    outPulses['GPS_TIME'] = pulses['GPS_TIME']
+    outPulses['NUMBER_OF_RETURNS'] = pulses['NUMBER_OF_RETURNS']
+    outPulses['NUMBER_OF_WAVEFORM_SAMPLES'] = 1
+
+    pulseNum = pulses['GPS_TIME'].astype(numpy.int64)
+    nBins = numpy.array(WAVEFORM_NBINS)[pulseNum % len(WAVEFORM_NBINS)]
+    waveformInfo = numpy.empty((1, nPulses), dtype=getWaveformDescr().dtype)
+    waveformInfo['NUMBER_OF_WAVEFORM_RECEIVED_BINS'] = nBins
+    waveformInfo['RECEIVE_WAVE_GAIN'] = 1.0
+    waveformInfo['RECEIVE_WAVE_OFFSET'] = 1.0
+
+    maxBins = max(WAVEFORM_NBINS)
+    received = (numpy.arange(maxBins)[:, numpy.newaxis, numpy.newaxis] +
+                    pulseNum[numpy.newaxis, numpy.newaxis, :]) % 200 + 1
+    received = numpy.ma.array(received,
+            mask=numpy.arange(maxBins)[:, numpy.newaxis, numpy.newaxis] >= nBins)
+
+    data.output1.setPulses(outPulses)
+    data.output1.setPoints(points)
+    data.output1.setWaveformInfo(waveformInfo)
+    data.output1.setReceived(received)
+
+def run(oldpath, newpath):
+    """
+    Runs the 29th basic test suite. Tests:
+
+    Reading a LAZ file with waveforms with different DECOMPRESS_THREADS
+    """
+    inputASCII = os.path.join(newpath, INPUT_ASCII)
+    utils.writeSyntheticASCII(inputASCII, nPulses=NPULSES)
+
+    colTypes = [(name, translatecommon.STRING_TO_DTYPE[typeString])
+                for name, typeString in utils.SYNTHETIC_ASCII_COLTYPES]
+
+    outputLAZ = os.path.join(newpath, OUTPUT_LAZ)
+    dataFiles = lidarprocessor.DataFiles()
+    dataFiles.input1 = lidarprocessor.LidarFile(inputASCII,
+                                lidarprocessor.READ)
+    dataFiles.input1.setLiDARDriverOption('COL_TYPES', colTypes)
+    dataFiles.input1.setLiDARDriverOption('PULSE_COLS',
+                                utils.SYNTHETIC_ASCII_PULSE_COLS)
+    dataFiles.output1 = lidarprocessor.LidarFile(outputLAZ,
+                                lidarprocessor.CREATE)
+    dataFiles.output1.setLiDARDriver('LAS')
+    dataFiles.output1.setLiDARDriverOption('FORMAT_VERSION', POINT_FORMAT)
+    dataFiles.output1.setLiDARDriverOption('RECORD_LENGTH', RECORD_LENGTH)
+    dataFiles.output1.setLiDARDriverOption('WAVEFORM_DESCR',
+                                getWaveformDescr())
+
+    controls = lidarprocessor.Controls()
+    progress = cuiprogress.GDALProgressBar()
+    controls.setProgress(progress)
+    controls.setSpatialProcessing(False)
+
+    lidarprocessor.doProcessing(writeFunc, dataFiles, controls=controls)
+
+    oneThread = utils.readLiDARData(outputLAZ, {'DECOMPRESS_THREADS' : 1},
+                        windowSize=WINDOWSIZE)
+    for nThreads in DECOMPRESS_THREADS:
+        manyThreads = utils.readLiDARData(outputLAZ,
+                        {'DECOMPRESS_THREADS' : nThreads},
+                        windowSize=WINDOWSIZE)
+        utils.compareLiDARData(oneThread, manyThreads)
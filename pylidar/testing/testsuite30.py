@@ -0,0 +1,91 @@
+"""
+Simple testsuite that checks the memory mapped (with PARSE_THREADS) and
+gzip readers of the ASCII driver parse the same numbers
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+import gzip
+import shutil
+import numpy
+from . import utils
+from pylidar.toolbox.translate import translatecommon
+
+REQUIRED_FORMATS = ["ASCIIGZ"]
+
+SYNTHETIC_ASCII = 'testsuite30_synthetic.dat'
+PLAIN_ASCII = 'testsuite30_plain.dat'
+FORMATTED_ASCII = 'testsuite30_formatted.dat'
+
+PLAIN_FORMAT = '%.3f %.3f %.3f %.3f %.3f %.3f %d %d\n'
+"how writeSyntheticASCII() writes each line"
+FORMATTED_FORMAT = '%.3f %.3f %.3f %+.3f %.6e %.6e %d %+d\n'
+"""
+the same values as PLAIN_FORMAT with a leading '+' on X and
+CLASSIFICATION and Y and Z as %e. Z is negative.
+"""
+
+PARSE_THREADS = [1, 4]
+WINDOWSIZE = 20
+"small so there are lots of blocks"
+
+def run(oldpath, newpath):
+    """
+    Runs the 30th basic test suite. Tests:
+
+    Reading an ASCII file with numbers with a leading '+' and in
+    exponent format memory mapped with PARSE_THREADS and gzip compressed
+    """
+    syntheticASCII = os.path.join(newpath, SYNTHETIC_ASCII)
+    utils.writeSyntheticASCII(syntheticASCII)
+    data = numpy.loadtxt(syntheticASCII)
+    # negative Z
+    data[:, 5] = -data[:, 5]
+
+    plainASCII = os.path.join(newpath, PLAIN_ASCII)
+    formattedASCII = os.path.join(newpath, FORMATTED_ASCII)
+    for fname, lineFormat in ((plainASCII, PLAIN_FORMAT),
+                (formattedASCII, FORMATTED_FORMAT)):
+        fileh = open(fname, 'w')
+        for row in data:
+            fileh.write(lineFormat % tuple(row))
+        fileh.close()
+
+    gzipASCII = formattedASCII + '.gz'
+    with open(formattedASCII, 'rb') as fIn:
+        with gzip.open(gzipASCII, 'wb') as fOut:
+            shutil.copyfileobj(fIn, fOut)
+
+    colTypes = [(name, translatecommon.STRING_TO_DTYPE[typeString])
+                for name, typeString in utils.SYNTHETIC_ASCII_COLTYPES]
+    options = {'COL_TYPES' : colTypes,
+                'PULSE_COLS' : utils.SYNTHETIC_ASCII_PULSE_COLS}
+
+    plain = utils.readLiDARData(plainASCII, options, windowSize=WINDOWSIZE)
+
+    for nThreads in PARSE_THREADS:
+        threadOptions = dict(options)
+        threadOptions['PARSE_THREADS'] = nThreads
+        formatted = utils.readLiDARData(formattedASCII, threadOptions,
+                        windowSize=WINDOWSIZE)
+        utils.compareLiDARData(plain, formatted)
+
+    gzipped = utils.readLiDARData(gzipASCII, options, windowSize=WINDOWSIZE)
+    utils.compareLiDARData(plain, gzipped)
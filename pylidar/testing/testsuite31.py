@@ -0,0 +1,74 @@
+"""
+Simple testsuite that checks the MEMORY_MAP option of the LVIS Binary driver
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+import numpy
+from . import utils
+from pylidar.lidarformats import lvisbin
+
+INPUT_LVIS = 'testsuite31.%s'
+
+NPULSES = 1000
+VERSIONS = [102, 103, 104]
+"the file versions (* 100) to test. These have LFID and SHOTNUMBER first"
+POINT_FROMS = [lvisbin.POINT_FROM_LCE, lvisbin.POINT_FROM_LGE,
+                lvisbin.POINT_FROM_LGW0, lvisbin.POINT_FROM_LGWEND]
+
+WINDOWSIZE = 17
+"so that the last block is not full"
+
+def writeSyntheticLVIS(newpath, version, seed=0):
+    """
+    Writes a synthetic set of big endian (as LVIS files are) LCE, LGE and
+    LGW files of the given version. Returns the name of the LCE file.
+    """
+    rng = numpy.random.RandomState(seed)
+    for fileType in lvisbin.FILE_TYPES:
+        dtype = numpy.dtype(lvisbin.RECORD_FIELDS[fileType][version])
+        records = numpy.zeros(NPULSES, dtype=dtype)
+        for name in dtype.names:
+            column = records[name]
+            if column.dtype.kind == 'f':
+                records[name] = rng.uniform(0.0001, 0.0002, column.shape)
+            else:
+                records[name] = rng.randint(0, 200, column.shape)
+        records.astype(dtype.newbyteorder('>')).tofile(
+                os.path.join(newpath, INPUT_LVIS % fileType.lower()))
+
+    return os.path.join(newpath, INPUT_LVIS % 'lce')
+
+def run(oldpath, newpath):
+    """
+    Runs the 31st basic test suite. Tests:
+
+    Reading LVIS Binary files with and without MEMORY_MAP
+    """
+    for version in VERSIONS:
+        inputLVIS = writeSyntheticLVIS(newpath, version)
+        for pointFrom in POINT_FROMS:
+            fromFile = utils.readLiDARData(inputLVIS,
+                        {'POINT_FROM' : pointFrom, 'MEMORY_MAP' : False},
+                        windowSize=WINDOWSIZE)
+            memoryMapped = utils.readLiDARData(inputLVIS,
+                        {'POINT_FROM' : pointFrom, 'MEMORY_MAP' : True},
+                        windowSize=WINDOWSIZE)
+            utils.compareLiDARData(fromFile, memoryMapped)
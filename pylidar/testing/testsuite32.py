@@ -0,0 +1,166 @@
+"""
+Simple testsuite that checks reading all the beams of a GEDI L1A01 file
+with BEAM_ALL
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+import h5py
+import numpy
+from . import utils
+from pylidar.lidarformats import gedil1a01
+
+INPUT_GEDI = 'testsuite32.h5'
+
+BEAM_PULSES = [('BEAM0000', 30), ('BEAM0101', 25), ('BEAM1011', 20)]
+"the beams in the synthetic file and the number of pulses in each"
+
+WINDOWSIZE = 4
+"blocks of 16 pulses so some have pulses from 2 beams"
+
+def writeSyntheticGEDI(fname, seed=0):
+    """
+    Writes a synthetic GEDI L1A01 file with the beams in BEAM_PULSES.
+    Each pulse has a transmitted and received waveform of a random
+    number of samples. Returns a dictionary keyed on beam of dictionaries
+    of the datasets written, with the waveforms of each pulse split out
+    into lists (txwaveforms and rxwaveforms).
+    """
+    rng = numpy.random.RandomState(seed)
+    fileHandle = h5py.File(fname, 'w')
+    for name in gedil1a01.EXPECTED_HEADER_FIELDS:
+        fileHandle.attrs[name] = numpy.array([b'testsuite32'])
+
+    beamData = {}
+    shotNumber = 0
+    for beam, nPulses in BEAM_PULSES:
+        data = {}
+        data['shot_number'] = numpy.arange(shotNumber, shotNumber + nPulses,
+                                dtype=numpy.uint64)
+        shotNumber += nPulses
+        for prefix, minCount, maxCount in (('tx', 5, 10), ('rx', 20, 40)):
+            counts = rng.randint(minCount, maxCount,
+                                nPulses).astype(numpy.uint16)
+            samples = rng.uniform(0, 100, counts.sum()).astype(numpy.float32)
+            starts = numpy.cumsum(counts) - counts
+            data[prefix + '_sample_count'] = counts
+            # 1 based
+            data[prefix + '_sample_start_index'] = (starts + 1).astype(
+                                numpy.uint64)
+            data[prefix + 'waveform'] = samples
+            data[prefix + 'waveforms'] = [samples[start:start+count]
+                                for start, count in zip(starts, counts)]
+        for name in gedil1a01.DEFAULT_POINT_FROM:
+            data[name] = rng.uniform(-100, 100, nPulses)
+
+        group = fileHandle.create_group(beam)
+        geolocation = group.create_group('geolocation')
+        for name in data:
+            if name in gedil1a01.DEFAULT_POINT_FROM:
+                geolocation[name] = data[name]
+            elif not name.endswith('waveforms'):
+                group[name] = data[name]
+        beamData[beam] = data
+
+    fileHandle.close()
+    return beamData
+
+def checkWaveforms(name, blockData, expected):
+    """
+    Checks the (mask, data) 3d waveform of a block has the expected
+    samples for each pulse and is masked after them.
+    """
+    mask, data = blockData
+    for pulse, samples in enumerate(expected):
+        nSamples = len(samples)
+        if (not numpy.array_equal(data[:nSamples, 0, pulse], samples) or
+                mask[:nSamples, 0, pulse].any() or
+                not mask[nSamples:, 0, pulse].all()):
+            msg = '%s do not match' % name
+            raise utils.TestingDataMismatch(msg)
+
+def run(oldpath, newpath):
+    """
+    Runs the 32nd basic test suite. Tests:
+
+    Reading a GEDI L1A01 file with BEAM_ALL in blocks that cross beams
+    """
+    inputGEDI = os.path.join(newpath, INPUT_GEDI)
+    beamData = writeSyntheticGEDI(inputGEDI)
+
+    # what we expect for each pulse of all the beams
+    expected = {gedil1a01.BEAM_NAME : []}
+    for beam, nPulses in BEAM_PULSES:
+        data = beamData[beam]
+        for name in data:
+            expected.setdefault(name, [])
+            if name.endswith('waveforms'):
+                expected[name].extend(data[name])
+            else:
+                expected[name].append(data[name])
+        beamNumber = int(beam[len(gedil1a01.BEAM_NAME):], 2)
+        expected[gedil1a01.BEAM_NAME].append(numpy.full(nPulses, beamNumber))
+    for name in expected:
+        if not name.endswith('waveforms'):
+            expected[name] = numpy.concatenate(expected[name])
+
+    allBeams = utils.readLiDARData(inputGEDI,
+                    {'BEAM' : gedil1a01.BEAM_ALL}, windowSize=WINDOWSIZE)
+
+    blockSize = WINDOWSIZE * WINDOWSIZE
+    nPulses = len(expected['shot_number'])
+    if len(allBeams['pulses']) != (nPulses + blockSize - 1) // blockSize:
+        msg = 'Different number of blocks of pulses'
+        raise utils.TestingDataMismatch(msg)
+
+    for block in range(len(allBeams['pulses'])):
+        start = block * blockSize
+        end = min(start + blockSize, nPulses)
+
+        mask, pulses = allBeams['pulses'][block]
+        for name in ('shot_number', 'tx_sample_count', 'rx_sample_count',
+                    gedil1a01.BEAM_NAME):
+            if not numpy.array_equal(pulses[name], expected[name][start:end]):
+                msg = 'pulses do not match'
+                raise utils.TestingDataMismatch(msg)
+
+        mask, points = allBeams['points'][block]
+        for name, fileName in zip(('X', 'Y', 'Z'),
+                    gedil1a01.DEFAULT_POINT_FROM):
+            if not numpy.array_equal(points[name],
+                    expected[fileName][start:end]):
+                msg = 'points do not match'
+                raise utils.TestingDataMismatch(msg)
+
+        mask, info = allBeams['waveformInfo'][block]
+        if (not numpy.array_equal(info['NUMBER_OF_WAVEFORM_RECEIVED_BINS'][0],
+                    expected['rx_sample_count'][start:end]) or
+                not numpy.array_equal(
+                    info['NUMBER_OF_WAVEFORM_TRANSMITTED_BINS'][0],
+                    expected['tx_sample_count'][start:end])):
+            msg = 'waveformInfo do not match'
+            raise utils.TestingDataMismatch(msg)
+
+        checkWaveforms('transmitted', allBeams['transmitted'][block],
+                    expected['txwaveforms'][start:end])
+        checkWaveforms('received', allBeams['received'][block],
+                    expected['rxwaveforms'][start:end])
+
+    print('LiDAR data check ok')
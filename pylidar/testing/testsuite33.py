@@ -0,0 +1,124 @@
+"""
+Simple testsuite that checks processing blocks with a pool of worker
+processes (Controls.setNumWorkers)
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+import shutil
+from . import utils
+from pylidar import lidarprocessor
+from pylidar.lidarformats import generic
+from pylidar.toolbox.translate.ascii2spdv4 import translate
+from pylidar.toolbox.indexing.gridindex import createGridSpatialIndex
+from pylidar.toolbox.rasterization import rasterize
+from rios import cuiprogress
+
+INPUT_ASCII = 'testsuite33.dat'
+IMPORTED_SPD = 'testsuite33.spd'
+INDEXED_SPD = 'testsuite33_idx.spd'
+OUTPUT_DEM = 'testsuite33_%d.img'
+UPDATE_SPD = 'testsuite33_update_%d.spd'
+
+BINSIZE = 1.0
+WINDOWSIZE = 30
+"not a factor of the 100 bins across so the last blocks are partial"
+
+NUM_WORKERS = [1, 3]
+"the first is processed in this process and is compared with the others"
+
+def updatePointFunc(data):
+    """
+    Adds a HEIGHT column of the points' Z (the synthetic ground is at 0)
+    """
+    zVals = data.input1.getPointsByBins(colNames='Z')
+
+    if data.info.isFirstBlock():
+        data.input1.setScaling('HEIGHT', lidarprocessor.ARRAY_TYPE_POINTS,
+                    100.0, 0.0)
+
+    if zVals.shape[0] > 0:
+        data.input1.setPoints(zVals, colName='HEIGHT')
+
+def updateFile(fname, numWorkers):
+    """
+    Runs updatePointFunc on the given file opened UPDATE with
+    the given number of workers. Returns the warnings given.
+    """
+    messages = []
+    def messageHandler(message, level):
+        if level == lidarprocessor.MESSAGE_WARNING:
+            messages.append(message)
+
+    dataFiles = lidarprocessor.DataFiles()
+    dataFiles.input1 = lidarprocessor.LidarFile(fname, lidarprocessor.UPDATE)
+
+    controls = lidarprocessor.Controls()
+    progress = cuiprogress.GDALProgressBar()
+    controls.setProgress(progress)
+    controls.setMessageHandler(messageHandler)
+    controls.setSpatialProcessing(True)
+    controls.setWindowSize(WINDOWSIZE)
+    controls.setNumWorkers(numWorkers)
+
+    lidarprocessor.doProcessing(updatePointFunc, dataFiles, controls=controls)
+    return messages
+
+def run(oldpath, newpath):
+    """
+    Runs the 33rd basic test suite. Tests:
+
+    Creating a raster with different numbers of worker processes
+    Updating a SPDV4 file with more than 1 worker (done in 1 process)
+    """
+    inputASCII = os.path.join(newpath, INPUT_ASCII)
+    utils.writeSyntheticASCII(inputASCII)
+    info = generic.getLidarFileInfo(inputASCII)
+
+    importedSPD = os.path.join(newpath, IMPORTED_SPD)
+    translate(info, inputASCII, importedSPD, utils.SYNTHETIC_ASCII_COLTYPES,
+                utils.SYNTHETIC_ASCII_PULSE_COLS)
+    indexedSPD = os.path.join(newpath, INDEXED_SPD)
+    createGridSpatialIndex(importedSPD, indexedSPD, binSize=BINSIZE,
+                tempDir=newpath)
+
+    firstDEM = None
+    for numWorkers in NUM_WORKERS:
+        outputDEM = os.path.join(newpath, OUTPUT_DEM % numWorkers)
+        rasterize([indexedSPD], outputDEM, ['Z'], function="numpy.ma.mean",
+                atype='POINT', windowSize=WINDOWSIZE, numWorkers=numWorkers)
+        if firstDEM is None:
+            firstDEM = outputDEM
+        else:
+            utils.compareImageFiles(firstDEM, outputDEM)
+
+    firstUpdate = None
+    for numWorkers in NUM_WORKERS:
+        updateSPD = os.path.join(newpath, UPDATE_SPD % numWorkers)
+        shutil.copyfile(indexedSPD, updateSPD)
+        messages = updateFile(updateSPD, numWorkers)
+        if numWorkers > 1 and len(messages) == 0:
+            msg = 'No warning that UPDATE files are processed in 1 process'
+            raise utils.TestingDataMismatch(msg)
+
+        if firstUpdate is None:
+            firstUpdate = updateSPD
+        else:
+            utils.compareLiDARFiles(firstUpdate, updateSPD)
@@ -0,0 +1,102 @@
+"""
+Simple testsuite that checks errors on the writer thread of a
+writequeue.WriteQueue are raised by the processing thread
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import threading
+from . import utils
+from pylidar import writequeue
+
+QUEUE_SIZE = 2
+
+class WriteFailed(Exception):
+    "Raised by FailingDriver.writeData()"
+
+class FailingDriver(object):
+    """
+    Stands in for a driver. writeData() raises WriteFailed for the
+    block given by failBlock (once release is set) and records the 
+    other blocks written.
+    """
+    def __init__(self, failBlock):
+        self.failBlock = failBlock
+        self.written = []
+        self.release = threading.Event()
+
+    def writeData(self, block):
+        if block == self.failBlock:
+            self.release.wait()
+            raise WriteFailed('block %d' % block)
+        self.written.append(block)
+
+def checkRaises(func, *args):
+    """
+    Checks func raises WriteFailed
+    """
+    try:
+        func(*args)
+    except WriteFailed:
+        return
+    msg = '%s did not raise the writer thread error' % func.__name__
+    raise utils.TestingDataMismatch(msg)
+
+def run(oldpath, newpath):
+    """
+    Runs the 34th basic test suite. Tests:
+
+    An error on the writer thread being raised by put(), wait() and close()
+    """
+    # error raised by wait() then every later put(), wait() and close()
+    driver = FailingDriver(1)
+    writeQueue = writequeue.WriteQueue(driver, QUEUE_SIZE)
+    for block in range(4):
+        writeQueue.put(driver.writeData, block)
+    # fail once the blocks after it are waiting
+    driver.release.set()
+    checkRaises(writeQueue.wait)
+    checkRaises(writeQueue.put, driver.writeData, 4)
+    checkRaises(writeQueue.wait)
+    checkRaises(writeQueue.close)
+
+    # nothing after the failed block should have been written
+    if driver.written != [0]:
+        msg = 'blocks %s written rather than [0]' % driver.written
+        raise utils.TestingDataMismatch(msg)
+
+    # error raised by close() when nothing has waited for it
+    driver = FailingDriver(0)
+    driver.release.set()
+    writeQueue = writequeue.WriteQueue(driver, QUEUE_SIZE)
+    writeQueue.put(driver.writeData, 0)
+    checkRaises(writeQueue.close)
+
+    # no error
+    driver = FailingDriver(None)
+    writeQueue = writequeue.WriteQueue(driver, QUEUE_SIZE)
+    for block in range(4):
+        writeQueue.put(driver.writeData, block)
+    writeQueue.close()
+    if driver.written != list(range(4)):
+        msg = 'blocks %s written rather than %s' % (driver.written,
+                    list(range(4)))
+        raise utils.TestingDataMismatch(msg)
+
+    print('Write queue errors ok')
@@ -0,0 +1,182 @@
+"""
+Simple testsuite that checks the points binned with the SPDV4 point index
+(the POINT_INDEX driver option) are the same as when binned without it
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+import numpy
+from . import utils
+from pylidar import lidarprocessor
+from pylidar.lidarformats import generic
+from pylidar.lidarformats import gridindexutils
+from pylidar.lidarformats import spdv4_index
+from pylidar.toolbox.translate.ascii2spdv4 import translate
+from pylidar.toolbox.indexing.gridindex import createGridSpatialIndex
+from rios import cuiprogress
+
+INPUT_ASCII = 'testsuite35.dat'
+IMPORTED_SPD = 'testsuite35.spd'
+INDEXED_SPD = 'testsuite35_idx.spd'
+POINT_INDEXED_SPD = 'testsuite35_ptidx.spd'
+PIECES_SPD = 'testsuite35_pieces.spd'
+
+BINSIZE = 1.0
+WHOLE_WINDOWSIZE = 128
+"more than the 100 bins across so all the points are in 1 block"
+EDGE_WINDOWSIZE = 30
+"not a factor of the 100 bins across so the last blocks are partial"
+
+COLNAMES = ['X', 'Y', 'Z', 'RETURN_NUMBER']
+
+PIECES_CHUNK_SIZE = 777
+"number of points read at once when creating PIECES_SPD"
+PIECES_BUFFER_SIZE = 500
+"so the POINT_IDX of PIECES_SPD is created in many pieces"
+
+def readPointsByBinsFunc(data, otherArgs):
+    """
+    Called by readPointsByBins(). Saves the extent and the binned points
+    of each block.
+    """
+    extent = data.info.getExtent()
+    points = data.input.getPointsByBins(colNames=COLNAMES,
+                    indexByPulse=otherArgs.indexByPulse)
+    # the same for all the fields
+    mask = numpy.ma.getmaskarray(points)['X']
+    otherArgs.blocks.append(((extent.xMin, extent.yMax, extent.binSize),
+                    mask, numpy.ma.filled(points)))
+
+def readPointsByBins(fname, windowSize, indexByPulse):
+    """
+    Reads the given file spatially with getPointsByBins(). Returns a list
+    of the (xMin, yMax, binSize), mask and data of each block.
+    """
+    dataFiles = lidarprocessor.DataFiles()
+    dataFiles.input = lidarprocessor.LidarFile(fname, lidarprocessor.READ)
+
+    otherArgs = lidarprocessor.OtherArgs()
+    otherArgs.indexByPulse = indexByPulse
+    otherArgs.blocks = []
+
+    controls = lidarprocessor.Controls()
+    progress = cuiprogress.GDALProgressBar()
+    controls.setProgress(progress)
+    controls.setMessageHandler(lidarprocessor.silentMessageFn)
+    controls.setSpatialProcessing(True)
+    controls.setWindowSize(windowSize)
+
+    lidarprocessor.doProcessing(readPointsByBinsFunc, dataFiles,
+            otherArgs=otherArgs, controls=controls)
+    return otherArgs.blocks
+
+def compareBlocks(oldBlocks, newBlocks):
+    """
+    Checks 2 lists of blocks returned by readPointsByBins() match
+    """
+    if len(oldBlocks) != len(newBlocks):
+        msg = 'Different number of blocks'
+        raise utils.TestingDataMismatch(msg)
+
+    for (oldExtent, oldMask, oldData), (newExtent, newMask, newData) in zip(
+                oldBlocks, newBlocks):
+        if (oldExtent != newExtent or
+                not numpy.array_equal(oldMask, newMask) or
+                not utils.arraysEqual(oldData[~oldMask], newData[~newMask])):
+            msg = 'Binned points differ for block at %s' % (oldExtent,)
+            raise utils.TestingDataMismatch(msg)
+
+def checkBlocks(blocks, allPoints):
+    """
+    Checks each bin of the blocks returned by readPointsByBins() has
+    the points (in file order) of allPoints that are in it
+    """
+    for (xMin, yMax, binSize), mask, data in blocks:
+        maxPts, nrows, ncols = data.shape
+        binNum = gridindexutils.getBinNumbers(allPoints['Y'], allPoints['X'],
+                    binSize, yMax, xMin, nrows, ncols)
+        for row in range(nrows):
+            for col in range(ncols):
+                expected = allPoints[binNum == row * ncols + col]
+                nPts = expected.shape[0]
+                if (mask[:nPts, row, col].any() or
+                        not mask[nPts:, row, col].all() or
+                        not utils.arraysEqual(data[:nPts, row, col],
+                            expected)):
+                    msg = 'Bin %d %d of block at %s is wrong' % (row, col,
+                            (xMin, yMax))
+                    raise utils.TestingDataMismatch(msg)
+
+def run(oldpath, newpath):
+    """
+    Runs the 35th basic test suite. Tests:
+
+    Binning the points with the point index of a SPDV4 file
+    """
+    inputASCII = os.path.join(newpath, INPUT_ASCII)
+    utils.writeSyntheticASCII(inputASCII)
+    info = generic.getLidarFileInfo(inputASCII)
+
+    importedSPD = os.path.join(newpath, IMPORTED_SPD)
+    translate(info, inputASCII, importedSPD, utils.SYNTHETIC_ASCII_COLTYPES,
+                utils.SYNTHETIC_ASCII_PULSE_COLS)
+    indexedSPD = os.path.join(newpath, INDEXED_SPD)
+    createGridSpatialIndex(importedSPD, indexedSPD, binSize=BINSIZE,
+                tempDir=newpath)
+    pointIndexedSPD = os.path.join(newpath, POINT_INDEXED_SPD)
+    createGridSpatialIndex(importedSPD, pointIndexedSPD, binSize=BINSIZE,
+                tempDir=newpath, pointIndex=True)
+
+    # the same but POINT_IDX built from many chunks and in many pieces
+    piecesSPD = os.path.join(newpath, PIECES_SPD)
+    oldSizes = (spdv4_index.POINT_INDEX_CHUNK_SIZE,
+                spdv4_index.POINT_INDEX_BUFFER_SIZE)
+    spdv4_index.POINT_INDEX_CHUNK_SIZE = PIECES_CHUNK_SIZE
+    spdv4_index.POINT_INDEX_BUFFER_SIZE = PIECES_BUFFER_SIZE
+    try:
+        createGridSpatialIndex(importedSPD, piecesSPD, binSize=BINSIZE,
+                tempDir=newpath, pointIndex=True)
+    finally:
+        (spdv4_index.POINT_INDEX_CHUNK_SIZE,
+                spdv4_index.POINT_INDEX_BUFFER_SIZE) = oldSizes
+
+    # all in 1 block so binning the points of the pulses in the block
+    # gives all the points in each bin
+    oldBlocks = readPointsByBins(indexedSPD, WHOLE_WINDOWSIZE, False)
+    newBlocks = readPointsByBins(pointIndexedSPD, WHOLE_WINDOWSIZE, False)
+    compareBlocks(oldBlocks, newBlocks)
+
+    # the point index isn't used for indexByPulse
+    for windowSize in (WHOLE_WINDOWSIZE, EDGE_WINDOWSIZE):
+        oldBlocks = readPointsByBins(indexedSPD, windowSize, True)
+        newBlocks = readPointsByBins(pointIndexedSPD, windowSize, True)
+        compareBlocks(oldBlocks, newBlocks)
+
+    # with the point index, points near the edge of a block whose pulse
+    # is in the next block are still in the block
+    allPoints = utils.readLiDARData(pointIndexedSPD)['points']
+    allPoints = numpy.concatenate([data for mask, data in allPoints])
+    allPoints = allPoints[COLNAMES]
+    for windowSize in (WHOLE_WINDOWSIZE, EDGE_WINDOWSIZE):
+        blocks = readPointsByBins(pointIndexedSPD, windowSize, False)
+        checkBlocks(blocks, allPoints)
+        compareBlocks(blocks, readPointsByBins(piecesSPD, windowSize, False))
+
+    print('Binned points ok')
@@ -0,0 +1,169 @@
+"""
+Simple testsuite that checks reading the spatial index of a SPDV4 file
+in strips (spdv4_index.GridIndexRowCache) gives the same results as
+reading it all at once
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+import shutil
+import h5py
+import numpy
+from . import utils
+from pylidar import lidarprocessor
+from pylidar.lidarformats import generic
+from pylidar.lidarformats import spdv4_index
+from pylidar.toolbox.translate.ascii2spdv4 import translate
+from pylidar.toolbox.indexing.gridindex import createGridSpatialIndex
+from rios import cuiprogress
+
+INPUT_ASCII = 'testsuite36.dat'
+IMPORTED_SPD = 'testsuite36.spd'
+INDEXED_SPD = 'testsuite36_idx.spd'
+UPDATE_SPD = 'testsuite36_update_%d_%d.spd'
+
+BINSIZE = 1.0
+WINDOWSIZE = 10
+"""
+smaller than SI_CACHE_STRIP_ROWS and not a factor of it so some blocks
+straddle 2 strips
+"""
+
+FULL_CACHE = (100000, 1)
+"the (stripRows, numStrips) that reads the whole index at once"
+STRIP_CACHES = [(spdv4_index.SI_CACHE_STRIP_ROWS, 1),
+                (spdv4_index.SI_CACHE_STRIP_ROWS,
+                    spdv4_index.SI_CACHE_NUM_STRIPS),
+                (4, 2)]
+"""
+the (stripRows, numStrips) compared with FULL_CACHE. With 1 strip every
+block that straddles 2 strips evicts one
+"""
+
+SLICES = [(slice(10, 20), slice(5, 40)), (slice(40, 50), slice(0, None)),
+            (slice(0, 5), slice(90, 200)), (slice(12, 14), slice(3, 4)),
+            (slice(90, None), slice(0, None)), (slice(0, None), slice(50, 60))]
+"slices of the index read directly from the cache"
+
+def setCacheSize(stripRows, numStrips):
+    """
+    Sets the size of the GridIndexRowCache used for the spatial index.
+    Returns the old (stripRows, numStrips).
+    """
+    oldSize = (spdv4_index.SI_CACHE_STRIP_ROWS,
+                spdv4_index.SI_CACHE_NUM_STRIPS)
+    spdv4_index.SI_CACHE_STRIP_ROWS = stripRows
+    spdv4_index.SI_CACHE_NUM_STRIPS = numStrips
+    return oldSize
+
+def checkCache(fname):
+    """
+    Reads SLICES of the pulse index of the given file with a
+    GridIndexRowCache of 2 strips and checks they match reading
+    the datasets directly
+    """
+    fileHandle = h5py.File(fname, 'r')
+    group = fileHandle[spdv4_index.SPATIALINDEX_GROUP][
+                spdv4_index.SIMPLEPULSEGRID_GROUP]
+    for name in ('PLS_PER_BIN', 'BIN_OFFSETS'):
+        dataset = group[name]
+        data = dataset[...]
+        cache = spdv4_index.GridIndexRowCache(dataset, 16, 2)
+        for rowSlice, colSlice in SLICES:
+            if not numpy.array_equal(cache[rowSlice, colSlice],
+                        data[rowSlice, colSlice]):
+                msg = '%s read from the cache does not match' % name
+                raise utils.TestingDataMismatch(msg)
+            if len(cache.strips) > cache.numStrips:
+                msg = 'More strips cached than numStrips'
+                raise utils.TestingDataMismatch(msg)
+    fileHandle.close()
+
+def updatePointFunc(data):
+    """
+    Adds a HEIGHT column of the points' Z (the synthetic ground is at 0)
+    """
+    zVals = data.input1.getPointsByBins(colNames='Z')
+
+    if data.info.isFirstBlock():
+        data.input1.setScaling('HEIGHT', lidarprocessor.ARRAY_TYPE_POINTS,
+                    100.0, 0.0)
+
+    if zVals.shape[0] > 0:
+        data.input1.setPoints(zVals, colName='HEIGHT')
+
+def updateFile(fname):
+    """
+    Runs updatePointFunc on the given file spatially
+    """
+    dataFiles = lidarprocessor.DataFiles()
+    dataFiles.input1 = lidarprocessor.LidarFile(fname, lidarprocessor.UPDATE)
+
+    controls = lidarprocessor.Controls()
+    progress = cuiprogress.GDALProgressBar()
+    controls.setProgress(progress)
+    controls.setMessageHandler(lidarprocessor.silentMessageFn)
+    controls.setSpatialProcessing(True)
+    controls.setWindowSize(WINDOWSIZE)
+
+    lidarprocessor.doProcessing(updatePointFunc, dataFiles, controls=controls)
+
+def readAndUpdate(indexedSPD, newpath, cacheSize):
+    """
+    Reads the given file spatially and updates a copy of it with the
+    given (stripRows, numStrips) for the spatial index. Returns what
+    was read and the name of the updated file.
+    """
+    oldSize = setCacheSize(*cacheSize)
+    try:
+        data = utils.readLiDARData(indexedSPD, windowSize=WINDOWSIZE,
+                    spatial=True)
+        updateSPD = os.path.join(newpath, UPDATE_SPD % cacheSize)
+        shutil.copyfile(indexedSPD, updateSPD)
+        updateFile(updateSPD)
+    finally:
+        setCacheSize(*oldSize)
+    return data, updateSPD
+
+def run(oldpath, newpath):
+    """
+    Runs the 36th basic test suite. Tests:
+
+    Reading and updating a SPDV4 file spatially with the spatial index
+    read in strips
+    """
+    inputASCII = os.path.join(newpath, INPUT_ASCII)
+    utils.writeSyntheticASCII(inputASCII)
+    info = generic.getLidarFileInfo(inputASCII)
+
+    importedSPD = os.path.join(newpath, IMPORTED_SPD)
+    translate(info, inputASCII, importedSPD, utils.SYNTHETIC_ASCII_COLTYPES,
+                utils.SYNTHETIC_ASCII_PULSE_COLS)
+    indexedSPD = os.path.join(newpath, INDEXED_SPD)
+    createGridSpatialIndex(importedSPD, indexedSPD, binSize=BINSIZE,
+                tempDir=newpath)
+
+    checkCache(indexedSPD)
+
+    fullData, fullUpdate = readAndUpdate(indexedSPD, newpath, FULL_CACHE)
+    for cacheSize in STRIP_CACHES:
+        data, update = readAndUpdate(indexedSPD, newpath, cacheSize)
+        utils.compareLiDARData(fullData, data)
+        utils.compareLiDARFiles(fullUpdate, update)
@@ -0,0 +1,162 @@
+"""
+Simple testsuite that checks reading a selection of scattered runs
+with h5space.H5Space gives the same elements whatever the read gap
+threshold (see h5space.setReadGapThreshold)
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+import h5py
+import numpy
+from . import utils
+from pylidar.lidarformats import h5space
+
+OUTPUT_H5 = 'testsuite37.h5'
+
+DATASET_SIZE = 20000
+CHUNK_SIZE = 100
+BOOL_START = 321
+"the selection doesn't start at the start of the dataset"
+
+GAP_THRESHOLDS = [None, 0, h5space.DEFAULT_READ_GAP_THRESHOLD, 1000000]
+"the first reads each run separately and is compared with the others"
+
+def makeSelection(seed=0):
+    """
+    Returns a bool array of runs of 1 to 20 selected elements with gaps
+    of 1 to 600 between them (so some are merged and some aren't by the
+    default threshold) and the start and end of each run.
+    """
+    rng = numpy.random.RandomState(seed)
+    boolArray = numpy.zeros((DATASET_SIZE - BOOL_START,), dtype=bool)
+    runs = []
+    n = rng.randint(0, 10)
+    while True:
+        end = n + rng.randint(1, 21)
+        if end > boolArray.shape[0]:
+            break
+        boolArray[n:end] = True
+        runs.append((n, end))
+        n = end + rng.randint(1, 601)
+    return boolArray, runs
+
+def expectedReadRuns(runs, gapThreshold, chunkSize):
+    """
+    The number of hyperslabs coalesceBoolRuns() should read the runs as
+    """
+    readRuns = 1
+    for (lastStart, lastEnd), (start, end) in zip(runs[:-1], runs[1:]):
+        fill = gapThreshold is not None and start - lastEnd <= gapThreshold
+        if (gapThreshold is not None and chunkSize > 0 and
+                (BOOL_START + lastEnd - 1) // chunkSize ==
+                (BOOL_START + start) // chunkSize):
+            fill = True
+        if not fill:
+            readRuns += 1
+    return readRuns
+
+def checkCoalesce(boolArray, runs, gapThreshold, chunkSize):
+    """
+    Checks the output of coalesceBoolRuns() directly
+    """
+    outBool = numpy.empty_like(boolArray)
+    stats = numpy.zeros((len(h5space.READ_STATS_NAMES),), dtype=numpy.int64)
+    h5space.coalesceBoolRuns(boolArray, BOOL_START, gapThreshold, chunkSize,
+                outBool, stats)
+    stats = dict(zip(h5space.READ_STATS_NAMES, stats.tolist()))
+
+    # every selected element read and the runs read have no gaps
+    readIdx = numpy.flatnonzero(outBool)
+    nReadRuns = 1 + numpy.count_nonzero(numpy.diff(readIdx) > 1)
+    if (not outBool[boolArray].all() or
+            stats['selectionRuns'] != len(runs) or
+            stats['selectedElements'] != boolArray.sum() or
+            stats['readElements'] != outBool.sum() or
+            stats['readRuns'] != nReadRuns or
+            nReadRuns != expectedReadRuns(runs, gapThreshold, chunkSize)):
+        msg = 'coalesceBoolRuns wrong for gap threshold %d chunk size %d' % (
+                    gapThreshold, chunkSize)
+        raise utils.TestingDataMismatch(msg)
+
+def checkRead(dataSet, data, boolArray, runs, gapThreshold):
+    """
+    Checks H5Space.read() for a copy of boolArray with the given gap
+    threshold gives the selected elements of data, both before and after
+    updateBoolArray()
+    """
+    chunkSize = 0
+    if dataSet.chunks is not None:
+        chunkSize = dataSet.chunks[0]
+
+    h5space.setReadGapThreshold(gapThreshold)
+    boolArray = boolArray.copy()
+    space = h5space.H5Space(DATASET_SIZE, boolArray, BOOL_START)
+    readSpace, readMask, stats = space.getReadPlan(dataSet)
+    stats = dict(zip(h5space.READ_STATS_NAMES, stats.tolist()))
+    nReadRuns = expectedReadRuns(runs, gapThreshold, chunkSize)
+    merged = nReadRuns < len(runs)
+    if (merged != (readMask is not None) or
+            (gapThreshold is not None and stats['readRuns'] != nReadRuns)):
+        msg = 'Wrong read plan for gap threshold %s' % gapThreshold
+        raise utils.TestingDataMismatch(msg)
+
+    selected = data[BOOL_START:][boolArray]
+    if not numpy.array_equal(space.read(dataSet), selected):
+        msg = 'Wrong data read for gap threshold %s' % gapThreshold
+        raise utils.TestingDataMismatch(msg)
+
+    # drop every third element selected
+    mask = numpy.arange(selected.shape[0]) % 3 != 0
+    space.updateBoolArray(mask)
+    if not numpy.array_equal(space.read(dataSet), selected[mask]):
+        msg = 'Wrong data read after updateBoolArray for gap threshold %s' % (
+                    gapThreshold)
+        raise utils.TestingDataMismatch(msg)
+
+def run(oldpath, newpath):
+    """
+    Runs the 37th basic test suite. Tests:
+
+    Reading a selection of scattered runs from a contiguous and
+    a chunked HDF5 dataset with different read gap thresholds
+    """
+    outputH5 = os.path.join(newpath, OUTPUT_H5)
+    data = numpy.arange(DATASET_SIZE, dtype=numpy.float64)
+    fileHandle = h5py.File(outputH5, 'w')
+    contiguous = fileHandle.create_dataset('CONTIGUOUS', data=data)
+    chunked = fileHandle.create_dataset('CHUNKED', data=data,
+                chunks=(CHUNK_SIZE,))
+
+    boolArray, runs = makeSelection()
+
+    for gapThreshold in GAP_THRESHOLDS[1:]:
+        for chunkSize in (0, CHUNK_SIZE):
+            checkCoalesce(boolArray, runs, gapThreshold, chunkSize)
+
+    oldThreshold = h5space.readGapThreshold
+    try:
+        for gapThreshold in GAP_THRESHOLDS:
+            for dataSet in (contiguous, chunked):
+                checkRead(dataSet, data, boolArray, runs, gapThreshold)
+    finally:
+        h5space.setReadGapThreshold(oldThreshold)
+
+    fileHandle.close()
+    print('H5Space reads ok')
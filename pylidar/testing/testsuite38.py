@@ -0,0 +1,186 @@
+"""
+Simple testsuite that checks reading scaled SPDV4 columns as float32
+with setScaledDataType(), including when the next block has already
+been read ahead as float64
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+import h5py
+import numpy
+from . import utils
+from pylidar import lidarprocessor
+from pylidar.lidarformats import generic
+from pylidar.lidarformats import h5space
+from pylidar.lidarformats import spdv4
+from pylidar.toolbox.translate.ascii2spdv4 import translate
+from pylidar.toolbox.indexing.gridindex import createGridSpatialIndex
+from rios import cuiprogress
+
+INPUT_ASCII = 'testsuite38.dat'
+IMPORTED_SPD = 'testsuite38.spd'
+INDEXED_SPD = 'testsuite38_idx.spd'
+
+BINSIZE = 1.0
+WINDOWSIZE = 20
+
+FLOAT32_BLOCK = 3
+"the block setScaledDataType() is called in (the next is being read ahead)"
+
+PULSE_COLUMNS = ['X_IDX', 'Y_IDX']
+POINT_COLUMNS = ['X', 'Y', 'Z']
+FLOAT32_COLUMNS = [(lidarprocessor.ARRAY_TYPE_PULSES, 'X_IDX'),
+                    (lidarprocessor.ARRAY_TYPE_POINTS, 'Z')]
+"the columns read as float32"
+FLOAT32_TOLERANCE = 1e-4
+"""
+the difference allowed between float32 and float64 columns. Less than
+the 0.01 resolution of the data (the offset is added after converting
+to float32 so this is more than the float32 precision of small values)
+"""
+
+def readFunc(data, otherArgs):
+    """
+    Called by readBlocks(). Sets FLOAT32_COLUMNS to float32 in block
+    FLOAT32_BLOCK if otherArgs.useFloat32 and saves the pulses and
+    points of each block.
+    """
+    pulses = data.input.getPulses(colNames=PULSE_COLUMNS)
+    points = data.input.getPoints(colNames=POINT_COLUMNS)
+    if otherArgs.useFloat32 and len(otherArgs.blocks) == FLOAT32_BLOCK:
+        for arrayType, colName in FLOAT32_COLUMNS:
+            data.input.setScaledDataType(colName, arrayType, numpy.float32)
+        # the cached data for this block is in the old type too
+        pulses = data.input.getPulses(colNames=PULSE_COLUMNS)
+        points = data.input.getPoints(colNames=POINT_COLUMNS)
+
+    otherArgs.blocks.append((numpy.ma.filled(pulses),
+                    numpy.ma.filled(points)))
+
+def readBlocks(fname, spatial, useFloat32):
+    """
+    Reads the pulses and points of the file with the next block read
+    ahead. Returns a list of the (pulses, points) of each block.
+    """
+    dataFiles = lidarprocessor.DataFiles()
+    dataFiles.input = lidarprocessor.LidarFile(fname, lidarprocessor.READ)
+
+    otherArgs = lidarprocessor.OtherArgs()
+    otherArgs.useFloat32 = useFloat32
+    otherArgs.blocks = []
+
+    controls = lidarprocessor.Controls()
+    progress = cuiprogress.GDALProgressBar()
+    controls.setProgress(progress)
+    controls.setMessageHandler(lidarprocessor.silentMessageFn)
+    controls.setSpatialProcessing(spatial)
+    controls.setWindowSize(WINDOWSIZE)
+    controls.setPrefetch(True)
+
+    lidarprocessor.doProcessing(readFunc, dataFiles, otherArgs=otherArgs,
+                    controls=controls)
+    return otherArgs.blocks
+
+def checkFloat32(name, float32Data, float64Data):
+    """
+    Checks float32Data is float32 and within FLOAT32_TOLERANCE
+    of float64Data
+    """
+    if (float32Data.dtype != numpy.float32 or
+            float32Data.shape != float64Data.shape or
+            not numpy.allclose(float32Data, float64Data, rtol=0,
+                        atol=FLOAT32_TOLERANCE)):
+        msg = '%s read as float32 does not match float64' % name
+        raise utils.TestingDataMismatch(msg)
+
+def compareBlocks(float64Blocks, float32Blocks):
+    """
+    Checks the blocks returned by readBlocks() with and without
+    float32 columns match
+    """
+    if len(float64Blocks) != len(float32Blocks):
+        msg = 'Different number of blocks'
+        raise utils.TestingDataMismatch(msg)
+
+    for block, (float64Arrays, float32Arrays) in enumerate(zip(float64Blocks,
+                float32Blocks)):
+        for arrayType, float64Array, float32Array in zip(
+                    (lidarprocessor.ARRAY_TYPE_PULSES,
+                    lidarprocessor.ARRAY_TYPE_POINTS),
+                    float64Arrays, float32Arrays):
+            for name in float64Array.dtype.names:
+                if (block >= FLOAT32_BLOCK and
+                        (arrayType, name) in FLOAT32_COLUMNS):
+                    checkFloat32(name, float32Array[name],
+                                float64Array[name])
+                elif not utils.arraysEqual(float32Array[name],
+                                float64Array[name]):
+                    msg = '%s does not match in block %d' % (name, block)
+                    raise utils.TestingDataMismatch(msg)
+
+def checkReadFieldAndUnScale(fname):
+    """
+    Checks SPDV4File.readFieldAndUnScale() into a new float32 array and
+    into a float32 field of a structured array
+    """
+    fileHandle = h5py.File(fname, 'r')
+    pointsHandle = fileHandle['DATA']['POINTS']
+    nPoints = pointsHandle['Z'].shape[0]
+    space = h5space.createSpaceFromRange(0, nPoints, nPoints)
+
+    float64Data = spdv4.SPDV4File.readFieldAndUnScale(pointsHandle, 'Z',
+                    space)
+    float32Data = spdv4.SPDV4File.readFieldAndUnScale(pointsHandle, 'Z',
+                    space, scaledDtype=numpy.float32)
+    checkFloat32('Z', float32Data, float64Data)
+
+    out = numpy.zeros(nPoints, dtype=[('Z', numpy.float32),
+                    ('Y', numpy.float64)])
+    spdv4.SPDV4File.readFieldAndUnScale(pointsHandle, 'Z', space,
+                    out=out['Z'])
+    checkFloat32('Z', out['Z'], float64Data)
+    fileHandle.close()
+
+def run(oldpath, newpath):
+    """
+    Runs the 38th basic test suite. Tests:
+
+    Reading scaled SPDV4 columns as float32 with setScaledDataType()
+    while reading ahead, spatially and non spatially
+    """
+    inputASCII = os.path.join(newpath, INPUT_ASCII)
+    utils.writeSyntheticASCII(inputASCII)
+    info = generic.getLidarFileInfo(inputASCII)
+
+    importedSPD = os.path.join(newpath, IMPORTED_SPD)
+    translate(info, inputASCII, importedSPD, utils.SYNTHETIC_ASCII_COLTYPES,
+                utils.SYNTHETIC_ASCII_PULSE_COLS)
+    indexedSPD = os.path.join(newpath, INDEXED_SPD)
+    createGridSpatialIndex(importedSPD, indexedSPD, binSize=BINSIZE,
+                tempDir=newpath)
+
+    checkReadFieldAndUnScale(importedSPD)
+
+    for fname, spatial in ((importedSPD, False), (indexedSPD, True)):
+        float64Blocks = readBlocks(fname, spatial, False)
+        float32Blocks = readBlocks(fname, spatial, True)
+        compareBlocks(float64Blocks, float32Blocks)
+
+    print('float32 columns ok')
@@ -0,0 +1,142 @@
+"""
+Simple testsuite that checks the EXPECTED_NUMBER_OF_* options of the
+SPDV4 driver
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+import h5py
+from . import utils
+from pylidar import lidarprocessor
+from pylidar.lidarformats import generic
+from pylidar.toolbox.translate.ascii2spdv4 import translate
+from pylidar.toolbox.indexing.gridindex import copyScaling
+from rios import cuiprogress
+
+INPUT_ASCII = 'testsuite39.dat'
+IMPORTED_SPD = 'testsuite39.spd'
+COPIED_SPD = 'testsuite39_%d_%d.spd'
+
+EXPECTED_FACTORS = [None, 1, 3, 0.5]
+"""
+multiplied by the number of pulses and points for the EXPECTED_NUMBER_OF_*
+options. None doesn't set them. The others are exact, too many (so the
+columns must be trimmed) and too few (so they must grow)
+"""
+
+WRITE_BUFFER_SIZES = [0, 64 * 1024]
+"no buffering and a few blocks"
+
+WINDOWSIZE = 10
+
+def copyFunc(data):
+    """
+    Copies the pulses and points
+    """
+    if data.info.isFirstBlock():
+        copyScaling(data.input1, data.output1)
+
+    pulses = data.input1.getPulses()
+    points = data.input1.getPointsByPulse()
+    data.output1.setPulses(pulses)
+    data.output1.setPoints(points)
+
+def copyFile(inputSPD, outputSPD, bufferSize, nPulses, nPoints):
+    """
+    Copies the input file with the given WRITE_BUFFER_SIZE and
+    EXPECTED_NUMBER_OF_PULSES and EXPECTED_NUMBER_OF_POINTS
+    (if not None)
+    """
+    dataFiles = lidarprocessor.DataFiles()
+    dataFiles.input1 = lidarprocessor.LidarFile(inputSPD,
+                            lidarprocessor.READ)
+    dataFiles.output1 = lidarprocessor.LidarFile(outputSPD,
+                            lidarprocessor.CREATE)
+    dataFiles.output1.setLiDARDriver('SPDV4')
+    dataFiles.output1.setLiDARDriverOption('WRITE_BUFFER_SIZE', bufferSize)
+    if nPulses is not None:
+        dataFiles.output1.setLiDARDriverOption('EXPECTED_NUMBER_OF_PULSES',
+                            nPulses)
+        dataFiles.output1.setLiDARDriverOption('EXPECTED_NUMBER_OF_POINTS',
+                            nPoints)
+
+    controls = lidarprocessor.Controls()
+    progress = cuiprogress.GDALProgressBar()
+    controls.setProgress(progress)
+    controls.setSpatialProcessing(False)
+    controls.setWindowSize(WINDOWSIZE)
+
+    lidarprocessor.doProcessing(copyFunc, dataFiles, controls=controls)
+
+def checkLengths(fname, nPulses, nPoints):
+    """
+    Checks the header of the file has the given number of pulses and
+    points and every column is that long
+    """
+    fileHandle = h5py.File(fname, 'r')
+    if (fileHandle.attrs['NUMBER_OF_PULSES'] != nPulses or
+            fileHandle.attrs['NUMBER_OF_POINTS'] != nPoints):
+        msg = 'Wrong number of pulses or points in the header'
+        raise utils.TestingDataMismatch(msg)
+
+    for groupName, length in (('PULSES', nPulses), ('POINTS', nPoints)):
+        group = fileHandle['DATA'][groupName]
+        for name in group:
+            if group[name].shape[0] != length:
+                msg = '%s %s has %d elements rather than %d' % (groupName,
+                        name, group[name].shape[0], length)
+                raise utils.TestingDataMismatch(msg)
+    fileHandle.close()
+
+def run(oldpath, newpath):
+    """
+    Runs the 39th basic test suite. Tests:
+
+    Writing a SPDV4 file with EXPECTED_NUMBER_OF_PULSES and
+    EXPECTED_NUMBER_OF_POINTS more and less than what is written
+    """
+    inputASCII = os.path.join(newpath, INPUT_ASCII)
+    utils.writeSyntheticASCII(inputASCII)
+    info = generic.getLidarFileInfo(inputASCII)
+
+    importedSPD = os.path.join(newpath, IMPORTED_SPD)
+    translate(info, inputASCII, importedSPD, utils.SYNTHETIC_ASCII_COLTYPES,
+                utils.SYNTHETIC_ASCII_PULSE_COLS)
+    imported = utils.readLiDARData(importedSPD)
+
+    fileHandle = h5py.File(importedSPD, 'r')
+    nPulses = int(fileHandle.attrs['NUMBER_OF_PULSES'])
+    nPoints = int(fileHandle.attrs['NUMBER_OF_POINTS'])
+    fileHandle.close()
+
+    for factorNum, factor in enumerate(EXPECTED_FACTORS):
+        expectedPulses = None
+        expectedPoints = None
+        if factor is not None:
+            expectedPulses = int(nPulses * factor)
+            expectedPoints = int(nPoints * factor)
+
+        for bufferSize in WRITE_BUFFER_SIZES:
+            copiedSPD = os.path.join(newpath, COPIED_SPD % (factorNum,
+                            bufferSize))
+            copyFile(importedSPD, copiedSPD, bufferSize, expectedPulses,
+                            expectedPoints)
+            checkLengths(copiedSPD, nPulses, nPoints)
+            utils.compareLiDARData(imported, utils.readLiDARData(copiedSPD))
@@ -0,0 +1,163 @@
+"""
+Simple testsuite that checks the min and max values in the header of
+a SPDV4 file written in many blocks
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+import h5py
+import numpy
+from . import utils
+from pylidar import lidarprocessor
+from pylidar.lidarformats import generic
+from pylidar.lidarformats import spdv4
+from pylidar.toolbox import arrayutils
+from pylidar.toolbox.translate.ascii2spdv4 import translate
+from pylidar.toolbox.indexing.gridindex import copyScaling
+from rios import cuiprogress
+
+INPUT_ASCII = 'testsuite40.dat'
+IMPORTED_SPD = 'testsuite40.spd'
+COPIED_SPD = 'testsuite40_copy.spd'
+
+WINDOWSIZE = 10
+
+def copyFunc(data, otherArgs):
+    """
+    Copies the pulses and points, adding ZENITH and AZIMUTH to the
+    pulses. Nothing is written for the first block. The min and max
+    of the columns written are saved in otherArgs.
+    """
+    if data.info.isFirstBlock():
+        copyScaling(data.input1, data.output1)
+        for colName in ('ZENITH', 'AZIMUTH'):
+            data.output1.setScaling(colName, lidarprocessor.ARRAY_TYPE_PULSES,
+                        100.0, 0.0)
+
+    pulses = data.input1.getPulses()
+    points = data.input1.getPointsByPulse()
+    # some values that aren't on the 0.01 grid of the other columns
+    pulses = arrayutils.addFieldToStructArray(pulses, 'ZENITH',
+                numpy.float64, (pulses['X_IDX'] - 1000) / 3)
+    pulses = arrayutils.addFieldToStructArray(pulses, 'AZIMUTH',
+                numpy.float64, (pulses['Y_IDX'] - 2000) * 3.6)
+
+    if data.info.isFirstBlock():
+        pulses = pulses[:0]
+        points = points[:, :0]
+
+    for array, updateDict in ((pulses, spdv4.PULSES_HEADER_UPDATE_DICT),
+                (points, spdv4.POINTS_HEADER_UPDATE_DICT)):
+        for colName in array.dtype.names:
+            if colName in updateDict and array.size > 0:
+                column = array[colName]
+                if isinstance(column, numpy.ma.MaskedArray):
+                    column = column.compressed()
+                minKey, maxKey = updateDict[colName]
+                otherArgs.mins.append((minKey, column.min()))
+                otherArgs.maxs.append((maxKey, column.max()))
+
+    data.output1.setPulses(pulses)
+    data.output1.setPoints(points)
+
+def copyFile(inputSPD, outputSPD):
+    """
+    Copies the input file with copyFunc. Returns dictionaries of the
+    min and max of the columns written keyed on the header field.
+    """
+    dataFiles = lidarprocessor.DataFiles()
+    dataFiles.input1 = lidarprocessor.LidarFile(inputSPD,
+                            lidarprocessor.READ)
+    dataFiles.output1 = lidarprocessor.LidarFile(outputSPD,
+                            lidarprocessor.CREATE)
+    dataFiles.output1.setLiDARDriver('SPDV4')
+
+    otherArgs = lidarprocessor.OtherArgs()
+    otherArgs.mins = []
+    otherArgs.maxs = []
+
+    controls = lidarprocessor.Controls()
+    progress = cuiprogress.GDALProgressBar()
+    controls.setProgress(progress)
+    controls.setSpatialProcessing(False)
+    controls.setWindowSize(WINDOWSIZE)
+
+    lidarprocessor.doProcessing(copyFunc, dataFiles, otherArgs=otherArgs,
+                    controls=controls)
+
+    mins = {}
+    for key, value in otherArgs.mins:
+        mins[key] = min(mins.get(key, value), value)
+    maxs = {}
+    for key, value in otherArgs.maxs:
+        maxs[key] = max(maxs.get(key, value), value)
+    return mins, maxs
+
+def checkHeader(fname, mins, maxs):
+    """
+    Checks the min and max fields of the header of the file match
+    the given dictionaries
+    """
+    fileHandle = h5py.File(fname, 'r')
+    for values in (mins, maxs):
+        for key in values:
+            if fileHandle.attrs[key] != values[key]:
+                msg = '%s in header is %s rather than %s' % (key,
+                        fileHandle.attrs[key], values[key])
+                raise utils.TestingDataMismatch(msg)
+    fileHandle.close()
+
+def run(oldpath, newpath):
+    """
+    Runs the 40th basic test suite. Tests:
+
+    The min and max in the header of SPDV4 files translated and copied
+    in many blocks, the first of which is empty
+    """
+    inputASCII = os.path.join(newpath, INPUT_ASCII)
+    utils.writeSyntheticASCII(inputASCII)
+    info = generic.getLidarFileInfo(inputASCII)
+
+    importedSPD = os.path.join(newpath, IMPORTED_SPD)
+    translate(info, inputASCII, importedSPD, utils.SYNTHETIC_ASCII_COLTYPES,
+                utils.SYNTHETIC_ASCII_PULSE_COLS)
+
+    # the translated file against the points in the ASCII file
+    # (before they are rounded to the scaling)
+    colNames = [colName for colName, colType in
+                    utils.SYNTHETIC_ASCII_COLTYPES]
+    asciiData = numpy.loadtxt(inputASCII)
+    mins = {}
+    maxs = {}
+    for colName in ('X', 'Y', 'Z'):
+        column = asciiData[:, colNames.index(colName)]
+        minKey, maxKey = spdv4.POINTS_HEADER_UPDATE_DICT[colName]
+        mins[minKey] = column.min()
+        maxs[maxKey] = column.max()
+    checkHeader(importedSPD, mins, maxs)
+
+    copiedSPD = os.path.join(newpath, COPIED_SPD)
+    mins, maxs = copyFile(importedSPD, copiedSPD)
+    if 'ZENITH_MIN' not in mins or 'X_MIN' not in mins:
+        msg = 'Columns missing from the copy'
+        raise utils.TestingDataMismatch(msg)
+    checkHeader(copiedSPD, mins, maxs)
+
+    print('Header min and max ok')
@@ -0,0 +1,149 @@
+"""
+Simple testsuite that checks reading pulse ranges of a LAS file out of
+order, with and without the CHECKPOINT_SIDECAR option
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+from . import utils
+from pylidar import lidarprocessor
+from pylidar.lidarformats import generic
+from pylidar.lidarformats import las
+from pylidar.toolbox.translate import translatecommon
+from rios import cuiprogress
+
+REQUIRED_FORMATS = ["LAS"]
+
+INPUT_ASCII = 'testsuite41.dat'
+OUTPUT_LAS = 'testsuite41.las'
+
+NPULSES = 45000
+"enough for several entries in the checkpoint table"
+
+POINT_FORMAT = 1
+RECORD_LENGTH = 28
+
+RANGE_SIZE = 7000
+"doesn't line up with las.CHECKPOINT_INTERVAL"
+
+def writeFunc(data):
+    """
+    Writes the pulses and points of the ASCII file to the LAS file
+    """
+    if data.info.isFirstBlock():
+        for colName in ('X', 'Y', 'Z'):
+            data.output1.setScaling(colName, lidarprocessor.ARRAY_TYPE_POINTS,
+                    1000.0, 0.0)
+
+    pulses = data.input1.getPulses(['GPS_TIME', 'NUMBER_OF_RETURNS'])
+    points = data.input1.getPointsByPulse(['X', 'Y', 'Z', 'CLASSIFICATION'])
+    data.output1.setPulses(pulses)
+    data.output1.setPoints(points)
+
+def readRanges(fname, ranges, driverOptions):
+    """
+    Reads the given (start, end) pulse ranges of the file in the order
+    given. Returns a dictionary keyed on the range of the pulses and
+    points and the number of entries in the checkpoint table that were
+    loaded from the sidecar.
+    """
+    lidarFile = lidarprocessor.LidarFile(fname, lidarprocessor.READ)
+    for key in driverOptions:
+        lidarFile.setLiDARDriverOption(key, driverOptions[key])
+    controls = lidarprocessor.Controls()
+    driver = generic.getReaderForLiDARFile(fname, generic.READ, controls,
+                    lidarFile)
+    nLoadedCheckpoints = driver.nLoadedCheckpoints
+
+    data = {}
+    for start, end in ranges:
+        driver.setPulseRange(generic.PulseRange(start, end))
+        data[(start, end)] = (driver.readPulsesForRange(),
+                    driver.readPointsForRange())
+    driver.close()
+    return data, nLoadedCheckpoints
+
+def compareRanges(sequential, data):
+    """
+    Checks the data returned by readRanges() matches the sequential read
+    """
+    for pulseRange in sequential:
+        for oldArray, newArray in zip(sequential[pulseRange],
+                    data[pulseRange]):
+            if not utils.arraysEqual(oldArray, newArray):
+                msg = 'pulses %d to %d do not match' % pulseRange
+                raise utils.TestingDataMismatch(msg)
+
+def run(oldpath, newpath):
+    """
+    Runs the 41st basic test suite. Tests:
+
+    Reading pulse ranges of a LAS file out of order and backwards with
+    the checkpoint table found as it goes and loaded from the sidecar
+    """
+    inputASCII = os.path.join(newpath, INPUT_ASCII)
+    utils.writeSyntheticASCII(inputASCII, nPulses=NPULSES)
+
+    colTypes = [(name, translatecommon.STRING_TO_DTYPE[typeString])
+                for name, typeString in utils.SYNTHETIC_ASCII_COLTYPES]
+
+    outputLAS = os.path.join(newpath, OUTPUT_LAS)
+    dataFiles = lidarprocessor.DataFiles()
+    dataFiles.input1 = lidarprocessor.LidarFile(inputASCII,
+                                lidarprocessor.READ)
+    dataFiles.input1.setLiDARDriverOption('COL_TYPES', colTypes)
+    dataFiles.input1.setLiDARDriverOption('PULSE_COLS',
+                                utils.SYNTHETIC_ASCII_PULSE_COLS)
+    dataFiles.output1 = lidarprocessor.LidarFile(outputLAS,
+                                lidarprocessor.CREATE)
+    dataFiles.output1.setLiDARDriver('LAS')
+    dataFiles.output1.setLiDARDriverOption('FORMAT_VERSION', POINT_FORMAT)
+    dataFiles.output1.setLiDARDriverOption('RECORD_LENGTH', RECORD_LENGTH)
+
+    controls = lidarprocessor.Controls()
+    progress = cuiprogress.GDALProgressBar()
+    controls.setProgress(progress)
+    controls.setSpatialProcessing(False)
+
+    lidarprocessor.doProcessing(writeFunc, dataFiles, controls=controls)
+
+    ranges = [(start, start + RANGE_SIZE)
+                for start in range(0, NPULSES, RANGE_SIZE)]
+    sequential, nLoaded = readRanges(outputLAS, ranges, {})
+
+    # the last, then the first, then backwards from the end
+    outOfOrder = [ranges[-1], ranges[0]] + ranges[-2:0:-1]
+    data, nLoaded = readRanges(outputLAS, outOfOrder, {})
+    compareRanges(sequential, data)
+    if os.path.exists(outputLAS + las.CHECKPOINT_SIDECAR_EXT):
+        msg = 'sidecar written without CHECKPOINT_SIDECAR'
+        raise utils.TestingDataMismatch(msg)
+
+    # the first read finds the checkpoints and saves them
+    for expectLoaded in (False, True):
+        data, nLoaded = readRanges(outputLAS, outOfOrder,
+                    {'CHECKPOINT_SIDECAR' : True})
+        compareRanges(sequential, data)
+        if (nLoaded > 0) != expectLoaded:
+            msg = 'sidecar loaded was %s rather than %s' % (nLoaded > 0,
+                        expectLoaded)
+            raise utils.TestingDataMismatch(msg)
+
+    print('LAS ranges ok')
@@ -0,0 +1,129 @@
+"""
+Simple testsuite that checks reading pulse ranges of a gzip compressed
+ASCII file out of order, with the index of access points and the
+checkpoint table loaded from the CHECKPOINT_SIDECAR
+"""
+
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import os
+import gzip
+import shutil
+from . import utils
+from pylidar import lidarprocessor
+from pylidar.lidarformats import generic
+from pylidar.lidarformats import ascii
+from pylidar.toolbox.translate import translatecommon
+
+REQUIRED_FORMATS = ["ASCIIGZ"]
+
+INPUT_ASCII = 'testsuite42.dat'
+INPUT_GZIP = 'testsuite42.dat.gz'
+
+NPULSES = 60000
+"""
+enough for the gzip file to be over 1MB and the uncompressed data
+to span several ascii.GZIP_INDEX_SPAN's
+"""
+
+RANGE_SIZE = 7000
+"doesn't line up with ascii.CHECKPOINT_INTERVAL"
+
+def readRanges(fname, ranges, driverOptions):
+    """
+    Reads the given (start, end) pulse ranges of the ASCII file in the
+    order given. Returns a dictionary keyed on the range of the pulses
+    and points and the driver (closed) so the number of checkpoints and
+    access points loaded from the sidecar can be checked.
+    """
+    colTypes = [(name, translatecommon.STRING_TO_DTYPE[typeString])
+                for name, typeString in utils.SYNTHETIC_ASCII_COLTYPES]
+
+    lidarFile = lidarprocessor.LidarFile(fname, lidarprocessor.READ)
+    lidarFile.setLiDARDriverOption('COL_TYPES', colTypes)
+    lidarFile.setLiDARDriverOption('PULSE_COLS',
+                utils.SYNTHETIC_ASCII_PULSE_COLS)
+    for key in driverOptions:
+        lidarFile.setLiDARDriverOption(key, driverOptions[key])
+    controls = lidarprocessor.Controls()
+    driver = generic.getReaderForLiDARFile(fname, generic.READ, controls,
+                    lidarFile)
+
+    data = {}
+    for start, end in ranges:
+        driver.setPulseRange(generic.PulseRange(start, end))
+        data[(start, end)] = (driver.readPulsesForRange(),
+                    driver.readPointsForRange())
+    driver.close()
+    return data, driver
+
+def compareRanges(expected, data):
+    """
+    Checks the data returned by readRanges() matches the expected data
+    """
+    for pulseRange in expected:
+        for oldArray, newArray in zip(expected[pulseRange],
+                    data[pulseRange]):
+            if not utils.arraysEqual(oldArray, newArray):
+                msg = 'pulses %d to %d do not match' % pulseRange
+                raise utils.TestingDataMismatch(msg)
+
+def run(oldpath, newpath):
+    """
+    Runs the 42nd basic test suite. Tests:
+
+    Reading pulse ranges of a gzip compressed ASCII file out of order
+    and backwards with the index of access points and the checkpoint
+    table built as it goes and loaded from the sidecar
+    """
+    inputASCII = os.path.join(newpath, INPUT_ASCII)
+    utils.writeSyntheticASCII(inputASCII, nPulses=NPULSES)
+
+    inputGzip = os.path.join(newpath, INPUT_GZIP)
+    with open(inputASCII, 'rb') as inFile:
+        outFile = gzip.open(inputGzip, 'wb')
+        shutil.copyfileobj(inFile, outFile)
+        outFile.close()
+
+    ranges = [(start, start + RANGE_SIZE)
+                for start in range(0, NPULSES, RANGE_SIZE)]
+    # the uncompressed file is memory mapped
+    expected, driver = readRanges(inputASCII, ranges, {})
+
+    # the last, then the first, then backwards from the end
+    outOfOrder = [ranges[-1], ranges[0]] + ranges[-2:0:-1]
+    data, driver = readRanges(inputGzip, outOfOrder, {})
+    compareRanges(expected, data)
+    if os.path.exists(inputGzip + ascii.CHECKPOINT_SIDECAR_EXT):
+        msg = 'sidecar written without CHECKPOINT_SIDECAR'
+        raise utils.TestingDataMismatch(msg)
+
+    # the first read builds the index and saves it
+    for expectLoaded in (False, True):
+        data, driver = readRanges(inputGzip, outOfOrder,
+                    {'CHECKPOINT_SIDECAR' : True})
+        compareRanges(expected, data)
+        for name, nLoaded in (('checkpoints', driver.nLoadedCheckpoints),
+                    ('access points', driver.nLoadedAccessPoints)):
+            if (nLoaded > 0) != expectLoaded:
+                msg = '%s loaded from sidecar was %s rather than %s' % (
+                            name, nLoaded > 0, expectLoaded)
+                raise utils.TestingDataMismatch(msg)
+
+    print('ASCII gzip ranges ok')
@@ -52,6 +52,17 @@ in TESTDATA_DIR.
 VERSION_FILE = 'version.txt'
 "name of the file containing the version information in the tar file"
 
+SYNTHETIC_TESTS = ['testsuite25', 'testsuite26', 'testsuite27',
+                    'testsuite28', 'testsuite29', 'testsuite30',
+                    'testsuite31', 'testsuite32', 'testsuite33',
+                    'testsuite34', 'testsuite35', 'testsuite36',
+                    'testsuite37', 'testsuite38', 'testsuite39',
+                    'testsuite40', 'testsuite41', 'testsuite42']
+"""
+tests that create their own input data in the 'new' directory. These 
+are run whatever tests the tar file lists.
+"""
+
 # maybe these should be in lidarprocessor also?
 ARRAY_TYPE_TRANSMITTED = 100
 ARRAY_TYPE_RECEIVED = 101
@@ -388,6 +399,89 @@ def compareLiDARFiles(oldfile, newfile, windowSize=None):
     oldChecksum.doCheck(newChecksum)
     print('LiDAR files check ok')
 
+def readLiDARDataFunc(data, otherArgs):
+    """
+    Internal method. Called by readLiDARData via lidarprocessor.
+    """
+    arrays = [data.input.getPulses(), data.input.getPoints(), 
+                data.input.getWaveformInfo(), data.input.getTransmitted(),
+                data.input.getReceived()]
+    for name, array in zip(otherArgs.names, arrays):
+        if array is None:
+            continue
+        # keep the mask so masked arrays can be compared
+        otherArgs.data[name].append((numpy.ma.getmaskarray(array), 
+                    numpy.ma.filled(array)))
+
+def readLiDARData(infile, driverOptions=None, windowSize=None, 
+                spatial=False):
+    """
+    Reads all the pulses, points, waveform info, transmitted and received
+    of a file (non spatially unless spatial is True) with the given 
+    driver options. Returns a dictionary with a list of the (mask, data)
+    of each block for each of these. Use compareLiDARData() to check
+    the file reads the same with different options.
+    """
+    dataFiles = lidarprocessor.DataFiles()
+    dataFiles.input = lidarprocessor.LidarFile(infile, lidarprocessor.READ)
+    if driverOptions is not None:
+        for key in driverOptions:
+            dataFiles.input.setLiDARDriverOption(key, driverOptions[key])
+
+    otherArgs = lidarprocessor.OtherArgs()
+    otherArgs.names = ['pulses', 'points', 'waveformInfo', 'transmitted', 
+                'received']
+    otherArgs.data = dict([(name, []) for name in otherArgs.names])
+
+    controls = lidarprocessor.Controls()
+    progress = cuiprogress.GDALProgressBar()
+    controls.setProgress(progress)
+    controls.setMessageHandler(lidarprocessor.silentMessageFn)
+    controls.setSpatialProcessing(spatial)
+    if windowSize is not None:
+        controls.setWindowSize(windowSize)
+
+    lidarprocessor.doProcessing(readLiDARDataFunc, dataFiles, 
+            otherArgs=otherArgs, controls=controls)
+
+    return otherArgs.data
+
+def arraysEqual(oldArray, newArray):
+    """
+    Internal method. Like numpy.array_equal() but compares structured
+    arrays field by field and treats NaNs in the same place as equal
+    (LAS files have NaN for AZIMUTH and ZENITH for example).
+    """
+    if oldArray.dtype.names is not None:
+        return all([arraysEqual(oldArray[name], newArray[name]) 
+                    for name in oldArray.dtype.names])
+    if oldArray.shape != newArray.shape:
+        return False
+    same = oldArray == newArray
+    if numpy.issubdtype(oldArray.dtype, numpy.floating):
+        same |= numpy.isnan(oldArray) & numpy.isnan(newArray)
+    return bool(numpy.all(same))
+
+def compareLiDARData(oldData, newData):
+    """
+    Compares what was returned by two calls to readLiDARData() and raises
+    an exception if they do not match.
+    """
+    for name in oldData:
+        oldBlocks = oldData[name]
+        newBlocks = newData[name]
+        if len(oldBlocks) != len(newBlocks):
+            msg = 'Different number of blocks of %s' % name
+            raise TestingDataMismatch(msg)
+        for (oldMask, oldArray), (newMask, newArray) in zip(oldBlocks, 
+                            newBlocks):
+            if (oldArray.dtype != newArray.dtype or 
+                    not numpy.array_equal(oldMask, newMask) or 
+                    not arraysEqual(oldArray, newArray)):
+                msg = '%s do not match' % name
+                raise TestingDataMismatch(msg)
+    print('LiDAR data check ok')
+
 def compareImageFiles(oldfile, newfile):
     """
     Compares two image files using gdalchksum.py
@@ -433,6 +527,33 @@ def compareNumpyFiles(oldfile, newfile):
         raise TestingDataMismatch(msg)
     print('numpy data checks ok')
 
+SYNTHETIC_ASCII_COLTYPES = [('GPS_TIME', 'FLOAT64'), ('X_IDX', 'FLOAT64'), 
+    ('Y_IDX', 'FLOAT64'), ('X', 'FLOAT64'), ('Y', 'FLOAT64'), ('Z', 'FLOAT64'),
+    ('ORIG_RETURN_NUMBER', 'UINT8'), ('CLASSIFICATION', 'UINT8')]
+"column types of the files written by writeSyntheticASCII()"
+SYNTHETIC_ASCII_PULSE_COLS = ['GPS_TIME', 'X_IDX', 'Y_IDX']
+"pulse columns of the files written by writeSyntheticASCII()"
+
+def writeSyntheticASCII(fname, nPulses=2000, seed=0):
+    """
+    Writes a time sequential ASCII file with random pulses with 
+    1 to 3 points each (see SYNTHETIC_ASCII_COLTYPES). Used by the tests
+    that create their own data. The same seed gives the same file.
+    """
+    rng = numpy.random.RandomState(seed)
+    fileh = open(fname, 'w')
+    for n in range(nPulses):
+        xIdx = rng.uniform(1000, 1100)
+        yIdx = rng.uniform(2000, 2100)
+        nReturns = rng.randint(1, 4)
+        for ret in range(nReturns):
+            x = xIdx + rng.uniform(-1, 1)
+            y = yIdx + rng.uniform(-1, 1)
+            z = rng.uniform(0, 50)
+            fileh.write('%.3f %.3f %.3f %.3f %.3f %.3f %d %d\n' % (n + 1, 
+                xIdx, yIdx, x, y, z, ret + 1, rng.randint(1, 6)))
+    fileh.close()
+
 def extractTarFile(tarFile, pathToUse='.', doVersionCheck=True):
     """
     Extracts the tarFile to the given path and checks the version matches
@@ -56,6 +56,13 @@ def getCmdargs():
             " If not specified, a temporary directory will be created and " +
             "removed at the end of processing.")
     p.add_argument("--wkt", help="projection to use for output in WKT format")
+    p.add_argument("--pointindex", default=False, action="store_true",
+        help="Also create an index on the locations of the points. " +
+            "Only for the CARTESIAN index type.")
+    p.add_argument("--compression", 
+        choices=['GZIP', 'LZF', 'NONE', 'BLOSC', 'ZSTD'],
+        help="Compression to use for the columns of the output file. " +
+            "Default is GZIP. BLOSC and ZSTD require the hdf5plugin module")
 
     cmdargs = p.parse_args()
 
@@ -98,5 +105,7 @@ def run():
                                 pulseIndexMethod=pulseindexmethod,
                                 binSize=cmdargs.resolution,
                                 blockSize=cmdargs.blocksize,
-                                wkt=cmdargs.wkt) 
+                                wkt=cmdargs.wkt,
+                                pointIndex=cmdargs.pointindex,
+                                compression=cmdargs.compression) 
 
@@ -24,9 +24,6 @@ import sys
 import pprint
 import argparse
 from pylidar.lidarformats import generic
-# need to import lidarprocessor also so we have
-# all the formats imported
-from pylidar import lidarprocessor
 
 def getCmdargs():
     """
@@ -56,6 +56,10 @@ def getCmdargs():
         help="Multiple input files will be combined in this way")
     p.add_argument("--windowsize", type=float, 
         help="Window size to use for each processing block")
+    p.add_argument("--numworkers", type=int,
+        help="Number of processes to use for processing blocks")
+    p.add_argument("--prefetch", default=False, action="store_true",
+        help="Read the next block while the current one is being processed")
     p.add_argument("--drivername", 
         help="GDAL driver to use for the output image file")
     p.add_argument("--driveroptions", nargs="+",
@@ -94,5 +98,6 @@ def run():
         cmdargs.type, cmdargs.background, cmdargs.binsize, cmdargs.module,
         cmdargs.quiet, footprint=cmdargs.footprint, 
         windowSize=cmdargs.windowsize, driverName=cmdargs.drivername,
-        driverOptions=cmdargs.driveroptions)
+        driverOptions=cmdargs.driveroptions, numWorkers=cmdargs.numworkers,
+        prefetch=cmdargs.prefetch)
 
@@ -24,21 +24,9 @@ from __future__ import print_function, division
 import sys
 import argparse
 from pylidar.lidarformats import generic
-# need to import lidarprocessor also so we have
-# all the formats imported
 from pylidar import lidarprocessor
-
-# conversion modules
-from pylidar.toolbox.translate import las2spdv4
-from pylidar.toolbox.translate import spdv32spdv4
-from pylidar.toolbox.translate import rieglrxp2spdv4
-from pylidar.toolbox.translate import rieglrdb2spdv4
-from pylidar.toolbox.translate import spdv42las
-from pylidar.toolbox.translate import ascii2spdv4
-from pylidar.toolbox.translate import lvisbin2spdv4
-from pylidar.toolbox.translate import lvishdf52spdv4
-from pylidar.toolbox.translate import pulsewaves2spdv4
-from pylidar.toolbox.translate import spdv42pulsewaves
+# conversion modules are imported below as needed
+# so we only load the drivers we are using
 
 def getCmdargs():
     """
@@ -107,6 +95,9 @@ def getCmdargs():
             "GROUND,LOWVEGE,MEDVEGE,HIGHVEGE,BUILDING,LOWPOINT,HIGHPOINT," +
             "WATER,RAIL,ROAD,BRIDGE,WIREGUARD,WIRECOND,TRANSTOWER,INSULATOR," +
             "TRUNK,FOLIAGE,BRANCH] (only for ASCII inputs)")
+    p.add_argument("--parsethreads", type=int, help="Number of threads " +
+            "used to parse uncompressed input. Default is 1. " +
+            "(only for ASCII inputs)")
     p.add_argument("--constcol", nargs=4, metavar=('type', 'varName', 'dtype', 
             'value'), action='append', help="Create a constant column in the " +
             "output file with the given type, name and value. type should be " +
@@ -115,6 +106,15 @@ def getCmdargs():
     p.add_argument("--lasscalings", default=False, action="store_true",
             help="Use the scalings and types in the LAS file in the output. " + 
             "Overrides --scaling. (only for LAS inputs)")
+    p.add_argument("--compression", 
+            choices=['GZIP', 'LZF', 'NONE', 'BLOSC', 'ZSTD'],
+            help="Compression to use for the columns of the output file. " +
+            "Default is GZIP. BLOSC and ZSTD require the hdf5plugin module " +
+            "(only for SPDV4 outputs)")
+    p.add_argument("--writebuffersize", type=int,
+            help="Number of bytes of data to hold in memory before writing " +
+            "to the output file. Default is 32Mb. 0 writes each block " +
+            "straight away (only for SPDV4 outputs)")
 
     cmdargs = p.parse_args()
 
@@ -154,33 +154,45 @@ def run():
     inFormat = info.getDriverName()
 
     if inFormat == 'LAS' and cmdargs.format == 'SPDV4':
+        from pylidar.toolbox.translate import las2spdv4
         las2spdv4.translate(info, cmdargs.input, cmdargs.output, 
                 cmdargs.range, cmdargs.spatial, cmdargs.extent, cmdargs.scaling, 
                 cmdargs.epsg, cmdargs.binsize, cmdargs.buildpulses, 
                 cmdargs.pulseindex, cmdargs.null, cmdargs.constcol,
-                cmdargs.lasscalings)
+                cmdargs.lasscalings, compression=cmdargs.compression,
+                writeBufferSize=cmdargs.writebuffersize)
 
     elif inFormat == 'SPDV3' and cmdargs.format == 'SPDV4':
+        from pylidar.toolbox.translate import spdv32spdv4
         spdv32spdv4.translate(info, cmdargs.input, cmdargs.output,
                 cmdargs.range, cmdargs.spatial, cmdargs.extent, cmdargs.scaling,
-                cmdargs.null, cmdargs.constcol)
+                cmdargs.null, cmdargs.constcol, compression=cmdargs.compression,
+                writeBufferSize=cmdargs.writebuffersize)
 
     elif inFormat == 'riegl RXP' and cmdargs.format == 'SPDV4':
+        from pylidar.toolbox.translate import rieglrxp2spdv4
         rieglrxp2spdv4.translate(info, cmdargs.input, cmdargs.output,
                 cmdargs.range, cmdargs.scaling, cmdargs.internalrotation, 
                 cmdargs.magneticdeclination, cmdargs.externalrotationfn,
-                cmdargs.null, cmdargs.constcol, epsg=cmdargs.epsg, wkt=wktStr)
+                cmdargs.null, cmdargs.constcol, epsg=cmdargs.epsg, wkt=wktStr,
+                compression=cmdargs.compression,
+                writeBufferSize=cmdargs.writebuffersize)
 
     elif inFormat == 'riegl RDB' and cmdargs.format == 'SPDV4':
+        from pylidar.toolbox.translate import rieglrdb2spdv4
         rieglrdb2spdv4.translate(info, cmdargs.input, cmdargs.output,
                 cmdargs.range, cmdargs.scaling, cmdargs.null, 
-                cmdargs.constcol, epsg=cmdargs.epsg, wkt=wktStr)
+                cmdargs.constcol, epsg=cmdargs.epsg, wkt=wktStr,
+                compression=cmdargs.compression,
+                writeBufferSize=cmdargs.writebuffersize)
 
     elif inFormat == 'SPDV4' and cmdargs.format == 'LAS':
+        from pylidar.toolbox.translate import spdv42las
         spdv42las.translate(info, cmdargs.input, cmdargs.output, 
                 cmdargs.spatial, cmdargs.extent)
 
     elif inFormat == 'ASCII' and cmdargs.format == 'SPDV4':
+        from pylidar.toolbox.translate import ascii2spdv4
 
         if cmdargs.coltype is None:
             msg = "must pass --coltypes parameter"
@@ -209,27 +221,37 @@ def run():
 
         ascii2spdv4.translate(info, cmdargs.input, cmdargs.output,
                 cmdargs.coltype, pulsecols, cmdargs.range, cmdargs.scaling, 
-                classtrans, cmdargs.null, cmdargs.constcol)
+                classtrans, cmdargs.null, cmdargs.constcol, 
+                compression=cmdargs.compression,
+                writeBufferSize=cmdargs.writebuffersize,
+                parseThreads=cmdargs.parsethreads)
 
     elif inFormat == 'LVIS Binary' and cmdargs.format == 'SPDV4':
-
+        from pylidar.toolbox.translate import lvisbin2spdv4
         lvisbin2spdv4.translate(info, cmdargs.input, cmdargs.output,
                 cmdargs.range, cmdargs.scaling, 
-                cmdargs.null, cmdargs.constcol)
+                cmdargs.null, cmdargs.constcol, 
+                compression=cmdargs.compression,
+                writeBufferSize=cmdargs.writebuffersize)
 
     elif inFormat == 'LVIS HDF5' and cmdargs.format == 'SPDV4':
-
+        from pylidar.toolbox.translate import lvishdf52spdv4
         lvishdf52spdv4.translate(info, cmdargs.input, cmdargs.output,
                 cmdargs.range, cmdargs.scaling, 
-                cmdargs.null, cmdargs.constcol)
+                cmdargs.null, cmdargs.constcol, 
+                compression=cmdargs.compression,
+                writeBufferSize=cmdargs.writebuffersize)
 
     elif inFormat == 'PulseWaves' and cmdargs.format == 'SPDV4':
-
+        from pylidar.toolbox.translate import pulsewaves2spdv4
         pulsewaves2spdv4.translate(info, cmdargs.input, cmdargs.output,
                 cmdargs.range, cmdargs.scaling, 
-                cmdargs.null, cmdargs.constcol)
+                cmdargs.null, cmdargs.constcol, 
+                compression=cmdargs.compression,
+                writeBufferSize=cmdargs.writebuffersize)
 
     elif inFormat == 'SPDV4' and cmdargs.format == 'PULSEWAVES':
+        from pylidar.toolbox.translate import spdv42pulsewaves
         spdv42pulsewaves.translate(info, cmdargs.input, cmdargs.output)
 
     else:
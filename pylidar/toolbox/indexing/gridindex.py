@@ -64,7 +64,8 @@ PULSE_INDEX_MAX_INTENSITY = spdv4.SPDV4_PULSE_INDEX_MAX_INTENSITY
 
 def createGridSpatialIndex(infile, outfile, binSize=1.0, blockSize=None, 
         tempDir=None, extent=None, indexType=INDEX_CARTESIAN,
-        pulseIndexMethod=PULSE_INDEX_FIRST_RETURN, wkt=None):
+        pulseIndexMethod=PULSE_INDEX_FIRST_RETURN, wkt=None, pointIndex=False,
+        compression=None):
     """
     Creates a grid spatially indexed file from a non spatial input file.
     Currently only supports creation of a SPD V4 file.
@@ -80,6 +81,11 @@ def createGridSpatialIndex(infile, outfile, binSize=1.0, blockSize=None,
     pulseIndexMethod is one of the PULSE_INDEX_* constants.
     wkt is the projection to use for the output. Copied from the input if
     not supplied.
+    pointIndex is whether to also create an index on the locations of the
+    points (only for INDEX_CARTESIAN). See the POINT_INDEX option of the
+    SPDV4 driver.
+    compression is the compression to use for the columns of the output
+    (see the COMPRESSION option of the SPDV4 driver). None for the default.
     nPulsesPerChunkMerge is the number of pulses to process at a time
     when merging.
 
@@ -105,7 +111,8 @@ def createGridSpatialIndex(infile, outfile, binSize=1.0, blockSize=None,
         if len(wkt) == 0:
             wkt = getDefaultWKT()
 
-    indexAndMerge(extentList, extent, wkt, outfile, header) 
+    indexAndMerge(extentList, extent, wkt, outfile, header, pointIndex,
+                compression)
     
     # delete the temp files
     for fname, extent in extentList:
@@ -465,7 +472,8 @@ def indexPulses(pulses, points, pulseIndexMethod):
 
     return xIdx, yIdx
 
-def indexAndMerge(extentList, extent, wkt, outfile, header):
+def indexAndMerge(extentList, extent, wkt, outfile, header, pointIndex=False,
+        compression=None):
     """
     Internal method to merge all the temporary files into the output
     spatially indexing as we go.
@@ -486,6 +494,10 @@ def indexAndMerge(extentList, extent, wkt, outfile, header):
     # create output file    
     userClass = lidarprocessor.LidarFile(outfile, generic.CREATE)
     userClass.setLiDARDriverOption('SCALING_BUT_NO_DATA_WARNING', False)
+    if pointIndex:
+        userClass.setLiDARDriverOption('POINT_INDEX', True)
+    if compression is not None:
+        userClass.setLiDARDriverOption('COMPRESSION', compression)
     controls = lidarprocessor.Controls()
     controls.setSpatialProcessing(True)
     outDriver = spdv4.SPDV4File(outfile, generic.CREATE, controls, userClass)
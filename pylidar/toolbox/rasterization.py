@@ -23,6 +23,7 @@ from __future__ import print_function, division
 import numpy
 import importlib
 from pylidar import lidarprocessor
+from pylidar.lidarformats import binnedarray
 from rios import cuiprogress
 
 DEFAULT_FUNCTION = "numpy.ma.min"
@@ -31,6 +32,14 @@ DEFAULT_ATTRIBUTE = 'POINT'
 POINT = 0
 PULSE = 1
 
+BINNED_REDUCERS = {numpy.ma.min : 'min', numpy.ma.max : 'max',
+    numpy.ma.sum : 'sum', numpy.ma.mean : 'mean', numpy.ma.std : 'std',
+    numpy.ma.median : 'median', numpy.ma.count : 'getCount'}
+"""
+Functions that have an equivalent method on binnedarray.BinnedArray.
+These are calculated without creating the 3d masked arrays.
+"""
+
 class RasterizationError(Exception):
     "Exception type for rasterization errors"
 
@@ -39,6 +48,10 @@ def writeImageFunc(data, otherArgs):
     Called from pylidar.lidarprocessor. Calls the nominated
     function on the data.
     """
+    if getattr(otherArgs, 'binnedReducer', None) is not None:
+        writeImageFuncBinned(data, otherArgs)
+        return
+
     # get data for each file
     if otherArgs.atype == POINT:
         dataList = [input.getPointsByBins(colNames=otherArgs.attributes)
@@ -69,9 +82,42 @@ def writeImageFunc(data, otherArgs):
 
     data.imageOut.setData(outStack)
 
+def writeImageFuncBinned(data, otherArgs):
+    """
+    Called from writeImageFunc when otherArgs.func is one of the
+    BINNED_REDUCERS. Reads the data as binnedarray.BinnedArray objects
+    and calls the matching method.
+    """
+    if otherArgs.atype == POINT:
+        dataList = [input.getPointsByBins(colNames=otherArgs.attributes,
+                    binned=True) for input in data.inList]
+    else:
+        dataList = [input.getPulsesByBins(colNames=otherArgs.attributes,
+                    binned=True) for input in data.inList]
+
+    # create output
+    nLayers = len(otherArgs.attributes)
+    (nRows, nCols) = dataList[0].shape
+    outStack = numpy.empty((nLayers, nRows, nCols), dtype=numpy.float64)
+    # a layer per attribute
+    nIdx = 0
+    for attribute in otherArgs.attributes:
+        # stack each attribute separately as the dtypes may differ
+        # between files
+        attributeData = binnedarray.BinnedArray.stack(
+                        [binned[attribute] for binned in dataList])
+        attributeDataFunc = getattr(attributeData, otherArgs.binnedReducer)()
+        outStack[nIdx] = numpy.ma.getdata(attributeDataFunc)
+        outStack[nIdx][numpy.ma.getmaskarray(attributeDataFunc)] = (
+                        otherArgs.background)
+        nIdx += 1
+
+    data.imageOut.setData(outStack)
+
 def rasterize(infiles, outfile, attributes, function=DEFAULT_FUNCTION, 
         atype=DEFAULT_ATTRIBUTE, background=0, binSize=None, extraModule=None, 
-        quiet=False, footprint=None, windowSize=None, driverName=None, driverOptions=None):
+        quiet=False, footprint=None, windowSize=None, driverName=None, driverOptions=None,
+        numWorkers=None, prefetch=False):
     """
     Apply the given function to the list of input files and create
     an output raster file. attributes is a list of attributes to run
@@ -85,6 +131,10 @@ def rasterize(infiles, outfile, attributes, function=DEFAULT_FUNCTION,
     this for modules other than numpy that are needed by your function.
     quiet means no progress etc
     footprint specifies the footprint type
+    numWorkers is the number of processes to use (see 
+    lidarprocessor.Controls.setNumWorkers)
+    prefetch means read the next block while the current one is being
+    processed (see lidarprocessor.Controls.setPrefetch)
     """
     dataFiles = lidarprocessor.DataFiles()
     dataFiles.inList = [lidarprocessor.LidarFile(fname, lidarprocessor.READ) 
@@ -118,9 +168,16 @@ def rasterize(infiles, outfile, attributes, function=DEFAULT_FUNCTION,
     if windowSize is not None:
         controls.setWindowSize(windowSize)
 
+    if numWorkers is not None:
+        controls.setNumWorkers(numWorkers)
+
+    controls.setPrefetch(prefetch)
+
     otherArgs = lidarprocessor.OtherArgs()
     # reference to the function to call
     otherArgs.func = eval(function, globalsDict)
+    # use the binned data if the function is one we can do that way
+    otherArgs.binnedReducer = BINNED_REDUCERS.get(otherArgs.func)
     otherArgs.attributes = attributes
     otherArgs.background = background
     atype = atype.upper()
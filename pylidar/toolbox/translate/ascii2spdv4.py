@@ -52,7 +52,8 @@ def transFunc(data, otherArgs):
 
 def translate(info, infile, outfile, colTypes, pulseCols=None, expectRange=None, 
         scaling=None, classificationTranslation=None, nullVals=None, 
-        constCols=None):
+        constCols=None, compression=None,
+        writeBufferSize=None, parseThreads=None):
     """
     Main function which does the work.
 
@@ -68,6 +69,10 @@ def translate(info, infile, outfile, colTypes, pulseCols=None, expectRange=None,
         number, second the lidarprocessor code.
     * nullVals is a list of tuples with (type, varname, value)
     * constCols is a list of tupes with (type, varname, dtype, value)
+    * compression and writeBufferSize are the options of the output 
+        (see translatecommon.setOutputDriverOptions()).
+    * parseThreads is the number of threads used to parse the input
+        (see the PARSE_THREADS option of the ASCII driver). None for the default.
     """
     scalingsDict = translatecommon.overRideDefaultScalings(scaling)
 
@@ -89,6 +94,9 @@ def translate(info, infile, outfile, colTypes, pulseCols=None, expectRange=None,
         dataFiles.input1.setLiDARDriverOption('CLASSIFICATION_CODES', 
                 classificationTranslation)
 
+    if parseThreads is not None:
+        dataFiles.input1.setLiDARDriverOption('PARSE_THREADS', parseThreads)
+
     controls = lidarprocessor.Controls()
     progress = cuiprogress.GDALProgressBar()
     controls.setProgress(progress)
@@ -103,6 +111,8 @@ def translate(info, infile, outfile, colTypes, pulseCols=None, expectRange=None,
     dataFiles.output1 = lidarprocessor.LidarFile(outfile, lidarprocessor.CREATE)
     dataFiles.output1.setLiDARDriver('SPDV4')
     dataFiles.output1.setLiDARDriverOption('SCALING_BUT_NO_DATA_WARNING', False)
+    translatecommon.setOutputDriverOptions(dataFiles.output1, compression,
+                    writeBufferSize)
 
     lidarprocessor.doProcessing(transFunc, dataFiles, controls=controls, 
                     otherArgs=otherArgs)
@@ -107,7 +107,8 @@ def updateScalingWithLASValues(scalingDict, input, pointsArray):
 
 def translate(info, infile, outfile, expectRange=None, spatial=None, extent=None, 
         scaling=None, epsg=None, binSize=None, buildPulses=False, pulseIndex=None, 
-        nullVals=None, constCols=None, useLASScaling=False):
+        nullVals=None, constCols=None, useLASScaling=False, compression=None,
+        writeBufferSize=None):
     """
     Main function which does the work.
 
@@ -126,6 +127,8 @@ def translate(info, infile, outfile, expectRange=None, spatial=None, extent=None
         pulses are indexed.
     * nullVals is a list of tuples with (type, varname, value)
     * constCols is a list of tupes with (type, varname, dtype, value)
+    * compression and writeBufferSize are the options of the output 
+        (see translatecommon.setOutputDriverOptions()).
     * if useLASScaling is True, then the scaling used in the LAS file
         is used for columns. Overrides anything given in 'scaling'
     
@@ -189,6 +192,13 @@ def translate(info, infile, outfile, expectRange=None, spatial=None, extent=None
     dataFiles.output1 = lidarprocessor.LidarFile(outfile, lidarprocessor.CREATE)
     dataFiles.output1.setLiDARDriver('SPDV4')
     dataFiles.output1.setLiDARDriverOption('SCALING_BUT_NO_DATA_WARNING', False)
+    translatecommon.setOutputDriverOptions(dataFiles.output1, compression,
+                    writeBufferSize)
+    # the header gives the total number of points. There can't be
+    # more pulses than points
+    nPoints = int(info.header['NUMBER_OF_POINT_RECORDS'])
+    dataFiles.output1.setLiDARDriverOption('EXPECTED_NUMBER_OF_POINTS', nPoints)
+    dataFiles.output1.setLiDARDriverOption('EXPECTED_NUMBER_OF_PULSES', nPoints)
 
     lidarprocessor.doProcessing(transFunc, dataFiles, controls=controls, 
                     otherArgs=otherArgs)
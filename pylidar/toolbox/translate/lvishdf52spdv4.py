@@ -59,7 +59,8 @@ def transFunc(data, otherArgs):
         data.output1.setReceived(revc)
 
 def translate(info, infile, outfile, expectRange=None,  
-        scaling=None, nullVals=None, constCols=None):
+        scaling=None, nullVals=None, constCols=None, compression=None,
+        writeBufferSize=None):
     """
     Main function which does the work.
 
@@ -69,6 +70,8 @@ def translate(info, infile, outfile, expectRange=None,
     * scaling is a list of tuples with (type, varname, dtype, gain, offset).
     * nullVals is a list of tuples with (type, varname, value)
     * constCols is a list of tupes with (type, varname, dtype, value)
+    * compression and writeBufferSize are the options of the output 
+        (see translatecommon.setOutputDriverOptions()).
     
     """
     scalingsDict = translatecommon.overRideDefaultScalings(scaling)
@@ -91,6 +94,11 @@ def translate(info, infile, outfile, expectRange=None,
     dataFiles.output1 = lidarprocessor.LidarFile(outfile, lidarprocessor.CREATE)
     dataFiles.output1.setLiDARDriver('SPDV4')
     dataFiles.output1.setLiDARDriverOption('SCALING_BUT_NO_DATA_WARNING', False)
+    translatecommon.setOutputDriverOptions(dataFiles.output1, compression,
+                    writeBufferSize)
+    # so the output columns can be created at their final size
+    dataFiles.output1.setLiDARDriverOption('EXPECTED_NUMBER_OF_PULSES', 
+                    int(info.totalNumberPulses))
 
     lidarprocessor.doProcessing(transFunc, dataFiles, controls=controls, 
                     otherArgs=otherArgs)
@@ -62,7 +62,8 @@ def transFunc(data, otherArgs):
         data.output1.setTransmitted(trans)
 
 def translate(info, infile, outfile, expectRange=None,  
-        scaling=None, nullVals=None, constCols=None):
+        scaling=None, nullVals=None, constCols=None, compression=None,
+        writeBufferSize=None):
     """
     Main function which does the work.
 
@@ -72,6 +73,8 @@ def translate(info, infile, outfile, expectRange=None,
     * scaling is a list of tuples with (type, varname, dtype, gain, offset).
     * nullVals is a list of tuples with (type, varname, value)
     * constCols is a list of tupes with (type, varname, dtype, value)
+    * compression and writeBufferSize are the options of the output 
+        (see translatecommon.setOutputDriverOptions()).
     
     """
     scalingsDict = translatecommon.overRideDefaultScalings(scaling)
@@ -94,6 +97,8 @@ def translate(info, infile, outfile, expectRange=None,
     dataFiles.output1 = lidarprocessor.LidarFile(outfile, lidarprocessor.CREATE)
     dataFiles.output1.setLiDARDriver('SPDV4')
     dataFiles.output1.setLiDARDriverOption('SCALING_BUT_NO_DATA_WARNING', False)
+    translatecommon.setOutputDriverOptions(dataFiles.output1, compression,
+                    writeBufferSize)
 
     lidarprocessor.doProcessing(transFunc, dataFiles, controls=controls, 
                     otherArgs=otherArgs)
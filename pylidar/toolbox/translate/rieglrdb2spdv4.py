@@ -83,7 +83,8 @@ def transFunc(data, otherArgs):
         data.output1.setPoints(points)
 
 def translate(info, infile, outfile, expectRange=None, scalings=None, 
-        nullVals=None, constCols=None, epsg=None, wkt=None):
+        nullVals=None, constCols=None, epsg=None, wkt=None, compression=None,
+        writeBufferSize=None):
     """
     Main function which does the work.
 
@@ -93,6 +94,8 @@ def translate(info, infile, outfile, expectRange=None, scalings=None,
     * scaling is a list of tuples with (type, varname, gain, offset).
     * nullVals is a list of tuples with (type, varname, value)
     * constCols is a list of tupes with (type, varname, dtype, value)
+    * compression and writeBufferSize are the options of the output 
+        (see translatecommon.setOutputDriverOptions()).
     """
     scalingsDict = translatecommon.overRideDefaultScalings(scalings)
 
@@ -123,6 +126,8 @@ def translate(info, infile, outfile, expectRange=None, scalings=None,
     dataFiles.output1 = lidarprocessor.LidarFile(outfile, lidarprocessor.CREATE)
     dataFiles.output1.setLiDARDriver('SPDV4')
     dataFiles.output1.setLiDARDriverOption('SCALING_BUT_NO_DATA_WARNING', False)
+    translatecommon.setOutputDriverOptions(dataFiles.output1, compression,
+                    writeBufferSize)
     
     lidarprocessor.doProcessing(transFunc, dataFiles, controls=controls, 
                     otherArgs=otherArgs)
@@ -108,7 +108,8 @@ def transFunc(data, otherArgs):
 def translate(info, infile, outfile, expectRange=None, scalings=None, 
         internalrotation=False, magneticdeclination=0.0, 
         externalrotationfn=None, nullVals=None, constCols=None, 
-        epsg=None, wkt=None):
+        epsg=None, wkt=None, compression=None,
+        writeBufferSize=None):
     """
     Main function which does the work.
 
@@ -123,6 +124,8 @@ def translate(info, infile, outfile, expectRange=None, scalings=None,
     * magneticdeclination. If not 0, then this will be applied to the data
     * nullVals is a list of tuples with (type, varname, value)
     * constCols is a list of tupes with (type, varname, dtype, value)
+    * compression and writeBufferSize are the options of the output 
+        (see translatecommon.setOutputDriverOptions()).
     """
     scalingsDict = translatecommon.overRideDefaultScalings(scalings)
 
@@ -182,6 +185,8 @@ def translate(info, infile, outfile, expectRange=None, scalings=None,
     dataFiles.output1 = lidarprocessor.LidarFile(outfile, lidarprocessor.CREATE)
     dataFiles.output1.setLiDARDriver('SPDV4')
     dataFiles.output1.setLiDARDriverOption('SCALING_BUT_NO_DATA_WARNING', False)
+    translatecommon.setOutputDriverOptions(dataFiles.output1, compression,
+                    writeBufferSize)
     
     lidarprocessor.doProcessing(transFunc, dataFiles, controls=controls, 
                     otherArgs=otherArgs)
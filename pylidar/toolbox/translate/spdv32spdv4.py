@@ -68,7 +68,8 @@ def transFunc(data, otherArgs):
     data.output1.setTransmitted(trans)
 
 def translate(info, infile, outfile, expectRange=None, spatial=False, 
-            extent=None, scaling=None, nullVals=None, constCols=None):
+            extent=None, scaling=None, nullVals=None, constCols=None, 
+            compression=None, writeBufferSize=None):
     """
     Main function which does the work.
 
@@ -82,6 +83,8 @@ def translate(info, infile, outfile, expectRange=None, spatial=False,
     * scaling is a list of tuples with (type, varname, gain, offset).
     * nullVals is a list of tuples with (type, varname, value)
     * constCols is a list of tupes with (type, varname, dtype, value)
+    * compression and writeBufferSize are the options of the output 
+        (see translatecommon.setOutputDriverOptions()).
     """
     scalingsDict = translatecommon.overRideDefaultScalings(scaling)
 
@@ -100,6 +103,13 @@ def translate(info, infile, outfile, expectRange=None, spatial=False,
     dataFiles.output1 = lidarprocessor.LidarFile(outfile, lidarprocessor.CREATE)
     dataFiles.output1.setLiDARDriver('SPDV4')
     dataFiles.output1.setLiDARDriverOption('SCALING_BUT_NO_DATA_WARNING', False)
+    translatecommon.setOutputDriverOptions(dataFiles.output1, compression,
+                    writeBufferSize)
+    # so the output columns can be created at their final size
+    dataFiles.output1.setLiDARDriverOption('EXPECTED_NUMBER_OF_POINTS', 
+                    int(info.header['NUMBER_OF_POINTS']))
+    dataFiles.output1.setLiDARDriverOption('EXPECTED_NUMBER_OF_PULSES', 
+                    int(info.header['NUMBER_OF_PULSES']))
 
     controls = lidarprocessor.Controls()
     progress = cuiprogress.GDALProgressBar()
@@ -177,6 +177,24 @@ def setOutputNull(nullVals, output):
 
         output.setNullValue(varName, code, value)
 
+def setOutputDriverOptions(outputFile, compression=None, 
+        writeBufferSize=None):
+    """
+    Set the SPD V4 driver options that all the translators take.
+
+    outputFile should be the instance of 
+    :class:`pylidar.lidarprocessor.LidarFile` for the output.
+
+    * compression is the compression to use for the columns of the output
+        (see the COMPRESSION option of the SPDV4 driver). None for the default.
+    * writeBufferSize is the number of bytes to buffer before writing
+        (see the WRITE_BUFFER_SIZE option of the SPDV4 driver). None for the default.
+    """
+    if compression is not None:
+        outputFile.setLiDARDriverOption('COMPRESSION', compression)
+    if writeBufferSize is not None:
+        outputFile.setLiDARDriverOption('WRITE_BUFFER_SIZE', writeBufferSize)
+
 def addConstCols(constCols, points, pulses, waveforms=None):
     """
     Add constant columns to points, pulses or waveforms
@@ -278,6 +278,23 @@ class LidarData(object):
         self.receivedToWrite = None
         self.transmittedToWrite = None
         self.waveformInfoToWrite = None
+        # set by the processor if writes are to be done on another thread
+        self.writeQueue = None
+        
+    def setWriteQueue(self, writeQueue):
+        """
+        For internal use. Used by the processor to set the 
+        writequeue.WriteQueue instance to pass writes to.
+        """
+        self.writeQueue = writeQueue
+        
+    def waitForWrites(self):
+        """
+        For internal use. Waits for any outstanding writes so other
+        methods on the driver can be called safely.
+        """
+        if self.writeQueue is not None:
+            self.writeQueue.wait()
         
     def translateFieldNames(self, otherLidarData, array, arrayType):
         """
@@ -343,7 +360,7 @@ class LidarData(object):
         
         return pulses
         
-    def getPulsesByBins(self, extent=None, colNames=None):
+    def getPulsesByBins(self, extent=None, colNames=None, binned=False):
         """
         Returns the pulses for the extent of the current block
         as a 3 dimensional structured masked array. Only valid for spatial 
@@ -361,9 +378,18 @@ class LidarData(object):
 
         colNames can be a name or list of column names to return. By default
         all columns are returned.
+        
+        Set binned to True to return a lidarformats.binnedarray.BinnedArray
+        instead of the 3 dimensional array. This holds the pulses as a 1d 
+        array sorted by bin with the start and count for each bin so uses 
+        much less memory when some bins have many more pulses than others. 
+        BinnedArrays are for reading only and can't be passed to setPulses().
         """
         if self.controls.spatialProcessing:
-            pulses = self.driver.readPulsesForExtentByBins(extent, colNames)
+            if binned:
+                pulses = self.driver.readPulsesForExtentBinned(extent, colNames)
+            else:
+                pulses = self.driver.readPulsesForExtentByBins(extent, colNames)
         else:
             msg = 'Call only valid when doing spatial processing'
             raise generic.LiDARNonSpatialProcessing(msg)
@@ -371,7 +397,7 @@ class LidarData(object):
         return pulses
         
     def getPointsByBins(self, extent=None, colNames=None, indexByPulse=False,
-                returnPulseIndex=False):
+                returnPulseIndex=False, binned=False):
         """
         Returns the points for the extent of the current block
         as a 3 dimensional structured masked array. Only valid for spatial 
@@ -395,10 +421,19 @@ class LidarData(object):
         
         Set returnPulseIndex to True to also return a 3 dimensional masked array
         containing the indexes into the 1d array returned by getPulses().
+        
+        Set binned to True to return a lidarformats.binnedarray.BinnedArray
+        instead of the 3 dimensional array (see getPulsesByBins()). 
+        If returnPulseIndex is also True the indexes are returned as a 1d 
+        array that matches the data attribute of the BinnedArray.
         """
         if self.controls.spatialProcessing:
-            points = self.driver.readPointsForExtentByBins(extent, colNames, 
-                        indexByPulse, returnPulseIndex)
+            if binned:
+                points = self.driver.readPointsForExtentBinned(extent, 
+                        colNames, indexByPulse, returnPulseIndex)
+            else:
+                points = self.driver.readPointsForExtentByBins(extent, 
+                        colNames, indexByPulse, returnPulseIndex)
         else:
             msg = 'Call only valid when doing spatial processing'
             raise generic.LiDARNonSpatialProcessing(msg)
@@ -507,30 +542,35 @@ class LidarData(object):
         """
         Returns the header as a dictionary of header key/value pairs.
         """
+        self.waitForWrites()
         return self.driver.getHeader()
         
     def setHeader(self, headerDict):
         """
         Sets header values as a dictionary of header key/value pairs.
         """
+        self.waitForWrites()
         self.driver.setHeader(headerDict)
         
     def getHeaderValue(self, name):
         """
         Gets a particular header value with the given name
         """
+        self.waitForWrites()
         return self.driver.getHeaderValue(name)
         
     def setHeaderValue(self, name, value):
         """
         Sets a particular header value with the given name
         """
+        self.waitForWrites()
         self.driver.setHeaderValue(name, value)
         
     def setHeaderValues(self, **kwargs):
         """
         Overloaded version to support key word args instead
         """
+        self.waitForWrites()
         for name in kwargs:
             self.driver.setHeaderValue(name, kwargs[name])
             
@@ -540,6 +580,7 @@ class LidarData(object):
         
         arrayType is one of the lidarprocessor.ARRAY_TYPE_* constants
         """
+        self.waitForWrites()
         self.driver.setScaling(colName, arrayType, gain, offset)
         
     def getScaling(self, colName, arrayType):
@@ -548,6 +589,7 @@ class LidarData(object):
 
         arrayType is one of the lidarprocessor.ARRAY_TYPE_* constants
         """
+        self.waitForWrites()
         return self.driver.getScaling(colName, arrayType)
         
     def setNativeDataType(self, colName, arrayType, dtype):
@@ -559,6 +601,7 @@ class LidarData(object):
         
         generic.LiDARArrayColumnError is raised if information cannot be found.
         """
+        self.waitForWrites()
         self.driver.setNativeDataType(colName, arrayType, dtype)
         
     def getNativeDataType(self, colName, arrayType):
@@ -571,8 +614,21 @@ class LidarData(object):
         
         generic.LiDARArrayColumnError is raised if information cannot be found.
         """
+        self.waitForWrites()
         return self.driver.getNativeDataType(colName, arrayType)
 
+    def setScaledDataType(self, colName, arrayType, dtype):
+        """
+        Set the dtype (numpy.float32 etc) that a column with scaling is
+        returned as when read. The default is numpy.float64. Using a smaller 
+        type saves memory for columns like INTENSITY where the extra 
+        precision is not needed.
+        
+        arrayType is one of the lidarprocessor.ARRAY_TYPE_* constants
+        """
+        self.waitForWrites()
+        self.driver.setScaledDataType(colName, arrayType, dtype)
+
     def setNullValue(self, colName, arrayType, value, scaled=True):
         """
         Set the 'null' value for the given column.
@@ -584,6 +640,7 @@ class LidarData(object):
 
         generic.LiDARArrayColumnError is raised if this cannot be set for the column.
         """
+        self.waitForWrites()
         self.driver.setNullValue(colName, arrayType, value, scaled)
 
     def getNullValue(self, colName, arrayType, scaled=True):
@@ -598,6 +655,7 @@ class LidarData(object):
         Raises generic.LiDARArrayColumnError if information cannot be
         found for the column.
         """
+        self.waitForWrites()
         return self.driver.getNullValue(colName, arrayType, scaled)    
 
     def getScalingColumns(self, arrayType):
@@ -607,6 +665,7 @@ class LidarData(object):
 
         arrayType is one of the lidarprocessor.ARRAY_TYPE_* constants
         """
+        self.waitForWrites()
         return self.driver.getScalingColumns(arrayType)
         
     def setWaveformInfo(self, info, colName=None):
@@ -716,9 +775,14 @@ class LidarData(object):
         """
         writes data to file set via the set*() functions
         """
-        self.driver.writeData(self.pulsesToWrite, self.pointsToWrite, 
-            self.transmittedToWrite, self.receivedToWrite, 
-            self.waveformInfoToWrite)
+        if self.writeQueue is not None:
+            self.writeQueue.put(self.driver.writeData, self.pulsesToWrite, 
+                self.pointsToWrite, self.transmittedToWrite, 
+                self.receivedToWrite, self.waveformInfoToWrite)
+        else:
+            self.driver.writeData(self.pulsesToWrite, self.pointsToWrite, 
+                self.transmittedToWrite, self.receivedToWrite, 
+                self.waveformInfoToWrite)
         # reset for next time
         self.pointsToWrite = None
         self.pulsesToWrite = None
@@ -738,6 +802,15 @@ class ImageData(object):
         self.mode = mode
         self.driver = driver
         self.data = None
+        # set by the processor if writes are to be done on another thread
+        self.writeQueue = None
+        
+    def setWriteQueue(self, writeQueue):
+        """
+        For internal use. Used by the processor to set the 
+        writequeue.WriteQueue instance to pass writes to.
+        """
+        self.writeQueue = writeQueue
         
     def getData(self):
         """
@@ -757,6 +830,9 @@ class ImageData(object):
         """
         Now actually do the write
         """
-        self.driver.setData(self.data)
+        if self.writeQueue is not None:
+            self.writeQueue.put(self.driver.setData, self.data)
+        else:
+            self.driver.setData(self.data)
         self.data = None
         
@@ -0,0 +1,104 @@
+
+"""
+Contains the WriteQueue class which allows the writing of data
+to a driver to happen on a separate thread to the processing.
+
+See lidarprocessor.Controls.setWriteQueueSize().
+"""
+# This file is part of PyLidar
+# Copyright (C) 2015 John Armston, Pete Bunting, Neil Flood, Sam Gillingham
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import threading
+try:
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+
+class WriteQueue(object):
+    """
+    Runs calls to a driver (writeData(), setData(), setExtent() etc)
+    on a dedicated writer thread, in the order they were added.
+
+    maxSize is the maximum number of calls that can be waiting. Once this
+    is reached, put() blocks until the writer thread has caught up. This
+    keeps the amount of data held in memory bounded.
+
+    If one of the calls raises an exception the remaining calls are
+    discarded and the exception is raised by every later call to put(),
+    wait() or close().
+    """
+    def __init__(self, driver, maxSize):
+        self.driver = driver
+        self.queue = queue.Queue(maxSize)
+        self.error = None
+        self.thread = threading.Thread(target=self.writerThread)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def writerThread(self):
+        """
+        Internal method. Runs on the writer thread and processes
+        calls in the queue until None is received.
+        """
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    break
+
+                if self.error is None:
+                    func, args = item
+                    func(*args)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def checkError(self):
+        """
+        Raise any exception that occured on the writer thread.
+        The error is kept so nothing more is written.
+        """
+        if self.error is not None:
+            raise self.error
+
+    def put(self, func, *args):
+        """
+        Add a call of func with args to the queue. Blocks if the
+        queue is full.
+        """
+        self.checkError()
+        self.queue.put((func, args))
+
+    def wait(self):
+        """
+        Wait for all the calls in the queue to complete. Needed
+        before calling any other methods on the driver.
+        """
+        self.queue.join()
+        self.checkError()
+
+    def close(self):
+        """
+        Wait for all the calls to complete and stop the writer thread.
+        Does not close the driver.
+        """
+        self.queue.put(None)
+        self.thread.join()
+        self.checkError()
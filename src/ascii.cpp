@@ -25,6 +25,9 @@
 #include <string.h>
 #include <ctype.h>
 #include <new>
+#include <vector>
+#include <thread>
+#include <algorithm>
 #include <Python.h>
 #include "numpy/arrayobject.h"
 #include "pylvector.h"
@@ -38,12 +41,27 @@
     #define _CRT_SECURE_NO_WARNINGS
 #endif
 
+// for memory mapping uncompressed files
+#ifdef _WIN32
+    #define NOMINMAX // we want std::min/max
+    #include <windows.h>
+#else
+    #include <sys/mman.h>
+    #include <sys/stat.h>
+    #include <fcntl.h>
+    #include <unistd.h>
+#endif
+
 // for CVector
 static const int nGrowBy = 10000;
 static const int nInitSize = 256*256;
 
 static const int nMaxLineSize = 8192;
 
+// number of pulses between entries in the checkpoint table
+// of pulse offsets
+static const long CHECKPOINT_INTERVAL = 10000;
+
 /* An exception object for this module */
 /* created in the init function */
 struct ASCIIState
@@ -122,10 +140,11 @@ static PyObject *ascii_getFileType(PyObject *self, PyObject *args)
     if( (nType == ASCII_UNKNOWN ) && ( nLen >= 4 ) && ((strcmp(pszLastExt, ".dat") == 0 ) ||
             (strcmp(pszLastExt, ".csv") == 0 ) || (strcmp(pszLastExt, ".txt") == 0 )) )
     {
-        // just check first char is a digit or a space or a comment
+        // just check first char could start a number or is a space or a comment
         // TODO: should we able to configure what is a comment like we do below in the reader?
         // not always able to - eg from file info we don't have the driver opyions
-        if( (aData[0] == ' ') || isdigit(aData[0]) || (aData[0] == '#') )
+        if( (aData[0] == ' ') || (aData[0] == '\t') || isdigit(aData[0]) || (aData[0] == '-') || 
+                (aData[0] == '+') || (aData[0] == '.') || (aData[0] == '#') )
         {
             nType = ASCII_UNCOMPRESSED;
         }
@@ -177,6 +196,325 @@ static struct PyModuleDef moduledef = {
 };
 #endif
 
+#ifdef HAVE_ZLIB
+// size of the window of uncompressed data inflate() needs to restart
+static const int nGzipWindowSize = 32768;
+// bytes of compressed data read from the file at a time
+static const int nGzipChunkSize = 65536;
+// minimum number of uncompressed bytes between entries in the
+// index of gzip access points
+static const long GZIP_INDEX_SPAN = 1048576;
+
+#ifdef _WIN32
+    #define ascii_fseek _fseeki64
+#else
+    #define ascii_fseek fseeko
+#endif
+
+/* Access points for restarting decompression of a gzip file */
+/* part way through. One element in each vector per access point */
+struct SGzipIndex
+{
+    std::vector<npy_int64> outOffsets; // offset in the uncompressed data
+    std::vector<npy_int64> inOffsets; // offset in the file of the first whole byte
+    std::vector<npy_uint8> bits; // bits (0-7) of the byte before inOffset that are needed
+    std::vector<unsigned char> windows; // the nGzipWindowSize bytes of uncompressed data before outOffset
+};
+
+// Reads a gzip file with inflate() rather than gzgets() so an index of
+// access points can be built as the file is decompressed (like zlib's
+// examples/zran.c). Each access point is at the start of a deflate
+// block and decompression can be restarted from any of them, so
+// seek() doesn't have to decompress from the start of the file.
+class CGzipReader
+{
+public:
+    CGzipReader()
+    {
+        m_pFH = NULL;
+        m_bStreamInit = false;
+        m_pszError = NULL;
+        m_pIn = new unsigned char[nGzipChunkSize];
+        m_pWindow = new unsigned char[nGzipWindowSize];
+        memset(&m_strm, 0, sizeof(m_strm));
+    }
+    ~CGzipReader()
+    {
+        if( m_bStreamInit )
+            inflateEnd(&m_strm);
+        if( m_pFH != NULL )
+            fclose(m_pFH);
+        delete[] m_pIn;
+        delete[] m_pWindow;
+    }
+
+    bool open(const char *pszFname)
+    {
+        m_pFH = fopen(pszFname, "rb");
+        if( m_pFH == NULL )
+            return false;
+
+        // 15 + 32 - gzip (or zlib) header expected
+        if( inflateInit2(&m_strm, 47) != Z_OK )
+            return false;
+        m_bStreamInit = true;
+
+        return restart(0);
+    }
+
+    // same as gzgets(). Returns NULL at the end of the file or if
+    // there is an error (getError() is then not NULL).
+    char *gets(char *pszBuffer, int nLength)
+    {
+        int n = 0;
+        while( n < ( nLength - 1 ) )
+        {
+            if( ( m_nReadPos == m_nWritePos ) && !fill() )
+                break;
+
+            const unsigned char *pStart = m_pWindow + m_nReadPos;
+            int nAvail = std::min(m_nWritePos - m_nReadPos, nLength - 1 - n);
+            const unsigned char *pNewLine = (const unsigned char*)memchr(pStart, '\n', nAvail);
+            int nCopy = (pNewLine != NULL) ? (pNewLine - pStart + 1) : nAvail;
+            memcpy(&pszBuffer[n], pStart, nCopy);
+            n += nCopy;
+            m_nReadPos += nCopy;
+            if( pNewLine != NULL )
+                break;
+        }
+
+        if( n == 0 )
+            return NULL;
+        pszBuffer[n] = '\0';
+        return pszBuffer;
+    }
+
+    // offset in the uncompressed data of the next byte gets() returns
+    npy_int64 tell()
+    {
+        return m_nOutPos - ( m_nWritePos - m_nReadPos );
+    }
+
+    // move to nOffset in the uncompressed data. Decompression is restarted 
+    // from the closest access point if that is nearer than where we are now.
+    // Returns false on error.
+    bool seek(npy_int64 nOffset)
+    {
+        const std::vector<npy_int64> &outOffsets = m_index.outOffsets;
+        // number of access points at or before nOffset
+        size_t nPoints = std::upper_bound(outOffsets.begin(), outOffsets.end(), 
+                                nOffset) - outOffsets.begin();
+        if( ( nOffset < tell() ) || ( ( nPoints > 0 ) && ( outOffsets[nPoints - 1] > tell() ) ) )
+        {
+            if( !restart(nPoints) )
+                return false;
+        }
+
+        // decompress and throw away until we get there
+        while( tell() < nOffset )
+        {
+            if( ( m_nReadPos == m_nWritePos ) && !fill() )
+                break;
+            m_nReadPos += (int)std::min((npy_int64)(m_nWritePos - m_nReadPos), nOffset - tell());
+        }
+        return m_pszError == NULL;
+    }
+
+    const char *getError()
+    {
+        return m_pszError;
+    }
+
+    SGzipIndex *getIndex()
+    {
+        return &m_index;
+    }
+
+private:
+    // start decompressing from access point nPoint - 1 or the start of 
+    // the file if nPoint is 0.
+    bool restart(size_t nPoint)
+    {
+        npy_int64 nIn = 0;
+        int nBits = 0;
+        if( nPoint > 0 )
+        {
+            nIn = m_index.inOffsets[nPoint - 1];
+            nBits = m_index.bits[nPoint - 1];
+        }
+        if( nBits > 0 )
+            nIn--;
+
+        if( ascii_fseek(m_pFH, nIn, SEEK_SET) != 0 )
+        {
+            m_pszError = "Unable to seek in gzip file";
+            return false;
+        }
+        m_nInPos = nIn;
+        m_strm.avail_in = 0;
+        m_bEOF = false;
+        m_pszError = NULL;
+
+        if( nPoint == 0 )
+        {
+            inflateReset2(&m_strm, 47);
+            m_bRaw = false;
+            memset(m_pWindow, 0, nGzipWindowSize);
+            m_nOutPos = 0;
+            m_nWritePos = 0;
+            m_nReadPos = 0;
+            return true;
+        }
+
+        // part way through a deflate stream so no header
+        inflateReset2(&m_strm, -15);
+        m_bRaw = true;
+        if( nBits > 0 )
+        {
+            int c = fgetc(m_pFH);
+            if( c == EOF )
+            {
+                m_pszError = "Unable to read gzip file";
+                return false;
+            }
+            m_nInPos++;
+            inflatePrime(&m_strm, nBits, c >> (8 - nBits));
+        }
+        const unsigned char *pWindow = &m_index.windows[(nPoint - 1) * nGzipWindowSize];
+        inflateSetDictionary(&m_strm, pWindow, nGzipWindowSize);
+        // the window continues on from here
+        memcpy(m_pWindow, pWindow, nGzipWindowSize);
+        m_nOutPos = m_index.outOffsets[nPoint - 1];
+        m_nWritePos = nGzipWindowSize;
+        m_nReadPos = nGzipWindowSize;
+        return true;
+    }
+
+    // make sure at least nBytes of compressed data are available
+    bool ensureInput(unsigned int nBytes)
+    {
+        if( m_strm.avail_in < nBytes )
+        {
+            memmove(m_pIn, m_strm.next_in, m_strm.avail_in);
+            size_t nRead = fread(&m_pIn[m_strm.avail_in], 1, nGzipChunkSize - m_strm.avail_in, m_pFH);
+            m_nInPos += nRead;
+            m_strm.next_in = m_pIn;
+            m_strm.avail_in += nRead;
+        }
+        return m_strm.avail_in >= nBytes;
+    }
+
+    // called at the end of a gzip member. Returns true if another follows.
+    bool nextMember()
+    {
+        if( m_bRaw )
+        {
+            // inflate doesn't read the 8 byte gzip trailer in raw mode
+            if( !ensureInput(8) )
+                return false;
+            m_strm.next_in += 8;
+            m_strm.avail_in -= 8;
+        }
+
+        // anything other than another gzip header is ignored like gzread() does
+        if( !ensureInput(2) || ( m_strm.next_in[0] != 0x1f ) || ( m_strm.next_in[1] != 0x8b ) )
+            return false;
+
+        inflateReset2(&m_strm, 47);
+        m_bRaw = false;
+        return true;
+    }
+
+    void addAccessPoint(int nWritePos)
+    {
+        std::vector<npy_int64> &outOffsets = m_index.outOffsets;
+        npy_int64 nOut = m_nOutPos + ( nWritePos - m_nWritePos );
+        npy_int64 nLast = outOffsets.empty() ? 0 : outOffsets.back();
+        if( ( nOut - nLast ) < GZIP_INDEX_SPAN )
+            return;
+
+        outOffsets.push_back(nOut);
+        m_index.inOffsets.push_back(m_nInPos - m_strm.avail_in);
+        m_index.bits.push_back(m_strm.data_type & 7);
+        // the last nGzipWindowSize bytes of uncompressed data
+        size_t nSize = m_index.windows.size();
+        m_index.windows.resize(nSize + nGzipWindowSize);
+        unsigned char *pWindow = &m_index.windows[nSize];
+        memcpy(pWindow, &m_pWindow[nWritePos], nGzipWindowSize - nWritePos);
+        memcpy(&pWindow[nGzipWindowSize - nWritePos], m_pWindow, nWritePos);
+    }
+
+    // decompress some more data into m_pWindow. Only called once everything
+    // decompressed so far has been read. Returns false at the end of the file.
+    bool fill()
+    {
+        if( m_bEOF || ( m_pszError != NULL ) )
+            return false;
+
+        if( m_nWritePos == nGzipWindowSize )
+        {
+            m_nWritePos = 0;
+            m_nReadPos = 0;
+        }
+        m_strm.next_out = &m_pWindow[m_nWritePos];
+        m_strm.avail_out = nGzipWindowSize - m_nWritePos;
+
+        // stop at the end of each block (Z_BLOCK) so access points can be added
+        while( !m_bEOF && ( m_strm.avail_out == (unsigned int)( nGzipWindowSize - m_nWritePos ) ) )
+        {
+            if( !ensureInput(1) )
+            {
+                if( ferror(m_pFH) )
+                    m_pszError = "Unable to read gzip file";
+                // else truncated. Stop here like gzgets().
+                m_bEOF = true;
+                break;
+            }
+
+            int nRet = inflate(&m_strm, Z_BLOCK);
+            if( ( nRet == Z_NEED_DICT ) || ( nRet == Z_DATA_ERROR ) || ( nRet == Z_MEM_ERROR ) )
+            {
+                m_pszError = "Error decompressing gzip file";
+                m_bEOF = true;
+            }
+            else if( nRet == Z_STREAM_END )
+            {
+                if( !nextMember() )
+                    m_bEOF = true;
+            }
+            else if( ( m_strm.data_type & 128 ) && !( m_strm.data_type & 64 ) )
+            {
+                // at the start of a block that isn't the last one
+                addAccessPoint(nGzipWindowSize - m_strm.avail_out);
+            }
+        }
+
+        int nNewWritePos = nGzipWindowSize - m_strm.avail_out;
+        m_nOutPos += nNewWritePos - m_nWritePos;
+        m_nWritePos = nNewWritePos;
+        return ( m_nReadPos < m_nWritePos );
+    }
+
+    FILE *m_pFH;
+    z_stream m_strm;
+    bool m_bStreamInit;
+    bool m_bRaw; // true when restarted from an access point
+    bool m_bEOF;
+    const char *m_pszError;
+    unsigned char *m_pIn;
+    npy_int64 m_nInPos; // offset in the file after what has been read into m_pIn
+    // the last nGzipWindowSize bytes decompressed (circular). What has
+    // been decompressed but not read is between m_nReadPos and m_nWritePos.
+    unsigned char *m_pWindow;
+    int m_nReadPos;
+    int m_nWritePos;
+    npy_int64 m_nOutPos; // offset in the uncompressed data of m_nWritePos
+    SGzipIndex m_index;
+};
+#endif
+
+class CReadState;
+
 /* Python object wrapping a file reader */
 typedef struct 
 {
@@ -184,10 +522,14 @@ typedef struct
 
     // one of these will be non-null
 #ifdef HAVE_ZLIB
-    gzFile  gz_file;
+    CGzipReader *pGzip;
 #endif
     FILE    *unc_file; // uncompressed
 
+    // state of reads with CReadState. Kept between calls to readData
+    // so pulses can span blocks. NULL until first needed.
+    CReadState *pReadState;
+
     Py_ssize_t nPulsesRead;
     bool bFinished;
     bool bTimeSequential;
@@ -201,8 +543,105 @@ typedef struct
     SpylidarFieldDefn *pPointDefn;
     int *pPointLineIdxs;
 
+    // uncompressed files are memory mapped if possible and
+    // read with the functions below instead of CReadState.
+    // NULL if not mapped.
+    const char *pMapped;
+    npy_int64 nMappedSize;
+#ifdef _WIN32
+    HANDLE hMapping;
+#endif
+    int nParseThreads; // threads parsing a mapped file at once
+    npy_int64 nNextOffset; // offset in the mapped file of pulse nPulsesRead
+    std::vector<npy_int64> *pCheckpoints; // offset of every CHECKPOINT_INTERVAL'th pulse
+
 } PyASCIIReader;
 
+/* Record that pulse nPulse starts at nOffset if it is */
+/* the next entry needed in the checkpoint table */
+static void
+PyASCIIReader_addCheckpoint(PyASCIIReader *self, Py_ssize_t nPulse, npy_int64 nOffset)
+{
+    if( ( ( nPulse % CHECKPOINT_INTERVAL ) == 0 ) && 
+        ( (size_t)( nPulse / CHECKPOINT_INTERVAL ) == self->pCheckpoints->size() ) )
+    {
+        self->pCheckpoints->push_back(nOffset);
+    }
+}
+
+// memory map an uncompressed file. Leaves self->pMapped as NULL if
+// this fails so the file is read with CReadState instead.
+static void 
+PyASCIIReader_mapFile(PyASCIIReader *self, const char *pszFname)
+{
+#ifdef _WIN32
+    HANDLE hFile = CreateFileA(pszFname, GENERIC_READ, FILE_SHARE_READ, NULL, 
+                        OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL, NULL);
+    if( hFile == INVALID_HANDLE_VALUE )
+        return;
+
+    LARGE_INTEGER size;
+    if( !GetFileSizeEx(hFile, &size) || ( size.QuadPart == 0 ) )
+    {
+        CloseHandle(hFile);
+        return;
+    }
+
+    // the mapping keeps the file open
+    self->hMapping = CreateFileMappingA(hFile, NULL, PAGE_READONLY, 0, 0, NULL);
+    CloseHandle(hFile);
+    if( self->hMapping == NULL )
+        return;
+
+    void *pData = MapViewOfFile(self->hMapping, FILE_MAP_READ, 0, 0, 0);
+    if( pData == NULL )
+    {
+        CloseHandle(self->hMapping);
+        self->hMapping = NULL;
+        return;
+    }
+    self->pMapped = (const char*)pData;
+    self->nMappedSize = size.QuadPart;
+#else
+    int fd = open(pszFname, O_RDONLY);
+    if( fd < 0 )
+        return;
+
+    struct stat statBuf;
+    if( ( fstat(fd, &statBuf) != 0 ) || ( statBuf.st_size == 0 ) )
+    {
+        close(fd);
+        return;
+    }
+
+    // the mapping keeps the file open
+    void *pData = mmap(NULL, statBuf.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if( pData == MAP_FAILED )
+        return;
+
+    // mostly read from start to end
+    madvise(pData, statBuf.st_size, MADV_SEQUENTIAL);
+    self->pMapped = (const char*)pData;
+    self->nMappedSize = statBuf.st_size;
+#endif
+}
+
+static void 
+PyASCIIReader_unmapFile(PyASCIIReader *self)
+{
+    if( self->pMapped == NULL )
+        return;
+#ifdef _WIN32
+    UnmapViewOfFile(self->pMapped);
+    CloseHandle(self->hMapping);
+    self->hMapping = NULL;
+#else
+    munmap((void*)self->pMapped, self->nMappedSize);
+#endif
+    self->pMapped = NULL;
+}
+
 void FreeDefn(SpylidarFieldDefn *pDefn, int nFields)
 {
     for( int i = 0; i < nFields; i++ )
@@ -365,11 +804,11 @@ static int
 PyASCIIReader_init(PyASCIIReader *self, PyObject *args, PyObject *kwds)
 {
     const char *pszFname = NULL, *pszCommentChar = NULL;
-    int nType, nTimeSequential;
+    int nType, nTimeSequential, nParseThreads = 1;
     PyObject *pPulseDTypeList, *pPointDTypeList;
 
-    if( !PyArg_ParseTuple(args, "siOOis", &pszFname, &nType, &pPulseDTypeList,
-                &pPointDTypeList, &nTimeSequential, &pszCommentChar ) )
+    if( !PyArg_ParseTuple(args, "siOOis|i", &pszFname, &nType, &pPulseDTypeList,
+                &pPointDTypeList, &nTimeSequential, &pszCommentChar, &nParseThreads ) )
     {
         return -1;
     }
@@ -378,15 +817,24 @@ PyASCIIReader_init(PyASCIIReader *self, PyObject *args, PyObject *kwds)
 
     // nType should come from getFileType()
 #ifdef HAVE_ZLIB
-    self->gz_file = NULL;
+    self->pGzip = NULL;
 #endif
     self->unc_file = NULL;
+    self->pReadState = NULL;
+    self->pMapped = NULL;
+    self->nMappedSize = 0;
+#ifdef _WIN32
+    self->hMapping = NULL;
+#endif
+    self->nParseThreads = std::max(nParseThreads, 1);
+    self->nNextOffset = 0;
+    self->pCheckpoints = new std::vector<npy_int64>();
 
     if( nType == ASCII_GZIP )
     {
 #ifdef HAVE_ZLIB
-        self->gz_file = gzopen(pszFname, "rb");
-        if( self->gz_file == NULL )
+        self->pGzip = new CGzipReader();
+        if( !self->pGzip->open(pszFname) )
         {
             PyErr_SetString(error, "Unable to open file");
             return -1;
@@ -404,6 +852,8 @@ PyASCIIReader_init(PyASCIIReader *self, PyObject *args, PyObject *kwds)
             PyErr_SetString(error, "Unable to open file");
             return -1;
         }
+        // read with the mapped functions if we can
+        PyASCIIReader_mapFile(self, pszFname);
     }
     else
     {
@@ -447,20 +897,28 @@ PyASCIIReader_init(PyASCIIReader *self, PyObject *args, PyObject *kwds)
     return 0;
 }
 
+static void PyASCIIReader_deleteReadState(PyASCIIReader *self);
+
 /* destructor - close and delete */
 static void 
 PyASCIIReader_dealloc(PyASCIIReader *self)
 {
 #ifdef HAVE_ZLIB
-    if( self->gz_file != NULL )
+    if( self->pGzip != NULL )
     {
-        gzclose(self->gz_file);
+        delete self->pGzip;
     }
 #endif
     if( self->unc_file != NULL )
     {
         fclose(self->unc_file);
     }
+    PyASCIIReader_deleteReadState(self);
+    PyASCIIReader_unmapFile(self);
+    if( self->pCheckpoints != NULL )
+    {
+        delete self->pCheckpoints;
+    }
     if( self->pPulseDefn != NULL )
     {
         FreeDefn( self->pPulseDefn, self->nPulseFields);
@@ -479,123 +937,545 @@ PyASCIIReader_dealloc(PyASCIIReader *self)
     }
 }
 
-class CReadState
+// powers of 10 that can be represented exactly as a double
+static const double aExactPowersOf10[] = {1e0, 1e1, 1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 
+        1e8, 1e9, 1e10, 1e11, 1e12, 1e13, 1e14, 1e15, 1e16, 1e17, 1e18, 1e19, 
+        1e20, 1e21, 1e22};
+static const int nMaxExactPowerOf10 = 22;
+// largest integer a double can hold exactly (2^53)
+static const npy_uint64 nMaxExactMantissa = 9007199254740992ULL;
+
+// parse the digits of an integer field of nLength chars (not 
+// necessarily null terminated). Stops at the first char that isn't
+// a digit like strtoull does. Unlike strtoull it doesn't depend on the
+// locale and doesn't need a null.
+static npy_uint64 parseUInt(const char *pszString, int nLength)
 {
-public:
-    CReadState(int nFields, char cCommentChar)
+    const char *p = pszString;
+    const char *pEnd = pszString + nLength;
+    bool bNegative = false;
+    if( ( p < pEnd ) && ( ( *p == '-' ) || ( *p == '+' ) ) )
     {
-        m_bFirst = true;
-        m_nFields = nFields;
-        m_cCommentChar = cCommentChar;
-        m_pszCurrentLine = (char*)malloc(nMaxLineSize * sizeof(char));
-        if( m_pszCurrentLine == NULL )
+        bNegative = (*p == '-');
+        p++;
+    }
+    npy_uint64 nVal = 0;
+    while( ( p < pEnd ) && ( *p >= '0' ) && ( *p <= '9' ) )
+    {
+        nVal = (nVal * 10) + (*p - '0');
+        p++;
+    }
+    // strtoull negates too
+    if( bNegative )
+        nVal = (npy_uint64)0 - nVal;
+    return nVal;
+}
+
+// as for parseUInt, but signed
+static npy_int64 parseInt(const char *pszString, int nLength)
+{
+    return (npy_int64)parseUInt(pszString, nLength);
+}
+
+// parse a floating point field of nLength chars (not necessarily null 
+// terminated). Most numbers are converted exactly with a few 
+// multiplications (when the digits fit in a double and the power of 10 is
+// small - see Clinger 1990). Others, like those with many digits or nan/inf,
+// are passed to strtod.
+// Unlike atof the decimal point is always '.' whatever the locale.
+static double parseDouble(const char *pszString, int nLength)
+{
+    const char *p = pszString;
+    const char *pEnd = pszString + nLength;
+    bool bNegative = false;
+    if( ( p < pEnd ) && ( ( *p == '-' ) || ( *p == '+' ) ) )
+    {
+        bNegative = (*p == '-');
+        p++;
+    }
+
+    npy_uint64 nMantissa = 0;
+    int nSigDigits = 0; // digits in nMantissa (not counting leading zeros)
+    int nExp10 = 0;
+    bool bDigits = false;
+    while( ( p < pEnd ) && ( *p >= '0' ) && ( *p <= '9' ) )
+    {
+        if( nSigDigits < 19 )
         {
-            throw std::bad_alloc();
+            nMantissa = (nMantissa * 10) + (*p - '0');
+            if( nMantissa > 0 )
+                nSigDigits++;
         }
-        m_pszLastLine = (char*)malloc(nMaxLineSize * sizeof(char));
-        if( m_pszLastLine == NULL )
+        else
         {
-            free(m_pszCurrentLine);
-            throw std::bad_alloc();
+            // too many to keep. Not exact so strtod used below
+            nExp10++;
+        }
+        bDigits = true;
+        p++;
+    }
+    if( ( p < pEnd ) && ( *p == '.' ) )
+    {
+        p++;
+        while( ( p < pEnd ) && ( *p >= '0' ) && ( *p <= '9' ) )
+        {
+            if( nSigDigits < 19 )
+            {
+                nMantissa = (nMantissa * 10) + (*p - '0');
+                if( nMantissa > 0 )
+                    nSigDigits++;
+                nExp10--;
+            }
+            bDigits = true;
+            p++;
         }
+    }
 
-        m_pnCurrentColIdxs = (int*)malloc(nFields * sizeof(int));
-        if( m_pnCurrentColIdxs == NULL )
+    bool bFast = bDigits;
+    if( bFast && ( p < pEnd ) && ( ( *p == 'e' ) || ( *p == 'E' ) ) )
+    {
+        p++;
+        bool bNegativeExp = false;
+        if( ( p < pEnd ) && ( ( *p == '-' ) || ( *p == '+' ) ) )
         {
-            free(m_pszCurrentLine);
-            free(m_pszLastLine);
-            throw std::bad_alloc();
+            bNegativeExp = (*p == '-');
+            p++;
         }
-        m_pnLastColIdxs = (int*)malloc(nFields * sizeof(int));
-        if( m_pnLastColIdxs == NULL )
+        int nExp = 0;
+        bool bExpDigits = false;
+        while( ( p < pEnd ) && ( *p >= '0' ) && ( *p <= '9' ) )
         {
-            free(m_pszCurrentLine);
-            free(m_pszLastLine);
-            free(m_pnCurrentColIdxs);
-            throw std::bad_alloc();
+            if( nExp < 10000 )
+                nExp = (nExp * 10) + (*p - '0');
+            bExpDigits = true;
+            p++;
+        }
+        if( bExpDigits )
+        {
+            if( bNegativeExp )
+                nExp = -nExp;
+            nExp10 += nExp;
+        }
+        else
+        {
+            // leave to strtod
+            bFast = false;
         }
     }
-    ~CReadState()
+
+    if( bFast && ( nMantissa == 0 ) )
     {
-        free(m_pszCurrentLine);
-        free(m_pszLastLine);
-        free(m_pnCurrentColIdxs);
-        free(m_pnLastColIdxs);
+        return bNegative ? -0.0 : 0.0;
     }
 
-    bool getNewLine(PyASCIIReader *self, const char **pszErrorString)
+    if( bFast && ( nMantissa <= nMaxExactMantissa ) && 
+            ( nExp10 >= -nMaxExactPowerOf10 ) && ( nExp10 <= nMaxExactPowerOf10 ) )
     {
-        // read into last line then clobber
-        // try the various reader handles...
-        bool bIsComment = true;
-        int nStartIdx;
-        while(bIsComment)
+        double dVal = (double)nMantissa;
+        if( nExp10 < 0 )
+            dVal /= aExactPowersOf10[-nExp10];
+        else
+            dVal *= aExactPowersOf10[nExp10];
+        return bNegative ? -dVal : dVal;
+    }
+
+    // strtod needs a null terminated string
+    char szBuffer[128];
+    int nCopy = std::min(nLength, (int)sizeof(szBuffer) - 1);
+    memcpy(szBuffer, pszString, nCopy);
+    szBuffer[nCopy] = '\0';
+    return strtod(szBuffer, NULL);
+}
+
+// convert the nLength chars at pszString (not necessarily null terminated) 
+// to the type of the field and copy it into the record
+static void convertField(const char *pszString, int nLength, SpylidarFieldDefn *pElDefn, char *pRecord)
+{
+    if( pElDefn->cKind == 'i' )
+    {
+        npy_int64 data = parseInt(pszString, nLength);
+#if defined (_MSC_VER) && _MSC_VER < 1900
+        #define PRINTF_IFMT "%I64d"
+#else
+        #define PRINTF_IFMT "%lld"
+#endif            
+        switch(pElDefn->nSize)
         {
-#ifdef HAVE_ZLIB
-            if( self->gz_file != NULL )
+            case 1:
             {
-                if( gzgets(self->gz_file, m_pszLastLine, nMaxLineSize) == NULL)
+                if( (data < NPY_MIN_INT8) || (data > NPY_MAX_INT8))
                 {
-                    return false;
+                    // TODO: exception?
+                    fprintf(stderr, "Column %s data outside range of type (" PRINTF_IFMT ")\n", pElDefn->pszName, (long long)data);
                 }
+                npy_int8 d = (npy_int8)data;
+                memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
+                break;
             }
-#endif
-            if( self->unc_file != NULL )
+            case 2:
             {
-                if( fgets(m_pszLastLine, nMaxLineSize, self->unc_file) == NULL)
+                if( (data < NPY_MIN_INT16) || (data > NPY_MAX_INT16))
                 {
-                    return false;
+                    // TODO: exception?
+                    fprintf(stderr, "Column %s data outside range of type (" PRINTF_IFMT ")\n", pElDefn->pszName, (long long)data);
                 }
+                npy_int16 d = (npy_int16)data;
+                memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
+                break;
             }
-
-            // find first idx, some files have spaces etc at the start of the line
-            nStartIdx = 0;
-            while(isspace(m_pszLastLine[nStartIdx]) && (nStartIdx < nMaxLineSize))
-                nStartIdx++;
-
-            bIsComment = (m_pszLastLine[nStartIdx] == m_cCommentChar);
-        }
-
-        char *pszOldCurrent = m_pszCurrentLine;
-        m_pszCurrentLine = m_pszLastLine;
-        m_pszLastLine = pszOldCurrent;
-
-        // now do the indices
-        int *pnOldLast = m_pnLastColIdxs;
-        m_pnLastColIdxs = m_pnCurrentColIdxs;
-        m_pnCurrentColIdxs = pnOldLast;
-
-        m_pnCurrentColIdxs[0] = nStartIdx;
-        for( int i = 1; i < m_nFields; i++ )
-        {
-            // go through all the numbers
-            while((isdigit(m_pszCurrentLine[nStartIdx]) || (m_pszCurrentLine[nStartIdx] == '.') || (m_pszCurrentLine[nStartIdx] == '-')) 
-                        && (nStartIdx < nMaxLineSize))
-                nStartIdx++;
-
-            // then anything in between - setting to \0 while we are at it
-            while(((m_pszCurrentLine[nStartIdx] == ' ') || (m_pszCurrentLine[nStartIdx] == ',') || (m_pszCurrentLine[nStartIdx] == '\t')) 
-                        && (nStartIdx < nMaxLineSize))
+            case 4:
             {
-                m_pszCurrentLine[nStartIdx] = '\0';
-                nStartIdx++;
+                if( (data < NPY_MIN_INT32) || (data > NPY_MAX_INT32))
+                {
+                    // TODO: exception?
+                    fprintf(stderr, "Column %s data outside range of type (" PRINTF_IFMT ")\n", pElDefn->pszName, (long long)data);
+                }
+                npy_int32 d = (npy_int32)data;
+                memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
+                break;
             }
-
-            if( (m_pszCurrentLine[nStartIdx] == '\n' ) || (m_pszCurrentLine[nStartIdx] == '\r'))
+            case 8:
             {
-                *pszErrorString = "Number of columns in file does not match expected";
-                return false;
+                if( (data < NPY_MIN_INT64) || (data > NPY_MAX_INT64))
+                {
+                    // TODO: exception?
+                    fprintf(stderr, "Column %s data outside range of type (" PRINTF_IFMT ")\n", pElDefn->pszName, (long long)data);
+                }
+                npy_int64 d = (npy_int64)data;
+                memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
+                break;
             }
-
-            m_pnCurrentColIdxs[i] = nStartIdx;
+            default:
+                fprintf(stderr, "Undefined element size %d\n", pElDefn->nSize);
+                break;
         }
+    }
+    else if( pElDefn->cKind == 'u')
+    {
+        npy_uint64 data = parseUInt(pszString, nLength);
+#if defined( _MSC_VER) && _MSC_VER < 1900
+        #define PRINTF_UFMT "%I64u"
+#else
+        #define PRINTF_UFMT "%llu"
+#endif
+        switch(pElDefn->nSize)
+        {
+            case 1:
+            {
+                if( data > NPY_MAX_UINT8 )
+                {
+                    // TODO: exception?
+                    fprintf(stderr, "Column %s data outside range of type (" PRINTF_UFMT ")\n", pElDefn->pszName, (unsigned long long)data);
+                }
+                npy_uint8 d = (npy_uint8)data;
+                memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
+                break;
+            }
+            case 2:
+            {
+                if( data > NPY_MAX_UINT16 )
+                {
+                    // TODO: exception?
+                    fprintf(stderr, "Column %s data outside range of type (" PRINTF_UFMT ")\n", pElDefn->pszName, (unsigned long long)data);
+                }
+                npy_uint16 d = (npy_uint16)data;
+                memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
+                break;
+            }
+            case 4:
+            {
+                if( data > NPY_MAX_UINT32 )
+                {
+                    // TODO: exception?
+                    fprintf(stderr, "Column %s data outside range of type (" PRINTF_UFMT ")\n", pElDefn->pszName, (unsigned long long)data);
+                }
+                npy_uint32 d = (npy_uint32)data;
+                memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
+                break;
+            }
+            case 8:
+            {
+                if( data > NPY_MAX_UINT64 )
+                {
+                    // TODO: exception?
+                    fprintf(stderr, "Column %s data outside range of type (" PRINTF_UFMT ")\n", pElDefn->pszName, (unsigned long long)data);
+                }
+                npy_uint64 d = (npy_uint64)data;
+                memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
+                break;
+            }
+            default:
+                fprintf(stderr, "Undefined element size %d\n", pElDefn->nSize);
+                break;
+        }
+    }
+    else if( pElDefn->cKind == 'f')
+    {
+        double data = parseDouble(pszString, nLength);
+        switch(pElDefn->nSize)
+        {
+            case 4:
+            {
+                float d = (float)data;
+                memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
+                break;
+            }
+            case 8:
+            {
+                memcpy(&pRecord[pElDefn->nOffset], &data, sizeof(data));
+                break;
+            }
+            default:
+                fprintf(stderr, "Undefined element size %d\n", pElDefn->nSize);
+                break;
+        }
+    }
+    else
+    {
+        fprintf(stderr, "Unknown kind code %c\n", pElDefn->cKind);
+    }
+}
 
-        // keep going so we can replace \n with \0
-        while((m_pszCurrentLine[nStartIdx] != '\n') && (m_pszCurrentLine[nStartIdx] != '\r') && (nStartIdx < nMaxLineSize))
-            nStartIdx++;
-
-        if( (m_pszCurrentLine[nStartIdx] == '\n') || (m_pszCurrentLine[nStartIdx] == '\r'))
-            m_pszCurrentLine[nStartIdx] = '\0';
+// offset of the next line CReadState reads
+static npy_int64 
+PyASCIIReader_tell(PyASCIIReader *self)
+{
+#ifdef HAVE_ZLIB
+    if( self->pGzip != NULL )
+    {
+        return self->pGzip->tell();
+    }
+#endif
+    return ftell(self->unc_file);
+}
+
+// move CReadState to the line at nOffset (from PyASCIIReader_tell). 
+// Returns false and sets *pszErrorString if this fails.
+static bool 
+PyASCIIReader_seek(PyASCIIReader *self, npy_int64 nOffset, const char **pszErrorString)
+{
+#ifdef HAVE_ZLIB
+    if( self->pGzip != NULL )
+    {
+        if( !self->pGzip->seek(nOffset) )
+        {
+            *pszErrorString = self->pGzip->getError();
+            return false;
+        }
+        return true;
+    }
+#endif
+    if( fseek(self->unc_file, nOffset, SEEK_SET) != 0 )
+    {
+        *pszErrorString = "Unable to seek in file";
+        return false;
+    }
+    return true;
+}
+
+static inline bool isFieldSeparator(char c)
+{
+    return ( c == ' ' ) || ( c == ',' ) || ( c == '\t' );
+}
+
+// Find the first nFields fields on the line [pszLine, pszLineEnd).
+// Fields are separated by spaces, commas or tabs. Used for both memory
+// mapped and gzip files so they are split the same way.
+// Returns the number found, or -1 for blank lines and comments.
+static int 
+findFields(const char *pszLine, const char *pszLineEnd, char cCommentChar,
+        int nFields, const char **ppszFields, int *pnLengths)
+{
+    const char *p = pszLine;
+    // some files have spaces etc at the start of the line
+    while( ( p < pszLineEnd ) && isspace((unsigned char)*p) )
+        p++;
+
+    if( ( p == pszLineEnd ) || ( ( cCommentChar != '\0' ) && ( *p == cCommentChar ) ) )
+        return -1;
+
+    int nFound = 0;
+    while( ( nFound < nFields ) && ( p < pszLineEnd ) && ( *p != '\r' ) )
+    {
+        ppszFields[nFound] = p;
+        while( ( p < pszLineEnd ) && !isFieldSeparator(*p) && ( *p != '\r' ) )
+            p++;
+        pnLengths[nFound] = p - ppszFields[nFound];
+        nFound++;
+
+        while( ( p < pszLineEnd ) && isFieldSeparator(*p) )
+            p++;
+    }
+    return nFound;
+}
+
+class CReadState
+{
+public:
+    CReadState(int nFields, char cCommentChar)
+    {
+        m_bFirst = true;
+        m_bPending = false;
+        m_nCurrentLineOffset = 0;
+        m_nLastLineOffset = 0;
+        m_nFields = nFields;
+        m_cCommentChar = cCommentChar;
+        m_pszCurrentLine = (char*)malloc(nMaxLineSize * sizeof(char));
+        if( m_pszCurrentLine == NULL )
+        {
+            throw std::bad_alloc();
+        }
+        m_pszLastLine = (char*)malloc(nMaxLineSize * sizeof(char));
+        if( m_pszLastLine == NULL )
+        {
+            free(m_pszCurrentLine);
+            throw std::bad_alloc();
+        }
+
+        m_pnCurrentColIdxs = (int*)malloc(nFields * sizeof(int));
+        if( m_pnCurrentColIdxs == NULL )
+        {
+            free(m_pszCurrentLine);
+            free(m_pszLastLine);
+            throw std::bad_alloc();
+        }
+        m_pnLastColIdxs = (int*)malloc(nFields * sizeof(int));
+        if( m_pnLastColIdxs == NULL )
+        {
+            free(m_pszCurrentLine);
+            free(m_pszLastLine);
+            free(m_pnCurrentColIdxs);
+            throw std::bad_alloc();
+        }
+        m_pnCurrentColLengths = (int*)malloc(nFields * sizeof(int));
+        if( m_pnCurrentColLengths == NULL )
+        {
+            free(m_pszCurrentLine);
+            free(m_pszLastLine);
+            free(m_pnCurrentColIdxs);
+            free(m_pnLastColIdxs);
+            throw std::bad_alloc();
+        }
+        m_pnLastColLengths = (int*)malloc(nFields * sizeof(int));
+        if( m_pnLastColLengths == NULL )
+        {
+            free(m_pszCurrentLine);
+            free(m_pszLastLine);
+            free(m_pnCurrentColIdxs);
+            free(m_pnLastColIdxs);
+            free(m_pnCurrentColLengths);
+            throw std::bad_alloc();
+        }
+        m_ppszFields = (const char**)malloc(nFields * sizeof(const char*));
+        if( m_ppszFields == NULL )
+        {
+            free(m_pszCurrentLine);
+            free(m_pszLastLine);
+            free(m_pnCurrentColIdxs);
+            free(m_pnLastColIdxs);
+            free(m_pnCurrentColLengths);
+            free(m_pnLastColLengths);
+            throw std::bad_alloc();
+        }
+    }
+    ~CReadState()
+    {
+        free(m_pszCurrentLine);
+        free(m_pszLastLine);
+        free(m_pnCurrentColIdxs);
+        free(m_pnLastColIdxs);
+        free(m_pnCurrentColLengths);
+        free(m_pnLastColLengths);
+        free(m_ppszFields);
+    }
+
+    // start again (after seeking)
+    void reset()
+    {
+        m_bFirst = true;
+        m_bPending = false;
+    }
+
+    // the current line is returned again by the next call to getNewLine()
+    void setPending()
+    {
+        m_bPending = true;
+    }
+
+    // offset of the current line from PyASCIIReader_tell()
+    npy_int64 getCurrentLineOffset()
+    {
+        return m_nCurrentLineOffset;
+    }
+
+    bool getNewLine(PyASCIIReader *self, const char **pszErrorString)
+    {
+        if( m_bPending )
+        {
+            m_bPending = false;
+            return true;
+        }
+
+        // read into last line then clobber
+        // try the various reader handles...
+        int nFound = -1;
+        while(nFound < 0)
+        {
+            m_nLastLineOffset = PyASCIIReader_tell(self);
+#ifdef HAVE_ZLIB
+            if( self->pGzip != NULL )
+            {
+                if( self->pGzip->gets(m_pszLastLine, nMaxLineSize) == NULL)
+                {
+                    *pszErrorString = self->pGzip->getError();
+                    return false;
+                }
+            }
+#endif
+            if( self->unc_file != NULL )
+            {
+                if( fgets(m_pszLastLine, nMaxLineSize, self->unc_file) == NULL)
+                {
+                    return false;
+                }
+            }
+
+            // split the same way as memory mapped files. 
+            // Blank lines and comments are skipped.
+            const char *pszLineEnd = strchr(m_pszLastLine, '\n');
+            if( pszLineEnd == NULL )
+                pszLineEnd = m_pszLastLine + strlen(m_pszLastLine);
+            nFound = findFields(m_pszLastLine, pszLineEnd, m_cCommentChar, 
+                        m_nFields, m_ppszFields, m_pnLastColLengths);
+        }
+
+        if( nFound < m_nFields )
+        {
+            *pszErrorString = "Number of columns in file does not match expected";
+            return false;
+        }
+
+        for( int i = 0; i < m_nFields; i++ )
+        {
+            m_pnLastColIdxs[i] = m_ppszFields[i] - m_pszLastLine;
+        }
+
+        char *pszOldCurrent = m_pszCurrentLine;
+        m_pszCurrentLine = m_pszLastLine;
+        m_pszLastLine = pszOldCurrent;
+
+        // now do the indices
+        int *pnOldLast = m_pnLastColIdxs;
+        m_pnLastColIdxs = m_pnCurrentColIdxs;
+        m_pnCurrentColIdxs = pnOldLast;
+
+        int *pnOldLastLengths = m_pnLastColLengths;
+        m_pnLastColLengths = m_pnCurrentColLengths;
+        m_pnCurrentColLengths = pnOldLastLengths;
+
+        npy_int64 nOldCurrentOffset = m_nCurrentLineOffset;
+        m_nCurrentLineOffset = m_nLastLineOffset;
+        m_nLastLineOffset = nOldCurrentOffset;
 
         // print
         /*
@@ -626,8 +1506,10 @@ public:
         // check all the strings are the same
         for( int i = 0; i < nPulseIdxs; i++ )
         {
-            int idx = m_pnCurrentColIdxs[pPulseIdxs[i]];
-            if(strcmp(&m_pszCurrentLine[idx], &m_pszLastLine[idx]) != 0)
+            int nCol = pPulseIdxs[i];
+            if( ( m_pnCurrentColLengths[nCol] != m_pnLastColLengths[nCol] ) || 
+                    ( memcmp(&m_pszCurrentLine[m_pnCurrentColIdxs[nCol]], 
+                        &m_pszLastLine[m_pnLastColIdxs[nCol]], m_pnCurrentColLengths[nCol]) != 0 ) )
                 return false;
         }
         return true;
@@ -638,226 +1520,478 @@ public:
     {
         for( int i = 0; i < nIdxs; i++ )
         {
-            int idx = m_pnCurrentColIdxs[pIdxs[i]];
-            char *pszString = &m_pszCurrentLine[idx];
-            SpylidarFieldDefn *pElDefn = &pDefn[i];
-            if( pElDefn->cKind == 'i' )
+            int nCol = pIdxs[i];
+            convertField(&m_pszCurrentLine[m_pnCurrentColIdxs[nCol]], 
+                    m_pnCurrentColLengths[nCol], &pDefn[i], pRecord);
+        }
+    }
+
+private:
+    bool m_bFirst;
+    bool m_bPending;
+    int m_nFields;
+    char m_cCommentChar;
+    char *m_pszCurrentLine;
+    char *m_pszLastLine;
+    int *m_pnCurrentColIdxs;
+    int *m_pnLastColIdxs;
+    int *m_pnCurrentColLengths;
+    int *m_pnLastColLengths;
+    const char **m_ppszFields; // filled in by findFields
+    npy_int64 m_nCurrentLineOffset;
+    npy_int64 m_nLastLineOffset;
+};
+
+static void 
+PyASCIIReader_deleteReadState(PyASCIIReader *self)
+{
+    if( self->pReadState != NULL )
+    {
+        delete self->pReadState;
+        self->pReadState = NULL;
+    }
+}
+
+// Returns the offset of the line after the one at nOffset in the mapped
+// file and sets *pnLineEnd to the end of the line at nOffset (the newline).
+static npy_int64 
+PyASCIIReader_nextLine(PyASCIIReader *self, npy_int64 nOffset, npy_int64 *pnLineEnd)
+{
+    const char *pNewLine = (const char*)memchr(self->pMapped + nOffset, '\n', 
+                                self->nMappedSize - nOffset);
+    if( pNewLine == NULL )
+    {
+        *pnLineEnd = self->nMappedSize;
+        return self->nMappedSize;
+    }
+    *pnLineEnd = pNewLine - self->pMapped;
+    return *pnLineEnd + 1;
+}
+
+// Move forward through the mapped file from pulse self->nPulsesRead (which
+// starts at self->nNextOffset) to pulse nPulse. The checkpoint table is
+// added to along the way. If pPulseOffsets is not NULL the offset of 
+// the first line of each pulse passed is appended to it.
+// Returns false if the end of the file is reached first or there is
+// an error (*pszErrorString is set).
+static bool 
+PyASCIIReader_scanToPulse(PyASCIIReader *self, Py_ssize_t nPulse, 
+        std::vector<npy_int64> *pPulseOffsets, const char **pszErrorString)
+{
+    // only the pulse fields are needed to find where each pulse starts
+    int nScanFields = 0;
+    for( int i = 0; i < self->nPulseFields; i++ )
+    {
+        nScanFields = std::max(nScanFields, self->pPulseLineIdxs[i] + 1);
+    }
+    // +1 so there is always an element
+    std::vector<const char*> fields(nScanFields + 1), pulseFields(nScanFields + 1);
+    std::vector<int> lengths(nScanFields + 1), pulseLengths(nScanFields + 1);
+
+    while( self->nPulsesRead < nPulse )
+    {
+        // first line of the pulse - skip any comments
+        npy_int64 nLineEnd, nNext = 0;
+        int nFound = -1;
+        while( self->nNextOffset < self->nMappedSize )
+        {
+            nNext = PyASCIIReader_nextLine(self, self->nNextOffset, &nLineEnd);
+            nFound = findFields(self->pMapped + self->nNextOffset, self->pMapped + nLineEnd,
+                        self->cCommentChar, nScanFields, &fields[0], &lengths[0]);
+            if( nFound >= 0 )
+                break;
+            self->nNextOffset = nNext;
+        }
+
+        if( nFound < 0 )
+        {
+            // end of file
+            return false;
+        }
+        if( nFound < nScanFields )
+        {
+            *pszErrorString = "Number of columns in file does not match expected";
+            return false;
+        }
+
+        PyASCIIReader_addCheckpoint(self, self->nPulsesRead, self->nNextOffset);
+        if( pPulseOffsets != NULL )
+            pPulseOffsets->push_back(self->nNextOffset);
+        self->nPulsesRead++;
+
+        if( !self->bTimeSequential )
+        {
+            // a pulse for each line
+            self->nNextOffset = nNext;
+            continue;
+        }
+
+        // find the next line with different pulse fields
+        pulseFields.swap(fields);
+        pulseLengths.swap(lengths);
+        npy_int64 nOffset = nNext;
+        while( nOffset < self->nMappedSize )
+        {
+            nNext = PyASCIIReader_nextLine(self, nOffset, &nLineEnd);
+            nFound = findFields(self->pMapped + nOffset, self->pMapped + nLineEnd,
+                        self->cCommentChar, nScanFields, &fields[0], &lengths[0]);
+            if( nFound >= 0 )
             {
-#if defined (_MSC_VER) && _MSC_VER < 1900
-                // early versions of MSVC don't have strtoll
-                __int64 data = _strtoi64(pszString, NULL, 10);
-                #define PRINTF_IFMT "%I64d"
-#else
-                long long data = strtoll(pszString, NULL, 10);
-                #define PRINTF_IFMT "%lld"
-#endif            
-                switch(pElDefn->nSize)
+                bool bSamePulse = true;
+                for( int i = 0; bSamePulse && ( i < self->nPulseFields ); i++ )
                 {
-                    case 1:
-                    {
-                        if( (data < NPY_MIN_INT8) || (data > NPY_MAX_INT8))
-                        {
-                            // TODO: exception?
-                            fprintf(stderr, "Column %s data outside range of type (" PRINTF_IFMT ")\n", pElDefn->pszName, data);
-                        }
-                        npy_int8 d = (npy_int8)data;
-                        memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
-                        break;
-                    }
-                    case 2:
-                    {
-                        if( (data < NPY_MIN_INT16) || (data > NPY_MAX_INT16))
-                        {
-                            // TODO: exception?
-                            fprintf(stderr, "Column %s data outside range of type (" PRINTF_IFMT ")\n", pElDefn->pszName, data);
-                        }
-                        npy_int16 d = (npy_int16)data;
-                        memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
-                        break;
-                    }
-                    case 4:
-                    {
-                        if( (data < NPY_MIN_INT32) || (data > NPY_MAX_INT32))
-                        {
-                            // TODO: exception?
-                            fprintf(stderr, "Column %s data outside range of type (" PRINTF_IFMT ")\n", pElDefn->pszName, data);
-                        }
-                        npy_int32 d = (npy_int32)data;
-                        memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
-                        break;
-                    }
-                    case 8:
-                    {
-                        if( (data < NPY_MIN_INT64) || (data > NPY_MAX_INT64))
-                        {
-                            // TODO: exception?
-                            fprintf(stderr, "Column %s data outside range of type (" PRINTF_IFMT ")\n", pElDefn->pszName, data);
-                        }
-                        npy_int64 d = (npy_int64)data;
-                        memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
-                        break;
-                    }
-                    default:
-                        fprintf(stderr, "Undefined element size %d\n", pElDefn->nSize);
-                        break;
+                    int idx = self->pPulseLineIdxs[i];
+                    bSamePulse = ( idx < nFound ) && ( lengths[idx] == pulseLengths[idx] ) &&
+                        ( memcmp(fields[idx], pulseFields[idx], lengths[idx]) == 0 );
                 }
+                if( !bSamePulse )
+                    break;
             }
-            else if( pElDefn->cKind == 'u')
+            nOffset = nNext;
+        }
+        self->nNextOffset = nOffset;
+    }
+    return true;
+}
+
+/* The pulses and points parsed by one thread */
+struct SParsedData
+{
+    std::vector<char> pulses;
+    std::vector<char> points;
+    npy_int64 nPulses;
+    npy_int64 nPoints;
+    const char *pszErrorString;
+};
+
+// Parse the nPulses pulses that start at the offsets in pPulseOffsets
+// in the mapped file. The last one ends at nEndOffset. PTS_START_IDX is
+// set relative to the first point in pParsed. Run by the parsing threads
+// so no Python calls.
+static void 
+PyASCIIReader_parsePulses(PyASCIIReader *self, const npy_int64 *pPulseOffsets, 
+        npy_int64 nPulses, npy_int64 nEndOffset, int nNumOfReturnsOffset, 
+        int nPtsStartIdxOffset, SParsedData *pParsed)
+{
+    pParsed->nPulses = 0;
+    pParsed->nPoints = 0;
+    pParsed->pszErrorString = NULL;
+    if( nPulses == 0 )
+        return;
+
+    try
+    {
+        int nFields = self->nPulseFields + self->nPointFields;
+        std::vector<const char*> fields(nFields);
+        std::vector<int> lengths(nFields);
+        int nPulseSize = self->pPulseDefn[0].nStructTotalSize;
+        int nPointSize = self->pPointDefn[0].nStructTotalSize;
+        std::vector<char> pulseItem(nPulseSize);
+        std::vector<char> pointItem(nPointSize);
+        pParsed->pulses.reserve(nPulses * nPulseSize);
+
+        npy_int64 nOffset = pPulseOffsets[0];
+        while( nOffset < nEndOffset )
+        {
+            npy_int64 nLineEnd;
+            npy_int64 nNext = PyASCIIReader_nextLine(self, nOffset, &nLineEnd);
+            int nFound = findFields(self->pMapped + nOffset, self->pMapped + nLineEnd,
+                        self->cCommentChar, nFields, &fields[0], &lengths[0]);
+            if( nFound >= 0 )
             {
-#if defined( _MSC_VER) && _MSC_VER < 1900
-                // early versions of MSVC don't have strtoull
-                unsigned __int64 data = _strtoui64(pszString, NULL, 10);
-                #define PRINTF_UFMT "%I64u"
-#else
-                unsigned long long data = strtoull(pszString, NULL, 10);
-                #define PRINTF_UFMT "%llu"
-#endif
-                switch(pElDefn->nSize)
+                if( nFound < nFields )
                 {
-                    case 1:
-                    {
-                        if( data > NPY_MAX_UINT8 )
-                        {
-                            // TODO: exception?
-                            fprintf(stderr, "Column %s data outside range of type (" PRINTF_UFMT ")\n", pElDefn->pszName, data);
-                        }
-                        npy_uint8 d = (npy_uint8)data;
-                        memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
-                        break;
-                    }
-                    case 2:
-                    {
-                        if( data > NPY_MAX_UINT16 )
-                        {
-                            // TODO: exception?
-                            fprintf(stderr, "Column %s data outside range of type (" PRINTF_UFMT ")\n", pElDefn->pszName, data);
-                        }
-                        npy_uint16 d = (npy_uint16)data;
-                        memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
-                        break;
-                    }
-                    case 4:
-                    {
-                        if( data > NPY_MAX_UINT32 )
-                        {
-                            // TODO: exception?
-                            fprintf(stderr, "Column %s data outside range of type (" PRINTF_UFMT ")\n", pElDefn->pszName, data);
-                        }
-                        npy_uint32 d = (npy_uint32)data;
-                        memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
-                        break;
-                    }
-                    case 8:
-                    {
-                        if( data > NPY_MAX_UINT64 )
-                        {
-                            // TODO: exception?
-                            fprintf(stderr, "Column %s data outside range of type (" PRINTF_UFMT ")\n", pElDefn->pszName, data);
-                        }
-                        npy_uint64 d = (npy_uint64)data;
-                        memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
-                        break;
-                    }
-                    default:
-                        fprintf(stderr, "Undefined element size %d\n", pElDefn->nSize);
-                        break;
+                    pParsed->pszErrorString = "Number of columns in file does not match expected";
+                    return;
                 }
-            }
-            else if( pElDefn->cKind == 'f')
-            {
-                double data = atof(pszString);
-                switch(pElDefn->nSize)
+
+                if( ( pParsed->nPulses < nPulses ) && ( nOffset == pPulseOffsets[pParsed->nPulses] ) )
                 {
-                    case 4:
+                    // new pulse
+                    for( int i = 0; i < self->nPulseFields; i++ )
                     {
-                        float d = (float)data;
-                        memcpy(&pRecord[pElDefn->nOffset], &d, sizeof(d));
-                        break;
+                        int idx = self->pPulseLineIdxs[i];
+                        convertField(fields[idx], lengths[idx], &self->pPulseDefn[i], &pulseItem[0]);
                     }
-                    case 8:
-                    {
-                        memcpy(&pRecord[pElDefn->nOffset], &data, sizeof(data));
-                        break;
-                    }
-                    default:
-                        fprintf(stderr, "Undefined element size %d\n", pElDefn->nSize);
-                        break;
+
+                    npy_uint64 nPtsStartIdx = pParsed->nPoints;
+                    memcpy(&pulseItem[nPtsStartIdxOffset], &nPtsStartIdx, sizeof(nPtsStartIdx));
+                    npy_uint8 nNumReturns = 0;
+                    memcpy(&pulseItem[nNumOfReturnsOffset], &nNumReturns, sizeof(nNumReturns));
+
+                    pParsed->pulses.insert(pParsed->pulses.end(), pulseItem.begin(), pulseItem.end());
+                    pParsed->nPulses++;
                 }
+
+                // add our new point
+                for( int i = 0; i < self->nPointFields; i++ )
+                {
+                    int idx = self->pPointLineIdxs[i];
+                    convertField(fields[idx], lengths[idx], &self->pPointDefn[i], &pointItem[0]);
+                }
+                pParsed->points.insert(pParsed->points.end(), pointItem.begin(), pointItem.end());
+                pParsed->nPoints++;
+
+                // update NUMBER_OF_RETURNS on pulse
+                char *pLastPulse = &pParsed->pulses[(pParsed->nPulses - 1) * nPulseSize];
+                npy_uint8 nNumReturns;
+                memcpy(&nNumReturns, &pLastPulse[nNumOfReturnsOffset], sizeof(nNumReturns));
+                nNumReturns++;
+                memcpy(&pLastPulse[nNumOfReturnsOffset], &nNumReturns, sizeof(nNumReturns));
             }
-            else
-            {
-                fprintf(stderr, "Unknown kind code %c\n", pElDefn->cKind);
-            }
+            nOffset = nNext;
         }
     }
+    catch(std::bad_alloc& ba)
+    {
+        pParsed->pszErrorString = "Out of memory";
+    }
+}
 
-private:
-    bool m_bFirst;
-    int m_nFields;
-    char m_cCommentChar;
-    char *m_pszCurrentLine;
-    char *m_pszLastLine;
-    int *m_pnCurrentColIdxs;
-    int *m_pnLastColIdxs;
-};
+// find offset of NUMBER_OF_RETURNS and PTS_START_IDX so we can fill them in
+static void
+PyASCIIReader_getPulseIdxOffsets(PyASCIIReader *self, int *pnNumOfReturnsOffset,
+        int *pnPtsStartIdxOffset)
+{
+    *pnNumOfReturnsOffset = -1;
+    *pnPtsStartIdxOffset = -1;
+    int i = 0;
+    while( self->pPulseDefn[i].pszName != NULL )
+    {
+        if( strcmp(self->pPulseDefn[i].pszName, "NUMBER_OF_RETURNS") == 0)
+            *pnNumOfReturnsOffset = self->pPulseDefn[i].nOffset;
+        else if( strcmp(self->pPulseDefn[i].pszName, "PTS_START_IDX") == 0)
+            *pnPtsStartIdxOffset = self->pPulseDefn[i].nOffset;
 
-static PyObject *PyASCIIReader_readData(PyASCIIReader *self, PyObject *args)
+        i++;
+    }
+    if( (*pnNumOfReturnsOffset == -1) || (*pnPtsStartIdxOffset == -1))
+    {
+        // this should never happen
+        fprintf(stderr, "couldn't find NUMBER_OF_RETURNS or PTS_START_IDX");
+    }
+}
+
+// readData for memory mapped files. The lines for the pulses in the range
+// are found on this thread then split between self->nParseThreads threads
+// to be converted.
+// Use the checkpoint table to find the closest known pulse at or 
+// before nPulseStart. Returns true and sets *pnPulse and *pnOffset
+// to it if seeking there gets us closer than we are now.
+static bool
+PyASCIIReader_findCheckpoint(PyASCIIReader *self, Py_ssize_t nPulseStart,
+        Py_ssize_t *pnPulse, npy_int64 *pnOffset)
 {
-    Py_ssize_t nPulseStart, nPulseEnd, nPulses;
-    if( !PyArg_ParseTuple(args, "nn:readData", &nPulseStart, &nPulseEnd ) )
-        return NULL;
+    if( nPulseStart == self->nPulsesRead )
+        return false;
 
-    nPulses = nPulseEnd - nPulseStart;
-    PyObject *pTuple = NULL;
+    size_t nCheckpoint = nPulseStart / CHECKPOINT_INTERVAL;
+    if( nCheckpoint >= self->pCheckpoints->size() )
+    {
+        // not that far yet. Use the last one.
+        nCheckpoint = self->pCheckpoints->size();
+        if( nCheckpoint > 0 )
+            nCheckpoint--;
+    }
+    Py_ssize_t nCheckpointPulse = nCheckpoint * CHECKPOINT_INTERVAL;
 
-    try
+    // only seek if it gets us closer than we are
+    if( ( nPulseStart >= self->nPulsesRead ) && ( nCheckpointPulse <= self->nPulsesRead ) )
+        return false;
+
+    if( nCheckpoint < self->pCheckpoints->size() )
+    {
+        *pnOffset = self->pCheckpoints->at(nCheckpoint);
+        *pnPulse = nCheckpointPulse;
+    }
+    else
+    {
+        // go back to zero and start again
+        *pnOffset = 0;
+        *pnPulse = 0;
+    }
+    return true;
+}
+
+// Returns true if there are no more lines with data (ie only blank lines and
+// comments) in the mapped file from self->nNextOffset
+static bool
+PyASCIIReader_atEndOfMapped(PyASCIIReader *self)
+{
+    const char *pszField;
+    int nLength;
+    npy_int64 nOffset = self->nNextOffset;
+    while( nOffset < self->nMappedSize )
     {
-        CReadState state(self->nPulseFields + self->nPointFields, self->cCommentChar);
+        npy_int64 nLineEnd;
+        npy_int64 nNext = PyASCIIReader_nextLine(self, nOffset, &nLineEnd);
+        if( findFields(self->pMapped + nOffset, self->pMapped + nLineEnd,
+                    self->cCommentChar, 1, &pszField, &nLength) >= 0 )
+            return false;
+        nOffset = nNext;
+    }
+    return true;
+}
+
+static PyObject *
+PyASCIIReader_readMapped(PyASCIIReader *self, Py_ssize_t nPulseStart, Py_ssize_t nPulseEnd)
+{
+    Py_ssize_t nSeekPulse;
+    npy_int64 nSeekOffset;
+    if( PyASCIIReader_findCheckpoint(self, nPulseStart, &nSeekPulse, &nSeekOffset) )
+    {
+        self->nNextOffset = nSeekOffset;
+        self->nPulsesRead = nSeekPulse;
+        self->bFinished = false;
+    }
 
-        Py_ssize_t nPulsesToIgnore = 0;
-        if(nPulseStart < self->nPulsesRead)
+    int nNumOfReturnsOffset, nPtsStartIdxOffset;
+    PyASCIIReader_getPulseIdxOffsets(self, &nNumOfReturnsOffset, &nPtsStartIdxOffset);
+
+    PyObject *pTuple = NULL;
+    try
+    {
+        // find where each of the pulses start
+        const char *pszErrorString = NULL;
+        std::vector<npy_int64> pulseOffsets;
+        bool bOK = PyASCIIReader_scanToPulse(self, nPulseStart, NULL, &pszErrorString) &&
+                PyASCIIReader_scanToPulse(self, nPulseEnd, &pulseOffsets, &pszErrorString);
+        if( pszErrorString != NULL )
         {
-            // the start location before the current location
-            // reset to beginning and read through
-#ifdef HAVE_ZLIB
-            if( self->gz_file != NULL )
+            PyErr_SetString(GETSTATE_FC->error, pszErrorString);
+            return NULL;
+        }
+        // like the line reader, finish when the last pulse has been read
+        // rather than returning an empty block next time
+        if( !bOK || PyASCIIReader_atEndOfMapped(self) )
+            self->bFinished = true;
+
+        // give each thread the same number of pulses
+        npy_int64 nPulses = pulseOffsets.size();
+        npy_int64 nEndOffset = self->nNextOffset;
+        int nThreads = (int)std::max((npy_int64)1, std::min((npy_int64)self->nParseThreads, nPulses));
+        std::vector<SParsedData> parsed(nThreads);
+        const npy_int64 *pPulseOffsets = pulseOffsets.empty() ? NULL : &pulseOffsets[0];
+
+        // no Python in here so let other Python threads run
+        Py_BEGIN_ALLOW_THREADS
+        if( nThreads == 1 )
+        {
+            PyASCIIReader_parsePulses(self, pPulseOffsets, nPulses, nEndOffset,
+                        nNumOfReturnsOffset, nPtsStartIdxOffset, &parsed[0]);
+        }
+        else
+        {
+            std::vector<std::thread> threads;
+            for( int i = 0; i < nThreads; i++ )
             {
-                gzseek(self->gz_file, 0, SEEK_SET);
+                npy_int64 nFirst = (nPulses * i) / nThreads;
+                npy_int64 nLast = (nPulses * (i + 1)) / nThreads;
+                npy_int64 nThreadEndOffset = (nLast < nPulses) ? pulseOffsets[nLast] : nEndOffset;
+                threads.push_back(std::thread(PyASCIIReader_parsePulses, self, 
+                        pPulseOffsets + nFirst, nLast - nFirst, nThreadEndOffset,
+                        nNumOfReturnsOffset, nPtsStartIdxOffset, &parsed[i]));
             }
-#endif
-            if( self->unc_file != NULL )
+            for( int i = 0; i < nThreads; i++ )
             {
-                rewind(self->unc_file);
+                threads[i].join();
             }
-            nPulsesToIgnore = nPulseStart;
-            self->nPulsesRead = 0;
-            self->bFinished = false;
         }
-        else if(nPulseStart > self->nPulsesRead)
+        Py_END_ALLOW_THREADS
+
+        npy_int64 nTotalPoints = 0;
+        for( int i = 0; i < nThreads; i++ )
         {
-            nPulsesToIgnore = (nPulseStart - self->nPulsesRead);
+            if( parsed[i].pszErrorString != NULL )
+            {
+                PyErr_SetString(GETSTATE_FC->error, parsed[i].pszErrorString);
+                return NULL;
+            }
+            nTotalPoints += parsed[i].nPoints;
         }
 
-        const char *pszErrorString = NULL;
-
-        while(nPulsesToIgnore > 0)
+        // put them all together in order
+        int nPulseSize = self->pPulseDefn[0].nStructTotalSize;
+        int nPointSize = self->pPointDefn[0].nStructTotalSize;
+        pylidar::CVector<char> pulseVector(std::max(nPulses, (npy_int64)1), nGrowBy, nPulseSize);
+        pylidar::CVector<char> pointVector(std::max(nTotalPoints, (npy_int64)1), nGrowBy, nPointSize);
+        for( int i = 0; i < nThreads; i++ )
         {
-            if(!state.getNewLine(self, &pszErrorString))
+            // make PTS_START_IDX relative to the start of the whole block
+            npy_uint64 nPointsBefore = pointVector.getNumElems();
+            for( npy_int64 n = 0; n < parsed[i].nPulses; n++ )
             {
-                if( pszErrorString != NULL )
-                {
-                    PyErr_SetString(GETSTATE_FC->error, pszErrorString);
-                    return NULL;
-                }
-                self->bFinished = true;
-                break;
+                char *pPulse = &parsed[i].pulses[n * nPulseSize];
+                npy_uint64 nPtsStartIdx;
+                memcpy(&nPtsStartIdx, &pPulse[nPtsStartIdxOffset], sizeof(nPtsStartIdx));
+                nPtsStartIdx += nPointsBefore;
+                memcpy(&pPulse[nPtsStartIdxOffset], &nPtsStartIdx, sizeof(nPtsStartIdx));
+                pulseVector.push(pPulse);
+            }
+            for( npy_int64 n = 0; n < parsed[i].nPoints; n++ )
+            {
+                pointVector.push(&parsed[i].points[n * nPointSize]);
             }
+            // free as we go
+            std::vector<char>().swap(parsed[i].pulses);
+            std::vector<char>().swap(parsed[i].points);
+        }
+
+        PyArrayObject *pPulses = pulseVector.getNumpyArray(self->pPulseDefn);
+        PyArrayObject *pPoints = pointVector.getNumpyArray(self->pPointDefn);
+
+        // build tuple
+        pTuple = PyTuple_Pack(2, pPulses, pPoints);
+
+        Py_DECREF(pPulses);
+        Py_DECREF(pPoints);
+    }
+    catch(std::bad_alloc& ba)
+    {
+        PyErr_SetString(GETSTATE_FC->error, "Out of memory");
+        return NULL;
+    }
+
+    return pTuple;
+}
+
+static PyObject *PyASCIIReader_readData(PyASCIIReader *self, PyObject *args)
+{
+    Py_ssize_t nPulseStart, nPulseEnd;
+    if( !PyArg_ParseTuple(args, "nn:readData", &nPulseStart, &nPulseEnd ) )
+        return NULL;
 
-            if( !self->bTimeSequential || !state.isSamePulse(self->pPulseLineIdxs, self->nPulseFields))
+    if( self->pMapped != NULL )
+    {
+        return PyASCIIReader_readMapped(self, nPulseStart, nPulseEnd);
+    }
+
+    PyObject *pTuple = NULL;
+
+    try
+    {
+        if( self->pReadState == NULL )
+        {
+            self->pReadState = new CReadState(self->nPulseFields + self->nPointFields, 
+                                    self->cCommentChar);
+        }
+        CReadState *pState = self->pReadState;
+
+        const char *pszErrorString = NULL;
+        Py_ssize_t nSeekPulse;
+        npy_int64 nSeekOffset;
+        if( PyASCIIReader_findCheckpoint(self, nPulseStart, &nSeekPulse, &nSeekOffset) )
+        {
+            // for gzip files this restarts decompression from the closest
+            // access point in the index instead of the start of the file
+            if( !PyASCIIReader_seek(self, nSeekOffset, &pszErrorString) )
             {
-                nPulsesToIgnore--;
-                self->nPulsesRead++;
+                PyErr_SetString(GETSTATE_FC->error, pszErrorString);
+                return NULL;
             }
+            pState->reset();
+            self->nPulsesRead = nSeekPulse;
+            self->bFinished = false;
         }
 
         // we take a few liberties at this point. 
@@ -872,28 +2006,14 @@ static PyObject *PyASCIIReader_readData(PyASCIIReader *self, PyObject *args)
         char *pulseItem = new char[self->pPulseDefn[0].nStructTotalSize];
         char *pointItem = new char[self->pPointDefn[0].nStructTotalSize];
 
-        // find offset of NUMBER_OF_RETURNS and PTS_START_IDX so we can fill them in
-        int nNumOfReturnsOffset = -1;
-        int nPtsStartIdxOffset = -1;
-        int i = 0;
-        while( self->pPulseDefn[i].pszName != NULL )
-        {
-            if( strcmp(self->pPulseDefn[i].pszName, "NUMBER_OF_RETURNS") == 0)
-                nNumOfReturnsOffset = self->pPulseDefn[i].nOffset;
-            else if( strcmp(self->pPulseDefn[i].pszName, "PTS_START_IDX") == 0)
-                nPtsStartIdxOffset = self->pPulseDefn[i].nOffset;
+        int nNumOfReturnsOffset, nPtsStartIdxOffset;
+        PyASCIIReader_getPulseIdxOffsets(self, &nNumOfReturnsOffset, &nPtsStartIdxOffset);
 
-            i++;
-        }
-        if( (nNumOfReturnsOffset == -1) || (nPtsStartIdxOffset == -1))
-        {
-            // this should never happen
-            fprintf(stderr, "couldn't find NUMBER_OF_RETURNS or PTS_START_IDX");
-        }
-
-        while( nPulses > 0 )
+        // the pulses before nPulseStart are read but not converted
+        bool bInRange = false;
+        while( true )
         {
-            if(!state.getNewLine(self, &pszErrorString))
+            if(!pState->getNewLine(self, &pszErrorString))
             {
                 if( pszErrorString != NULL )
                 {
@@ -908,13 +2028,26 @@ static PyObject *PyASCIIReader_readData(PyASCIIReader *self, PyObject *args)
 
             bool bSamePulse = false;
             if( self->bTimeSequential )
-                bSamePulse = state.isSamePulse(self->pPulseLineIdxs, self->nPulseFields);
+                bSamePulse = pState->isSamePulse(self->pPulseLineIdxs, self->nPulseFields);
 
             if( !bSamePulse )
             {
                 // new pulse
+                if( self->nPulsesRead >= nPulseEnd )
+                {
+                    // first line of the pulse after the range. Keep for next time.
+                    pState->setPending();
+                    break;
+                }
+
+                PyASCIIReader_addCheckpoint(self, self->nPulsesRead, pState->getCurrentLineOffset());
+                self->nPulsesRead++;
+                bInRange = ( self->nPulsesRead > nPulseStart );
+                if( !bInRange )
+                    continue;
+
                 if( self->bTimeSequential )
-                    state.copyDataToRecord(self->pPulseLineIdxs, self->nPulseFields, self->pPulseDefn, pulseItem);
+                    pState->copyDataToRecord(self->pPulseLineIdxs, self->nPulseFields, self->pPulseDefn, pulseItem);
 
                 // set PTS_START_IDX
                 npy_uint64 nPtsStartIdx = pointVector.getNumElems();
@@ -923,13 +2056,14 @@ static PyObject *PyASCIIReader_readData(PyASCIIReader *self, PyObject *args)
                 memcpy(&pulseItem[nNumOfReturnsOffset], &nNumReturns, sizeof(nNumReturns));
 
                 pulseVector.push(pulseItem);
-                nPulses--;
-                self->nPulsesRead++;
             }
-
+            else if( !bInRange )
+            {
+                continue;
+            }
 
             // add our new point
-            state.copyDataToRecord(self->pPointLineIdxs, self->nPointFields, self->pPointDefn, pointItem);
+            pState->copyDataToRecord(self->pPointLineIdxs, self->nPointFields, self->pPointDefn, pointItem);
             pointVector.push(pointItem);
 
             // update NUMBER_OF_RETURNS on pulse
@@ -963,10 +2097,102 @@ static PyObject *PyASCIIReader_readData(PyASCIIReader *self, PyObject *args)
     return pTuple;
 }
 
+// replace the checkpoint table (from a previous run on the same file)
+static PyObject *PyASCIIReader_setCheckpoints(PyASCIIReader *self, PyObject *args)
+{
+    PyObject *pCheckpoints;
+    if( !PyArg_ParseTuple(args, "O:setCheckpoints", &pCheckpoints ) )
+        return NULL;
+
+    PyArrayObject *pArray = (PyArrayObject*)PyArray_FROMANY(pCheckpoints, NPY_INT64, 1, 1, NPY_ARRAY_IN_ARRAY);
+    if( pArray == NULL )
+    {
+        // exception already set
+        return NULL;
+    }
+
+    self->pCheckpoints->clear();
+    npy_intp nSize = PyArray_DIM(pArray, 0);
+    for( npy_intp i = 0; i < nSize; i++ )
+    {
+        self->pCheckpoints->push_back(*(npy_int64*)PyArray_GETPTR1(pArray, i));
+    }
+    Py_DECREF(pArray);
+
+    Py_RETURN_NONE;
+}
+
+// replace the index of gzip access points (from a previous run on the same file)
+static PyObject *PyASCIIReader_setGzipIndex(PyASCIIReader *self, PyObject *args)
+{
+    PyObject *pOutOffsets, *pInOffsets, *pBits, *pWindows;
+    if( !PyArg_ParseTuple(args, "OOOO:setGzipIndex", &pOutOffsets, &pInOffsets, 
+                &pBits, &pWindows ) )
+        return NULL;
+
+#ifdef HAVE_ZLIB
+    if( self->pGzip == NULL )
+    {
+        PyErr_SetString(GETSTATE_FC->error, "Not a gzip file");
+        return NULL;
+    }
+
+    PyArrayObject *pOutArray = (PyArrayObject*)PyArray_FROMANY(pOutOffsets, NPY_INT64, 1, 1, NPY_ARRAY_IN_ARRAY);
+    PyArrayObject *pInArray = (PyArrayObject*)PyArray_FROMANY(pInOffsets, NPY_INT64, 1, 1, NPY_ARRAY_IN_ARRAY);
+    PyArrayObject *pBitsArray = (PyArrayObject*)PyArray_FROMANY(pBits, NPY_UINT8, 1, 1, NPY_ARRAY_IN_ARRAY);
+    PyArrayObject *pWindowsArray = (PyArrayObject*)PyArray_FROMANY(pWindows, NPY_UINT8, 2, 2, NPY_ARRAY_IN_ARRAY);
+    if( ( pOutArray == NULL ) || ( pInArray == NULL ) || ( pBitsArray == NULL ) || ( pWindowsArray == NULL ) )
+    {
+        // exception already set
+        Py_XDECREF(pOutArray);
+        Py_XDECREF(pInArray);
+        Py_XDECREF(pBitsArray);
+        Py_XDECREF(pWindowsArray);
+        return NULL;
+    }
+
+    npy_intp nSize = PyArray_DIM(pOutArray, 0);
+    if( ( PyArray_DIM(pInArray, 0) != nSize ) || ( PyArray_DIM(pBitsArray, 0) != nSize ) ||
+        ( PyArray_DIM(pWindowsArray, 0) != nSize ) || ( PyArray_DIM(pWindowsArray, 1) != nGzipWindowSize ) )
+    {
+        PyErr_SetString(GETSTATE_FC->error, "gzip index arrays are the wrong size");
+        Py_DECREF(pOutArray);
+        Py_DECREF(pInArray);
+        Py_DECREF(pBitsArray);
+        Py_DECREF(pWindowsArray);
+        return NULL;
+    }
+
+    SGzipIndex *pIndex = self->pGzip->getIndex();
+    npy_int64 *pOut = (npy_int64*)PyArray_DATA(pOutArray);
+    npy_int64 *pIn = (npy_int64*)PyArray_DATA(pInArray);
+    npy_uint8 *pBitsData = (npy_uint8*)PyArray_DATA(pBitsArray);
+    unsigned char *pWindowsData = (unsigned char*)PyArray_DATA(pWindowsArray);
+    pIndex->outOffsets.assign(pOut, pOut + nSize);
+    pIndex->inOffsets.assign(pIn, pIn + nSize);
+    pIndex->bits.assign(pBitsData, pBitsData + nSize);
+    pIndex->windows.assign(pWindowsData, pWindowsData + nSize * nGzipWindowSize);
+
+    Py_DECREF(pOutArray);
+    Py_DECREF(pInArray);
+    Py_DECREF(pBitsArray);
+    Py_DECREF(pWindowsArray);
+
+    Py_RETURN_NONE;
+#else
+    PyErr_SetString(GETSTATE_FC->error, "Not a gzip file");
+    return NULL;
+#endif
+}
+
 /* Table of methods */
 static PyMethodDef PyASCIIReader_methods[] = {
     {"readData", (PyCFunction)PyASCIIReader_readData, METH_VARARGS, 
         "reads data. pass pulsestart, pulseend"}, 
+    {"setCheckpoints", (PyCFunction)PyASCIIReader_setCheckpoints, METH_VARARGS, 
+        "set the table of pulse offsets. pass a 1d array"}, 
+    {"setGzipIndex", (PyCFunction)PyASCIIReader_setGzipIndex, METH_VARARGS, 
+        "set the index of gzip access points. pass the arrays returned by gzipIndex"}, 
     {NULL}  /* Sentinel */
 };
 
@@ -983,10 +2209,76 @@ static PyObject *PyASCIIReader_getPulsesRead(PyASCIIReader *self, void *closure)
     return PyLong_FromSsize_t(self->nPulsesRead);
 }
 
+static PyObject *PyASCIIReader_getMapped(PyASCIIReader *self, void *closure)
+{
+    if( self->pMapped != NULL )
+        Py_RETURN_TRUE;
+    else
+        Py_RETURN_FALSE;
+}
+
+static PyObject *PyASCIIReader_getCheckpoints(PyASCIIReader *self, void *closure)
+{
+    npy_intp nSize = self->pCheckpoints->size();
+    PyArrayObject *pArray = (PyArrayObject*)PyArray_SimpleNew(1, &nSize, NPY_INT64);
+    if( pArray == NULL )
+        return NULL;
+    for( npy_intp i = 0; i < nSize; i++ )
+    {
+        *(npy_int64*)PyArray_GETPTR1(pArray, i) = self->pCheckpoints->at(i);
+    }
+    return (PyObject*)pArray;
+}
+
+// returns a tuple of arrays (outOffsets, inOffsets, bits, windows) or
+// None if not a gzip file
+static PyObject *PyASCIIReader_getGzipIndex(PyASCIIReader *self, void *closure)
+{
+#ifdef HAVE_ZLIB
+    if( self->pGzip != NULL )
+    {
+        SGzipIndex *pIndex = self->pGzip->getIndex();
+        npy_intp nSize = pIndex->outOffsets.size();
+        npy_intp windowDims[2] = {nSize, nGzipWindowSize};
+        PyArrayObject *pOutArray = (PyArrayObject*)PyArray_SimpleNew(1, &nSize, NPY_INT64);
+        PyArrayObject *pInArray = (PyArrayObject*)PyArray_SimpleNew(1, &nSize, NPY_INT64);
+        PyArrayObject *pBitsArray = (PyArrayObject*)PyArray_SimpleNew(1, &nSize, NPY_UINT8);
+        PyArrayObject *pWindowsArray = (PyArrayObject*)PyArray_SimpleNew(2, windowDims, NPY_UINT8);
+        if( ( pOutArray == NULL ) || ( pInArray == NULL ) || ( pBitsArray == NULL ) || ( pWindowsArray == NULL ) )
+        {
+            Py_XDECREF(pOutArray);
+            Py_XDECREF(pInArray);
+            Py_XDECREF(pBitsArray);
+            Py_XDECREF(pWindowsArray);
+            return NULL;
+        }
+        if( nSize > 0 )
+        {
+            memcpy(PyArray_DATA(pOutArray), &pIndex->outOffsets[0], nSize * sizeof(npy_int64));
+            memcpy(PyArray_DATA(pInArray), &pIndex->inOffsets[0], nSize * sizeof(npy_int64));
+            memcpy(PyArray_DATA(pBitsArray), &pIndex->bits[0], nSize * sizeof(npy_uint8));
+            memcpy(PyArray_DATA(pWindowsArray), &pIndex->windows[0], nSize * nGzipWindowSize);
+        }
+        PyObject *pTuple = PyTuple_Pack(4, pOutArray, pInArray, pBitsArray, pWindowsArray);
+        Py_DECREF(pOutArray);
+        Py_DECREF(pInArray);
+        Py_DECREF(pBitsArray);
+        Py_DECREF(pWindowsArray);
+        return pTuple;
+    }
+#endif
+    Py_RETURN_NONE;
+}
+
 /* get/set */
 static PyGetSetDef PyASCIIReader_getseters[] = {
     {(char*)"finished", (getter)PyASCIIReader_getFinished, NULL, (char*)"Get Finished reading state", NULL}, 
     {(char*)"pulsesRead", (getter)PyASCIIReader_getPulsesRead, NULL, (char*)"Get number of pulses read", NULL},
+    {(char*)"mapped", (getter)PyASCIIReader_getMapped, NULL, (char*)"Whether the file is memory mapped", NULL},
+    {(char*)"checkpoints", (getter)PyASCIIReader_getCheckpoints, NULL, 
+        (char*)"Offset of the first line of every CHECKPOINT_INTERVAL'th pulse found so far", NULL},
+    {(char*)"gzipIndex", (getter)PyASCIIReader_getGzipIndex, NULL, 
+        (char*)"Index of gzip access points found so far as a tuple of arrays (outOffsets, inOffsets, bits, windows). None if not a gzip file", NULL},
     {NULL}  /* Sentinel */
 };
 
@@ -1128,6 +2420,11 @@ init_ascii(void)
     PyObject *pFormatNameDict = GetFormatNameDict();
     PyModule_AddObject(pModule, "FORMAT_NAMES", pFormatNameDict);
 
+    PyModule_AddIntConstant(pModule, "CHECKPOINT_INTERVAL", CHECKPOINT_INTERVAL);
+#ifdef HAVE_ZLIB
+    PyModule_AddIntConstant(pModule, "GZIP_INDEX_SPAN", GZIP_INDEX_SPAN);
+#endif
+
     // format presence flags
 #ifdef HAVE_ZLIB
     Py_INCREF(Py_True);
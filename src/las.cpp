@@ -22,10 +22,12 @@
 
 #define _USE_MATH_DEFINES // for Windows
 #include <cmath>
+#include <cstddef>
 #include <map>
 #include <vector>
 #include <set>
 #include <string>
+#include <thread>
 #include <Python.h>
 #include "numpy/arrayobject.h"
 #include "pylvector.h"
@@ -40,6 +42,12 @@ static const int nInitSize = 256*256;
 // for creating pulses
 static const long FIRST_RETURN = 0;
 static const long LAST_RETURN = 1;
+// number of pulses between entries in the checkpoint table
+// used for seeking to a pulse on non-spatial reads
+static const long CHECKPOINT_INTERVAL = 10000;
+// number of points decoded by each thread with DECOMPRESS_THREADS if
+// the LAZ file doesn't have fixed size chunks
+static const I64 DEFAULT_DECODE_CHUNK_SIZE = 50000;
 
 /* An exception object for this module */
 /* created in the init function */
@@ -145,6 +153,28 @@ static SpylidarFieldDefn LasPointFields[] = {
     {NULL} // Sentinel
 };
 
+/* index of each field in LasPointFields. Any extra fields follow */
+enum {
+    LASPOINT_X,
+    LASPOINT_Y,
+    LASPOINT_Z,
+    LASPOINT_INTENSITY,
+    LASPOINT_RETURN_NUMBER,
+    LASPOINT_CLASSIFICATION,
+    LASPOINT_SYNTHETIC_FLAG,
+    LASPOINT_KEYPOINT_FLAG,
+    LASPOINT_WITHHELD_FLAG,
+    LASPOINT_USER_DATA,
+    LASPOINT_POINT_SOURCE_ID,
+    LASPOINT_DELETED_FLAG,
+    LASPOINT_EXTENDED_POINT_TYPE,
+    LASPOINT_RED,
+    LASPOINT_GREEN,
+    LASPOINT_BLUE,
+    LASPOINT_NIR,
+    LASPOINT_NFIELDS
+};
+
 /* Structure for waveform Info */
 typedef struct {
     npy_uint32 number_of_waveform_received_bins;
@@ -176,9 +206,19 @@ typedef struct {
     long nPulseIndex; // FIRST_RETURN or LAST_RETURNs
     SpylidarFieldDefn *pLasPointFieldsWithExt; // != NULL and use instead of LasPointFields when extended fields defined
     std::map<std::string, int> *pExtraPointNativeTypes; // if pLasPointFieldsWithExt != typenums of the extra fields
+    std::vector<npy_int64> *pCheckpoints; // point index of the first point of every CHECKPOINT_INTERVAL'th pulse
+    I64 nCurrentPoint; // index of the point in pReader->point
+    // for decoding LAZ chunks ahead of time on worker threads (DECOMPRESS_THREADS)
+    bool bDecodeAhead; // false if not compressed, DECOMPRESS_THREADS < 2 or spatial read
+    std::vector<LASreader*> *pWorkerReaders; // one for each thread
+    I64 nDecodeChunkSize; // points decoded by each thread
+    std::vector<U8> *pDecoded; // point records decoded by the threads (see PyLasFileRead_storePoint)
+    I64 nDecodedStart; // index of the first point in pDecoded
+    I64 nDecodedCount; // number of points in pDecoded
+    I64 nDecodedPos; // index into pDecoded of the next point to return
 } PyLasFileRead;
 
-static const char *SupportedDriverOptionsRead[] = {"BUILD_PULSES", "BIN_SIZE", "PULSE_INDEX", NULL};
+static const char *SupportedDriverOptionsRead[] = {"BUILD_PULSES", "BIN_SIZE", "PULSE_INDEX", "CHECKPOINT_SIDECAR", "DECOMPRESS_THREADS", NULL};
 static PyObject *las_getReadSupportedOptions(PyObject *self, PyObject *args)
 {
     return pylidar_stringArrayToTuple(SupportedDriverOptionsRead);
@@ -257,9 +297,207 @@ PyLasFileRead_dealloc(PyLasFileRead *self)
     {
         delete self->pExtraPointNativeTypes;
     }
+    if(self->pCheckpoints != NULL)
+    {
+        delete self->pCheckpoints;
+    }
+    if(self->pWorkerReaders != NULL)
+    {
+        for( size_t i = 0; i < self->pWorkerReaders->size(); i++ )
+        {
+            LASreader *pWorkerReader = self->pWorkerReaders->at(i);
+            pWorkerReader->close();
+            delete pWorkerReader;
+        }
+        delete self->pWorkerReaders;
+    }
+    if(self->pDecoded != NULL)
+    {
+        delete self->pDecoded;
+    }
     Py_TYPE(self)->tp_free((PyObject*)self);
 }
 
+/* Record that pulse nPulse starts at point nPoint if it is */
+/* the next entry needed in the checkpoint table */
+static void
+PyLasFileRead_addCheckpoint(PyLasFileRead *self, Py_ssize_t nPulse, I64 nPoint)
+{
+    if( ( ( nPulse % CHECKPOINT_INTERVAL ) == 0 ) && 
+        ( (size_t)( nPulse / CHECKPOINT_INTERVAL ) == self->pCheckpoints->size() ) )
+    {
+        self->pCheckpoints->push_back(nPoint);
+    }
+}
+
+/* LASpoint::copy_to() and copy_from() don't keep the legacy return_number, */
+/* number_of_returns and scan_angle_rank fields of the extended (LAS 1.4) */
+/* point types which are what readData uses. So decoded points are stored */
+/* as the LASpoint data members from X up to extra_bytes followed by the */
+/* extra bytes themselves. */
+#define DECODED_POINT_FIELDS_SIZE (offsetof(LASpoint, extra_bytes) - offsetof(LASpoint, X))
+
+/* Size of each point record in pDecoded */
+static U32
+PyLasFileRead_getDecodedPointSize(LASpoint *pPoint)
+{
+    return DECODED_POINT_FIELDS_SIZE + pPoint->extra_bytes_number;
+}
+
+/* Copy pPoint into pBuffer */
+static void
+PyLasFileRead_storePoint(LASpoint *pPoint, U8 *pBuffer)
+{
+    memcpy(pBuffer, &pPoint->X, DECODED_POINT_FIELDS_SIZE);
+    if( pPoint->extra_bytes_number > 0 )
+    {
+        memcpy(pBuffer + DECODED_POINT_FIELDS_SIZE, pPoint->extra_bytes, pPoint->extra_bytes_number);
+    }
+}
+
+/* Copy a point stored by PyLasFileRead_storePoint back into pPoint */
+static void
+PyLasFileRead_loadPoint(LASpoint *pPoint, const U8 *pBuffer)
+{
+    memcpy(&pPoint->X, pBuffer, DECODED_POINT_FIELDS_SIZE);
+    if( pPoint->extra_bytes_number > 0 )
+    {
+        memcpy(pPoint->extra_bytes, pBuffer + DECODED_POINT_FIELDS_SIZE, pPoint->extra_bytes_number);
+    }
+}
+
+/* Decode nPoints points starting at nStart with pReader into pBuffer */
+/* (see PyLasFileRead_storePoint). Run by the worker threads. */
+/* The number actually decoded is put in pnDecoded. */
+static void
+PyLasFileRead_decodePoints(LASreader *pReader, I64 nStart, I64 nPoints, U8 *pBuffer, I64 *pnDecoded)
+{
+    *pnDecoded = 0;
+    if( !pReader->seek(nStart) )
+        return;
+
+    U32 nRecordSize = PyLasFileRead_getDecodedPointSize(&pReader->point);
+    while( ( *pnDecoded < nPoints ) && pReader->read_point() )
+    {
+        PyLasFileRead_storePoint(&pReader->point, pBuffer + (*pnDecoded * nRecordSize));
+        (*pnDecoded)++;
+    }
+}
+
+/* Decode the points following those already in self->pDecoded. */
+/* Each worker thread decodes one chunk of the LAZ file - these are */
+/* compressed independently so can be decoded at the same time. */
+/* Returns false if there are no more points. */
+static bool
+PyLasFileRead_decodeAhead(PyLasFileRead *self)
+{
+    I64 nStart = self->nDecodedStart + self->nDecodedCount;
+    I64 nTotalPoints = self->pReader->npoints;
+    if( nStart >= nTotalPoints )
+        return false;
+
+    // work out the range of each thread. The first goes up 
+    // to the start of the next chunk so they all line up with the chunks
+    size_t nThreads = self->pWorkerReaders->size();
+    std::vector<I64> starts;
+    std::vector<I64> counts;
+    I64 nUnitStart = nStart;
+    I64 nUnitEnd = ((nStart / self->nDecodeChunkSize) + 1) * self->nDecodeChunkSize;
+    while( ( starts.size() < nThreads ) && ( nUnitStart < nTotalPoints ) )
+    {
+        nUnitEnd = std::min(nUnitEnd, nTotalPoints);
+        starts.push_back(nUnitStart);
+        counts.push_back(nUnitEnd - nUnitStart);
+        nUnitStart = nUnitEnd;
+        nUnitEnd += self->nDecodeChunkSize;
+    }
+
+    U32 nRecordSize = PyLasFileRead_getDecodedPointSize(&self->pReader->point);
+    I64 nPoints = nUnitStart - nStart;
+    self->pDecoded->resize(nPoints * nRecordSize);
+    std::vector<I64> decoded(starts.size());
+
+    // no Python in here so let other Python threads run
+    Py_BEGIN_ALLOW_THREADS
+    std::vector<std::thread> threads;
+    U8 *pBuffer = &(*self->pDecoded)[0];
+    for( size_t i = 0; i < starts.size(); i++ )
+    {
+        threads.push_back(std::thread(PyLasFileRead_decodePoints, self->pWorkerReaders->at(i),
+                        starts[i], counts[i], pBuffer + ((starts[i] - nStart) * nRecordSize),
+                        &decoded[i]));
+    }
+    for( size_t i = 0; i < threads.size(); i++ )
+    {
+        threads[i].join();
+    }
+    Py_END_ALLOW_THREADS
+
+    // stop at the first thread that didn't get all its points
+    // (shouldn't happen unless the file is truncated)
+    I64 nDecoded = 0;
+    for( size_t i = 0; i < starts.size(); i++ )
+    {
+        nDecoded += decoded[i];
+        if( decoded[i] < counts[i] )
+            break;
+    }
+
+    self->nDecodedStart = nStart;
+    self->nDecodedCount = nDecoded;
+    self->nDecodedPos = 0;
+    return nDecoded > 0;
+}
+
+/* Read the next point into self->pReader->point and set */
+/* self->nCurrentPoint. Returns false if there are no more points */
+static bool
+PyLasFileRead_readPoint(PyLasFileRead *self)
+{
+    if( !self->bDecodeAhead )
+    {
+        if( !self->pReader->read_point() )
+            return false;
+        self->nCurrentPoint = self->pReader->p_count - 1;
+        return true;
+    }
+
+    if( self->nDecodedPos >= self->nDecodedCount )
+    {
+        if( !PyLasFileRead_decodeAhead(self) )
+            return false;
+    }
+
+    U32 nRecordSize = PyLasFileRead_getDecodedPointSize(&self->pReader->point);
+    PyLasFileRead_loadPoint(&self->pReader->point, &(*self->pDecoded)[self->nDecodedPos * nRecordSize]);
+    self->nCurrentPoint = self->nDecodedStart + self->nDecodedPos;
+    self->nDecodedPos++;
+    return true;
+}
+
+/* Seek so the next point read is nPoint */
+static void
+PyLasFileRead_seek(PyLasFileRead *self, I64 nPoint)
+{
+    if( !self->bDecodeAhead )
+    {
+        self->pReader->seek(nPoint);
+    }
+    else if( ( nPoint >= self->nDecodedStart ) && 
+            ( nPoint < ( self->nDecodedStart + self->nDecodedCount ) ) )
+    {
+        // already decoded
+        self->nDecodedPos = nPoint - self->nDecodedStart;
+    }
+    else
+    {
+        // decodeAhead starts from here
+        self->nDecodedStart = nPoint;
+        self->nDecodedCount = 0;
+        self->nDecodedPos = 0;
+    }
+}
+
 /* init method - open file */
 static int 
 PyLasFileRead_init(PyLasFileRead *self, PyObject *args, PyObject *kwds)
@@ -285,6 +523,16 @@ PyObject *pOptionDict;
     self->nPulseIndex = FIRST_RETURN;
     self->pLasPointFieldsWithExt = NULL;
     self->pExtraPointNativeTypes = NULL;
+    self->pCheckpoints = new std::vector<npy_int64>();
+    self->nCurrentPoint = -1;
+    self->bDecodeAhead = false;
+    self->pWorkerReaders = NULL;
+    self->nDecodeChunkSize = DEFAULT_DECODE_CHUNK_SIZE;
+    self->pDecoded = NULL;
+    self->nDecodedStart = 0;
+    self->nDecodedCount = 0;
+    self->nDecodedPos = 0;
+    long nDecompressThreads = 0;
 
     /* Check creation options */
     PyObject *pBuildPulses = PyDict_GetItemString(pOptionDict, "BUILD_PULSES");
@@ -333,6 +581,24 @@ PyObject *pOptionDict;
         }
     }
 
+    PyObject *pDecompressThreads = PyDict_GetItemString(pOptionDict, "DECOMPRESS_THREADS");
+    if( pDecompressThreads != NULL )
+    {
+        PyObject *pDecompressThreadsLong = PyNumber_Long(pDecompressThreads);
+        if( ( pDecompressThreadsLong != NULL ) && PyLong_Check(pDecompressThreadsLong) )
+        {
+            nDecompressThreads = PyLong_AsLong(pDecompressThreadsLong);
+            Py_DECREF(pDecompressThreadsLong);
+        }
+        else
+        {
+            // raise Python exception
+            Py_XDECREF(pDecompressThreadsLong);
+            PyErr_SetString(GETSTATE_FC->error, "DECOMPRESS_THREADS must be an int");    
+            return -1;
+        }
+    }
+
     LASreadOpener lasreadopener;
     lasreadopener.set_file_name(pszFname);
     self->pReader = lasreadopener.open();
@@ -347,6 +613,34 @@ PyObject *pOptionDict;
     // sets to NULL if no waveforms
     self->pWaveformReader = lasreadopener.open_waveform13(&self->pReader->header);
 
+    // only worth decoding ahead on other threads if the file is compressed
+    if( ( nDecompressThreads > 1 ) && ( self->pReader->header.laszip != NULL ) )
+    {
+        if( self->pReader->header.laszip->chunk_size != U32_MAX )
+        {
+            // line up with the chunks
+            self->nDecodeChunkSize = self->pReader->header.laszip->chunk_size;
+        }
+
+        // each thread needs its own reader
+        self->pWorkerReaders = new std::vector<LASreader*>();
+        for( long i = 0; i < nDecompressThreads; i++ )
+        {
+            LASreadOpener workeropener;
+            workeropener.set_file_name(pszFname);
+            LASreader *pWorkerReader = workeropener.open();
+            if( pWorkerReader == NULL )
+            {
+                // raise Python exception
+                PyErr_SetString(GETSTATE_FC->error, "Unable to open las file for decompression thread");
+                return -1;
+            }
+            self->pWorkerReaders->push_back(pWorkerReader);
+        }
+        self->pDecoded = new std::vector<U8>();
+        self->bDecodeAhead = true;
+    }
+
     return 0;
 }
 
@@ -519,50 +813,222 @@ void ConvertCoordsToAngles(double x0, double x1, double y0, double y1, double z0
     }                            
 }
 
+// upper case copy of a field name. pylidar_structArrayToNumpy gives
+// numpy upper case names so this is what the Python side uses.
+static std::string PyLasFile_upperName(const char *pszName)
+{
+    std::string name(pszName);
+    for( size_t i = 0; i < name.size(); i++ )
+    {
+        name[i] = toupper(name[i]);
+    }
+    return name;
+}
+
+// convert a sequence of column names into a set of upper case names.
+// Returns NULL (with the Python exception set) on error.
+static std::set<std::string> *PyLasFileRead_getColumnSet(PyObject *pColumns)
+{
+    PyObject *pSeq = PySequence_Fast(pColumns, "pointColumns must be a sequence of strings");
+    if( pSeq == NULL )
+    {
+        // exception already set
+        return NULL;
+    }
+
+    std::set<std::string> *pColumnSet = new std::set<std::string>();
+    Py_ssize_t nItems = PySequence_Fast_GET_SIZE(pSeq);
+    for( Py_ssize_t i = 0; i < nItems; i++ )
+    {
+        PyObject *pItem = PySequence_Fast_GET_ITEM(pSeq, i);
+#if PY_MAJOR_VERSION >= 3
+        PyObject *bytesKey = PyUnicode_AsEncodedString(pItem, NULL, NULL);
+        if( bytesKey == NULL )
+        {
+            delete pColumnSet;
+            Py_DECREF(pSeq);
+            return NULL;
+        }
+        char *pszName = PyBytes_AsString(bytesKey);
+#else
+        char *pszName = PyString_AsString(pItem);
+        if( pszName == NULL )
+        {
+            delete pColumnSet;
+            Py_DECREF(pSeq);
+            return NULL;
+        }
+#endif
+        pColumnSet->insert(PyLasFile_upperName(pszName));
+#if PY_MAJOR_VERSION >= 3
+        Py_DECREF(bytesKey);
+#endif
+    }
+    Py_DECREF(pSeq);
+    return pColumnSet;
+}
+
+// Work out where each point field goes in the records returned by readData.
+// If pColumnSet isn't NULL only the fields in it are included, packed 
+// together so the others never get converted or passed to numpy.
+// pOffsets is filled with the offset of each field in the record (-1 if
+// not wanted) and pnRecordSize with the size of the record. Returns the
+// definition of the record which should be freed with free().
+static SpylidarFieldDefn *PyLasFileRead_getPointRecordDefn(PyLasFileRead *self, 
+        std::set<std::string> *pColumnSet, std::vector<int> *pOffsets, 
+        int *pnRecordSize)
+{
+    SpylidarFieldDefn *pDefn = LasPointFields;
+    if( self->pLasPointFieldsWithExt != NULL )
+    {
+        // extra fields - use other definition instead
+        pDefn = self->pLasPointFieldsWithExt;
+    }
+
+    int nFields = 1; // sentinel
+    for( SpylidarFieldDefn *p = pDefn; p->pszName != NULL; p++ )
+    {
+        nFields++;
+    }
+    SpylidarFieldDefn *pOutDefn = (SpylidarFieldDefn*)malloc(sizeof(SpylidarFieldDefn) * nFields);
+
+    if( pColumnSet == NULL )
+    {
+        // everything - keep the layout of the structure
+        memcpy(pOutDefn, pDefn, sizeof(SpylidarFieldDefn) * nFields);
+        for( SpylidarFieldDefn *p = pDefn; p->pszName != NULL; p++ )
+        {
+            pOffsets->push_back(p->nOffset);
+        }
+        *pnRecordSize = pDefn[0].nStructTotalSize;
+        return pOutDefn;
+    }
+
+    int nOutFields = 0;
+    int nOutSize = 0;
+    while( pDefn->pszName != NULL )
+    {
+        if( pColumnSet->count(PyLasFile_upperName(pDefn->pszName)) > 0 )
+        {
+            pOutDefn[nOutFields] = *pDefn;
+            pOutDefn[nOutFields].nOffset = nOutSize;
+            pOffsets->push_back(nOutSize);
+            nOutSize += pDefn->nSize;
+            nOutFields++;
+        }
+        else
+        {
+            pOffsets->push_back(-1);
+        }
+        pDefn++;
+    }
+    for( int i = 0; i < nOutFields; i++ )
+    {
+        pOutDefn[i].nStructTotalSize = nOutSize;
+    }
+    // ensure sentinel set
+    memset(&pOutDefn[nOutFields], 0, sizeof(SpylidarFieldDefn));
+
+    *pnRecordSize = nOutSize;
+    return pOutDefn;
+}
+
+// set field nField of the point record to expr (of the given type)
+// if it was asked for. expr isn't evaluated otherwise.
+#define SET_POINT_FIELD(nField, type, expr) \
+    if( pointOffsets[nField] >= 0 ) \
+    { \
+        type val = (expr); \
+        memcpy(pPointRecord + pointOffsets[nField], &val, sizeof(type)); \
+    }
+
 // read pulses, points, waveforminfo and received for the range.
 // it seems only possible to read all these at once with las.
-static PyObject *PyLasFileRead_readData(PyLasFileRead *self, PyObject *args)
+// pointColumns is an optional sequence of the point columns to return
+// (default all, None is returned for the points if it is empty) and 
+// waveforms can be set to False to skip reading the waveforms (empty 
+// arrays are returned for the info and received).
+static PyObject *PyLasFileRead_readData(PyLasFileRead *self, PyObject *args, PyObject *kwds)
 {
-    Py_ssize_t nPulseStart, nPulseEnd, nPulses = 0;
-    if( !PyArg_ParseTuple(args, "|nn:readData", &nPulseStart, &nPulseEnd ) )
+    Py_ssize_t nPulseStart = -1, nPulseEnd = -1, nPulses = 0;
+    PyObject *pPointColumns = Py_None;
+    int bReadWaveforms = 1;
+    static char *kwlist[] = {(char*)"start", (char*)"end", (char*)"pointColumns", 
+                            (char*)"waveforms", NULL};
+    if( !PyArg_ParseTupleAndKeywords(args, kwds, "|nnOi:readData", kwlist, 
+                &nPulseStart, &nPulseEnd, &pPointColumns, &bReadWaveforms ) )
         return NULL;
 
     LASpoint *pPoint = &self->pReader->point;
 
     // start and end pulses optional - only set for non-spatial read
-    if( PyTuple_Size(args) == 2 )
+    bool bNonSpatial = ( nPulseStart >= 0 ) && ( nPulseEnd >= 0 );
+    if( bNonSpatial )
     {
         nPulses = nPulseEnd - nPulseStart;
         self->bFinished = false;
 
-        // Can't use self->pReader->seek() to go to an arbitary
-        // pulse since this function works on points
-        if( nPulseStart < self->nPulsesRead )
+        // self->pReader->seek() works on points so use the checkpoint
+        // table to find the closest known pulse at or before nPulseStart
+        if( nPulseStart != self->nPulsesRead )
         {
-            // go back to zero and start again
-            self->pReader->seek(0);
-            self->nPulsesRead = 0;
-            // next if will ignore the needed number of pulses
+            size_t nCheckpoint = nPulseStart / CHECKPOINT_INTERVAL;
+            if( nCheckpoint >= self->pCheckpoints->size() )
+            {
+                // not that far yet. Use the last one.
+                // (the table always has pulse 0 once anything is read)
+                nCheckpoint = self->pCheckpoints->size();
+                if( nCheckpoint > 0 )
+                    nCheckpoint--;
+            }
+            Py_ssize_t nCheckpointPulse = nCheckpoint * CHECKPOINT_INTERVAL;
+
+            // only seek if it gets us closer than we are
+            if( ( nPulseStart < self->nPulsesRead ) || ( nCheckpointPulse > self->nPulsesRead ) )
+            {
+                if( nCheckpoint < self->pCheckpoints->size() )
+                {
+                    PyLasFileRead_seek(self, self->pCheckpoints->at(nCheckpoint));
+                    self->nPulsesRead = nCheckpointPulse;
+                }
+                else
+                {
+                    // go back to zero and start again
+                    PyLasFileRead_seek(self, 0);
+                    self->nPulsesRead = 0;
+                }
+            }
         }
 
         if( nPulseStart > self->nPulsesRead )
         {
-            // ok now we need to ignore some pulses to get to the right point
-            while( self->nPulsesRead < nPulseStart )
+            // ok now we need to ignore some pulses to get to the right point.
+            // Count the pulses the same way as the loop below does
+            int nSkipReturns = 0;
+            while( ( self->nPulsesRead < nPulseStart ) || ( nSkipReturns > 0 ) )
             {
-                if( !self->pReader->read_point() )
+                if( !PyLasFileRead_readPoint(self) )
                 {
                     // bFinished set below where we can create
                     // empty arrays
                     break;
                 }
-                // 1-based
-                if( !self->bBuildPulses || ( pPoint->return_number == 1 ) )
+                if( !self->bBuildPulses || ( nSkipReturns == 0 ) )
+                {
+                    // first point of a pulse
+                    PyLasFileRead_addCheckpoint(self, self->nPulsesRead, 
+                                self->nCurrentPoint);
+                    if( self->bBuildPulses )
+                        nSkipReturns = pPoint->get_number_of_returns();
+                    else
+                        nSkipReturns = 1;
                     self->nPulsesRead++;
+                }
+                nSkipReturns--;
             }
         }
     }
-    else if( PyTuple_Size(args) != 0 )
+    else if( ( nPulseStart >= 0 ) || ( nPulseEnd >= 0 ) )
     {
         // raise Python exception
         PyErr_SetString(GETSTATE_FC->error, "readData either takes 2 params for non-spatial reads, or 0 params for spatial reads");
@@ -570,12 +1036,30 @@ static PyObject *PyLasFileRead_readData(PyLasFileRead *self, PyObject *args)
 
     }
 
+    // NULL if all the point columns are wanted
+    std::set<std::string> *pColumnSet = NULL;
+    if( pPointColumns != Py_None )
+    {
+        pColumnSet = PyLasFileRead_getColumnSet(pPointColumns);
+        if( pColumnSet == NULL )
+        {
+            // exception already set
+            return NULL;
+        }
+    }
+    // offset of each point field in the records returned (-1 if not wanted)
+    std::vector<int> pointOffsets;
+    SpylidarFieldDefn *pPointDefn = NULL; // we don't know the fields - may be extra fields
+    int nPointRecordSize = 0;
+    char *pPointRecord = NULL; // the point being filled in
+
     pylidar::CVector<SLasPulse> pulses(nInitSize, nGrowBy);
-    pylidar::CVector<SLasPoint> *pPoints = NULL; // we don't know size - may be extra fields
+    pylidar::CVector<SLasPoint> *pPoints = NULL; // NULL if no point fields are wanted
     pylidar::CVector<SLasWaveformInfo> waveformInfos(nInitSize, nGrowBy);
     pylidar::CVector<U8> received(nInitSize, nGrowBy);
+    npy_intp nPoints = 0;
+    std::vector<double> pointXYZ; // location of each point - needed for the pulses
     SLasPulse lasPulse;
-    SLasPoint *pLasPoint = NULL; // we don't know size - may be extra fields
     SLasWaveformInfo lasWaveformInfo;
     bool bFinished = false;
     int nReturnNumber = 0; // pPoint->get_return_number can be unreliable so we need another way
@@ -584,7 +1068,7 @@ static PyObject *PyLasFileRead_readData(PyLasFileRead *self, PyObject *args)
     // non-spatial reads get bFinished updated.
     while( !bFinished )
     {
-        if( !self->pReader->read_point() )
+        if( !PyLasFileRead_readPoint(self) )
         {
             self->bFinished = true;
             // have to do a bit of a hack here since
@@ -592,12 +1076,12 @@ static PyObject *PyLasFileRead_readData(PyLasFileRead *self, PyObject *args)
             // it could be that not all the points were within the 
             // extent so we must check that we haven't got an incomplete
             // set of returns and adjust appropriately.
-            if( self->bBuildPulses && (pPoints != NULL))
+            if( self->bBuildPulses && ( nPoints > 0 ) )
             {
                 SLasPulse *pLastPulse = pulses.getLastElement();
                 if( pLastPulse != NULL )
                 {
-                    pLastPulse->number_of_returns = pPoints->getNumElems() - pLastPulse->pts_start_idx;
+                    pLastPulse->number_of_returns = nPoints - pLastPulse->pts_start_idx;
                 }
             }
             break;
@@ -644,6 +1128,7 @@ static PyObject *PyLasFileRead_readData(PyLasFileRead *self, PyObject *args)
                 // TODO: see comment about alignment above for RISC
                 pDest->nOffset = sizeof(SLasPoint) + (i * sizeof(double));
                 // nStructTotalSize done above
+                pDest->bIgnore = 0;
 
                 // now the map of types
                 int typenum;
@@ -697,85 +1182,86 @@ static PyObject *PyLasFileRead_readData(PyLasFileRead *self, PyObject *args)
             //}
         }
 
-        // allocate space if needed
-        if( pLasPoint == NULL )
+        // work out the point records now the fields are known
+        if( pPointDefn == NULL )
         {
-            int nSizeStruct = LasPointFields[0].nStructTotalSize;
-            if( self->pLasPointFieldsWithExt != NULL )
+            pPointDefn = PyLasFileRead_getPointRecordDefn(self, pColumnSet, 
+                                    &pointOffsets, &nPointRecordSize);
+            pPointRecord = (char*)malloc(std::max(nPointRecordSize, 1));
+            // CVector doesn't like 0 sized elements
+            if( nPointRecordSize > 0 )
             {
-                // there are extra fields. Use this size instead
-                nSizeStruct = self->pLasPointFieldsWithExt[0].nStructTotalSize;
+                pPoints = new pylidar::CVector<SLasPoint>(nInitSize, nGrowBy, nPointRecordSize);
             }
-            pLasPoint = (SLasPoint*)malloc(nSizeStruct);
-
-            // now know size of items
-            pPoints = new pylidar::CVector<SLasPoint>(nInitSize, nGrowBy, nSizeStruct);
         }
 
-        // always add a new point
-        pLasPoint->x = self->pReader->get_x();
-        pLasPoint->y = self->pReader->get_y();
-        pLasPoint->z = self->pReader->get_z();
-        pLasPoint->intensity = pPoint->get_intensity();
+        // always add a new point, but only convert the fields asked for
+        double x = self->pReader->get_x();
+        double y = self->pReader->get_y();
+        double z = self->pReader->get_z();
+        pointXYZ.push_back(x);
+        pointXYZ.push_back(y);
+        pointXYZ.push_back(z);
+        SET_POINT_FIELD(LASPOINT_X, double, x);
+        SET_POINT_FIELD(LASPOINT_Y, double, y);
+        SET_POINT_FIELD(LASPOINT_Z, double, z);
+        SET_POINT_FIELD(LASPOINT_INTENSITY, npy_uint16, pPoint->get_intensity());
+        // NOTE: get_extended_return_number/get_return_number can't be relied on
+        // we deal with this below by re-writing.
+        SET_POINT_FIELD(LASPOINT_RETURN_NUMBER, npy_uint8, 0);
         if( pPoint->extended_point_type )
         {
             // use the 'extended' fields since they are bigger
             // I *think* there is no need for the un-extended fields in this case
-            // NOTE: get_extended_return_number/get_return_number can't be relied on
-            // we deal with this below by re-writing.
-            //pLasPoint->return_number = pPoint->get_extended_return_number() - 1; // 1-based for some reason
-            pLasPoint->classification = pPoint->get_extended_classification();
+            SET_POINT_FIELD(LASPOINT_CLASSIFICATION, npy_uint8, pPoint->get_extended_classification());
         }
         else
         {
-            //pLasPoint->return_number = pPoint->get_return_number() - 1; // 1-based for some reason
-            pLasPoint->classification = pPoint->get_classification();
+            SET_POINT_FIELD(LASPOINT_CLASSIFICATION, npy_uint8, pPoint->get_classification());
         }
-        pLasPoint->synthetic_flag = pPoint->get_synthetic_flag();
-        pLasPoint->keypoint_flag = pPoint->get_keypoint_flag();
-        pLasPoint->withheld_flag = pPoint->get_withheld_flag();
-        pLasPoint->user_data = pPoint->get_user_data();
-        pLasPoint->point_source_ID = pPoint->get_point_source_ID();
-        pLasPoint->deleted_flag = pPoint->get_deleted_flag();
-        pLasPoint->extended_point_type = pPoint->extended_point_type; // no function?
-        pLasPoint->red = pPoint->rgb[0];        
-        pLasPoint->green = pPoint->rgb[1];        
-        pLasPoint->blue = pPoint->rgb[2];        
-        pLasPoint->nir = pPoint->rgb[3];        
-
-        // now extra fields
+        SET_POINT_FIELD(LASPOINT_SYNTHETIC_FLAG, npy_uint8, pPoint->get_synthetic_flag());
+        SET_POINT_FIELD(LASPOINT_KEYPOINT_FLAG, npy_uint8, pPoint->get_keypoint_flag());
+        SET_POINT_FIELD(LASPOINT_WITHHELD_FLAG, npy_uint8, pPoint->get_withheld_flag());
+        SET_POINT_FIELD(LASPOINT_USER_DATA, npy_uint8, pPoint->get_user_data());
+        SET_POINT_FIELD(LASPOINT_POINT_SOURCE_ID, npy_uint16, pPoint->get_point_source_ID());
+        SET_POINT_FIELD(LASPOINT_DELETED_FLAG, npy_uint32, pPoint->get_deleted_flag());
+        SET_POINT_FIELD(LASPOINT_EXTENDED_POINT_TYPE, npy_uint8, pPoint->extended_point_type); // no function?
+        SET_POINT_FIELD(LASPOINT_RED, npy_uint16, pPoint->rgb[0]);
+        SET_POINT_FIELD(LASPOINT_GREEN, npy_uint16, pPoint->rgb[1]);
+        SET_POINT_FIELD(LASPOINT_BLUE, npy_uint16, pPoint->rgb[2]);
+        SET_POINT_FIELD(LASPOINT_NIR, npy_uint16, pPoint->rgb[3]);
+
+        // now extra fields. These follow the standard ones.
         if( self->pLasPointFieldsWithExt != NULL )
         {
             for( I32 i = 0; i < pPoint->attributer->number_attributes; i++ )
             {
                 // TODO: _U etc
-                double dVal = pPoint->get_attribute_as_float(i);
-
-                // find offset
-                SpylidarFieldDefn *pDefn = &self->pLasPointFieldsWithExt[0];
-                while( pDefn->pszName != NULL )
-                {
-                    if( strcmp(pPoint->get_attribute_name(i), pDefn->pszName) == 0 )
-                    {
-                        // use memcpy so works on SPARC etc without unaligned mem access
-                        memcpy((char*)pLasPoint + pDefn->nOffset, &dVal, sizeof(double));
-                        break;
-                    }
-                    pDefn++;
-                }
+                SET_POINT_FIELD(LASPOINT_NFIELDS + i, double, pPoint->get_attribute_as_float(i));
             }
         }
 
-        pPoints->push(pLasPoint);
-        //fprintf(stderr, "Pushed new point ret num %d %d\n", pLasPoint->return_number, nReturnNumber);
+        if( pPoints != NULL )
+        {
+            pPoints->push((SLasPoint*)pPointRecord);
+        }
+        nPoints++;
+        //fprintf(stderr, "Pushed new point %d\n", nReturnNumber);
 
         // only add a pulse if we are building a pulse per point (self->bBuildPulses == false)
         // or this is the first return of a number of points
         if( !self->bBuildPulses || (nReturnNumber == 0 ) )
         {
+            if( bNonSpatial )
+            {
+                // non-spatial so remember where pulses start 
+                PyLasFileRead_addCheckpoint(self, self->nPulsesRead + pulses.getNumElems(),
+                            self->nCurrentPoint);
+            }
+
             lasPulse.scan_angle_rank = pPoint->get_scan_angle_rank();
             lasPulse.scan_angle = pPoint->get_scan_angle();
-            lasPulse.pts_start_idx = pPoints->getNumElems() - 1;
+            lasPulse.pts_start_idx = nPoints - 1;
             //fprintf(stderr, "expecting %d points\n", (int)pPoint->get_number_of_returns());
             if( self->bBuildPulses )
                 lasPulse.number_of_returns = pPoint->get_number_of_returns();
@@ -791,9 +1277,9 @@ static PyObject *PyLasFileRead_readData(PyLasFileRead *self, PyObject *args)
             lasPulse.edge_of_flight_line = pPoint->get_edge_of_flight_line();
             lasPulse.scanner_channel = pPoint->get_extended_scanner_channel(); // 0 if not 'extended'
 
-            if( self->pWaveformReader != NULL )
+            if( ( self->pWaveformReader != NULL ) && bReadWaveforms )
             {
-                // we have waveforms
+                // we have waveforms and they were asked for
                 self->pWaveformReader->read_waveform(pPoint);
 
                 U8 lasindex = pPoint->wavepacket.getIndex();
@@ -840,9 +1326,9 @@ static PyObject *PyLasFileRead_readData(PyLasFileRead *self, PyObject *args)
                        This is calculated as the location of the first return 
                        minus the time offset multiplied by XYZ(t) which is a vector
                        away from the laser origin */
-                    lasPulse.x_origin = pLasPoint->x - location * self->pWaveformReader->XYZt[0];
-                    lasPulse.y_origin = pLasPoint->y - location * self->pWaveformReader->XYZt[1];
-                    lasPulse.z_origin = pLasPoint->z - location * self->pWaveformReader->XYZt[2];
+                    lasPulse.x_origin = x - location * self->pWaveformReader->XYZt[0];
+                    lasPulse.y_origin = y - location * self->pWaveformReader->XYZt[1];
+                    lasPulse.z_origin = z - location * self->pWaveformReader->XYZt[2];
 
                     /* Get the end location of the return pulse
                       This is calculated as start location of the pulse
@@ -888,7 +1374,7 @@ static PyObject *PyLasFileRead_readData(PyLasFileRead *self, PyObject *args)
 
         // update loop exit for non-spatial reads
         // spatial reads keep going until all the way through the file
-        if( PyTuple_Size(args) == 2 )
+        if( bNonSpatial )
         {
             // need to ensure we have read all the points for the last
             // pulse also
@@ -897,35 +1383,56 @@ static PyObject *PyLasFileRead_readData(PyLasFileRead *self, PyObject *args)
     }
 
     self->nPulsesRead += pulses.getNumElems();
-    //fprintf(stderr, "pulses %ld points %ld\n", pulses.getNumElems(), pPoints->getNumElems());
+    //fprintf(stderr, "pulses %ld points %ld\n", pulses.getNumElems(), nPoints);
+
+    if( pPointDefn == NULL )
+    {
+        // There were no points loaded in this call. 
+        // We still need to create an empty array so go through the process
+        // so the fields match any arrays we have already returned.
+        pPointDefn = PyLasFileRead_getPointRecordDefn(self, pColumnSet, 
+                                &pointOffsets, &nPointRecordSize);
+        if( nPointRecordSize > 0 )
+        {
+            pPoints = new pylidar::CVector<SLasPoint>(nInitSize, nGrowBy, nPointRecordSize);
+        }
+    }
+
+    // SET_POINT_FIELD is used on the points already read below
+    free(pPointRecord);
 
     // go through all the pulses and do some tidying up
     for( npy_intp nPulseCount = 0; nPulseCount < pulses.getNumElems(); nPulseCount++)
     {
         SLasPulse *pPulse = pulses.getElem(nPulseCount);
-        SLasPoint *p1 = pPoints->getElem(pPulse->pts_start_idx);
-        SLasPoint *p2 = NULL;
+        double *p1 = NULL; // x, y and z of the first point
+        double *p2 = NULL; // and the last
 
         // set x_idx and y_idx for the pulses
         if( pPulse->number_of_returns > 0 )
         {
-            p2 = pPoints->getElem(pPulse->pts_start_idx + pPulse->number_of_returns - 1);
+            p1 = &pointXYZ[pPulse->pts_start_idx * 3];
+            p2 = &pointXYZ[(pPulse->pts_start_idx + pPulse->number_of_returns - 1) * 3];
             if( self->nPulseIndex == FIRST_RETURN )
             {
-                pPulse->x_idx = p1->x;
-                pPulse->y_idx = p1->y;
+                pPulse->x_idx = p1[0];
+                pPulse->y_idx = p1[1];
             }
             else
             {
-                pPulse->x_idx = p2->x;
-                pPulse->y_idx = p2->y;
+                pPulse->x_idx = p2[0];
+                pPulse->y_idx = p2[1];
             }
             
             // now re-write the return_number as we can't trust the return from 
             // get_return_number() (above)
-            for( npy_intp i = 0; i < pPulse->number_of_returns; i++ )
+            if( pointOffsets[LASPOINT_RETURN_NUMBER] >= 0 )
             {
-                pPoints->getElem(pPulse->pts_start_idx + i)->return_number = i;
+                for( npy_intp i = 0; i < pPulse->number_of_returns; i++ )
+                {
+                    pPointRecord = (char*)pPoints->getElem(pPulse->pts_start_idx + i);
+                    SET_POINT_FIELD(LASPOINT_RETURN_NUMBER, npy_uint8, i);
+                }
             }
         }
 
@@ -934,39 +1441,30 @@ static PyObject *PyLasFileRead_readData(PyLasFileRead *self, PyObject *args)
         // zenith, azimuth etc if self->bBuildPulses
         if( self->bBuildPulses && ( pPulse->number_of_returns > 1 ) && ( pPulse->zenith == 0 ) && ( pPulse->azimuth == 0) )
         {
-            ConvertCoordsToAngles(p2->x, p1->x, p2->y, p1->y, p2->z, p1->z,
+            ConvertCoordsToAngles(p2[0], p1[0], p2[1], p1[1], p2[2], p1[2],
                         &pPulse->zenith, &pPulse->azimuth);
         }
     }
 
-    // as we only allocated when we knew the size with extra fields
-    free(pLasPoint);
-
     PyArrayObject *pNumpyPulses = pulses.getNumpyArray(LasPulseFields);
-    SpylidarFieldDefn *pPointDefn = LasPointFields;
-    if( self->pLasPointFieldsWithExt != NULL )
+
+    // None if no point fields were asked for since numpy can't
+    // have an array without fields
+    PyObject *pNumpyPoints = Py_None;
+    if( pPoints != NULL )
     {
-        // extra fields - use other definition instead
-        pPointDefn = self->pLasPointFieldsWithExt;
+        pNumpyPoints = (PyObject*)pPoints->getNumpyArray(pPointDefn);
+        delete pPoints;
     }
-
-    if( pPoints == NULL )
+    else
     {
-        // There were no points loaded in this call. 
-        // We still need to create an empty array so go through the process
-        // so the fields match any arrays we have already returned.
-        int nSizeStruct = LasPointFields[0].nStructTotalSize;
-        if( self->pLasPointFieldsWithExt != NULL )
-        {
-            // there are extra fields. Use this size instead
-            nSizeStruct = self->pLasPointFieldsWithExt[0].nStructTotalSize;
-        }
-        // now know size of items
-        pPoints = new pylidar::CVector<SLasPoint>(nInitSize, nGrowBy, nSizeStruct);
+        Py_INCREF(pNumpyPoints);
+    }
+    free(pPointDefn);
+    if( pColumnSet != NULL )
+    {
+        delete pColumnSet;
     }
-
-    PyArrayObject *pNumpyPoints = pPoints->getNumpyArray(pPointDefn);
-    delete pPoints;
     PyArrayObject *pNumpyInfos = waveformInfos.getNumpyArray(LasWaveformInfoFields);
     PyArrayObject *pNumpyReceived = received.getNumpyArray(NPY_UINT8);
 
@@ -1026,6 +1524,9 @@ static PyObject *PyLasFileRead_setExtent(PyLasFileRead *self, PyObject *args)
 
     // set the new extent - point should now only be within these coords
     self->pReader->inside_rectangle(xMin, yMin, xMax, yMax);
+    // the worker threads don't know about the extent or use 
+    // the spatial index so read directly from now on
+    self->bDecodeAhead = false;
     // seek back to the start - laslib doesn't seem to do this
     // we want to read all points in the file within these coords
     self->pReader->seek(0);
@@ -1138,13 +1639,40 @@ static PyObject *PyLasFileRead_getNativeDataType(PyLasFileRead *self, PyObject *
 }
 
 /* Table of methods */
+// replace the checkpoint table with one previously obtained from
+// the checkpoints attribute (ie loaded from a sidecar file)
+static PyObject *PyLasFileRead_setCheckpoints(PyLasFileRead *self, PyObject *args)
+{
+    PyObject *pCheckpoints;
+    if( !PyArg_ParseTuple(args, "O:setCheckpoints", &pCheckpoints ) )
+        return NULL;
+
+    PyArrayObject *pArray = (PyArrayObject*)PyArray_FROMANY(pCheckpoints, NPY_INT64, 1, 1, NPY_ARRAY_IN_ARRAY);
+    if( pArray == NULL )
+    {
+        // exception already set
+        return NULL;
+    }
+
+    self->pCheckpoints->clear();
+    npy_intp nSize = PyArray_DIM(pArray, 0);
+    for( npy_intp i = 0; i < nSize; i++ )
+    {
+        self->pCheckpoints->push_back(*(npy_int64*)PyArray_GETPTR1(pArray, i));
+    }
+    Py_DECREF(pArray);
+
+    Py_RETURN_NONE;
+}
+
 static PyMethodDef PyLasFileRead_methods[] = {
     {"readHeader", (PyCFunction)PyLasFileRead_readHeader, METH_NOARGS, NULL},
-    {"readData", (PyCFunction)PyLasFileRead_readData, METH_VARARGS, NULL}, 
+    {"readData", (PyCFunction)PyLasFileRead_readData, METH_VARARGS | METH_KEYWORDS, NULL}, 
     {"getEPSG", (PyCFunction)PyLasFileRead_getEPSG, METH_NOARGS, NULL},
     {"setExtent", (PyCFunction)PyLasFileRead_setExtent, METH_VARARGS, NULL},
     {"getScaling", (PyCFunction)PyLasFileRead_getScaling, METH_VARARGS, NULL},
     {"getNativeDataType", (PyCFunction)PyLasFileRead_getNativeDataType, METH_VARARGS, NULL},
+    {"setCheckpoints", (PyCFunction)PyLasFileRead_setCheckpoints, METH_VARARGS, NULL},
     {NULL}  /* Sentinel */
 };
 
@@ -1197,6 +1725,20 @@ static int PyLasFileRead_setBinSize(PyLasFileRead *self, PyObject *value, void *
 }
 
 
+static PyObject *PyLasFileRead_getCheckpoints(PyLasFileRead *self, void *closure)
+{
+    npy_intp nSize = self->pCheckpoints->size();
+    PyObject *pArray = PyArray_SimpleNew(1, &nSize, NPY_INT64);
+    if( pArray == NULL )
+        return NULL;
+
+    for( npy_intp i = 0; i < nSize; i++ )
+    {
+        *(npy_int64*)PyArray_GETPTR1((PyArrayObject*)pArray, i) = self->pCheckpoints->at(i);
+    }
+    return pArray;
+}
+
 /* get/set */
 static PyGetSetDef PyLasFileRead_getseters[] = {
     {(char*)"build_pulses", (getter)PyLasFileRead_getBuildPulses, NULL, 
@@ -1209,6 +1751,8 @@ static PyGetSetDef PyLasFileRead_getseters[] = {
         (char*)"Number of pulses read", NULL},
     {(char*)"binSize", (getter)PyLasFileRead_getBinSize, (setter)PyLasFileRead_setBinSize,
         (char*)"Bin size to use for spatial data", NULL},
+    {(char*)"checkpoints", (getter)PyLasFileRead_getCheckpoints, NULL,
+        (char*)"Point index of the first point of every CHECKPOINT_INTERVAL'th pulse found so far", NULL},
     {NULL}  /* Sentinel */
 };
 
@@ -2430,6 +2974,7 @@ init_las(void)
     // module constants
     PyModule_AddIntConstant(pModule, "FIRST_RETURN", FIRST_RETURN);
     PyModule_AddIntConstant(pModule, "LAST_RETURN", LAST_RETURN);
+    PyModule_AddIntConstant(pModule, "CHECKPOINT_INTERVAL", CHECKPOINT_INTERVAL);
 
 #if PY_MAJOR_VERSION >= 3
     return pModule;
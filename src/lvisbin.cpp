@@ -1577,8 +1577,27 @@ static PyObject *PyLVISFiles_getFinished(PyLVISFiles* self, void *closure)
         Py_RETURN_FALSE;
 }
 
+// versions of the files as found by detect_release_version(). 0 if the file isn't open.
+static PyObject *PyLVISFiles_getLCEVersion(PyLVISFiles* self, void *closure)
+{
+    return PyFloat_FromDouble(self->lceVersion);
+}
+
+static PyObject *PyLVISFiles_getLGEVersion(PyLVISFiles* self, void *closure)
+{
+    return PyFloat_FromDouble(self->lgeVersion);
+}
+
+static PyObject *PyLVISFiles_getLGWVersion(PyLVISFiles* self, void *closure)
+{
+    return PyFloat_FromDouble(self->lgwVersion);
+}
+
 static PyGetSetDef PyLVISFiles_getseters[] = {
     {(char*)"finished", (getter)PyLVISFiles_getFinished, NULL, (char*)"Get Finished reading state", NULL},
+    {(char*)"lceVersion", (getter)PyLVISFiles_getLCEVersion, NULL, (char*)"Get version of the LCE file", NULL},
+    {(char*)"lgeVersion", (getter)PyLVISFiles_getLGEVersion, NULL, (char*)"Get version of the LGE file", NULL},
+    {(char*)"lgwVersion", (getter)PyLVISFiles_getLGWVersion, NULL, (char*)"Get version of the LGW file", NULL},
     {NULL}  /* Sentinel */
 };
 